@@ -1,8 +1,16 @@
 import argparse
+import json
 import logging
+import sys
+import time
 from pathlib import Path
 
-from matching.process import conduct_matching_from_file, create_mailing_list
+from matching.batch import find_cohorts, match_cohorts, summarise
+from matching.cache import ScoreCache
+from matching.observer import NULL_OBSERVER, Profiler
+from matching.export import FORMATS
+from matching.process import conduct_matching_from_file, create_mailing_lists
+from matching.rules.spec import load_rules
 
 
 def main():
@@ -10,15 +18,125 @@ def main():
         description='Match mentors to mentees. Your files should be called "mentees.csv" and "mentors.csv".'
     )
     parser.add_argument(
-        "filepath", type=str, help="the path to the data containing the files"
+        "filepath",
+        type=str,
+        nargs="+",
+        help="the path to the data containing the files. Give more than one, a glob pattern, or a text file listing "
+        "them, to match a batch of cohorts",
     )
-    path_to_data = Path(parser.parse_args().filepath)
+    parser.add_argument(
+        "--rules",
+        type=Path,
+        required=True,
+        help="a JSON, TOML or YAML file describing the rules for each round. See matching.rules.spec",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="the number of processes to score matches with. More than one uses vectorised scoring",
+    )
+    parser.add_argument(
+        "--capacity-matching",
+        action="store_true",
+        help="make every round's matches in one solve, rather than one round at a time",
+    )
+    parser.add_argument(
+        "--partition-by",
+        help='solve each round in shards of participants who share this attribute, such as "profession", or '
+        '"components" to shard by which pairs are allowed, followed by one clean-up solve for everyone left over',
+    )
+    parser.add_argument(
+        "--score-cache",
+        type=Path,
+        help="a folder to keep rule outcomes in, so that running the same cohort again doesn't score the same rules "
+        "again. Uses vectorised scoring",
+    )
+    parser.add_argument(
+        "--export-format",
+        choices=[*FORMATS, "columnar"],
+        default="csv",
+        help='the format to write the lists in. "columnar" is Parquet if pyarrow is installed, and npz otherwise',
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        help="write timings, pair counts and per-rule statistics for the run to this file",
+    )
+    parser.add_argument(
+        "--profile-format",
+        choices=["json", "chrome"],
+        default="json",
+        help='"chrome" writes a trace that can be opened in chrome://tracing or Perfetto',
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="in a batch, the number of cohorts to match at once, each in its own process",
+    )
+    parser.add_argument(
+        "--summary",
+        type=Path,
+        help="in a batch, write the time each cohort took and how many matches it made to this file, rather than to "
+        "the screen",
+    )
+    args = parser.parse_args()
+    scoring = "vectorised" if args.workers > 1 or args.score_cache else "object"
+    if len(args.filepath) > 1 or not Path(args.filepath[0]).is_dir():
+        if args.profile:
+            parser.error("--profile can only be used with one cohort")
+        try:
+            cohorts = find_cohorts(args.filepath)
+        except ValueError as error:
+            parser.error(str(error))
+        match_batch(cohorts, args, scoring)
+        return
+    path_to_data = Path(args.filepath[0])
+    profiler = Profiler() if args.profile else None
     logging.info("Beginning matching exercise. This might take up to five minutes.")
-    mentors, mentees = conduct_matching_from_file(path_to_data)
+    mentors, mentees = conduct_matching_from_file(
+        path_to_data,
+        load_rules(args.rules),
+        scoring=scoring,
+        workers=args.workers,
+        observer=profiler,
+        capacity_matching=args.capacity_matching,
+        partition_by=args.partition_by,
+        score_cache=None if args.score_cache is None else ScoreCache(args.score_cache),
+    )
     logging.info("Matches found. Exporting to output folder!")
     out_put_folder = path_to_data / "output"
-    create_mailing_list(mentors, out_put_folder)
-    create_mailing_list(mentees, out_put_folder)
+    with (NULL_OBSERVER if profiler is None else profiler).stage("export"):
+        create_mailing_lists(mentors, mentees, out_put_folder, args.export_format)
+    if profiler is not None:
+        profiler.dump(args.profile, args.profile_format)
+
+
+def match_batch(cohorts, args, scoring):
+    logging.info(f"Matching {len(cohorts)} cohorts, {args.jobs} at a time.")
+    start = time.perf_counter()
+    reports = match_cohorts(
+        cohorts,
+        args.rules,
+        jobs=args.jobs,
+        export_format=args.export_format,
+        score_cache=args.score_cache,
+        scoring=scoring,
+        workers=args.workers,
+        capacity_matching=args.capacity_matching,
+        partition_by=args.partition_by,
+    )
+    summary = summarise(reports, time.perf_counter() - start)
+    if args.summary is None:
+        json.dump(summary, sys.stdout, indent=2)
+    else:
+        args.summary.write_text(json.dumps(summary, indent=2))
+    for report in reports:
+        if report.error is not None:
+            logging.error(f"Couldn't match {report.folder}: {report.error}")
+    if summary["failed"]:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,193 @@
+"""
+Matching many cohorts in one go.
+
+Each cohort is a folder with a ``mentors.csv`` and a ``mentees.csv``, as on the command line, and is matched with the
+same rules file and written to its own ``output`` folder. `find_cohorts` turns folders, glob patterns and manifest
+files into a list of cohort folders, and `match_cohorts` matches them in a pool of worker processes. Each worker
+starts Python and imports the package once, however many cohorts it matches.
+
+The biggest cohorts are started first. Matching takes roughly as long as the number of mentor/mentee pairs, and a big
+cohort left until last would keep one worker busy long after the others have run out of work. Starting with the big
+ones leaves the small ones to fill in the gaps at the end.
+
+A cohort that can't be matched doesn't stop the others: its `CohortReport` has the error instead. A worker process
+that dies, say for running out of memory, breaks the pool, and every cohort that hadn't finished by then is reported
+with that error too.
+"""
+import glob
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from matching.cache import ScoreCache
+from matching.process import conduct_matching_from_file, create_mailing_lists
+from matching.rules.spec import load_rules
+
+#: The files a cohort folder must have
+COHORT_FILES = ("mentors.csv", "mentees.csv")
+
+
+class CohortReport(NamedTuple):
+    folder: str
+    mentors: int
+    mentees: int
+    #: How many mentor/mentee pairs were made, over every round
+    matches: int
+    seconds: float
+    error: Optional[str] = None
+
+
+def _is_cohort(folder: Path) -> bool:
+    return all((folder / name).is_file() for name in COHORT_FILES)
+
+
+def find_cohorts(sources: Iterable[str]) -> List[Path]:
+    """
+    Lists the cohort folders in ``sources``, in order and without repeats. Each source is a cohort folder, a glob
+    pattern like ``"cohorts/*"``, whose matches are kept if they're cohort folders, or a manifest: a text file with a
+    folder or pattern on each line, relative to the manifest. Blank lines and lines starting with ``#`` are skipped
+    """
+    folders: Dict[Path, None] = {}
+    for source in sources:
+        path = Path(source)
+        if path.is_dir():
+            if not _is_cohort(path):
+                raise ValueError(
+                    f"{path} isn't a cohort: it needs {' and '.join(COHORT_FILES)}"
+                )
+            folders[path] = None
+        elif path.is_file():
+            lines = (line.strip() for line in path.read_text().splitlines())
+            entries = [line for line in lines if line and not line.startswith("#")]
+            folders.update(
+                dict.fromkeys(find_cohorts(str(path.parent / line) for line in entries))
+            )
+        else:
+            matched = [
+                Path(match)
+                for match in sorted(glob.glob(source))
+                if _is_cohort(Path(match))
+            ]
+            if not matched:
+                raise ValueError(f"There are no cohort folders matching {source}")
+            folders.update(dict.fromkeys(matched))
+    return list(folders)
+
+
+def _rows(path: Path) -> int:
+    # counted by line, so a value with a line break in it is counted twice, which is near enough for an estimate
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    return max(lines + (last != b"\n") - 1, 0)
+
+
+def cohort_size(folder: Path) -> int:
+    """
+    Estimates how much work matching a cohort is: the number of mentors times the number of mentees, from the lines in
+    their files
+    """
+    return _rows(folder / "mentors.csv") * _rows(folder / "mentees.csv")
+
+
+def match_cohort(
+    folder: Path,
+    rules_path: Path,
+    export_format: str = "csv",
+    score_cache: Optional[Path] = None,
+    **options: Any,
+) -> CohortReport:
+    """
+    Matches one cohort folder with the rules in ``rules_path`` and writes its lists to its ``output`` folder. The
+    ``options`` are passed to `conduct_matching_from_file`. Any error is caught and reported
+    """
+    start = time.perf_counter()
+    mentors: List[Any] = []
+    mentees: List[Any] = []
+    try:
+        mentors, mentees = conduct_matching_from_file(
+            folder,
+            load_rules(rules_path),
+            score_cache=None if score_cache is None else ScoreCache(score_cache),
+            **options,
+        )
+        create_mailing_lists(mentors, mentees, folder / "output", export_format)
+    except Exception as error:
+        return CohortReport(
+            str(folder),
+            len(mentors),
+            len(mentees),
+            0,
+            time.perf_counter() - start,
+            f"{type(error).__name__}: {error}",
+        )
+    return CohortReport(
+        str(folder),
+        len(mentors),
+        len(mentees),
+        sum(len(mentor.connections) for mentor in mentors),
+        time.perf_counter() - start,
+    )
+
+
+def match_cohorts(
+    folders: Iterable[Path],
+    rules_path: Path,
+    jobs: int = 1,
+    export_format: str = "csv",
+    score_cache: Optional[Path] = None,
+    **options: Any,
+) -> List[CohortReport]:
+    """
+    Matches every cohort in ``folders``, ``jobs`` at a time, biggest first (see `cohort_size`), and returns a report on
+    each, in the order they were given. With one job, the cohorts are matched in this process. See `match_cohort`
+    """
+    if jobs < 1:
+        raise ValueError("Cohorts need at least one job to be matched in")
+    folders = list(folders)
+    order = sorted(
+        range(len(folders)), key=lambda index: cohort_size(folders[index]), reverse=True
+    )
+    settings = dict(export_format=export_format, score_cache=score_cache, **options)
+    reports: List[Optional[CohortReport]] = [None] * len(folders)
+    if jobs == 1 or len(folders) < 2:
+        for index in order:
+            reports[index] = match_cohort(folders[index], rules_path, **settings)
+    else:
+        with ProcessPoolExecutor(min(jobs, len(folders))) as pool:
+            futures = {
+                index: pool.submit(match_cohort, folders[index], rules_path, **settings)
+                for index in order
+            }
+            for index, future in futures.items():
+                try:
+                    reports[index] = future.result()
+                except Exception as error:
+                    # the worker itself failed, perhaps killed for running out of memory, taking the pool with it
+                    reports[index] = CohortReport(
+                        str(folders[index]),
+                        0,
+                        0,
+                        0,
+                        0.0,
+                        f"{type(error).__name__}: {error}",
+                    )
+    return [report for report in reports if report is not None]
+
+
+def summarise(reports: List[CohortReport], seconds: float) -> Dict[str, Any]:
+    """
+    Sums up a batch of cohorts that took ``seconds`` from start to finish, for writing as JSON
+    """
+    return {
+        "cohorts": [report._asdict() for report in reports],
+        "matched": sum(report.error is None for report in reports),
+        "failed": sum(report.error is not None for report in reports),
+        "matches": sum(report.matches for report in reports),
+        "seconds": seconds,
+        "cohort seconds": sum(report.seconds for report in reports),
+    }
@@ -0,0 +1,688 @@
+"""
+Benchmarks for the matching pipeline.
+
+Run ``python -m matching.bench pipeline`` to time every stage of a matching round on synthetic cohorts, and
+``python -m matching.bench compare`` to compare two of its reports. ``python -m matching.bench solvers`` compares the
+assignment solvers on random score matrices, and ``python -m matching.bench approximation`` measures how far the
+approximate solvers fall short of the best assignment. ``python -m matching.bench participants`` measures the
+participant model, ``python -m matching.bench ingest`` measures how quickly participant files are loaded, and
+``python -m matching.bench serialization`` how quickly whole cohorts are encoded and decoded. Every benchmark writes JSON
+to standard output.
+"""
+import argparse
+import csv
+import datetime
+import json
+import operator
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from importlib import metadata
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import matching.rules.rule as rl
+from matching.columnar import Vocabulary
+from matching.connections import connect_all
+from matching.factory import ParticipantFactory
+from matching.ingest import load_participants, read_table
+from matching.match import Match
+from matching.mentee import Mentee
+from matching.mentor import Mentor
+from matching.process import (
+    assign_from_candidate_graph,
+    calculate_matches,
+    create_mailing_lists,
+    create_matches,
+    create_participant_list_from_path,
+    generate_candidate_graph,
+    generate_match_matrix,
+    generate_score_matrix,
+    prepare_matrix,
+)
+from matching.serialization import (
+    cohort_from_bytes,
+    cohort_from_dict,
+    cohort_to_bytes,
+    cohort_to_dict,
+)
+from matching.solvers import (
+    SOLVERS,
+    AuctionSolver,
+    GreedySolver,
+    JonkerVolgenantSolver,
+    SolverProtocol,
+    get_solver,
+    prepare_costs,
+)
+
+
+def random_score_matrix(
+    rows: int, columns: int, seed: int = 0, disallowed_share: float = 0.2
+) -> np.ndarray:
+    """
+    Returns the kind of cost matrix `prepare_matrix` produces for random scores below 20, with a share of the cells
+    disallowed
+    """
+    generator = np.random.default_rng(seed)
+    scores = generator.integers(0, 20, size=(rows, columns))
+    return prepare_costs(scores, generator.random((rows, columns)) < disallowed_share)
+
+
+def benchmark_solvers(
+    sizes: Sequence[int], solvers: Sequence[str], seed: int = 0
+) -> List[Dict]:
+    """
+    Times each solver on a square and a rectangular matrix of every size, and records the cost of the assignment it
+    finds. The exact solvers should all agree on the cost; see `benchmark_approximation` for the approximate ones
+    """
+    results = []
+    for size in sizes:
+        for rows, columns in ((size, size), (size, size * 3 // 2)):
+            cost_matrix = random_score_matrix(rows, columns, seed)
+            for name in solvers:
+                start = time.perf_counter()
+                assignment = get_solver(name).solve(cost_matrix)
+                elapsed = time.perf_counter() - start
+                results.append(
+                    {
+                        "solver": name,
+                        "rows": rows,
+                        "columns": columns,
+                        "seconds": elapsed,
+                        "total_cost": int(
+                            sum(cost_matrix[row, column] for row, column in assignment)
+                        ),
+                    }
+                )
+    return results
+
+
+def benchmark_approximation(
+    sizes: Sequence[int],
+    epsilons: Sequence[float] = (0.5, 1.0, 5.0),
+    improvement_passes: Sequence[int] = (0, 2),
+    seed: int = 0,
+) -> List[Dict]:
+    """
+    Scores a synthetic cohort of each size with `default_rules`, then solves it exactly with Jonker-Volgenant and
+    approximately with `GreedySolver` and `AuctionSolver` at each of the given settings. Each result has the seconds the
+    solver took, the total score of its assignment and its ``gap``: the share of the best possible total score that it
+    fell short by.
+    """
+    solvers: List[Tuple[str, Optional[float], SolverProtocol]] = [
+        ("jonker-volgenant", None, JonkerVolgenantSolver())
+    ]
+    solvers += [
+        ("greedy", passes, GreedySolver(improvement_passes=passes))
+        for passes in improvement_passes
+    ]
+    solvers += [
+        ("auction", epsilon, AuctionSolver(epsilon=epsilon)) for epsilon in epsilons
+    ]
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            mentors, mentees = _load(
+                write_synthetic_cohort(Path(directory), size, seed)
+            )
+        score_matrix = generate_score_matrix(mentors, mentees, default_rules())
+        scores = score_matrix.take(*score_matrix.viable()).masked_scores()
+        costs = prepare_costs(scores)
+        optimum = None
+        for name, setting, solver in solvers:
+            start = time.perf_counter()
+            assignment = solver.solve(costs)
+            elapsed = time.perf_counter() - start
+            total = int(sum(scores[pair] for pair in assignment))
+            optimum = total if optimum is None else optimum
+            results.append(
+                {
+                    "size": size,
+                    "solver": name,
+                    "setting": setting,
+                    "seconds": elapsed,
+                    "total_score": total,
+                    "gap": (optimum - total) / optimum if optimum else 0.0,
+                }
+            )
+    return results
+
+
+def benchmark_participants(
+    count: int = 10000, pairs: int = 100000, seed: int = 0
+) -> Dict:
+    """
+    Measures how much memory each participant takes up, and how quickly pairs can be evaluated. Every participant has
+    three connections, so that the "previously matched" check built into `Match` has some work to do.
+    """
+    generator = random.Random(seed)
+    organisations = [f"Department {i}" for i in range(40)]
+    professions = [f"Profession {i}" for i in range(25)]
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    # each row gets its own copy of every string, as it would when read from a CSV file
+    rows = [
+        {
+            "first name": f"First {i}",
+            "last name": f"Last {i}",
+            "email": f"participant.{i}@example.com",
+            "role": "".join("Some role"),
+            "organisation": "".join(generator.choice(organisations)),
+            "grade": generator.randint(0, 6),
+            "profession": "".join(generator.choice(professions)),
+        }
+        for i in range(count)
+    ]
+    mentors = [Mentor(**row) for row in rows[: count // 2]]
+    mentees = [Mentee(**row) for row in rows[count // 2 :]]
+    del rows
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    for mentor in mentors:
+        mentor.mentees.extend(generator.sample(mentees, 3))
+    for mentee in mentees:
+        mentee.mentors.extend(generator.sample(mentors, 3))
+
+    sample = [
+        (generator.choice(mentors), generator.choice(mentees)) for _ in range(pairs)
+    ]
+    start = time.perf_counter()
+    for mentor, mentee in sample:
+        Match(mentor, mentee, []).calculate_match()
+    elapsed = time.perf_counter() - start
+    return {
+        "participants": count,
+        "bytes_per_participant": (after - before) / count,
+        "pairs": pairs,
+        "pairs_per_second": pairs / elapsed,
+    }
+
+
+#: Grades run from 0 (most junior) to 6. Mentees are mostly junior and mentors mostly senior
+MENTEE_GRADE_WEIGHTS = [0.12, 0.22, 0.26, 0.2, 0.12, 0.06, 0.02]
+MENTOR_GRADE_WEIGHTS = [0.01, 0.04, 0.1, 0.2, 0.28, 0.24, 0.13]
+PARTICIPANT_HEADER = [
+    "first name",
+    "last name",
+    "email",
+    "role",
+    "organisation",
+    "grade",
+    "profession",
+]
+
+
+def _zipf_weights(count: int) -> List[float]:
+    return [1 / (rank + 1) for rank in range(count)]
+
+
+def synthetic_rows(role: str, count: int, generator: random.Random) -> List[List]:
+    """
+    Returns ``count`` rows for a participant file. Organisations and professions follow a Zipf distribution, so a few
+    big departments and professions account for most people, as in a real cohort; grades follow the weights above.
+    """
+    organisations = [f"Department {i}" for i in range(40)]
+    professions = [f"Profession {i}" for i in range(25)]
+    grade_weights = MENTOR_GRADE_WEIGHTS if role == "mentor" else MENTEE_GRADE_WEIGHTS
+    return [
+        [f"First {i}", f"Last {i}", f"{role}.{i}@example.com", "Some role", *values]
+        for i, values in enumerate(
+            zip(
+                generator.choices(
+                    organisations, _zipf_weights(len(organisations)), k=count
+                ),
+                generator.choices(range(7), grade_weights, k=count),
+                generator.choices(
+                    professions, _zipf_weights(len(professions)), k=count
+                ),
+            )
+        )
+    ]
+
+
+def write_participant_file(
+    path: Path, rows: int, seed: int = 0, role: str = "mentor"
+) -> Path:
+    """
+    Writes a participant file of ``rows`` synthetic participants, with the same columns as ``mentors.csv``
+    """
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(PARTICIPANT_HEADER)
+        writer.writerows(synthetic_rows(role, rows, random.Random(seed)))
+    return path
+
+
+def write_synthetic_cohort(
+    path: Path, size: int, seed: int = 0, both_share: float = 0.05
+) -> Path:
+    """
+    Writes ``mentors.csv`` and ``mentees.csv`` for a cohort of ``size`` participants, two in five of them mentors. A
+    ``both_share`` of the mentors have signed up as mentees too, with the same email address, as people do.
+    """
+    generator = random.Random(seed)
+    mentor_count = size * 2 // 5
+    mentors = synthetic_rows("mentor", mentor_count, generator)
+    mentees = synthetic_rows("mentee", size - mentor_count, generator)
+    for mentee, mentor in zip(
+        mentees, generator.sample(mentors, int(len(mentors) * both_share))
+    ):
+        mentee[:3] = mentor[:3]
+    for role, rows in (("mentor", mentors), ("mentee", mentees)):
+        with open(path / f"{role}s.csv", "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(PARTICIPANT_HEADER)
+            writer.writerows(rows)
+    return path
+
+
+def default_rules() -> List[rl.RuleProtocol]:
+    """
+    A typical round: mentors must be one or two grades more senior and from a different organisation, and sharing a
+    profession or being exactly one grade apart scores extra
+    """
+    return [
+        rl.Disqualify(rl.Grade(2, operator.gt).evaluate),
+        rl.Disqualify(rl.Grade(0, operator.le).evaluate),
+        rl.Disqualify(rl.Equivalent("organisation").evaluate),
+        rl.Grade(1, operator.eq, {True: 12, False: 0}),
+        rl.Equivalent("profession", {True: 4, False: 0}),
+        rl.UnmatchedBonus(6),
+    ]
+
+
+def _load(path: Path):
+    return (
+        create_participant_list_from_path(Mentor, path),
+        create_participant_list_from_path(Mentee, path),
+    )
+
+
+def _export(mentors, mentees, output: Path):
+    create_mailing_lists(mentors, mentees, output)
+
+
+def _object_pipeline(path: Path, output: Path, rules, solver: str) -> Iterator[str]:
+    mentors, mentees = _load(path)
+    yield "load"
+    match_matrix = generate_match_matrix(mentors, mentees, rules)
+    yield "generate_match_matrix"
+    good_matches = create_matches(match_matrix)
+    del match_matrix
+    yield "create_matches"
+    prepared_matrix = prepare_matrix(good_matches)
+    yield "prepare_matrix"
+    for row, column in calculate_matches(prepared_matrix, solver):  # type: ignore
+        good_matches[row][column].mark_successful()
+    yield "calculate_matches"
+    _export(mentors, mentees, output)
+    yield "export"
+
+
+def _vectorised_pipeline(path: Path, output: Path, rules, solver: str) -> Iterator[str]:
+    mentors, mentees = _load(path)
+    yield "load"
+    score_matrix = generate_score_matrix(mentors, mentees, rules)
+    yield "generate_score_matrix"
+    prepared_matrix = prepare_costs(score_matrix.scores, score_matrix.disallowed)
+    yield "prepare_matrix"
+    for row, column in calculate_matches(prepared_matrix, solver):
+        if not score_matrix.disallowed[row, column]:
+            Match(mentors[row], mentees[column], []).mark_successful()
+    yield "calculate_matches"
+    _export(mentors, mentees, output)
+    yield "export"
+
+
+def _sparse_pipeline(path: Path, output: Path, rules, solver: str) -> Iterator[str]:
+    mentors, mentees = _load(path)
+    yield "load"
+    candidate_graph = generate_candidate_graph(mentors, mentees, rules)
+    yield "generate_candidate_graph"
+    assign_from_candidate_graph(mentors, mentees, candidate_graph)
+    yield "calculate_matches"
+    _export(mentors, mentees, output)
+    yield "export"
+
+
+#: Each pipeline runs one round, one stage per step. The object pipeline is the one `process_data` uses by default; it
+#: holds a `Match` for every pair, so beyond a few thousand participants use "vectorised" or, for the biggest cohorts,
+#: "sparse"
+PIPELINES: Dict[str, Callable[[Path, Path, List, str], Iterator[str]]] = {
+    "object": _object_pipeline,
+    "vectorised": _vectorised_pipeline,
+    "sparse": _sparse_pipeline,
+}
+
+
+def _run_stages(
+    stages: Iterator[str], track_memory: bool, until: Optional[str] = None
+) -> Dict[str, float]:
+    """
+    Runs a pipeline a stage at a time, stopping after the stage called ``until`` if there is one. Returns either the
+    seconds each stage took or, if ``track_memory``, the peak number of bytes each stage allocated on top of what was
+    already allocated when it started
+    """
+    measurements: Dict[str, float] = {}
+    while True:
+        start: float
+        if track_memory:
+            tracemalloc.reset_peak()
+            start, _ = tracemalloc.get_traced_memory()
+        else:
+            start = time.perf_counter()
+        stage = next(stages, None)
+        if stage is None:
+            return measurements
+        if track_memory:
+            measurements[stage] = tracemalloc.get_traced_memory()[1] - start
+        else:
+            measurements[stage] = time.perf_counter() - start
+        if stage == until:
+            return measurements
+
+
+def benchmark_pipeline(
+    sizes: Sequence[int],
+    pipeline: str = "object",
+    solver: str = "munkres",
+    seed: int = 0,
+    track_memory: bool = True,
+    until: Optional[str] = None,
+) -> Dict:
+    """
+    Runs one round of matching on a synthetic cohort of each size, timing every stage. If ``track_memory``, the round
+    is run a second time under `tracemalloc` to find each stage's peak memory, so that the timings aren't slowed down
+    by it. With ``until``, the round stops after that stage: the biggest cohorts can be loaded and scored long before
+    they can be solved.
+    """
+    run = PIPELINES[pipeline]
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            path = write_synthetic_cohort(Path(directory), size, seed)
+            seconds = _run_stages(
+                run(path, path / "output", default_rules(), solver), False, until
+            )
+            peak_bytes: Dict[str, float] = {}
+            if track_memory:
+                tracemalloc.start()
+                try:
+                    peak_bytes = _run_stages(
+                        run(path, path / "memory", default_rules(), solver),
+                        True,
+                        until,
+                    )
+                finally:
+                    tracemalloc.stop()
+        for stage, elapsed in seconds.items():
+            results.append(
+                {
+                    "size": size,
+                    "stage": stage,
+                    "seconds": elapsed,
+                    "peak_bytes": peak_bytes.get(stage),
+                }
+            )
+    return {
+        "pipeline": pipeline,
+        "solver": solver,
+        "seed": seed,
+        "environment": _environment(),
+        "results": results,
+    }
+
+
+def _environment() -> Dict[str, str]:
+    try:
+        version = metadata.version("mentor-match")
+    except metadata.PackageNotFoundError:
+        version = "unknown"
+    return {
+        "mentor_match": version,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "recorded_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+
+def compare_pipeline_results(
+    baseline: Dict, current: Dict, threshold: float = 0.1
+) -> List[Dict]:
+    """
+    Compares two sets of `benchmark_pipeline` results stage by stage. A stage has regressed if it took more than
+    ``threshold`` longer, or used more than ``threshold`` more memory, than it did in the baseline.
+    """
+
+    def _by_stage(report: Dict) -> Dict:
+        return {
+            (result["size"], result["stage"]): result for result in report["results"]
+        }
+
+    baseline_stages = _by_stage(baseline)
+    comparison = []
+    for key, result in _by_stage(current).items():
+        if key not in baseline_stages:
+            continue
+        before = baseline_stages[key]
+        row: Dict[str, object] = {"size": key[0], "stage": key[1], "regressed": False}
+        for measure in ("seconds", "peak_bytes"):
+            if before[measure] and result[measure] is not None:
+                ratio = result[measure] / before[measure]
+                row[f"{measure}_ratio"] = ratio
+                row["regressed"] = row["regressed"] or ratio > 1 + threshold
+        comparison.append(row)
+    return comparison
+
+
+def benchmark_ingest(
+    rows: int = 100000, chunk_size: int = 10000, seed: int = 0
+) -> Dict:
+    """
+    Times loading a participant file of ``rows`` rows: the old way, through `csv.DictReader`, and with the chunked
+    loader into tables, participants and columns
+    """
+
+    def _dict_reader(path: Path):
+        with open(path, "r") as file:
+            return [Mentor(**row) for row in csv.DictReader(file)]
+
+    loaders: Dict[str, Callable[[Path], object]] = {
+        "dict_reader_participants": _dict_reader,
+        "table": lambda path: read_table(path, chunk_size),
+        "table_mmap": lambda path: read_table(path, chunk_size, use_mmap=True),
+        "participants": lambda path: load_participants(
+            Mentor, path, chunk_size=chunk_size
+        ),
+        "columns": lambda path: read_table(path, chunk_size).to_columns(  # type: ignore
+            Vocabulary()
+        ),
+    }
+    results: Dict[str, object] = {"rows": rows, "chunk_size": chunk_size}
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_participant_file(Path(directory) / "mentors.csv", rows, seed)
+        for name, load in loaders.items():
+            start = time.perf_counter()
+            load(path)
+            results[f"{name}_rows_per_second"] = rows / (time.perf_counter() - start)
+    return results
+
+
+def benchmark_serialization(
+    sizes: Sequence[int] = (10000, 50000), seed: int = 0
+) -> List[Dict]:
+    """
+    Times a round trip of a matched synthetic cohort of each size: through `Person.to_dict`, JSON and
+    `ParticipantFactory`, and through `matching.serialization` as JSON and in its binary format. Each result has the
+    seconds taken to encode and decode, the size of the encoding, and how many participant objects decoding built
+    """
+
+    def _nested_decode(payload):
+        return [
+            ParticipantFactory.create_from_dict(data) for data in json.loads(payload)
+        ]
+
+    encodings: Dict[str, Tuple[Callable, Callable]] = {
+        "nested_json": (
+            lambda people: json.dumps([person.to_dict() for person in people]).encode(),
+            _nested_decode,
+        ),
+        "table_json": (
+            lambda people: json.dumps(cohort_to_dict(people)).encode(),
+            lambda payload: cohort_from_dict(json.loads(payload)),
+        ),
+        "table_binary": (cohort_to_bytes, cohort_from_bytes),
+    }
+    results = []
+    for size in sizes:
+        generator = random.Random(seed)
+        mentor_count = size * 2 // 5
+        mentors = [
+            Mentor(**dict(zip(PARTICIPANT_HEADER, row)))
+            for row in synthetic_rows("mentor", mentor_count, generator)
+        ]
+        mentees = [
+            Mentee(**dict(zip(PARTICIPANT_HEADER, row)))
+            for row in synthetic_rows("mentee", size - mentor_count, generator)
+        ]
+        # three mentees for every mentor, and no more than two mentors for any mentee
+        connect_all(
+            (mentor, mentees[(3 * i + offset) % len(mentees)])
+            for i, mentor in enumerate(mentors)
+            for offset in range(3)
+        )
+        people = mentors + mentees
+        for name, (encode, decode) in encodings.items():
+            start = time.perf_counter()
+            payload = encode(people)
+            encoded = time.perf_counter()
+            decoded = decode(payload)
+            finished = time.perf_counter()
+            results.append(
+                {
+                    "participants": size,
+                    "encoding": name,
+                    "encode_seconds": encoded - start,
+                    "decode_seconds": finished - encoded,
+                    "bytes": len(payload),
+                    "objects_built": len(decoded)
+                    + sum(len(person.connections) for person in decoded)
+                    if name == "nested_json"
+                    else len(decoded),
+                }
+            )
+    return results
+
+
+def main(arguments: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the matching pipeline")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    solver_parser = subparsers.add_parser(
+        "solvers", help="compare the assignment solvers"
+    )
+    solver_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[50, 100, 200, 400]
+    )
+    solver_parser.add_argument(
+        "--solvers", nargs="+", choices=list(SOLVERS), default=list(SOLVERS)
+    )
+    solver_parser.add_argument("--seed", type=int, default=0)
+    approximation_parser = subparsers.add_parser(
+        "approximation",
+        help="measure how far the approximate solvers fall short of the exact one",
+    )
+    approximation_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 4000]
+    )
+    approximation_parser.add_argument(
+        "--epsilons", type=float, nargs="+", default=[0.5, 1.0, 5.0]
+    )
+    approximation_parser.add_argument(
+        "--improvement-passes", type=int, nargs="+", default=[0, 2]
+    )
+    approximation_parser.add_argument("--seed", type=int, default=0)
+    participant_parser = subparsers.add_parser(
+        "participants", help="measure participant memory and pair evaluation speed"
+    )
+    participant_parser.add_argument("--count", type=int, default=10000)
+    participant_parser.add_argument("--pairs", type=int, default=100000)
+    ingest_parser = subparsers.add_parser(
+        "ingest", help="measure how quickly participant files are loaded"
+    )
+    ingest_parser.add_argument("--rows", type=int, default=100000)
+    ingest_parser.add_argument("--chunk-size", type=int, default=10000)
+    serialization_parser = subparsers.add_parser(
+        "serialization", help="time encoding and decoding whole cohorts"
+    )
+    serialization_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000, 50000]
+    )
+    serialization_parser.add_argument("--seed", type=int, default=0)
+    pipeline_parser = subparsers.add_parser(
+        "pipeline", help="time each stage of a matching round on synthetic cohorts"
+    )
+    pipeline_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100, 250, 500, 1000]
+    )
+    pipeline_parser.add_argument(
+        "--pipeline", choices=list(PIPELINES), default="object"
+    )
+    pipeline_parser.add_argument("--solver", choices=list(SOLVERS), default="munkres")
+    pipeline_parser.add_argument("--seed", type=int, default=0)
+    pipeline_parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="skip the second run that measures peak memory",
+    )
+    pipeline_parser.add_argument(
+        "--until", help="the last stage to run, for example load"
+    )
+    compare_parser = subparsers.add_parser(
+        "compare", help="compare two pipeline reports, flagging regressions"
+    )
+    compare_parser.add_argument("baseline", type=Path)
+    compare_parser.add_argument("current", type=Path)
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args(arguments)
+    results: object
+    if args.benchmark == "pipeline":
+        results = benchmark_pipeline(
+            args.sizes,
+            args.pipeline,
+            args.solver,
+            args.seed,
+            not args.no_memory,
+            args.until,
+        )
+    elif args.benchmark == "compare":
+        results = compare_pipeline_results(
+            json.loads(args.baseline.read_text()),
+            json.loads(args.current.read_text()),
+            args.threshold,
+        )
+    elif args.benchmark == "solvers":
+        results = benchmark_solvers(args.sizes, args.solvers, args.seed)
+    elif args.benchmark == "approximation":
+        results = benchmark_approximation(
+            args.sizes, args.epsilons, args.improvement_passes, args.seed
+        )
+    elif args.benchmark == "participants":
+        results = benchmark_participants(args.count, args.pairs)
+    elif args.benchmark == "serialization":
+        results = benchmark_serialization(args.sizes, args.seed)
+    else:
+        results = benchmark_ingest(args.rows, args.chunk_size)
+    json.dump(results, sys.stdout, indent=2)
+    if args.benchmark == "compare" and any(row["regressed"] for row in results):  # type: ignore
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
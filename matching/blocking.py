@@ -0,0 +1,163 @@
+"""
+Blocking: ruling pairs out before they're scored.
+
+Every `Match` carries two `Disqualify` rules, and rule lists often add more. For most pairs in a big cohort one of
+these is bound to fire, and yet the pair still pays for a `Match` and every rule. The `BlockingIndex` builds a few
+cheap indexes up front so that those pairs are skipped entirely.
+"""
+import logging
+from collections import defaultdict
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    DefaultDict,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from matching.match import Match
+from matching.observer import Observer
+from matching.rules import rule as rl
+from matching.rules.compiler import compile_rules
+
+if TYPE_CHECKING:
+    from matching.mentee import Mentee
+    from matching.mentor import Mentor
+
+
+class PrunedMatch(Match):
+    """
+    Stands in for a pair the blocking index has ruled out. It is never scored and is always disallowed, so
+    `create_matches` and `prepare_matrix` treat it exactly like a disqualified `Match`. One instance is shared by every
+    pruned cell.
+    """
+
+    def __init__(self):
+        self._disallowed = True
+        self._score = 0
+        self.rules = []
+
+
+PRUNED = PrunedMatch()
+
+
+class BlockingIndex:
+    """
+    Indexes the mentees of one round so that, for each mentor, the mentees they can't possibly be matched with are
+    known without scoring them. A pair is pruned if:
+
+    - the mentor and mentee have the same email address (looked up in a hash of mentee emails)
+    - they've been matched before (looked up in each participant's set of previous connections)
+    - a `Disqualify` rule wrapping `Grade.evaluate` rules out the mentee's grade (mentees are bucketed by grade)
+    - a `Disqualify` rule wrapping `Equivalent.evaluate` rules out the mentee's value of that attribute
+
+    Any other rule might depend on anything, so it's left to be scored as normal.
+    """
+
+    def __init__(
+        self,
+        mentors: Sequence["Mentor"],
+        mentees: Sequence["Mentee"],
+        rules: Sequence[rl.RuleProtocol],
+    ):
+        self.mentors = mentors
+        self.mentees = mentees
+        self.pair_count = len(mentors) * len(mentees)
+        self.pruned_count = 0
+        self._grade_rules: List[rl.Grade] = []
+        self._equivalence_attributes: List[str] = []
+        for rule in rules:
+            wrapped_rule = (
+                rule.wrapped_rule if isinstance(rule, rl.Disqualify) else None
+            )
+            if isinstance(wrapped_rule, rl.Grade):
+                self._grade_rules.append(wrapped_rule)
+            elif isinstance(wrapped_rule, rl.Equivalent):
+                self._equivalence_attributes.append(wrapped_rule.attribute)
+
+        self._mentees_by_email: DefaultDict[Hashable, Set[int]] = defaultdict(set)
+        self._previous_mentees: DefaultDict[Hashable, Set[int]] = defaultdict(set)
+        self._buckets: DefaultDict[Tuple, List[int]] = defaultdict(list)
+        for index, mentee in enumerate(mentees):
+            self._mentees_by_email[mentee.email].add(index)
+            self._buckets[self._bucket_key(mentee)].append(index)
+        for index, mentee in enumerate(mentees):
+            for mentor in mentee.mentors:
+                self._previous_mentees[mentor.email].add(index)
+        self._allowed_buckets: Dict[Tuple, List[Tuple]] = {}
+
+    def _bucket_key(self, participant) -> Tuple:
+        return (participant.grade,) + tuple(
+            participant.__getattribute__(attribute)
+            for attribute in self._equivalence_attributes
+        )
+
+    def _bucket_allowed(self, mentor_key: Tuple, mentee_key: Tuple) -> bool:
+        grade_difference = mentor_key[0] - mentee_key[0]
+        if any(
+            rule.operator(grade_difference, rule.target_diff)
+            for rule in self._grade_rules
+        ):
+            return False
+        return all(
+            mentor_value != mentee_value
+            for mentor_value, mentee_value in zip(mentor_key[1:], mentee_key[1:])
+        )
+
+    def candidates(self, mentor: "Mentor") -> Set[int]:
+        """
+        Returns the indices of the mentees this mentor might be matched with, and counts the rest as pruned
+        """
+        mentor_key = self._bucket_key(mentor)
+        if mentor_key not in self._allowed_buckets:
+            self._allowed_buckets[mentor_key] = [
+                mentee_key
+                for mentee_key in self._buckets
+                if self._bucket_allowed(mentor_key, mentee_key)
+            ]
+        candidates = {
+            index
+            for mentee_key in self._allowed_buckets[mentor_key]
+            for index in self._buckets[mentee_key]
+        }
+        candidates -= self._mentees_by_email.get(mentor.email, set())
+        candidates -= self._previous_mentees.get(mentor.email, set())
+        for previous_mentee in mentor.mentees:
+            candidates -= self._mentees_by_email.get(previous_mentee.email, set())
+        self.pruned_count += len(self.mentees) - len(candidates)
+        return candidates
+
+
+def generate_blocked_match_matrix(
+    mentor_list: Sequence["Mentor"],
+    mentee_list: Sequence["Mentee"],
+    rules: List[rl.RuleProtocol],
+    report: Callable[[BlockingIndex], None] = lambda index: None,
+    observer: Optional[Observer] = None,
+) -> List[List[Match]]:
+    """
+    Like `generate_match_matrix`, except that pairs the `BlockingIndex` rules out are never scored: their cells hold
+    the shared `PRUNED` placeholder instead. Once the grid is built, the index is passed to ``report``.
+    """
+    index = BlockingIndex(mentor_list, mentee_list, rules)
+    compiled_rules = compile_rules(rules, observer)
+    matrix = []
+    for mentor in mentor_list:
+        candidates = index.candidates(mentor)
+        matrix.append(
+            [
+                compiled_rules.match(mentor, mentee) if column in candidates else PRUNED
+                for column, mentee in enumerate(mentee_list)
+            ]
+        )
+    logging.info(
+        f"Blocking pruned {index.pruned_count} of {index.pair_count} pairs before"
+        " scoring"
+    )
+    report(index)
+    return matrix
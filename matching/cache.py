@@ -0,0 +1,145 @@
+"""
+An on-disk cache of rule outcomes.
+
+Re-running the same cohort while tweaking one round's rules means scoring the same rules against the same people
+over and over. A `ScoreCache` keeps each rule's outcome for every pair in a folder, and reuses it whenever the same rule
+is scored against the same data again.
+
+An outcome is looked up by a key made from the rule's `Fingerprint` - its class and settings - and the values in the
+participant columns it reads. Changing a rule's settings, or the data it looks at, gives a different key, so nothing
+stale is ever used; changing someone's profession doesn't invalidate the rules that only look at grades. Rules that
+can't be fingerprinted, like a `Generic` rule built around a `lambda`, are scored as normal every time.
+
+Outcomes are stored as bit-packed ``.npy`` files, one bit per pair, so 1,600 mentors by 2,400 mentees take under half a
+megabyte. When the folder grows past ``max_bytes``, the entries used least recently are deleted.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from matching.columnar import ParticipantColumns, ScoreMatrix
+from matching.rules.rule import Rule
+
+#: Bump this if the way outcomes are keyed or stored changes, so that old entries are never read
+_FORMAT = "1"
+
+
+class ScoreCache:
+    """
+    A folder of rule outcomes, with at most ``max_bytes`` of them kept. ``hits``, ``misses`` and ``bypassed`` count how
+    many rules were found in the cache, were scored and stored, or couldn't be cached at all.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def can_cache(rule: object) -> bool:
+        return isinstance(rule, Rule) and rule.fingerprint() is not None
+
+    def key(
+        self, rule: Rule, mentors: ParticipantColumns, mentees: ParticipantColumns
+    ) -> Optional[str]:
+        """
+        The key this rule's outcome for these participants is stored under, or `None` if the rule can't be cached
+        """
+        fingerprint = rule.fingerprint()
+        if fingerprint is None:
+            return None
+        # some of the columns a fingerprint lists, like an `Expression`'s flags, only exist once the rule has prepared
+        # them
+        rule.prepare(mentors, mentees)
+        digest = hashlib.sha256(
+            repr((_FORMAT, fingerprint.settings, len(mentors), len(mentees))).encode()
+        )
+        for name in fingerprint.columns:
+            digest.update(name.encode())
+            for participants in (mentors, mentees):
+                digest.update(
+                    np.ascontiguousarray(
+                        participants.column(name), dtype=np.int64
+                    ).tobytes()
+                )
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.npy"
+
+    def apply(
+        self,
+        rule: Rule,
+        mentors: ParticipantColumns,
+        mentees: ParticipantColumns,
+        score_matrix: ScoreMatrix,
+    ) -> bool:
+        """
+        Adds the rule's outcome to ``score_matrix``, from the cache if it's there and otherwise by evaluating the rule
+        and storing the outcome. Returns `False`, having done nothing, if the rule can't be cached
+        """
+        key = self.key(rule, mentors, mentees)
+        if key is None:
+            self.bypassed += 1
+            return False
+        outcome = self._load(key, len(mentees))
+        if outcome is None:
+            self.misses += 1
+            outcome = np.asarray(rule.evaluate_array(mentors, mentees), dtype=bool)
+            self._store(key, outcome)
+        else:
+            self.hits += 1
+        rule.apply_outcome(outcome, score_matrix)
+        return True
+
+    def _load(self, key: str, columns: int) -> Optional[np.ndarray]:
+        path = self._path(key)
+        try:
+            packed = np.load(path, mmap_mode="r")
+            os.utime(path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        return np.unpackbits(packed, axis=1, count=columns).view(bool)
+
+    def _store(self, key: str, outcome: np.ndarray) -> None:
+        # written to a temporary file and moved into place, so that a reader never sees half an entry
+        file, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(file, "wb") as temporary_file:
+            np.save(temporary_file, np.packbits(outcome, axis=1))
+        os.replace(temporary, self._path(key))
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Deletes the entries used least recently until the cache is no bigger than ``max_bytes``
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npy"):
+                try:
+                    status = entry.stat()
+                except FileNotFoundError:
+                    # evicted by another process sharing the folder
+                    continue
+                entries.append((status.st_mtime, status.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self) -> None:
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npy"):
+                os.remove(entry.path)
@@ -0,0 +1,404 @@
+"""
+Columnar representations of mentors and mentees.
+
+The object-based scoring path builds a `Match` for every mentor/mentee pair and applies each rule to it in turn. The
+classes here turn lists of participants into NumPy arrays so that the whole grid of scores can be calculated at once.
+"""
+import time
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Collection,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from matching.cache import ScoreCache
+    from matching.match import Match
+    from matching.observer import Observer
+    from matching.person import Person
+    from matching.rules.rule import RuleProtocol
+
+Indices = Union[Sequence[int], np.ndarray]
+
+
+class Vocabulary:
+    """
+    Maps attribute values to small integer codes. Mentors and mentees in the same cohort share a vocabulary, so that
+    comparing two codes is the same as comparing the values they stand for.
+    """
+
+    def __init__(self):
+        self._tables: Dict[str, Dict[Hashable, int]] = {}
+
+    def encode(self, attribute: str, values: Sequence[Hashable]) -> np.ndarray:
+        table = self._tables.setdefault(attribute, {})
+        return np.fromiter(
+            (table.setdefault(value, len(table)) for value in values),
+            dtype=np.int64,
+            count=len(values),
+        )
+
+
+def flag_column(attribute: str, values: Collection[Hashable]) -> str:
+    """
+    The name of the column that says whether each participant's `attribute` is one of ``values``
+    """
+    return f"{attribute} in [{', '.join(sorted(repr(value) for value in values))}]"
+
+
+class ParticipantColumns:
+    """
+    A list of participants stored column by column. Grades, email codes and connection counts are extracted up front;
+    any other attribute is encoded the first time a rule asks for it.
+
+    A compact copy (see `compact`) has no participants or vocabulary, only the columns already encoded.
+    """
+
+    def __init__(
+        self,
+        participants: Optional[Sequence["Person"]],
+        vocabulary: Optional[Vocabulary],
+        columns: Optional[Dict[str, np.ndarray]] = None,
+    ):
+        self.participants = participants
+        self.vocabulary = vocabulary
+        if columns is None:
+            assert participants is not None and vocabulary is not None
+            columns = {
+                "grade": np.fromiter(
+                    (participant.grade for participant in participants),
+                    dtype=np.int64,
+                    count=len(participants),
+                ),
+                "email": vocabulary.encode(
+                    "email", [participant.email for participant in participants]
+                ),
+                "connection_count": np.fromiter(
+                    (len(participant.connections) for participant in participants),
+                    dtype=np.int64,
+                    count=len(participants),
+                ),
+            }
+        self._columns = columns
+
+    def __len__(self) -> int:
+        return len(self._columns["grade"])
+
+    @property
+    def grade(self) -> np.ndarray:
+        return self._columns["grade"]
+
+    @property
+    def email(self) -> np.ndarray:
+        return self._columns["email"]
+
+    @property
+    def connection_count(self) -> np.ndarray:
+        return self._columns["connection_count"]
+
+    def codes(self, attribute: str) -> np.ndarray:
+        """
+        Returns the integer codes for `attribute`, encoding it against the shared vocabulary if this is the first
+        time it has been asked for
+        """
+        if attribute not in self._columns:
+            if self.participants is None or self.vocabulary is None:
+                raise KeyError(f"{attribute} was not encoded before compacting")
+            self._columns[attribute] = self.vocabulary.encode(
+                attribute,
+                [
+                    participant.__getattribute__(attribute)
+                    for participant in self.participants
+                ],
+            )
+        return self._columns[attribute]
+
+    def flags(self, attribute: str, values: Collection[Hashable]) -> np.ndarray:
+        """
+        Returns whether each participant's `attribute` is one of ``values``, working it out the first time it's asked
+        for. Like codes, flags are kept when the columns are compacted, under the name `flag_column` gives them
+        """
+        name = flag_column(attribute, values)
+        if name not in self._columns:
+            if self.participants is None:
+                raise KeyError(f"{name} was not worked out before compacting")
+            wanted = set(values)
+            self._columns[name] = np.fromiter(
+                (
+                    participant.__getattribute__(attribute) in wanted
+                    for participant in self.participants
+                ),
+                dtype=bool,
+                count=len(self.participants),
+            )
+        return self._columns[name]
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Returns one of the columns extracted up front, like "grade", or the codes for any other attribute
+        """
+        return self._columns[name] if name in self._columns else self.codes(name)
+
+    def refresh_connections(self, indices: Indices) -> None:
+        """
+        Re-reads the number of connections for the participants at `indices`
+        """
+        assert self.participants is not None
+        for index in indices:
+            self.connection_count[index] = len(self.participants[index].connections)
+
+    def take(self, indices: Indices) -> "ParticipantColumns":
+        """
+        Returns a new `ParticipantColumns` holding only the participants at `indices`
+        """
+        index_array = np.asarray(indices, dtype=np.int64)
+        return ParticipantColumns(
+            None
+            if self.participants is None
+            else [self.participants[i] for i in index_array],
+            self.vocabulary,
+            {name: column[index_array] for name, column in self._columns.items()},
+        )
+
+    def with_connection_count(
+        self, connection_count: np.ndarray
+    ) -> "ParticipantColumns":
+        """
+        Returns a compact copy (see `compact`) in which everyone has these numbers of connections instead
+        """
+        return ParticipantColumns(
+            None, None, {**self._columns, "connection_count": connection_count}
+        )
+
+    def compact(self) -> "ParticipantColumns":
+        """
+        Returns a copy holding only the columns that have been encoded so far, without the participants or the
+        vocabulary. This is far cheaper to send to another process.
+        """
+        return ParticipantColumns(None, None, dict(self._columns))
+
+
+class ScoreMatrix:
+    """
+    The scores for every mentor/mentee pair in a round, along with a mask of the pairs that have been disqualified.
+    Rows are mentors and columns are mentees, exactly like the `List[List[Match]]` grid.
+    """
+
+    def __init__(self, scores: np.ndarray, disallowed: np.ndarray):
+        self.scores = scores
+        self.disallowed = disallowed
+
+    @classmethod
+    def empty(cls, rows: int, columns: int) -> "ScoreMatrix":
+        return cls(
+            np.zeros((rows, columns), dtype=np.int64),
+            np.zeros((rows, columns), dtype=bool),
+        )
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.scores.shape
+
+    def masked_scores(self) -> np.ndarray:
+        """
+        Returns the scores as `Match.score` would report them: a disallowed pair always scores 0
+        """
+        return np.where(self.disallowed, 0, self.scores)
+
+    def viable(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the indices of the rows and columns that have at least one allowed pairing. As in `create_matches`,
+        rows are filtered first and columns are then checked against the remaining rows only.
+        """
+        allowed = ~self.disallowed
+        rows = np.flatnonzero(allowed.any(axis=1))
+        columns = np.flatnonzero(allowed[rows].any(axis=0))
+        return rows, columns
+
+    def take(self, rows: Indices, columns: Indices) -> "ScoreMatrix":
+        selector = np.ix_(np.asarray(rows), np.asarray(columns))
+        return ScoreMatrix(self.scores[selector], self.disallowed[selector])
+
+
+def evaluate_pairwise(
+    evaluate: Callable[["Match"], bool],
+    mentors: ParticipantColumns,
+    mentees: ParticipantColumns,
+) -> np.ndarray:
+    """
+    Evaluates a condition one pair at a time. This is the fallback for rules that have no vectorised implementation,
+    such as a `Generic` rule built around a `lambda`.
+    """
+    from matching.match import Match
+
+    if mentors.participants is None or mentees.participants is None:
+        raise ValueError("Compact columns can only be scored by vectorised rules")
+
+    outcome = np.empty((len(mentors), len(mentees)), dtype=bool)
+    for i, mentor in enumerate(mentors.participants):
+        for j, mentee in enumerate(mentees.participants):
+            outcome[i, j] = bool(evaluate(Match(mentor, mentee, [])))  # type: ignore
+    return outcome
+
+
+def apply_pairwise(
+    rule: "RuleProtocol",
+    mentors: ParticipantColumns,
+    mentees: ParticipantColumns,
+    score_matrix: ScoreMatrix,
+) -> None:
+    """
+    Applies a rule that only implements `RuleProtocol` by handing it a `Match` for every pair, then copying the
+    outcome into `score_matrix`
+    """
+    from matching.match import Match
+
+    if mentors.participants is None or mentees.participants is None:
+        raise ValueError("Compact columns can only be scored by vectorised rules")
+
+    for i, mentor in enumerate(mentors.participants):
+        for j, mentee in enumerate(mentees.participants):
+            match = Match(mentor, mentee, [])  # type: ignore
+            score_matrix.scores[i, j] += rule.apply(match)
+            score_matrix.disallowed[i, j] |= match.disallowed
+
+
+def _pair_keys(mentor_codes: np.ndarray, mentee_codes: np.ndarray) -> np.ndarray:
+    return (mentor_codes << 32) | mentee_codes
+
+
+class CohortColumns:
+    """
+    The mentors and mentees of one matching round as columns. This also records which pairs have been matched before,
+    so that the two disqualifying rules every `Match` carries can be applied to the whole grid at once.
+    """
+
+    def __init__(self, mentors: Sequence["Person"], mentees: Sequence["Person"]):
+        vocabulary = Vocabulary()
+        self.mentors = ParticipantColumns(mentors, vocabulary)
+        self.mentees = ParticipantColumns(mentees, vocabulary)
+        self.previous_pairs = self._encode_previous_pairs(vocabulary, mentors, mentees)
+
+    @classmethod
+    def from_columns(
+        cls,
+        mentors: ParticipantColumns,
+        mentees: ParticipantColumns,
+        previous_pairs: np.ndarray,
+    ) -> "CohortColumns":
+        cohort = cls.__new__(cls)
+        cohort.mentors = mentors
+        cohort.mentees = mentees
+        cohort.previous_pairs = previous_pairs
+        return cohort
+
+    @staticmethod
+    def _encode_previous_pairs(
+        vocabulary: Vocabulary,
+        mentors: Iterable["Person"],
+        mentees: Iterable["Person"],
+    ) -> np.ndarray:
+        pairs: List[Tuple[Hashable, Hashable]] = []
+        for mentor in mentors:
+            pairs.extend((mentor.email, mentee.email) for mentee in mentor.connections)
+        for mentee in mentees:
+            pairs.extend((mentor.email, mentee.email) for mentor in mentee.connections)
+        if not pairs:
+            return np.empty(0, dtype=np.int64)
+        mentor_emails, mentee_emails = zip(*pairs)
+        return np.unique(
+            _pair_keys(
+                vocabulary.encode("email", mentor_emails),
+                vocabulary.encode("email", mentee_emails),
+            )
+        )
+
+    def builtin_disallowed(
+        self, mentors: ParticipantColumns, mentees: ParticipantColumns
+    ) -> np.ndarray:
+        """
+        The vectorised equivalent of the two `Disqualify` rules built into `Match`: a mentor can't be matched with
+        themselves, or with someone they've been matched with before
+        """
+        return self.same_person(mentors, mentees) | self.previously_matched(
+            mentors, mentees
+        )
+
+    @staticmethod
+    def same_person(
+        mentors: ParticipantColumns, mentees: ParticipantColumns
+    ) -> np.ndarray:
+        return mentors.email[:, np.newaxis] == mentees.email[np.newaxis, :]
+
+    def previously_matched(
+        self, mentors: ParticipantColumns, mentees: ParticipantColumns
+    ) -> np.ndarray:
+        return np.isin(
+            _pair_keys(mentors.email[:, np.newaxis], mentees.email[np.newaxis, :]),
+            self.previous_pairs,
+        )
+
+    def record_match(self, mentor: int, mentee: int) -> None:
+        """
+        Brings the columns up to date after the mentor and mentee at these indices have been matched
+        """
+        self.mentors.refresh_connections([mentor])
+        self.mentees.refresh_connections([mentee])
+        self.previous_pairs = np.union1d(
+            self.previous_pairs,
+            _pair_keys(self.mentors.email[[mentor]], self.mentees.email[[mentee]]),
+        )
+
+    def score(
+        self,
+        rules: Sequence["RuleProtocol"],
+        observer: Optional["Observer"] = None,
+        cache: Optional["ScoreCache"] = None,
+    ) -> ScoreMatrix:
+        return score_block(self, self.mentors, self.mentees, rules, observer, cache)
+
+
+def score_block(
+    cohort: CohortColumns,
+    mentors: ParticipantColumns,
+    mentees: ParticipantColumns,
+    rules: Sequence["RuleProtocol"],
+    observer: Optional["Observer"] = None,
+    cache: Optional["ScoreCache"] = None,
+) -> ScoreMatrix:
+    """
+    Scores every pair in `mentors` x `mentees`, which may be any subset of the cohort's participants. If the
+    ``observer`` hands out a `RuleCounter` for a rule, the rule's evaluations, time and disqualifications are counted.
+    With a ``cache``, the outcome of every rule that can be cached is taken from it, or stored in it.
+    """
+    from matching.rules.rule import Rule
+
+    score_matrix = ScoreMatrix.empty(len(mentors), len(mentees))
+    score_matrix.disallowed |= cohort.builtin_disallowed(mentors, mentees)
+    for rule in rules:
+        counter = None if observer is None else observer.rule_counter(rule)
+        if counter is not None:
+            start = time.perf_counter()
+            disallowed_before = int(score_matrix.disallowed.sum())
+        if isinstance(rule, Rule):
+            if cache is None or not cache.apply(rule, mentors, mentees, score_matrix):
+                rule.apply_array(mentors, mentees, score_matrix)
+        else:
+            apply_pairwise(rule, mentors, mentees, score_matrix)
+        if counter is not None:
+            counter.seconds += time.perf_counter() - start
+            counter.evaluations += score_matrix.scores.size
+            counter.disqualified += (
+                int(score_matrix.disallowed.sum()) - disallowed_before
+            )
+    return score_matrix
@@ -0,0 +1,243 @@
+"""
+Tracking who has been matched with whom.
+
+Each participant's connections are held in a `Connections` list. It behaves like the plain list it replaces, but it
+also keeps two indexes of the people in it: their `participant_id`s and their emails. Membership tests use the email
+index, because two `Person` objects are equal when their emails are, and that's what lets a participant rebuilt by
+`ParticipantFactory` be recognised as a previous match. Either way a membership test is a set lookup rather than a scan
+that calls `Person.__eq__` on every connection. The list also knows how many connections its owner can have, so the
+limit that used to be hard-coded to three is now a per-person `capacity`.
+
+`connect` and `connected` work on pairs of participants, in both directions at once. A `ConnectionRegistry` looks
+participants up by `participant_id`, for when connections come in as ids, such as an assignment from a solver.
+"""
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    SupportsIndex,
+    Tuple,
+    Union,
+)
+
+if TYPE_CHECKING:
+    from matching.person import Person
+
+#: How many connections a participant can have unless they're given a different `capacity`
+DEFAULT_CAPACITY = 3
+
+
+class CapacityError(Exception):
+    """
+    Raised when a connection would take a participant past their capacity
+    """
+
+    pass
+
+
+class Connections(list):
+    """
+    One participant's connections. Every way of adding to the list checks the capacity first, and every way of
+    changing it keeps the indexes up to date. The indexes aren't built until they're first looked at, so a participant
+    with no connections only pays for an empty list, and a list can be filled with people who aren't finished yet, as
+    happens when a cohort whose people are connected to each other is unpickled or copied.
+    """
+
+    __slots__ = ("capacity", "_ids", "_emails")
+
+    def __init__(
+        self, connections: Iterable["Person"] = (), capacity: int = DEFAULT_CAPACITY
+    ):
+        super().__init__()
+        self.capacity = capacity
+        self._ids: Optional[Set[int]] = None
+        self._emails: Optional[Set[Optional[str]]] = None
+        self.extend(connections)
+
+    def __reduce__(self):
+        # rebuilt empty with its capacity and then filled, which leaves the indexes to be built when they're needed
+        return type(self), ((), self.capacity), None, iter(list(self))
+
+    def _indexes(self) -> Tuple[Set[int], Set[Optional[str]]]:
+        if self._ids is None or self._emails is None:
+            self._ids = {person.participant_id for person in self}
+            self._emails = {person.email for person in self}
+        return self._ids, self._emails
+
+    def __contains__(self, person: object) -> bool:
+        return len(self) > 0 and getattr(person, "email", None) in self._indexes()[1]
+
+    def contains_id(self, participant_id: int) -> bool:
+        return len(self) > 0 and participant_id in self._indexes()[0]
+
+    def ids(self) -> List[int]:
+        return [person.participant_id for person in self]
+
+    @property
+    def remaining(self) -> int:
+        return max(self.capacity - len(self), 0)
+
+    def _check_capacity(self, additions: int) -> None:
+        if len(self) + additions > self.capacity:
+            raise CapacityError(
+                f"Can't add {additions} connection(s) to {len(self)}: the capacity is {self.capacity}"
+            )
+
+    def _index(self, people: List["Person"]) -> None:
+        if self._ids is not None and self._emails is not None:
+            self._ids.update(person.participant_id for person in people)
+            self._emails.update(person.email for person in people)
+
+    def _reindex(self) -> None:
+        self._ids = self._emails = None
+
+    def append(self, person: "Person") -> None:
+        self._check_capacity(1)
+        super().append(person)
+        self._index([person])
+
+    def extend(self, people: Iterable["Person"]) -> None:
+        people = list(people)
+        self._check_capacity(len(people))
+        super().extend(people)
+        self._index(people)
+
+    def __iadd__(self, people: Iterable["Person"]) -> "Connections":  # type: ignore[override, misc]
+        self.extend(people)
+        return self
+
+    def __imul__(self, times: SupportsIndex) -> "Connections":  # type: ignore[override, misc]
+        self._check_capacity(len(self) * int(times) - len(self))
+        super().__imul__(times)
+        self._reindex()
+        return self
+
+    def insert(self, index: SupportsIndex, person: "Person") -> None:
+        self._check_capacity(1)
+        super().insert(index, person)
+        self._index([person])
+
+    def __setitem__(self, index, value) -> None:
+        new_length = (
+            len(self) - len(self[index]) + len(value)
+            if isinstance(index, slice)
+            else len(self)
+        )
+        if new_length > self.capacity:
+            raise CapacityError(
+                f"Can't have {new_length} connections: the capacity is {self.capacity}"
+            )
+        super().__setitem__(index, value)
+        self._reindex()
+
+    def __delitem__(self, index: Union[SupportsIndex, slice]) -> None:
+        super().__delitem__(index)
+        self._reindex()
+
+    def remove(self, person: "Person") -> None:
+        super().remove(person)
+        self._reindex()
+
+    def pop(self, index: SupportsIndex = -1) -> "Person":
+        person = super().pop(index)
+        self._reindex()
+        return person
+
+    def clear(self) -> None:
+        super().clear()
+        self._reindex()
+
+    def copy(self) -> "Connections":  # type: ignore[override]
+        return Connections(self, self.capacity)
+
+
+def connected(first: "Person", second: "Person") -> bool:
+    """
+    Whether either participant is in the other's connections. This is the check behind the built-in "previously
+    matched" rule, and takes the same time however many connections either of them has
+    """
+    return first in second.connections or second in first.connections
+
+
+def connect(first: "Person", second: "Person") -> None:
+    """
+    Adds each participant to the other's connections. Both capacities are checked before either list is changed, so a
+    `CapacityError` leaves them both as they were
+    """
+    first.connections._check_capacity(1)
+    second.connections._check_capacity(1)
+    first.connections.append(second)
+    second.connections.append(first)
+
+
+def connect_all(pairs: Iterable[Tuple["Person", "Person"]]) -> int:
+    """
+    Connects every pair, for example every mentor and mentee in an assignment. All the capacities are checked first, so
+    if any participant would go over theirs, a `CapacityError` is raised and nobody is connected.
+    :return: the number of pairs connected
+    """
+    pairs = list(pairs)
+    additions: Dict[int, int] = {}
+    participants: Dict[int, "Person"] = {}
+    for pair in pairs:
+        for person in pair:
+            additions[id(person)] = additions.get(id(person), 0) + 1
+            participants[id(person)] = person
+    for key, count in additions.items():
+        participants[key].connections._check_capacity(count)
+    for first, second in pairs:
+        first.connections.append(second)
+        second.connections.append(first)
+    return len(pairs)
+
+
+class ConnectionRegistry:
+    """
+    Finds participants by their `participant_id`, so that connections can be added and queried by id. The connections
+    themselves are still held by each participant, so the registry and the participants can't disagree.
+    """
+
+    def __init__(self, participants: Iterable["Person"] = ()):
+        self._participants: Dict[int, "Person"] = {}
+        self.register(participants)
+
+    def register(self, participants: Iterable["Person"]) -> None:
+        for participant in participants:
+            self._participants[participant.participant_id] = participant
+
+    def __len__(self) -> int:
+        return len(self._participants)
+
+    def __contains__(self, participant_id: object) -> bool:
+        return participant_id in self._participants
+
+    def __getitem__(self, participant_id: int) -> "Person":
+        return self._participants[participant_id]
+
+    def neighbours(self, participant_id: int) -> List[int]:
+        return self._participants[participant_id].connections.ids()
+
+    def connected(self, first_id: int, second_id: int) -> bool:
+        return connected(self._participants[first_id], self._participants[second_id])
+
+    def connect(self, first_id: int, second_id: int) -> None:
+        connect(self._participants[first_id], self._participants[second_id])
+
+    def add_assignment(self, pairs: Iterable[Tuple[int, int]]) -> int:
+        """
+        Connects each pair of participant ids, all or nothing, in the same way as `connect_all`
+        :return: the number of pairs connected
+        """
+        return connect_all(
+            (self._participants[first], self._participants[second])
+            for first, second in pairs
+        )
+
+    def set_capacity(self, participant_id: int, capacity: int) -> None:
+        self._participants[participant_id].capacity = capacity
+
+    def remaining(self, participant_id: int) -> int:
+        return self._participants[participant_id].connections.remaining
@@ -1,47 +1,405 @@
+"""
+Writing out the matches.
+
+`ExportToSpreadsheet` writes one row per participant, with their details followed by those of everyone they've been
+matched with. Rows are made one at a time as they're written, and the headings are worked out from the first row and
+the most connections anyone can have, so memory doesn't grow with the size of the cohort.
+
+Lists can be written as CSV, as gzipped CSV, or in a columnar format for downstream tools: Parquet if pyarrow is
+installed, and otherwise a NumPy ``.npz`` archive, which `read_columns` reads back. `export_all` writes several lists at
+once, one per thread. Compressing and writing files let other threads run, so the lists are written side by side.
+
+`ExportToEmail` tells each participant who they've been matched with, by email, sent in batches through
+`matching.mail`.
+"""
+import asyncio
 import csv
+import gzip
+import itertools
+import json
 import os
-from abc import abstractmethod
+import string
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
 
+from matching.connections import DEFAULT_CAPACITY
+from matching.mail import Email, EmailClient, SendReport, send_all
 from matching.mentee import Person
 
+try:
+    import pyarrow  # type: ignore
+    import pyarrow.parquet  # type: ignore
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pyarrow = None
+
+#: The file formats lists can be written in, and the suffix each gets. "columnar" is Parquet if pyarrow is installed,
+#: and npz if it isn't
+FORMATS = {"csv": ".csv", "csv.gz": ".csv.gz", "parquet": ".parquet", "npz": ".npz"}
+#: In columnar files, the number that stands for a missing grade
+MISSING_GRADE = -1
+
+
+def _is_grade(heading: str) -> bool:
+    return heading == "grade" or heading.endswith(" grade")
+
 
 class ExportToSpreadsheet:
-    def __init__(self, participants: list[Person], path_to_output_folder: Path):
+    """
+    Writes a list of participants out to ``path_to_output_folder``, as ``mentors-list.csv`` or ``mentees-list.csv``,
+    or with the suffix of another ``file_format`` (see `FORMATS`).
+
+    The participants can be any iterable, and are only read once. Rows come from `Person.to_dict_for_export`. The
+    headings are the first row's, followed by a set of "match" columns for as many connections as ``capacity``,
+    which is the largest capacity of anyone in the list if the participants are a sequence, and the default capacity
+    otherwise. Columnar formats are written ``batch_size`` rows at a time.
+    """
+
+    def __init__(
+        self,
+        participants: Iterable[Person],
+        path_to_output_folder: Path,
+        file_format: str = "csv",
+        capacity: Optional[int] = None,
+        batch_size: int = 4096,
+    ):
+        if file_format == "columnar":
+            file_format = "parquet" if pyarrow is not None else "npz"
+        if file_format not in FORMATS:
+            raise ValueError(f"Unknown export format: {file_format}")
+        if file_format == "parquet" and pyarrow is None:
+            raise ValueError("Exporting to Parquet needs pyarrow installed")
         self.output_path = path_to_output_folder
         self.participants = participants
+        self.file_format = file_format
+        if capacity is None:
+            capacity = (
+                max((participant.capacity for participant in participants), default=0)
+                if isinstance(participants, Sequence)
+                else DEFAULT_CAPACITY
+            )
+        self.capacity = capacity
+        self.batch_size = batch_size
 
-    def export(self):
+    def export(self) -> Path:
         """
         This function takes a list of either matched mentors or matched mentees. For each participant, it outputs their
-        data and the information of the participants they've been matched with. If a participant doesn't have the full
-        complement of three matches, the empty spaces are ignored.
-        """
-        participant_type = self.participants[0].class_name()
-        file_name = f"{participant_type}s-list.csv"
-        file = self.output_path.joinpath(file_name)
-        list_participants_as_dicts = [
-            participant.to_dict_for_export() for participant in self.participants
-        ]
-        field_headings = max(
-            list_participants_as_dicts, key=lambda participant: len(participant.keys())
-        ).keys()
+        data and the information of the participants they've been matched with. Participants with fewer connections
+        than others leave the rest of their match columns empty. Returns the path of the file it wrote.
+        """
+        participants = iter(self.participants)
+        first = next(participants, None)
+        if first is None:
+            raise ValueError("There are no participants to export")
+        file = self.output_path.joinpath(
+            f"{first.class_name()}s-list{FORMATS[self.file_format]}"
+        )
+        first_row = first.to_dict_for_export()
+        rows = itertools.chain(
+            [first_row],
+            (participant.to_dict_for_export() for participant in participants),
+        )
+        headings = self._headings(first, first_row)
         try:
             os.mkdir(self.output_path)
         except FileExistsError:
             pass
-        with open(file, "w", newline="") as output_file:
-            writer = csv.DictWriter(output_file, fieldnames=list(field_headings))
-            writer.writeheader()
-            for participant in list_participants_as_dicts:
-                writer.writerow(participant)
+        if self.file_format == "csv":
+            with open(file, "w", newline="") as output_file:
+                self._write_csv(output_file, headings, rows)
+        elif self.file_format == "csv.gz":
+            with gzip.open(file, "wt", newline="", compresslevel=6) as output_file:
+                self._write_csv(output_file, headings, rows)
+        elif self.file_format == "parquet":
+            self._write_parquet(file, headings, rows)
+        else:
+            self._write_npz(file, headings, rows)
+        return file
+
+    def _headings(self, first: Person, first_row: dict) -> List[str]:
+        headings = list(first_row)
+        connection_keys = [
+            heading[len("match 1 ") :]
+            for heading in headings
+            if heading.startswith("match 1 ")
+        ] or list(first.to_dict_for_export(depth=0))
+        for i in range(1, self.capacity + 1):
+            for key in connection_keys:
+                heading = f"match {i} {key}"
+                if heading not in first_row:
+                    headings.append(heading)
+        return headings
+
+    @staticmethod
+    def _write_csv(output_file: IO[str], headings: List[str], rows: Iterator[dict]):
+        writer = csv.DictWriter(output_file, fieldnames=headings)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    def _batches(self, headings: List[str], rows: Iterator[dict]):
+        """
+        Yields the rows ``batch_size`` at a time, as a list of values for each heading. Grades are whole numbers, with
+        `MISSING_GRADE` where there isn't one, and everything else is text
+        """
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                return
+            unknown = set().union(*batch).difference(headings)
+            if unknown:
+                raise ValueError(
+                    f"Rows have columns that aren't in the headings: {', '.join(sorted(unknown))}"
+                )
+            columns = {
+                heading: [row.get(heading) for row in batch] for heading in headings
+            }
+            for heading, values in columns.items():
+                if _is_grade(heading):
+                    columns[heading] = [
+                        MISSING_GRADE if value is None else int(value)
+                        for value in values
+                    ]
+            yield columns
+
+    def _write_parquet(self, file: Path, headings: List[str], rows: Iterator[dict]):
+        schema = pyarrow.schema(
+            [
+                (heading, pyarrow.int64() if _is_grade(heading) else pyarrow.string())
+                for heading in headings
+            ]
+        )
+        with pyarrow.parquet.ParquetWriter(file, schema) as writer:
+            for columns in self._batches(headings, rows):
+                arrays = [
+                    pyarrow.array(
+                        [None if value == MISSING_GRADE else value for value in values]
+                        if _is_grade(heading)
+                        else [
+                            None if value is None else str(value) for value in values
+                        ],
+                        type=field.type,
+                    )
+                    for (heading, values), field in zip(columns.items(), schema)
+                ]
+                writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+
+    def _write_npz(self, file: Path, headings: List[str], rows: Iterator[dict]):
+        # an .npz file is a zip of .npy files. Each batch of each column is its own file, so that only one batch is
+        # ever held in memory, and `np.load` can still read the whole thing
+        with zipfile.ZipFile(file, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("headings.json", json.dumps(headings))
+            for number, columns in enumerate(self._batches(headings, rows)):
+                for index, (heading, values) in enumerate(columns.items()):
+                    array = (
+                        np.array(values, dtype=np.int64)
+                        if _is_grade(heading)
+                        else np.array(
+                            ["" if value is None else str(value) for value in values]
+                        )
+                    )
+                    with archive.open(f"{index:04d}-{number:08d}.npy", "w") as entry:
+                        np.lib.format.write_array(entry, array, allow_pickle=False)
+
+
+def read_columns(path: Path) -> Dict[str, np.ndarray]:
+    """
+    Reads a list written in the "npz" format back in, as an array for each column
+    """
+    with zipfile.ZipFile(path) as archive:
+        headings = json.loads(archive.read("headings.json"))
+        batches: List[List[np.ndarray]] = [[] for _ in headings]
+        for name in sorted(archive.namelist()):
+            if name.endswith(".npy"):
+                with archive.open(name) as entry:
+                    batches[int(name[:4])].append(np.lib.format.read_array(entry))
+    return {
+        heading: np.concatenate(arrays) if arrays else np.array([])
+        for heading, arrays in zip(headings, batches)
+    }
+
+
+def export_all(
+    participant_lists: Sequence[Sequence[Person]],
+    path_to_output_folder: Path,
+    file_format: str = "csv",
+) -> List[Path]:
+    """
+    Writes each list of participants with `ExportToSpreadsheet`, all at the same time, and returns the paths written
+    """
+    exporters = [
+        ExportToSpreadsheet(participants, path_to_output_folder, file_format)
+        for participants in participant_lists
+    ]
+    path_to_output_folder.mkdir(parents=True, exist_ok=True)
+    if len(exporters) < 2:
+        return [exporter.export() for exporter in exporters]
+    with ThreadPoolExecutor(len(exporters)) as executor:
+        return list(executor.map(lambda exporter: exporter.export(), exporters))
+
+
+#: The email each kind of participant gets if no template is given. The first line is the subject
+DEFAULT_TEMPLATES = {
+    "mentor": """Subject: Your mentees
+
+Dear $first_name,
+
+Thank you for signing up to be a mentor. You've been matched with:
+
+$matches
+
+Please get in touch with them to arrange your first meeting.
+""",
+    "mentee": """Subject: Your mentor
+
+Dear $first_name,
+
+Thank you for signing up to be mentored. You've been matched with:
+
+$matches
+
+They'll be in touch to arrange your first meeting.
+""",
+}
+
+
+def read_template(text: str) -> Tuple[string.Template, string.Template]:
+    """
+    Splits an email template into its subject and body. The first line must be ``Subject:`` followed by the subject,
+    and the body is everything after the blank line that follows it
+    """
+    first_line, _, body = text.partition("\n")
+    if not first_line.startswith("Subject:"):
+        raise ValueError("An email template must start with a Subject: line")
+    return (
+        string.Template(first_line[len("Subject:") :].strip()),
+        string.Template(body.lstrip("\n")),
+    )
 
 
 class ExportToEmail:
-    def __init__(self, participants: list[Person], api_client: object):
+    """
+    Emails every participant who they've been matched with.
+
+    Each email is made from a template (see `read_template`), which is either given as ``template``, read from
+    ``{class name}.txt`` in ``template_folder``, or one of the `DEFAULT_TEMPLATES`. Templates use ``$name`` placeholders
+    for the participant's details, as given by `Person.to_dict_for_export` with spaces in the names replaced by
+    underscores, like ``$first_name``. ``$matches`` is a list of the people they've been matched with, one per line, and
+    ``$match_count`` is how many there are.
+
+    Emails are sent through ``api_client``, which can be any `EmailClient`, with `matching.mail.send_all`: the other
+    settings are passed on to it. Participants with no matches are skipped, unless ``skip_unmatched`` is `False`.
+    """
+
+    def __init__(
+        self,
+        participants: Iterable[Person],
+        api_client: EmailClient,
+        template: Optional[str] = None,
+        template_folder: Optional[Path] = None,
+        skip_unmatched: bool = True,
+        batch_size: int = 50,
+        concurrency: int = 8,
+        emails_per_second: Optional[float] = None,
+        max_attempts: int = 5,
+        backoff: float = 0.5,
+    ):
+        if template is not None and template_folder is not None:
+            raise ValueError("Give either a template or a template folder, not both")
         self.participants = participants
         self.client = api_client
+        self.template = None if template is None else read_template(template)
+        self.template_folder = template_folder
+        self.skip_unmatched = skip_unmatched
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.emails_per_second = emails_per_second
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._templates: Dict[str, Tuple[string.Template, string.Template]] = {}
+
+    def _template_for(
+        self, participant: Person
+    ) -> Tuple[string.Template, string.Template]:
+        if self.template is not None:
+            return self.template
+        name = participant.class_name()
+        if name not in self._templates:
+            if self.template_folder is not None:
+                text = self.template_folder.joinpath(f"{name}.txt").read_text()
+            elif name in DEFAULT_TEMPLATES:
+                text = DEFAULT_TEMPLATES[name]
+            else:
+                raise ValueError(f"There's no email template for a {name}")
+            self._templates[name] = read_template(text)
+        return self._templates[name]
 
-    @abstractmethod
-    def export(self):
-        raise NotImplementedError
+    @staticmethod
+    def fields(participant: Person) -> Dict[str, str]:
+        """
+        The values a template can use for this participant
+        """
+        fields = {
+            key.replace(" ", "_"): "" if value is None else str(value)
+            for key, value in participant.to_dict_for_export(depth=0).items()
+        }
+        matches = []
+        for connection in participant.connections:
+            details = connection.to_dict_for_export(depth=0)
+            name = f"{details.get('first name', '')} {details.get('last name', '')}"
+            about = ", ".join(
+                str(details[key])
+                for key in ("role", "organisation")
+                if details.get(key)
+            )
+            matches.append(
+                f"- {name.strip()}{', ' + about if about else ''} ({details.get('email', '')})"
+            )
+        fields["matches"] = "\n".join(matches)
+        fields["match_count"] = str(len(matches))
+        return fields
+
+    def render(self, participant: Person) -> Email:
+        """
+        Makes the email for this participant. Raises a `KeyError` if the template uses a placeholder there's no value
+        for
+        """
+        subject, body = self._template_for(participant)
+        fields = self.fields(participant)
+        return Email(
+            participant.email, subject.substitute(fields), body.substitute(fields)
+        )
+
+    async def export_async(self) -> SendReport:
+        """
+        Sends every email, and returns a report of what was sent and what wasn't
+        """
+        skipped = 0
+
+        def emails() -> Iterator[Email]:
+            nonlocal skipped
+            for participant in self.participants:
+                if self.skip_unmatched and not len(participant.connections):
+                    skipped += 1
+                    continue
+                yield self.render(participant)
+
+        report = await send_all(
+            emails(),
+            self.client,
+            batch_size=self.batch_size,
+            concurrency=self.concurrency,
+            emails_per_second=self.emails_per_second,
+            max_attempts=self.max_attempts,
+            backoff=self.backoff,
+        )
+        report.skipped = skipped
+        return report
+
+    def export(self) -> SendReport:
+        """
+        Sends every email, from code that isn't already running an event loop
+        """
+        return asyncio.run(self.export_async())
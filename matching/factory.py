@@ -17,7 +17,7 @@ class ParticipantFactory:
         participant_data = data_as_dict.get(participant_type_str, dict())
         participant = participant_type(**participant_data)
         connections: List[Dict[str, str]] = participant_data.get("connections", [])
-        participant._connections = [
+        participant.connections.extend(
             cls.create_from_dict(connection_data) for connection_data in connections
-        ]
+        )
         return participant
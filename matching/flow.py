@@ -0,0 +1,289 @@
+"""
+Many-to-many matching in a single solve.
+
+Running one assignment per round gives each participant at most one new connection per round, and every round is a
+full solve over the whole cohort. `CapacitySolver` instead finds all of the connections at once, as a minimum-cost
+flow: each mentor and mentee can take as many connections as their capacity allows, each pair is made at most once,
+and as many pairs as possible are made for the lowest total cost.
+
+Round-specific rules can still be used. With one cost matrix per round, each mentor gets one "slot" per round, and
+each of their connections is costed by the matrix of the slot it fills. The solver chooses which slot each connection
+goes in, so a mentor's connections are spread across the rounds' rules in whichever way scores best overall.
+"""
+from typing import List, Sequence
+
+import numpy as np
+
+from matching.solvers import Assignment
+
+_SOURCE, _MENTEE, _ROW = 0, 1, 2
+
+
+class CapacitySolver:
+    """
+    Successive shortest paths over a bipartite flow network. A source feeds each mentor's rows, every allowed pair is an
+    edge with capacity one, and each mentee drains into a sink. Each augmenting path is found with Dijkstra's
+    algorithm over reduced costs, as in `matching.solvers.JonkerVolgenantSolver`, and the relaxation of a mentor's
+    edges is vectorised.
+
+    After solving, ``iterations`` holds the number of nodes the searches scanned in total.
+    """
+
+    def __init__(self):
+        self.iterations = 0
+
+    def solve(
+        self,
+        costs: Sequence[np.ndarray],
+        mentor_capacity: np.ndarray,
+        mentee_capacity: np.ndarray,
+    ) -> Assignment:
+        """
+        Returns the `(mentor, mentee)` pairs of the cheapest flow that makes as many pairs as the capacities allow.
+        :param costs: one or more cost matrices, with a row per mentor and a column per mentee, and `np.inf` where a
+            pair isn't allowed. With one matrix, each mentor has a single row that can take up to their capacity of
+            mentees. With several, each mentor has one row per matrix, up to their capacity, and each row takes one
+            mentee at the cost in its own matrix
+        :param mentor_capacity: the most connections each mentor can be given
+        :param mentee_capacity: the most connections each mentee can be given
+        """
+        mentor_capacity = np.asarray(mentor_capacity, dtype=np.int64)
+        mentee_capacity = np.asarray(mentee_capacity, dtype=np.int64)
+        mentor_count, mentee_count = len(mentor_capacity), len(mentee_capacity)
+        if not (mentor_count and mentee_count and len(costs)):
+            return []
+        if len(costs) == 1:
+            row_mentor = np.flatnonzero(mentor_capacity > 0)
+            row_capacity = mentor_capacity[row_mentor]
+            row_costs = np.asarray(costs[0], dtype=np.float64)[row_mentor]
+        else:
+            slots = np.minimum(mentor_capacity, len(costs))
+            row_mentor = np.repeat(np.arange(mentor_count), np.maximum(slots, 0))
+            row_slot = np.concatenate([np.arange(max(slot, 0)) for slot in slots])
+            row_capacity = np.ones(len(row_mentor), dtype=np.int64)
+            row_costs = np.stack(
+                [np.asarray(cost, dtype=np.float64) for cost in costs]
+            )[row_slot, row_mentor]
+        row_costs = row_costs.copy()
+        row_costs[:, mentee_capacity <= 0] = np.inf
+        finite = np.isfinite(row_costs)
+        if not finite.any():
+            return []
+        # shifting every cost by the same amount doesn't change which flow is cheapest, because every unit of flow
+        # crosses exactly one pair, and it makes all the costs non-negative for Dijkstra's algorithm
+        row_costs[finite] -= row_costs[finite].min()
+        return self._solve(
+            row_costs,
+            row_mentor,
+            row_capacity,
+            mentee_capacity,
+            mentor_count,
+            multiple_rows=len(costs) > 1,
+        )
+
+    def _solve(
+        self,
+        costs: np.ndarray,
+        row_mentor: np.ndarray,
+        row_capacity: np.ndarray,
+        mentee_capacity: np.ndarray,
+        mentor_count: int,
+        multiple_rows: bool,
+    ) -> Assignment:
+        row_count, mentee_count = costs.shape
+        row_duals = np.zeros(row_count)
+        mentee_duals = np.zeros(mentee_count)
+        sink_dual = 0.0
+        # the row that holds each pair, or -1 if the pair isn't made
+        pair_row = np.full((mentor_count, mentee_count), -1, dtype=np.int64)
+        row_mentees: List[List[int]] = [[] for _ in range(row_count)]
+        mentee_rows: List[List[int]] = [[] for _ in range(mentee_count)]
+        rows_of_mentor: List[List[int]] = [[] for _ in range(mentor_count)]
+        for row, mentor in enumerate(row_mentor.tolist()):
+            rows_of_mentor[mentor].append(row)
+        row_used = np.zeros(row_count, dtype=np.int64)
+        # with several rows per mentor, each row holds at most one mentee, and `row_held` says which
+        row_held = np.full(row_count, -1, dtype=np.int64)
+        siblings = [
+            (row, other)
+            for rows in rows_of_mentor
+            for row in rows
+            for other in rows
+            if row != other
+        ]
+        sibling_row, sibling_other = np.array(siblings, dtype=np.int64).reshape(-1, 2).T
+        mentee_used = np.zeros(mentee_count, dtype=np.int64)
+
+        # the cheapest edge from any row with room to spare into each mentee. Rows only ever fill up, so this only
+        # needs working out again for the mentees whose pairs or cheapest row changed in the last augmentation
+        best_cost = np.full(mentee_count, np.inf)
+        best_row = np.full(mentee_count, -1, dtype=np.int64)
+        stale = set(range(mentee_count))
+
+        costs_by_mentee = np.ascontiguousarray(costs.T)
+
+        def refresh(mentees: np.ndarray, full_rows: np.ndarray):
+            reduced = costs_by_mentee[mentees]
+            reduced[:, full_rows] = np.inf
+            for position, mentee in enumerate(mentees.tolist()):
+                for row in mentee_rows[mentee]:
+                    reduced[position, rows_of_mentor[row_mentor[row]]] = np.inf
+            best = reduced.argmin(axis=1)
+            best_cost[mentees] = reduced[np.arange(len(mentees)), best]
+            best_row[mentees] = best
+
+        def add(row: int, mentee: int):
+            pair_row[row_mentor[row], mentee] = row
+            row_mentees[row].append(mentee)
+            mentee_rows[mentee].append(row)
+            row_used[row] += 1
+            mentee_used[mentee] += 1
+            row_held[row] = mentee
+            stale.add(mentee)
+
+        def remove(row: int, mentee: int):
+            pair_row[row_mentor[row], mentee] = -1
+            row_mentees[row].remove(mentee)
+            mentee_rows[mentee].remove(row)
+            row_used[row] -= 1
+            mentee_used[mentee] -= 1
+            if row_held[row] == mentee:
+                row_held[row] = -1
+            stale.add(mentee)
+
+        while True:
+            row_distance = np.full(row_count, np.inf)
+            # the distances of the rows and mentees that are waiting to be scanned, and infinity for the rest
+            row_open = np.full(row_count, np.inf)
+            mentee_scanned = np.zeros(mentee_count, dtype=bool)
+            row_path_kind = np.full(row_count, _SOURCE, dtype=np.int64)
+            row_path = np.full(row_count, -1, dtype=np.int64)
+            row_path_pair = np.full(row_count, -1, dtype=np.int64)
+
+            # every row with room to spare starts at the source. Their reduced distance plus their dual is always
+            # zero, so all their edges can be relaxed in one go, from the cheapest edges into each mentee
+            free = row_used < row_capacity
+            if not free.any():
+                break
+            row_distance[free] = -row_duals[free]
+            if stale:
+                refresh(np.array(sorted(stale), dtype=np.int64), ~free)
+                stale.clear()
+            mentee_distance = best_cost - mentee_duals
+            mentee_open = mentee_distance.copy()
+            mentee_path = best_row.copy()
+            spare = mentee_used < mentee_capacity
+            through = np.where(
+                spare, mentee_distance + mentee_duals - sink_dual, np.inf
+            )
+            sink_path = int(through.argmin())
+            sink_distance = float(through[sink_path])
+            if multiple_rows:
+                # the same for handing pairs over between a mentor's rows, from the free rows to the full ones
+                held = row_held[sibling_other]
+                usable = (
+                    (row_used[sibling_row] < row_capacity[sibling_row])
+                    & (held != -1)
+                    & (row_used[sibling_other] > 0)
+                )
+                froms, others, held = (
+                    sibling_row[usable],
+                    sibling_other[usable],
+                    held[usable],
+                )
+                candidates = (
+                    costs[froms, held] - costs[others, held] - row_duals[others]
+                )
+                order = np.lexsort((candidates, others))
+                sorted_others = others[order]
+                first = order[
+                    np.r_[True, sorted_others[1:] != sorted_others[:-1]][: len(order)]
+                ]
+                first = first[candidates[first] < row_distance[others[first]]]
+                improved = others[first]
+                row_distance[improved] = row_open[improved] = candidates[first]
+                row_path_kind[improved], row_path[improved] = _ROW, froms[first]
+                row_path_pair[improved] = held[first]
+
+            while True:
+                row = int(row_open.argmin())
+                mentee = int(mentee_open.argmin())
+                if mentee_open[mentee] <= row_open[row]:
+                    if mentee_open[mentee] >= sink_distance:
+                        break
+                    self.iterations += 1
+                    mentee_open[mentee] = np.inf
+                    mentee_scanned[mentee] = True
+                    distance = mentee_distance[mentee] + mentee_duals[mentee]
+                    for other in mentee_rows[mentee]:
+                        candidate = distance - costs[other, mentee] - row_duals[other]
+                        if candidate < row_distance[other]:
+                            row_distance[other] = row_open[other] = candidate
+                            row_path_kind[other], row_path[other] = _MENTEE, mentee
+                else:
+                    if row_open[row] >= sink_distance:
+                        break
+                    self.iterations += 1
+                    row_open[row] = np.inf
+                    distance = row_distance[row] + row_duals[row]
+                    reduced = distance + costs[row] - mentee_duals
+                    reduced[pair_row[row_mentor[row]] != -1] = np.inf
+                    improved = ~mentee_scanned & (reduced < mentee_distance)
+                    mentee_distance[improved] = mentee_open[improved] = reduced[
+                        improved
+                    ]
+                    mentee_path[improved] = row
+                    through = np.where(
+                        improved & spare,
+                        mentee_distance + mentee_duals - sink_dual,
+                        np.inf,
+                    )
+                    best_mentee = int(through.argmin())
+                    if through[best_mentee] < sink_distance:
+                        sink_distance = float(through[best_mentee])
+                        sink_path = best_mentee
+                    if multiple_rows:
+                        # hand one of this mentor's pairs over from another of their rows, freeing that row instead
+                        for other in rows_of_mentor[row_mentor[row]]:
+                            if other == row or not row_mentees[other]:
+                                continue
+                            other_mentee = row_mentees[other][0]
+                            candidate = (
+                                distance
+                                + costs[row, other_mentee]
+                                - costs[other, other_mentee]
+                                - row_duals[other]
+                            )
+                            if candidate < row_distance[other]:
+                                row_distance[other] = row_open[other] = candidate
+                                row_path_kind[other], row_path[other] = _ROW, row
+                                row_path_pair[other] = other_mentee
+
+            if np.isinf(sink_distance):
+                break
+            row_duals += np.minimum(row_distance, sink_distance)
+            mentee_duals += np.minimum(mentee_distance, sink_distance)
+            sink_dual += sink_distance
+
+            mentee = sink_path
+            row = int(mentee_path[mentee])
+            add(row, mentee)
+            while row_path_kind[row] != _SOURCE:
+                if row_path_kind[row] == _MENTEE:
+                    mentee = int(row_path[row])
+                    remove(row, mentee)
+                    row = int(mentee_path[mentee])
+                    add(row, mentee)
+                else:
+                    mentee, other = int(row_path_pair[row]), int(row_path[row])
+                    remove(row, mentee)
+                    add(other, mentee)
+                    row = other
+            if row_used[row] == row_capacity[row]:
+                stale.update(np.flatnonzero(best_row == row).tolist())
+
+        return sorted(
+            (int(row_mentor[row]), mentee)
+            for row, mentees in enumerate(row_mentees)
+            for mentee in mentees
+        )
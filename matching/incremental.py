@@ -0,0 +1,125 @@
+"""
+Incremental rescoring between matching rounds.
+
+After a round, the only participants whose state has changed are the ones who were just matched. Rules that don't
+depend on that state (see `Rule.state_dependent`) give the same answer in every round, and rules that do only give a
+different answer for rows and columns belonging to someone who was matched. The `IncrementalScorer` keeps each rule's
+contribution to the score matrix and only recalculates the parts that might have changed.
+"""
+from typing import Dict, Optional, Sequence, Set
+
+import numpy as np
+
+from matching.columnar import CohortColumns, ScoreMatrix, apply_pairwise
+from matching.rules.rule import Rule, RuleProtocol
+
+
+class _Contribution:
+    def __init__(
+        self,
+        score_matrix: ScoreMatrix,
+        state_dependent: bool,
+        rule: Optional[RuleProtocol] = None,
+    ):
+        self.score_matrix = score_matrix
+        self.state_dependent = state_dependent
+        self.rule = rule
+        self.stale_rows: Set[int] = set()
+        self.stale_columns: Set[int] = set()
+
+
+class IncrementalScorer:
+    """
+    Scores a cohort round after round, reusing as much of the previous rounds' work as it can. A rule's contribution is
+    cached against the rule object itself, so to benefit the same rule objects should be passed in each round. Call
+    `record_match` for every pair that is matched.
+    """
+
+    def __init__(self, mentors: Sequence, mentees: Sequence):
+        self.cohort = CohortColumns(mentors, mentees)
+        self._shape = (len(mentors), len(mentees))
+        self._same_person = self.cohort.same_person(
+            self.cohort.mentors, self.cohort.mentees
+        )
+        self._previously_matched = _Contribution(
+            ScoreMatrix(
+                np.zeros(self._shape, dtype=np.int64),
+                self.cohort.previously_matched(
+                    self.cohort.mentors, self.cohort.mentees
+                ),
+            ),
+            state_dependent=True,
+        )
+        self._contributions: Dict[int, _Contribution] = {}
+        self.rescored_rows = 0
+        self.rescored_columns = 0
+
+    def record_match(self, mentor: int, mentee: int) -> None:
+        self.cohort.record_match(mentor, mentee)
+        for contribution in [self._previously_matched, *self._contributions.values()]:
+            if contribution.state_dependent:
+                contribution.stale_rows.add(mentor)
+                contribution.stale_columns.add(mentee)
+
+    def _refresh(self, contribution: _Contribution, evaluate) -> None:
+        rows = sorted(contribution.stale_rows)
+        columns = sorted(contribution.stale_columns)
+        if rows:
+            update = evaluate(self.cohort.mentors.take(rows), self.cohort.mentees)
+            contribution.score_matrix.scores[rows] = update.scores
+            contribution.score_matrix.disallowed[rows] = update.disallowed
+        if columns:
+            update = evaluate(self.cohort.mentors, self.cohort.mentees.take(columns))
+            contribution.score_matrix.scores[:, columns] = update.scores
+            contribution.score_matrix.disallowed[:, columns] = update.disallowed
+        self.rescored_rows += len(rows)
+        self.rescored_columns += len(columns)
+        contribution.stale_rows.clear()
+        contribution.stale_columns.clear()
+
+    def _contribution(self, rule: RuleProtocol) -> ScoreMatrix:
+        contribution = self._contributions.get(id(rule))
+        if contribution is None or contribution.rule is not rule:
+            contribution = _Contribution(
+                _evaluate(rule, self.cohort.mentors, self.cohort.mentees),
+                getattr(rule, "state_dependent", True),
+                rule,
+            )
+            self._contributions[id(rule)] = contribution
+        else:
+            self._refresh(
+                contribution,
+                lambda mentors, mentees: _evaluate(rule, mentors, mentees),
+            )
+        return contribution.score_matrix
+
+    def score(self, rules: Sequence[RuleProtocol]) -> ScoreMatrix:
+        """
+        Returns the score matrix for a round with these rules. It is identical to the one `generate_score_matrix`
+        would return.
+        """
+        self._refresh(
+            self._previously_matched,
+            lambda mentors, mentees: ScoreMatrix(
+                np.zeros((len(mentors), len(mentees)), dtype=np.int64),
+                self.cohort.previously_matched(mentors, mentees),
+            ),
+        )
+        score_matrix = ScoreMatrix(
+            np.zeros(self._shape, dtype=np.int64),
+            self._same_person | self._previously_matched.score_matrix.disallowed,
+        )
+        for rule in rules:
+            contribution = self._contribution(rule)
+            score_matrix.scores += contribution.scores
+            score_matrix.disallowed |= contribution.disallowed
+        return score_matrix
+
+
+def _evaluate(rule: RuleProtocol, mentors, mentees) -> ScoreMatrix:
+    contribution = ScoreMatrix.empty(len(mentors), len(mentees))
+    if isinstance(rule, Rule):
+        rule.apply_array(mentors, mentees, contribution)
+    else:
+        apply_pairwise(rule, mentors, mentees, contribution)
+    return contribution
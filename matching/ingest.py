@@ -0,0 +1,360 @@
+"""
+Streaming, chunked loading of participant files.
+
+`csv.DictReader` builds a dictionary for every row, and a `Person` then has to pick that dictionary apart again. The
+loader here reads a file a chunk of rows at a time and stores each chunk column by column: integers in NumPy arrays,
+repetitive values like organisations as integer codes into a list of distinct values, and everything else as lists of
+strings. The header is checked once per file rather than once per row. A `ParticipantTable` can then be turned into
+`Person` objects or straight into `ParticipantColumns` for the vectorised scoring engine, without any `Person` being
+built at all.
+"""
+import csv
+import itertools
+import mmap
+import warnings
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
+
+import numpy as np
+
+from matching.columnar import CohortColumns, ParticipantColumns, Vocabulary
+from matching.person import Person
+
+ParticipantType = TypeVar("ParticipantType", bound=Person)
+
+INTEGER = "integer"
+CATEGORY = "category"
+TEXT = "text"
+
+#: How each column is stored. Columns that aren't listed are stored as text
+DEFAULT_SCHEMA: Dict[str, str] = {
+    "grade": INTEGER,
+    "organisation": CATEGORY,
+    "profession": CATEGORY,
+    "role": CATEGORY,
+}
+#: Columns that `Person` can't be built without
+REQUIRED_COLUMNS: Tuple[str, ...] = ("grade",)
+DEPRECATED_COLUMNS: Dict[str, str] = {
+    "current profession": "`current_profession` is deprecated. Use `profession` instead",
+    "current_profession": "`current_profession` is deprecated. Use `profession` instead",
+    "target profession": "`target_profession` is now deprecated. Please use `profession` instead",
+    "target_profession": "`target_profession` is now deprecated. Please use `profession` instead",
+}
+
+
+class _Categories:
+    """
+    The distinct values of one category column. It's shared by every chunk read from the same file, and only ever
+    grows, so codes handed out for an earlier chunk stay valid.
+    """
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, values: Sequence[str]) -> np.ndarray:
+        codes = self.codes
+        for value in set(values).difference(codes):
+            codes[value] = len(self.values)
+            self.values.append(value)
+        return np.fromiter(map(codes.__getitem__, values), np.int32, len(values))
+
+
+class ParticipantTable:
+    """
+    Some or all of the rows of a participant file, stored column by column. ``integers`` holds the integer columns as
+    NumPy arrays, ``codes`` and ``categories`` hold each category column as codes into its list of distinct values, and
+    ``text`` holds the remaining columns as lists of strings.
+    """
+
+    def __init__(
+        self,
+        header: Sequence[str],
+        integers: Dict[str, np.ndarray],
+        codes: Dict[str, np.ndarray],
+        categories: Dict[str, List[str]],
+        text: Dict[str, List[str]],
+    ):
+        self.header = list(header)
+        self.integers = integers
+        self.codes = codes
+        self.categories = categories
+        self.text = text
+
+    def __len__(self) -> int:
+        for columns in (self.integers, self.codes, self.text):
+            for column in columns.values():
+                return len(column)
+        return 0
+
+    def column(self, name: str) -> Union[np.ndarray, List[str]]:
+        """
+        Returns the values of one column, decoding category codes back into their values
+        """
+        if name in self.integers:
+            return self.integers[name]
+        if name in self.codes:
+            values = self.categories[name]
+            return [values[code] for code in self.codes[name].tolist()]
+        return self.text[name]
+
+    def rows(self) -> Iterator[Dict[str, Union[str, int]]]:
+        """
+        Yields each row as a dictionary, just as `csv.DictReader` would, except that integer columns hold `int`\\ s
+        """
+        columns = [
+            self.integers[name].tolist() if name in self.integers else self.column(name)
+            for name in self.header
+        ]
+        header = self.header
+        for values in zip(*columns):
+            yield dict(zip(header, values))
+
+    def to_participants(
+        self,
+        participant: Type[ParticipantType],
+        mapping_func: Optional[Callable[[Dict, str], Dict]] = None,
+    ) -> List[ParticipantType]:
+        if mapping_func is None:
+            return [participant(**row) for row in self.rows()]
+        role = participant.__str__()  # type: ignore
+        return [participant(**mapping_func(row, role)) for row in self.rows()]
+
+    def to_columns(self, vocabulary: Vocabulary) -> ParticipantColumns:
+        """
+        Returns these participants as columns for the vectorised scoring engine. Grades, emails and every category
+        column are encoded against ``vocabulary``, which should be shared between mentors and mentees. Nobody loaded
+        from a file has any connections yet.
+
+        The columns have no participants behind them, so they can only be scored by vectorised rules, and only on
+        attributes that were loaded as categories.
+        """
+        if "grade" not in self.integers:
+            raise ValueError("The grade column must be loaded as an integer column")
+        if "email" not in self.text:
+            raise ValueError("The email column must be loaded as a text column")
+        columns = {
+            "grade": self.integers["grade"].astype(np.int64),
+            "email": vocabulary.encode("email", self.text["email"]),
+            "connection_count": np.zeros(len(self), dtype=np.int64),
+        }
+        for name, codes in self.codes.items():
+            columns[name] = vocabulary.encode(name, self.categories[name])[codes]
+        return ParticipantColumns(None, vocabulary, columns)
+
+    @classmethod
+    def concatenate(cls, tables: Sequence["ParticipantTable"]) -> "ParticipantTable":
+        """
+        Joins chunks read from the same file back together
+        """
+        first = tables[0]
+        return cls(
+            first.header,
+            {
+                name: np.concatenate([table.integers[name] for table in tables])
+                for name in first.integers
+            },
+            {
+                name: np.concatenate([table.codes[name] for table in tables])
+                for name in first.codes
+            },
+            first.categories,
+            {
+                name: list(
+                    itertools.chain.from_iterable(table.text[name] for table in tables)
+                )
+                for name in first.text
+            },
+        )
+
+
+def validate_header(
+    header: Sequence[str], path: Path, required: Iterable[str] = REQUIRED_COLUMNS
+) -> None:
+    """
+    Checks a file's header once, before any of its rows are read
+    """
+    duplicates = sorted({name for name in header if header.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"{path} has duplicate columns: {', '.join(duplicates)}")
+    missing = [name for name in required if name not in header]
+    if missing:
+        raise ValueError(f"{path} is missing required columns: {', '.join(missing)}")
+    for name in header:
+        if name in DEPRECATED_COLUMNS:
+            warnings.warn(DEPRECATED_COLUMNS[name], DeprecationWarning)
+
+
+@contextmanager
+def _lines(path: Path, use_mmap: bool) -> Iterator[Iterable[str]]:
+    if not use_mmap:
+        with open(path, "r", newline="", encoding="utf-8-sig") as text_file:
+            yield text_file
+        return
+    with open(path, "rb") as file:
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file can't be mapped
+            yield iter(())
+            return
+        with mapped:
+            lines = iter(mapped.readline, b"")
+            first = next(lines, b"").decode("utf-8-sig")
+            yield itertools.chain([first], (line.decode("utf-8") for line in lines))
+
+
+def _integers(name: str, values: Sequence[str], path: Path, first_row: int):
+    try:
+        return np.array(values, dtype=np.int64)
+    except ValueError:
+        for row, value in enumerate(values, start=first_row):
+            try:
+                int(value)
+            except ValueError:
+                raise ValueError(
+                    f"Row {row} of {path} has {value!r} in the {name} column, which"
+                    " should be an integer"
+                ) from None
+        raise
+
+
+def iter_tables(
+    path: Union[str, Path],
+    chunk_size: int = 10000,
+    schema: Optional[Dict[str, str]] = None,
+    required: Iterable[str] = REQUIRED_COLUMNS,
+    use_mmap: bool = False,
+) -> Iterator[ParticipantTable]:
+    """
+    Reads a participant file ``chunk_size`` rows at a time, yielding a `ParticipantTable` for each chunk. At most one
+    chunk of raw rows is held in memory at once.
+
+    :param schema: how to store each column, as `INTEGER`, `CATEGORY` or `TEXT`. Defaults to `DEFAULT_SCHEMA`
+    :param required: the columns the file must have
+    :param use_mmap: read the file through a memory map rather than a buffered file object
+    """
+    path = Path(path)
+    schema = DEFAULT_SCHEMA if schema is None else schema
+    with _lines(path, use_mmap) as lines:
+        reader = csv.reader(lines)
+        header = next(reader, None)
+        if header is None:
+            return
+        validate_header(header, path, required)
+        kinds = [schema.get(name, TEXT) for name in header]
+        categories = {
+            name: _Categories() for name, kind in zip(header, kinds) if kind == CATEGORY
+        }
+        width = len(header)
+        rows_read = 0
+        while True:
+            rows = list(itertools.islice(reader, chunk_size))
+            if not rows:
+                return
+            lengths = set(map(len, rows))
+            if lengths != {width}:
+                if 0 in lengths:
+                    rows = [row for row in rows if row]
+                for number, row in enumerate(rows, start=rows_read + 1):
+                    if len(row) != width:
+                        raise ValueError(
+                            f"Row {number} of {path} has {len(row)} fields, but the"
+                            f" header has {width}"
+                        )
+                if not rows:
+                    continue
+            columns = list(zip(*rows))
+            del rows
+            integers, codes, text = {}, {}, {}
+            for name, kind, values in zip(header, kinds, columns):
+                if kind == INTEGER:
+                    integers[name] = _integers(name, values, path, rows_read + 1)
+                elif kind == CATEGORY:
+                    codes[name] = categories[name].encode(values)
+                else:
+                    text[name] = list(values)
+            rows_read += len(columns[0])
+            yield ParticipantTable(
+                header,
+                integers,
+                codes,
+                {name: category.values for name, category in categories.items()},
+                text,
+            )
+
+
+def read_table(
+    path: Union[str, Path],
+    chunk_size: int = 10000,
+    schema: Optional[Dict[str, str]] = None,
+    required: Iterable[str] = REQUIRED_COLUMNS,
+    use_mmap: bool = False,
+) -> Optional[ParticipantTable]:
+    """
+    Reads a whole participant file into one `ParticipantTable`, or returns `None` if the file is empty. See
+    `iter_tables` for the parameters.
+    """
+    tables = list(iter_tables(path, chunk_size, schema, required, use_mmap))
+    if not tables:
+        return None
+    return tables[0] if len(tables) == 1 else ParticipantTable.concatenate(tables)
+
+
+def load_participants(
+    participant: Type[ParticipantType],
+    path: Union[str, Path],
+    mapping_func: Optional[Callable[[Dict, str], Dict]] = None,
+    chunk_size: int = 10000,
+    use_mmap: bool = False,
+) -> List[ParticipantType]:
+    """
+    Reads a participant file a chunk at a time and builds a participant from each row.
+
+    If there's a ``mapping_func``, it's handed each row exactly as `csv.DictReader` would have produced it, with every
+    value a string, and nothing is required of the file's header: the mapping function may be what supplies the grade.
+    """
+    if mapping_func is None:
+        schema, required = DEFAULT_SCHEMA, REQUIRED_COLUMNS
+    else:
+        schema = {
+            name: kind for name, kind in DEFAULT_SCHEMA.items() if kind != INTEGER
+        }
+        required = ()
+    participants: List[ParticipantType] = []
+    for table in iter_tables(path, chunk_size, schema, required, use_mmap):
+        participants.extend(table.to_participants(participant, mapping_func))
+    return participants
+
+
+def load_cohort_columns(
+    path_to_data: Union[str, Path], chunk_size: int = 10000, use_mmap: bool = False
+) -> CohortColumns:
+    """
+    Reads ``mentors.csv`` and ``mentees.csv`` straight into a `CohortColumns`, ready to be scored by vectorised rules
+    """
+    vocabulary = Vocabulary()
+    sides: List[ParticipantColumns] = []
+    for role in ("mentor", "mentee"):
+        table = read_table(
+            Path(path_to_data) / f"{role}s.csv", chunk_size, use_mmap=use_mmap
+        )
+        if table is None:
+            raise ValueError(f"There are no {role}s in {path_to_data}")
+        sides.append(table.to_columns(vocabulary))
+    mentors, mentees = sides
+    return CohortColumns.from_columns(mentors, mentees, np.empty(0, dtype=np.int64))
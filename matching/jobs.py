@@ -0,0 +1,615 @@
+"""
+Running matching exercises as background jobs.
+
+A matching exercise for a big cohort takes minutes, which is too long to keep a web request waiting. A `JobService`
+takes a cohort and a rules file's contents (see `matching.rules.spec`), gives back a job id straight away, and runs the
+job in a pool of worker processes. The caller polls `JobService.status` for the job's state and progress, and fetches
+the matched cohort with `JobService.result` once it's finished.
+
+Everything is kept in a folder: a SQLite database of jobs, which is the queue, and a folder for each job with its
+cohort, encoded with `matching.serialization`, and its result. Nothing else is needed, so a service can be run and
+tested anywhere. More than one service can share a folder. Jobs that are queued when a service stops are run by the
+next one to use the folder. Each running job is marked with the service running it, and each service records a
+heartbeat every few seconds while it's going, so a job whose service has stopped, or died, without finishing it is
+queued again by another service, while jobs that other services are still running are left alone.
+
+No more than ``workers`` jobs run at once, and a job can be given a memory budget: the most memory its worker process
+may use, enforced by the operating system on Unix. Going over it fails the job rather than the machine. A queued job is
+cancelled straight away; a running job stops at the start or end of its next stage, such as scoring or solving a round.
+"""
+import contextlib
+import functools
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import (
+    Any,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from matching.mentee import Mentee
+from matching.mentor import Mentor
+from matching.observer import Observer
+from matching.process import process_data
+from matching.rules.spec import rules_from_spec
+from matching.serialization import cohort_from_bytes, cohort_to_bytes
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - resource is Unix-only
+    resource = None  # type: ignore
+
+#: The states a job can be in. The last three are final
+STATES = ("queued", "running", "finished", "failed", "cancelled")
+#: The `process_data` settings a job can be given
+OPTIONS = {"scoring", "solver", "capacity_matching", "partition_by"}
+
+_SCHEMA = """
+create table if not exists jobs (
+    id text primary key,
+    state text not null,
+    submitted real not null,
+    started real,
+    finished real,
+    progress text not null default '{}',
+    error text,
+    cancel_requested integer not null default 0,
+    owner text
+);
+create table if not exists services (
+    id text primary key,
+    heartbeat real not null
+);
+"""
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job that's been cancelled, to stop it
+    """
+
+    pass
+
+
+class QueueFull(Exception):
+    """
+    Raised when a job is submitted to a service that already has as many jobs queued as it allows
+    """
+
+    pass
+
+
+class JobStatus(NamedTuple):
+    job_id: str
+    state: str
+    #: The round the job is on, out of how many, and the stage of the round, like ``{"round": 1, "rounds": 3,
+    #: "stage": "score"}``
+    progress: Dict[str, Any]
+    error: Optional[str]
+    submitted: float
+    started: Optional[float]
+    finished: Optional[float]
+
+    @property
+    def done(self) -> bool:
+        return self.state in ("finished", "failed", "cancelled")
+
+
+class JobStore:
+    """
+    The job queue: a SQLite database in ``folder``, and a folder for each job's files. It can be opened by many
+    processes at once
+    """
+
+    def __init__(self, folder: Path):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        # a service uses its store from more than one thread, one at a time
+        self._connection = sqlite3.connect(
+            self.folder / "jobs.sqlite3",
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._connection.execute("pragma journal_mode=wal")
+        self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # taking the write lock up front means two processes can't both claim the same job
+        self._connection.execute("begin immediate")
+        try:
+            yield self._connection
+        except BaseException:
+            self._connection.execute("rollback")
+            raise
+        self._connection.execute("commit")
+
+    def job_folder(self, job_id: str) -> Path:
+        return self.folder / "jobs" / job_id
+
+    def add(self, job_id: str) -> None:
+        self._connection.execute(
+            "insert into jobs (id, state, submitted) values (?, 'queued', ?)",
+            (job_id, time.time()),
+        )
+
+    def count(self, state: str) -> int:
+        return self._connection.execute(
+            "select count(*) from jobs where state = ?", (state,)
+        ).fetchone()[0]
+
+    def beat(self, service_id: str) -> None:
+        """
+        Records that the service ``service_id`` is still running its jobs
+        """
+        self._connection.execute(
+            "insert or replace into services (id, heartbeat) values (?, ?)",
+            (service_id, time.time()),
+        )
+
+    def leave(self, service_id: str) -> None:
+        self._connection.execute("delete from services where id = ?", (service_id,))
+
+    def claim(self, owner: Optional[str] = None) -> Optional[str]:
+        """
+        Marks the job that's been queued the longest as running, by the service ``owner``, and returns its id, or `None`
+        if nothing's queued
+        """
+        with self._transaction() as connection:
+            row = connection.execute(
+                "select id from jobs where state = 'queued' order by submitted, rowid limit 1"
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "update jobs set state = 'running', started = ?, owner = ? where id = ?",
+                (time.time(), owner, row[0]),
+            )
+            return row[0]
+
+    def requeue_orphaned(self, stale_after: float) -> int:
+        """
+        Puts any running jobs whose service hasn't recorded a heartbeat in the last ``stale_after`` seconds back in the
+        queue, for when that service stopped without finishing them, unless they were being cancelled. Jobs of services
+        that are still going are left alone. Returns how many were queued again
+        """
+        orphaned = "state = 'running' and (owner is null or owner not in (select id from services where heartbeat >= ?))"
+        with self._transaction() as connection:
+            now = time.time()
+            connection.execute(
+                "delete from services where heartbeat < ?", (now - stale_after,)
+            )
+            connection.execute(
+                f"update jobs set state = 'cancelled', finished = ? where {orphaned} and cancel_requested = 1",
+                (now, now - stale_after),
+            )
+            return connection.execute(
+                f"update jobs set state = 'queued', started = null, progress = '{{}}', owner = null where {orphaned}",
+                (now - stale_after,),
+            ).rowcount
+
+    def set_progress(self, job_id: str, progress: Mapping[str, Any]) -> None:
+        self._connection.execute(
+            "update jobs set progress = ? where id = ?", (json.dumps(progress), job_id)
+        )
+
+    def finish(self, job_id: str, state: str, error: Optional[str] = None) -> None:
+        self._connection.execute(
+            "update jobs set state = ?, error = ?, finished = ? where id = ?",
+            (state, error, time.time(), job_id),
+        )
+
+    def cancel(self, job_id: str) -> str:
+        """
+        Cancels a queued job, or asks a running job to stop. Returns the job's state afterwards
+        """
+        with self._transaction() as connection:
+            state = self._state(connection, job_id)
+            if state == "queued":
+                connection.execute(
+                    "update jobs set state = 'cancelled', finished = ? where id = ?",
+                    (time.time(), job_id),
+                )
+                return "cancelled"
+            if state == "running":
+                connection.execute(
+                    "update jobs set cancel_requested = 1 where id = ?", (job_id,)
+                )
+            return state
+
+    def cancel_requested(self, job_id: str) -> bool:
+        row = self._connection.execute(
+            "select cancel_requested from jobs where id = ?", (job_id,)
+        ).fetchone()
+        return bool(row and row[0])
+
+    @staticmethod
+    def _state(connection: sqlite3.Connection, job_id: str) -> str:
+        row = connection.execute(
+            "select state from jobs where id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"There's no job {job_id}")
+        return row[0]
+
+    def status(self, job_id: str) -> JobStatus:
+        row = self._connection.execute(
+            "select id, state, progress, error, submitted, started, finished from jobs where id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"There's no job {job_id}")
+        return JobStatus(row[0], row[1], json.loads(row[2]), *row[3:])
+
+    def statuses(self) -> List[JobStatus]:
+        return [
+            self.status(job_id)
+            for job_id, in self._connection.execute(
+                "select id from jobs order by submitted, rowid"
+            ).fetchall()
+        ]
+
+
+def _write(path: Path, data: bytes) -> None:
+    # written to a temporary file and moved into place, so that a reader never sees half a file
+    file, temporary = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(file, "wb") as temporary_file:
+        temporary_file.write(data)
+    os.replace(temporary, path)
+
+
+class _JobObserver(Observer):
+    """
+    Records a job's progress as it goes, and stops it if it's been cancelled
+    """
+
+    def __init__(self, store: JobStore, job_id: str, rounds: int):
+        self.store = store
+        self.job_id = job_id
+        self.progress: Dict[str, Any] = {"round": 0, "rounds": rounds, "stage": None}
+
+    def _check(self) -> None:
+        if self.store.cancel_requested(self.job_id):
+            raise JobCancelled
+
+    def round_started(self, round_number: int, mentors: int, mentees: int) -> None:
+        self._check()
+        self.progress.update(round=round_number + 1, stage=None)
+        self.store.set_progress(self.job_id, self.progress)
+
+    @contextlib.contextmanager
+    def _stage(self, name: str) -> Iterator[None]:
+        self._check()
+        self.progress["stage"] = name
+        self.store.set_progress(self.job_id, self.progress)
+        yield
+        self._check()
+
+    def stage(self, name: str) -> ContextManager[None]:
+        return self._stage(name)
+
+
+def _address_space() -> Optional[int]:
+    # how much memory this process has mapped, where the platform says
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@contextlib.contextmanager
+def memory_budget(limit: Optional[int]) -> Iterator[None]:
+    """
+    Limits how much memory this process can use, in bytes, until the block ends. Going over raises `MemoryError`. The
+    limit covers everything the process has mapped, including Python and the libraries it's imported, so it needs to be
+    well above what the job itself uses. A process that already uses more than ``limit`` raises straight away, as memory
+    it's already got, and freed, can be used again without going over. Does nothing if ``limit`` is `None`, or if the
+    platform can't limit memory
+    """
+    if limit is None or resource is None:
+        yield
+        return
+    in_use = _address_space()
+    if in_use is not None and in_use > limit:
+        raise MemoryError(f"This process already uses {in_use} bytes")
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    resource.setrlimit(
+        resource.RLIMIT_AS,
+        (limit if hard == resource.RLIM_INFINITY else min(limit, hard), hard),
+    )
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+
+def run_job(folder: Path, job_id: str, memory_limit: Optional[int] = None) -> str:
+    """
+    Runs a job that's been claimed, records how it ended, and returns its final state. This is what the service's
+    worker processes run
+    """
+    store = JobStore(folder)
+    job_folder = store.job_folder(job_id)
+    try:
+        request = json.loads((job_folder / "request.json").read_text())
+        rules = rules_from_spec(request["rules"])
+        observer = _JobObserver(store, job_id, len(rules))
+        with memory_budget(memory_limit):
+            people = cohort_from_bytes((job_folder / "cohort.bin").read_bytes())
+            mentor_count, mentee_count = request["mentors"], request["mentees"]
+            mentors: List[Mentor] = people[:mentor_count]  # type: ignore
+            mentees: List[Mentee] = people[mentor_count : mentor_count + mentee_count]  # type: ignore
+            process_data(
+                mentors, mentees, rules, observer=observer, **request["options"]
+            )
+            result = cohort_to_bytes([*mentors, *mentees])
+        _write(job_folder / "result.bin", result)
+    except JobCancelled:
+        state, error = "cancelled", None
+    except MemoryError:
+        state, error = (
+            "failed",
+            f"The job used more than its memory budget of {memory_limit} bytes",
+        )
+    except Exception as error_raised:
+        state, error = "failed", f"{type(error_raised).__name__}: {error_raised}"
+    else:
+        state, error = "finished", None
+    store.finish(job_id, state, error)
+    store.close()
+    return state
+
+
+class JobService:
+    """
+    Runs matching jobs in the background, in up to ``workers`` processes at once. Jobs and their files are kept in
+    ``folder``. Each job's worker can use at most ``memory_limit`` bytes, if it's given, and once ``max_queued`` jobs
+    are waiting, no more can be submitted until some have started. Other services can use the same folder: a job one of
+    them was running is queued again once it's gone ``stale_after`` seconds without a heartbeat.
+
+    Use it as a context manager, or call `start` and `close`::
+
+        with JobService(Path("jobs"), workers=2) as service:
+            job_id = service.submit(mentors, mentees, rules)
+            status = service.wait(job_id)
+            mentors, mentees = service.result(job_id)
+    """
+
+    def __init__(
+        self,
+        folder: Path,
+        workers: int = 2,
+        memory_limit: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        poll_interval: float = 0.1,
+        stale_after: float = 60,
+    ):
+        if workers < 1:
+            raise ValueError("A job service needs at least one worker")
+        if stale_after <= 0:
+            raise ValueError("A job service's heartbeat can't go stale straight away")
+        self.folder = Path(folder)
+        self.workers = workers
+        self.memory_limit = memory_limit
+        self.max_queued = max_queued
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.service_id = uuid.uuid4().hex
+        self.store = JobStore(self.folder)
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(workers)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._dispatcher: Optional[threading.Thread] = None
+        self._heartbeat: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._running: Dict[str, Future] = {}
+
+    def __enter__(self) -> "JobService":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def start(self) -> None:
+        """
+        Starts running jobs, beginning with any that were left queued, or running by a service that's stopped, in the
+        folder
+        """
+        if self._dispatcher is not None:
+            return
+        with self._lock:
+            self.store.beat(self.service_id)
+            self.store.requeue_orphaned(self.stale_after)
+        self._heartbeat = threading.Thread(
+            target=self._beat, name="matching-jobs-heartbeat", daemon=True
+        )
+        self._heartbeat.start()
+        self._pool = ProcessPoolExecutor(self.workers)
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name="matching-jobs", daemon=True
+        )
+        self._dispatcher.start()
+
+    def close(self, cancel: bool = False) -> None:
+        """
+        Stops starting jobs, and waits for the running ones to finish, or cancels them if ``cancel`` is `True`. Queued
+        jobs stay queued, for the next service that uses the folder
+        """
+        if cancel:
+            for job_id in list(self._running):
+                self.cancel(job_id)
+        self._stopping.set()
+        self._wake.set()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+            self._dispatcher = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        # the heartbeat goes on until every running job has finished, so that nobody else takes them over
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        self.store.leave(self.service_id)
+        self.store.close()
+
+    def submit(
+        self,
+        mentors: Sequence[Mentor],
+        mentees: Sequence[Mentee],
+        rules: Mapping[str, Any],
+        **options: Any,
+    ) -> str:
+        """
+        Queues a matching exercise and returns its job id. ``rules`` is the contents of a rules file, and ``options``
+        are passed on to `process_data`: any of `OPTIONS`
+        """
+        unknown = set(options) - OPTIONS
+        if unknown:
+            raise ValueError(f"Jobs can't be given {', '.join(sorted(unknown))}")
+        # checked now, so that a mistake is reported to whoever made it rather than failing the job later
+        rules_from_spec(rules)
+        request = json.dumps(
+            {
+                "rules": rules,
+                "mentors": len(mentors),
+                "mentees": len(mentees),
+                "options": options,
+            }
+        )
+        with self._lock:
+            if (
+                self.max_queued is not None
+                and self.store.count("queued") >= self.max_queued
+            ):
+                raise QueueFull(f"There are already {self.max_queued} jobs queued")
+            job_id = uuid.uuid4().hex
+            job_folder = self.store.job_folder(job_id)
+            job_folder.mkdir(parents=True)
+            _write(job_folder / "cohort.bin", cohort_to_bytes([*mentors, *mentees]))
+            _write(job_folder / "request.json", request.encode())
+            self.store.add(job_id)
+        self._wake.set()
+        return job_id
+
+    def status(self, job_id: str) -> JobStatus:
+        with self._lock:
+            return self.store.status(job_id)
+
+    def statuses(self) -> List[JobStatus]:
+        with self._lock:
+            return self.store.statuses()
+
+    def cancel(self, job_id: str) -> str:
+        """
+        Cancels a queued job, or asks a running one to stop at the end of its current stage. Returns the job's state,
+        which is still "running" until it stops
+        """
+        with self._lock:
+            return self.store.cancel(job_id)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> JobStatus:
+        """
+        Waits for a job to finish, fail or be cancelled, and returns its status. Raises `TimeoutError` if it's still
+        going after ``timeout`` seconds
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = self.status(job_id)
+            if status.done:
+                return status
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Job {job_id} is still {status.state}")
+            time.sleep(self.poll_interval)
+
+    def result(self, job_id: str) -> Tuple[List[Mentor], List[Mentee]]:
+        """
+        The matched mentors and mentees from a finished job
+        """
+        status = self.status(job_id)
+        if status.state != "finished":
+            raise ValueError(f"Job {job_id} is {status.state}, not finished")
+        request = json.loads(
+            self.store.job_folder(job_id).joinpath("request.json").read_text()
+        )
+        people = cohort_from_bytes(
+            self.store.job_folder(job_id).joinpath("result.bin").read_bytes()
+        )
+        mentor_count = request["mentors"]
+        return (
+            people[:mentor_count],  # type: ignore
+            people[mentor_count : mentor_count + request["mentees"]],  # type: ignore
+        )
+
+    def _dispatch(self) -> None:
+        while not self._stopping.is_set():
+            if not self._slots.acquire(timeout=self.poll_interval):
+                continue
+            with self._lock:
+                job_id = (
+                    None
+                    if self._stopping.is_set()
+                    else self.store.claim(self.service_id)
+                )
+            if job_id is None:
+                self._slots.release()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            with self._lock:
+                self._replace_broken_pool()
+                assert self._pool is not None
+                future = self._pool.submit(
+                    run_job, self.folder, job_id, self.memory_limit
+                )
+            self._running[job_id] = future
+            future.add_done_callback(functools.partial(self._finished, job_id))
+
+    def _beat(self) -> None:
+        while not self._stopped.wait(self.stale_after / 4):
+            with self._lock:
+                self.store.beat(self.service_id)
+                requeued = self.store.requeue_orphaned(self.stale_after)
+            if requeued:
+                self._wake.set()
+
+    def _finished(self, job_id: str, future: Future) -> None:
+        self._running.pop(job_id, None)
+        self._slots.release()
+        error = future.exception()
+        if error is not None:
+            # the worker died before it could record how the job ended, perhaps killed for using too much memory
+            with self._lock:
+                if not self.store.status(job_id).done:
+                    self.store.finish(
+                        job_id, "failed", f"The worker stopped: {type(error).__name__}"
+                    )
+
+    def _replace_broken_pool(self) -> None:
+        # a pool whose worker died can't be used again, so a new one takes its place
+        if self._pool is not None and getattr(self._pool, "_broken", False):
+            self._pool.shutdown(wait=False)
+            self._pool = ProcessPoolExecutor(self.workers)
@@ -0,0 +1,314 @@
+"""
+Sending emails in bulk.
+
+Telling thousands of participants who they've been matched with one email at a time, and waiting for each to be
+accepted before sending the next, takes hours. `send_all` sends emails in batches, several batches at once, through an
+`EmailClient`. A batch that fails with a temporary error is tried again after a pause that doubles each time, and the
+whole run can be held under a rate limit, so that a provider's limits aren't broken.
+
+A client only has to implement `send_batch`. An email the server refuses for good, like one to an address that doesn't
+exist, is reported by the client and doesn't hold up the rest of its batch. `FileClient` writes each email to a folder
+instead of sending it, and `SMTPClient` hands them to an SMTP server, such as a local debugging server, so the whole
+process can be tried out without sending anything to anyone.
+"""
+import asyncio
+import email.message
+import itertools
+import logging
+import random
+import re
+import smtplib
+import time
+from pathlib import Path
+from typing import (
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+)
+
+
+class Email(NamedTuple):
+    to: str
+    subject: str
+    body: str
+
+
+class SendError(Exception):
+    """
+    Raised by a client when a batch couldn't be sent. If it's ``temporary``, the batch is tried again, after at least
+    ``retry_after`` seconds if the client knows how long to wait. If some of the batch was dealt with before the error,
+    the client should pass the rest as ``unsent``, so that nobody gets the same email twice, and the address of and
+    reason for any emails in the part that was dealt with that the server refused as ``refused``
+    """
+
+    def __init__(
+        self,
+        message: str,
+        temporary: bool = True,
+        retry_after: Optional[float] = None,
+        unsent: Optional[Sequence["Email"]] = None,
+        refused: Sequence[Tuple[str, str]] = (),
+    ):
+        super(SendError, self).__init__(message)
+        self.temporary = temporary
+        self.retry_after = retry_after
+        self.unsent = unsent
+        self.refused = refused
+
+
+#: Errors that are always worth trying again
+TEMPORARY_ERRORS = (ConnectionError, TimeoutError, asyncio.TimeoutError)
+
+
+class EmailClient(Protocol):
+    async def send_batch(
+        self, emails: Sequence[Email]
+    ) -> Optional[Sequence[Tuple[str, str]]]:
+        """
+        Sends every email in the batch, or raises an exception, ideally a `SendError`, if it can't. Returns the address
+        of and reason for any email the server refused for good, which aren't tried again
+        """
+        ...
+
+
+class SendReport:
+    """
+    What happened to a run of emails: how many were sent, how many batches had to be tried again, and the address and
+    reason for every email that couldn't be sent
+    """
+
+    def __init__(self):
+        self.sent = 0
+        self.retries = 0
+        self.skipped = 0
+        self.failed: List[Tuple[str, str]] = []
+
+    def __repr__(self) -> str:
+        return (
+            f"SendReport(sent={self.sent}, failed={len(self.failed)}, retries={self.retries}, "
+            f"skipped={self.skipped})"
+        )
+
+
+class RateLimiter:
+    """
+    A token bucket: lets through at most ``rate`` emails a second on average, in bursts of up to ``burst``
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(1.0, rate if burst is None else burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, count: int = 1) -> None:
+        """
+        Waits until ``count`` emails can be sent. A batch bigger than the burst is let through once the bucket is full
+        """
+        async with self._lock:
+            needed = min(float(count), self.burst)
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= needed:
+                    self._tokens -= count
+                    return
+                await asyncio.sleep((needed - self._tokens) / self.rate)
+
+
+def _batches(emails: Iterable[Email], batch_size: int) -> Iterator[List[Email]]:
+    iterator = iter(emails)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+async def send_all(
+    emails: Iterable[Email],
+    client: EmailClient,
+    batch_size: int = 50,
+    concurrency: int = 8,
+    emails_per_second: Optional[float] = None,
+    max_attempts: int = 5,
+    backoff: float = 0.5,
+) -> SendReport:
+    """
+    Sends every email through ``client``, ``batch_size`` at a time, with up to ``concurrency`` batches being sent at
+    once. Emails are only made as they're needed, so ``emails`` can be a generator.
+
+    A batch that fails with a `SendError` that's temporary, or with a connection error or timeout, is tried again up to
+    ``max_attempts`` times in all, waiting ``backoff`` seconds the first time and twice as long each time after, with a
+    little randomness so that batches don't all try again at once. Any other failure, or running out of attempts, is
+    recorded in the report and the run carries on with the next batch.
+    """
+    if batch_size < 1 or concurrency < 1 or max_attempts < 1:
+        raise ValueError("batch_size, concurrency and max_attempts must be at least 1")
+    limiter = None if emails_per_second is None else RateLimiter(emails_per_second)
+    report = SendReport()
+    queue: "asyncio.Queue[Optional[List[Email]]]" = asyncio.Queue(maxsize=concurrency)
+
+    async def send(batch: List[Email]) -> None:
+        for attempt in range(1, max_attempts + 1):
+            if limiter is not None:
+                await limiter.acquire(len(batch))
+            try:
+                refused = await client.send_batch(batch) or ()
+            except Exception as error:
+                temporary = (
+                    error.temporary
+                    if isinstance(error, SendError)
+                    else isinstance(error, TEMPORARY_ERRORS)
+                )
+                if isinstance(error, SendError) and error.unsent is not None:
+                    report.failed.extend(error.refused)
+                    report.sent += len(batch) - len(error.unsent) - len(error.refused)
+                    batch = list(error.unsent)
+                if not temporary or attempt == max_attempts:
+                    logging.warning(
+                        f"Couldn't send a batch of {len(batch)} emails: {error}"
+                    )
+                    report.failed.extend((message.to, str(error)) for message in batch)
+                    return
+                report.retries += 1
+                delay = backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                if isinstance(error, SendError) and error.retry_after is not None:
+                    delay = max(delay, error.retry_after)
+                await asyncio.sleep(delay)
+            else:
+                report.failed.extend(refused)
+                report.sent += len(batch) - len(refused)
+                return
+
+    async def worker() -> None:
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                return
+            await send(batch)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    try:
+        for batch in _batches(emails, batch_size):
+            await queue.put(batch)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+    return report
+
+
+def _message(email_to_send: Email, sender: str) -> email.message.EmailMessage:
+    message = email.message.EmailMessage()
+    message["From"] = sender
+    message["To"] = email_to_send.to
+    message["Subject"] = email_to_send.subject
+    message.set_content(email_to_send.body)
+    return message
+
+
+class FileClient:
+    """
+    Writes every email to ``folder`` as an ``.eml`` file, named after the address it's to, instead of sending it
+    """
+
+    def __init__(self, folder: Path, sender: str = "mentoring@localhost"):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.sender = sender
+
+    def _write(self, emails: Sequence[Email]) -> None:
+        for email_to_send in emails:
+            name = re.sub(r"[^\w.@+-]", "_", email_to_send.to)
+            self.folder.joinpath(f"{name}.eml").write_bytes(
+                bytes(_message(email_to_send, self.sender))
+            )
+
+    async def send_batch(self, emails: Sequence[Email]) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self._write, emails)
+
+
+class SMTPClient:
+    """
+    Sends emails through an SMTP server, one connection per batch. Pointed at a local debugging server, like
+    ``python -m aiosmtpd -n -l localhost:1025``, it shows every email without sending any
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 1025,
+        sender: str = "mentoring@localhost",
+        timeout: float = 30,
+    ):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.timeout = timeout
+
+    def _send(self, emails: Sequence[Email]) -> List[Tuple[str, str]]:
+        done = 0
+        refused: List[Tuple[str, str]] = []
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as server:
+                for email_to_send in emails:
+                    try:
+                        server.send_message(_message(email_to_send, self.sender))
+                    except smtplib.SMTPRecipientsRefused as error:
+                        codes = [code for code, _ in error.recipients.values()]
+                        if not all(500 <= code < 600 for code in codes):
+                            # a 4xx reply, like greylisting or a full mailbox, is worth trying again later
+                            raise SendError(
+                                _reasons(error),
+                                unsent=emails[done:],
+                                refused=refused,
+                            ) from error
+                        # the address is refused, but the connection can carry on with the next email
+                        refused.append((email_to_send.to, _reasons(error)))
+                    except (
+                        smtplib.SMTPDataError,
+                        smtplib.SMTPSenderRefused,
+                    ) as error:
+                        if not 500 <= error.smtp_code < 600:
+                            raise
+                        refused.append((email_to_send.to, str(error)))
+                    done += 1
+        except smtplib.SMTPResponseException as error:
+            # 4xx replies are the server asking us to try again later
+            raise SendError(
+                str(error),
+                temporary=400 <= error.smtp_code < 500,
+                unsent=emails[done:],
+                refused=refused,
+            ) from error
+        except (smtplib.SMTPServerDisconnected, OSError) as error:
+            raise SendError(
+                str(error), unsent=emails[done:], refused=refused
+            ) from error
+        return refused
+
+    async def send_batch(self, emails: Sequence[Email]) -> List[Tuple[str, str]]:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._send, emails
+        )
+
+
+def _reasons(error: smtplib.SMTPRecipientsRefused) -> str:
+    return "; ".join(
+        f"{code} {reply.decode(errors='replace') if isinstance(reply, bytes) else reply}"
+        for code, reply in error.recipients.values()
+    )
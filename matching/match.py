@@ -1,6 +1,7 @@
 import logging
 from typing import TYPE_CHECKING, List
 
+from matching.connections import connect, connected
 from matching.rules import rule as rl
 
 if TYPE_CHECKING:
@@ -8,6 +9,19 @@ if TYPE_CHECKING:
     from matching.mentee import Mentee
 
 
+def _same_person(match: "Match") -> bool:
+    return match.mentor == match.mentee
+
+
+def _previously_matched(match: "Match") -> bool:
+    return connected(match.mentor, match.mentee)
+
+
+#: The two rules built into every `Match`. They hold no state, so every `Match` shares the same two objects
+SAME_PERSON = rl.Disqualify(_same_person)
+PREVIOUSLY_MATCHED = rl.Disqualify(_previously_matched)
+
+
 class Match:
     """
     This is the class that calculates the score of each Match.
@@ -25,16 +39,26 @@ class Match:
         self.mentor = mentor
         self._disallowed: bool = False
         self._score: int = 0
-        self.rules: list[rl.RuleProtocol] = [
-            rl.Disqualify(lambda match: match.mentor == match.mentee),
-            rl.Disqualify(
-                lambda match: match.mentor in match.mentee.mentors
-                or match.mentee in match.mentor.mentees
-            ),
-        ]
+        self.rules: list[rl.RuleProtocol] = [SAME_PERSON, PREVIOUSLY_MATCHED]
         if rules:
             self.rules.extend(rules)
 
+    @classmethod
+    def from_result(
+        cls, mentor: "Mentor", mentee: "Mentee", score: int, disallowed: bool
+    ) -> "Match":
+        """
+        Returns a `Match` that has already been scored elsewhere, for example by a compiled rule list (see
+        `matching.rules.compiler`). Its rules are empty, so `calculate_match` leaves it as it is
+        """
+        match = cls.__new__(cls)
+        match.mentor = mentor
+        match.mentee = mentee
+        match._disallowed = disallowed
+        match._score = score
+        match.rules = []
+        return match
+
     @property
     def score(self):
         if self._disallowed:
@@ -68,8 +92,7 @@ class Match:
 
     def mark_successful(self):
         if not self.disallowed:
-            self.mentor.mentees.append(self.mentee)
-            self.mentee.mentors.append(self.mentor)
+            connect(self.mentor, self.mentee)
         else:
             logging.debug("Skipping this match as disallowed")
         self._score = 0
@@ -8,6 +8,8 @@ if TYPE_CHECKING:
 
 
 class Mentee(Person):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         """
         Base class for mentees
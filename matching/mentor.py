@@ -6,6 +6,8 @@ if TYPE_CHECKING:
 
 
 class Mentor(Person):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super(Mentor, self).__init__(**kwargs)
 
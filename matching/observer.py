@@ -0,0 +1,269 @@
+"""
+Instrumentation for matching runs.
+
+`process_data` reports what it's doing to an `Observer`: when each round starts and finishes, how long each stage takes,
+how many pairs were scored and disqualified, and how hard the solver had to work. The base `Observer` ignores all of
+it, and is what's used when no observer is passed, so a normal run pays almost nothing for the hooks. Subclass it to
+send events somewhere, or use a `Profiler`, which collects them and writes them out as JSON or in Chrome's trace event
+format (open the file in ``chrome://tracing`` or https://ui.perfetto.dev).
+"""
+import json
+import operator
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Union
+
+from matching.rules import rule as rl
+from matching.rules.expression import Expression
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - resource is Unix-only
+    resource = None  # type: ignore
+
+_NO_STAGE: ContextManager[None] = nullcontext()
+
+
+class RuleCounter:
+    """
+    How often one rule was evaluated, how long it took in total, and how many pairs it disqualified
+    """
+
+    def __init__(self, label: str):
+        self.label = label
+        self.evaluations = 0
+        self.seconds = 0.0
+        self.disqualified = 0
+
+    def to_dict(self) -> Dict[str, Union[str, int, float]]:
+        return {
+            "rule": self.label,
+            "evaluations": self.evaluations,
+            "seconds": self.seconds,
+            "disqualified": self.disqualified,
+        }
+
+
+class Observer:
+    """
+    Receives events from `process_data`. Every method does nothing; override the ones you're interested in.
+
+    Anything that costs time to work out, like counting the disqualified pairs in a grid, is only worked out if
+    ``enabled`` is `True`.
+    """
+
+    enabled: bool = False
+
+    def round_started(self, round_number: int, mentors: int, mentees: int) -> None:
+        pass
+
+    def stage(self, name: str) -> ContextManager[None]:
+        """
+        Returns a context manager wrapped around one stage of the current round
+        """
+        return _NO_STAGE
+
+    def pairs_scored(self, scored: int, disqualified: Optional[int]) -> None:
+        """
+        Reports how many pairs were scored this round, and how many of them were disqualified, if that's known
+        """
+        pass
+
+    def rule_counter(self, rule: rl.RuleProtocol) -> Optional[RuleCounter]:
+        """
+        Returns the counter that this rule's evaluations should be added to, or `None` if they shouldn't be counted.
+        Counting slows scoring down, so the base class doesn't
+        """
+        return None
+
+    def solver_finished(self, solver: str, iterations: Optional[int]) -> None:
+        pass
+
+    def round_finished(self, matched: int) -> None:
+        pass
+
+
+#: The observer used when none is given
+NULL_OBSERVER = Observer()
+
+
+def describe_rule(rule: rl.RuleProtocol) -> str:
+    """
+    A short, readable name for a rule, such as ``Disqualify(Grade(2, gt))``
+    """
+    if isinstance(rule, rl.Grade):
+        return f"Grade({rule.target_diff}, {getattr(rule.operator, '__name__', rule.operator)})"
+    if isinstance(rule, rl.Equivalent):
+        return f"Equivalent({rule.attribute!r})"
+    if isinstance(rule, Expression):
+        return f"Expression({rule.source!r})"
+    if isinstance(rule, rl.Generic):
+        wrapped_rule = rule.wrapped_rule
+        inner = (
+            describe_rule(wrapped_rule)
+            if wrapped_rule is not None
+            else getattr(rule._evaluate, "__name__", "function")
+        )
+        return f"{type(rule).__name__}({inner})"
+    return type(rule).__name__
+
+
+def _peak_memory() -> Optional[int]:
+    """
+    The most memory this process has used so far, in bytes
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, everything else kilobytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Profiler(Observer):
+    """
+    Collects everything `process_data` reports: each round's stage timings, pair counts and solver iterations, the
+    process's peak memory at the end of each stage, and per-rule evaluation counts and times. Per-rule counting times
+    every evaluation of every rule, which slows scoring down noticeably; pass ``count_rules=False`` to skip it.
+    """
+
+    enabled = True
+
+    def __init__(self, count_rules: bool = True):
+        self.count_rules = count_rules
+        self.rounds: List[Dict[str, Any]] = []
+        self.events: List[Dict[str, Any]] = []
+        self.rule_counters: Dict[int, RuleCounter] = {}
+        self._rules: List[rl.RuleProtocol] = []
+        self._started = time.perf_counter()
+        self._current: Optional[Dict[str, Any]] = None
+
+    def round_started(self, round_number: int, mentors: int, mentees: int) -> None:
+        self._current = {
+            "round": round_number,
+            "mentors": mentors,
+            "mentees": mentees,
+            "stages": {},
+            "pairs_scored": 0,
+            "pairs_disqualified": 0,
+            "solver": None,
+            "solver_iterations": None,
+            "matched": None,
+            "peak_memory_bytes": None,
+        }
+        self.rounds.append(self._current)
+
+    @contextmanager
+    def _timed_stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            peak_memory = _peak_memory()
+            round_number = None
+            if self._current is not None:
+                stages = self._current["stages"]
+                stages[name] = stages.get(name, 0.0) + end - start
+                self._current["peak_memory_bytes"] = peak_memory
+                round_number = self._current["round"]
+            self.events.append(
+                {
+                    "stage": name,
+                    "round": round_number,
+                    "start": start - self._started,
+                    "seconds": end - start,
+                    "peak_memory_bytes": peak_memory,
+                }
+            )
+
+    def stage(self, name: str) -> ContextManager[None]:
+        return self._timed_stage(name)
+
+    def pairs_scored(self, scored: int, disqualified: Optional[int]) -> None:
+        if self._current is not None:
+            self._current["pairs_scored"] += scored
+            if disqualified is None:
+                self._current["pairs_disqualified"] = None
+            elif self._current["pairs_disqualified"] is not None:
+                self._current["pairs_disqualified"] += disqualified
+
+    def rule_counter(self, rule: rl.RuleProtocol) -> Optional[RuleCounter]:
+        if not self.count_rules:
+            return None
+        counter = self.rule_counters.get(id(rule))
+        if counter is None:
+            # keep the rule alive, so that its id isn't reused by another rule
+            self._rules.append(rule)
+            counter = self.rule_counters[id(rule)] = RuleCounter(describe_rule(rule))
+        return counter
+
+    def solver_finished(self, solver: str, iterations: Optional[int]) -> None:
+        if self._current is not None:
+            self._current["solver"] = solver
+            self._current["solver_iterations"] = iterations
+
+    def round_finished(self, matched: int) -> None:
+        if self._current is not None:
+            self._current["matched"] = matched
+        self._current = None
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "rounds": self.rounds,
+            "stages": self.events,
+            "rules": [counter.to_dict() for counter in self.rule_counters.values()],
+            "peak_memory_bytes": _peak_memory(),
+        }
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """
+        The stages as complete ("X") events in Chrome's trace event format, with a counter track for memory
+        """
+        trace_events: List[Dict[str, Any]] = []
+        for event in self.events:
+            timestamp = event["start"] * 1e6
+            trace_events.append(
+                {
+                    "name": event["stage"],
+                    "cat": "stage",
+                    "ph": "X",
+                    "ts": timestamp,
+                    "dur": event["seconds"] * 1e6,
+                    "pid": 0,
+                    "tid": 0,
+                    "args": {"round": event["round"]},
+                }
+            )
+            if event["peak_memory_bytes"] is not None:
+                trace_events.append(
+                    {
+                        "name": "peak memory",
+                        "ph": "C",
+                        "ts": timestamp + event["seconds"] * 1e6,
+                        "pid": 0,
+                        "args": {"bytes": event["peak_memory_bytes"]},
+                    }
+                )
+        return {
+            "traceEvents": sorted(trace_events, key=operator.itemgetter("ts")),
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "rounds": self.rounds,
+                "rules": [counter.to_dict() for counter in self.rule_counters.values()],
+            },
+        }
+
+    def dump(self, path: Path, trace_format: str = "json") -> None:
+        """
+        Writes the profile to ``path``, either as a plain JSON report ("json") or as a Chrome trace ("chrome")
+        """
+        if trace_format == "json":
+            profile = self.report()
+        elif trace_format == "chrome":
+            profile = self.chrome_trace()
+        else:
+            raise ValueError(f"Unknown profile format: {trace_format}")
+        with open(path, "w") as profile_file:
+            json.dump(profile, profile_file, indent=2)
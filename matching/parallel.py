@@ -0,0 +1,96 @@
+"""
+Scoring a cohort across several processes.
+
+Scoring is independent from one mentor to the next, so the mentors are split into shards and each shard is scored in a
+worker process. Workers are sent compact columns (see `ParticipantColumns.compact`) and the rules themselves, and send
+back plain NumPy arrays, so no `Person` or `Match` objects cross the process boundary.
+"""
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from matching.columnar import (
+    CohortColumns,
+    ParticipantColumns,
+    ScoreMatrix,
+    apply_pairwise,
+    score_block,
+)
+from matching.rules.rule import Rule, RuleProtocol
+
+
+def can_score_in_worker(rule: RuleProtocol) -> bool:
+    """
+    A rule can be sent to a worker if it's vectorised, because the workers have no participants to fall back on, and if
+    it can be pickled. Rules built around a `lambda`, like most `Generic` rules, can't be.
+    """
+    if not (isinstance(rule, Rule) and rule.vectorised):
+        return False
+    try:
+        pickle.dumps(rule)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
+def _score_shard(
+    mentors: ParticipantColumns,
+    mentees: ParticipantColumns,
+    previous_pairs: np.ndarray,
+    rules: Sequence[Rule],
+) -> Tuple[np.ndarray, np.ndarray]:
+    cohort = CohortColumns.from_columns(mentors, mentees, previous_pairs)
+    score_matrix = score_block(cohort, mentors, mentees, rules)
+    return score_matrix.scores, score_matrix.disallowed
+
+
+def score_in_parallel(
+    mentors: Sequence, mentees: Sequence, rules: Sequence[RuleProtocol], workers: int
+) -> ScoreMatrix:
+    """
+    Returns the same `ScoreMatrix` as `generate_score_matrix`, with the mentors sharded across ``workers`` processes.
+
+    Rules that can't be sent to a worker (see `can_score_in_worker`) aren't dropped: they're scored in this process,
+    across the whole grid, while the workers get on with the rest.
+    """
+    cohort = CohortColumns(mentors, mentees)
+    if workers <= 1 or len(mentors) < 2:
+        return cohort.score(rules)
+    shareable: List[Rule] = [
+        rule for rule in rules if isinstance(rule, Rule) and can_score_in_worker(rule)
+    ]
+    local = [rule for rule in rules if rule not in shareable]
+
+    for rule in shareable:
+        rule.prepare(cohort.mentors, cohort.mentees)
+    compact_mentees = cohort.mentees.compact()
+    shards = [
+        shard
+        for shard in np.array_split(np.arange(len(mentors)), workers)
+        if len(shard)
+    ]
+    with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+        futures = [
+            pool.submit(
+                _score_shard,
+                cohort.mentors.take(shard).compact(),
+                compact_mentees,
+                cohort.previous_pairs,
+                shareable,
+            )
+            for shard in shards
+        ]
+        score_matrix = ScoreMatrix.empty(len(mentors), len(mentees))
+        for local_rule in local:
+            if isinstance(local_rule, Rule):
+                local_rule.apply_array(cohort.mentors, cohort.mentees, score_matrix)
+            else:
+                apply_pairwise(local_rule, cohort.mentors, cohort.mentees, score_matrix)
+        results: List[Tuple[np.ndarray, np.ndarray]] = [
+            future.result() for future in futures
+        ]
+    score_matrix.scores += np.vstack([scores for scores, _ in results])
+    score_matrix.disallowed |= np.vstack([disallowed for _, disallowed in results])
+    return score_matrix
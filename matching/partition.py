@@ -0,0 +1,106 @@
+"""
+Matching a cohort in shards.
+
+Rules like ``Equivalent("profession")`` reward pairs within a group so much that the best assignment is mostly made of
+pairs inside groups. The time an assignment takes to solve grows with the cube of the number of participants, so
+rather than solving the whole cohort at once, it can be split into shards that are each solved on their own, followed
+by one smaller clean-up solve over everyone the shards left unmatched. Many small solves are much quicker than one big
+one, and they can be spread across processes.
+
+Shards are made either from an attribute that participants share, such as "profession", or from the connected
+components of a `CandidateGraph`. No pair across two components is allowed or scores anything, so sharding by component
+only gives up pairs that score nothing.
+"""
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from matching.solvers import Assignment, SolverSpec, get_solver
+from matching.sparse import CandidateGraph
+
+#: A shard is the indices of its mentors and the indices of its mentees
+Shard = Tuple[np.ndarray, np.ndarray]
+
+
+def shards_by_attribute(
+    mentors: Sequence, mentees: Sequence, attribute: str
+) -> List[Shard]:
+    """
+    Puts the participants with the same value of ``attribute`` in the same shard. A value that only mentors, or only
+    mentees, have doesn't make a shard: those participants are left for the clean-up solve
+    """
+    groups: Dict[object, Tuple[List[int], List[int]]] = {}
+    for side, people in enumerate((mentors, mentees)):
+        for index, person in enumerate(people):
+            groups.setdefault(getattr(person, attribute), ([], []))[side].append(index)
+    return [
+        (
+            np.array(mentor_indices, dtype=np.int64),
+            np.array(mentee_indices, dtype=np.int64),
+        )
+        for mentor_indices, mentee_indices in groups.values()
+        if mentor_indices and mentee_indices
+    ]
+
+
+def shards_by_component(graph: CandidateGraph) -> List[Shard]:
+    """
+    Makes a shard from each connected component of the candidate graph that has at least one pair in it. Participants
+    with no candidate pairs at all are left for the clean-up solve
+    """
+    mentor_count, mentee_count = graph.shape
+    edge_mentors = np.repeat(np.arange(mentor_count), np.diff(graph.indptr))
+    edge_mentees = graph.indices.astype(np.int64) + mentor_count
+    # every participant starts with their own label, and takes the smallest label of anyone they share a pair with until
+    # nothing changes. Following labels to the label they point at halves the number of steps each time
+    labels = np.arange(mentor_count + mentee_count)
+    while True:
+        smallest = np.minimum(labels[edge_mentors], labels[edge_mentees])
+        updated = labels.copy()
+        np.minimum.at(updated, edge_mentors, smallest)
+        np.minimum.at(updated, edge_mentees, smallest)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    order = np.argsort(labels, kind="stable")
+    sorted_labels = labels[order]
+    starts = np.flatnonzero(sorted_labels[1:] != sorted_labels[:-1]) + 1
+    shards = []
+    for members in np.split(order, starts):
+        mentor_indices = members[members < mentor_count]
+        mentee_indices = members[members >= mentor_count] - mentor_count
+        if len(mentor_indices) and len(mentee_indices):
+            shards.append((mentor_indices, mentee_indices))
+    return shards
+
+
+def _solve(costs: np.ndarray, solver: SolverSpec) -> Tuple[Assignment, Optional[int]]:
+    backend = get_solver(solver)
+    iterations_before = getattr(backend, "iterations", 0)
+    assignment = backend.solve(costs)
+    iterations = getattr(backend, "iterations", None)
+    return assignment, None if iterations is None else iterations - iterations_before
+
+
+def solve_shards(
+    cost_matrices: Sequence[np.ndarray],
+    solver: SolverSpec = "munkres",
+    workers: int = 1,
+) -> List[Tuple[Assignment, Optional[int]]]:
+    """
+    Solves each cost matrix with ``solver``, across ``workers`` processes if there's more than one. Returns each
+    matrix's assignment and the number of iterations the solver took, if it counts them, in the same order as the
+    matrices. The biggest matrices are sent out first, so that one of them isn't left running on its own at the end.
+    """
+    if workers <= 1 or len(cost_matrices) < 2:
+        return [_solve(costs, solver) for costs in cost_matrices]
+    order = sorted(range(len(cost_matrices)), key=lambda i: -cost_matrices[i].size)
+    with ProcessPoolExecutor(min(workers, len(cost_matrices))) as executor:
+        solutions = executor.map(
+            _solve, [cost_matrices[i] for i in order], itertools.repeat(solver)
+        )
+        by_matrix = dict(zip(order, solutions))
+    return [by_matrix[i] for i in range(len(cost_matrices))]
@@ -1,20 +1,61 @@
+import functools
+import itertools
+import sys
 import warnings
-from typing import List, Dict, Union
+from typing import Dict, Optional, Tuple, Union
+
+from matching.connections import DEFAULT_CAPACITY, Connections
 
 CorePersonDict = Dict[str, Dict[str, Union[str, int]]]
 PersonDict = Dict[str, Dict[str, Union[str, int, list[CorePersonDict]]]]
 
 
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if type(value) is str else value
+
+
+@functools.lru_cache(maxsize=64)
+def _match_headings(number: int, keys: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    The output headings for someone's ``number``th connection, like "match 1 email". Every row has the same few, so
+    they're only made once
+    """
+    return tuple(f"match {number} {key}" for key in keys)
+
+
 class Person:
+    """
+    Participants are stored compactly: there's no instance `__dict__`, and organisations and professions, which are
+    shared by many participants, are interned so that each distinct value is only stored once. Subclasses that don't
+    declare `__slots__` get a `__dict__` as usual, so they're free to add attributes.
+    """
+
+    __slots__ = (
+        "participant_id",
+        "grade",
+        "organisation",
+        "profession",
+        "email",
+        "first_name",
+        "last_name",
+        "role",
+        "_connections",
+        "has_no_match",
+    )
+    _ids = itertools.count()
+
     def __init__(self, **kwargs):
         """
         When creating a person from a dictionary, we expect a grade as an integer. The lower the `int`, the lower the
-        grade. It is the client's responsibility to turn this integer back into a human-readable `str` if needed
+        grade. It is the client's responsibility to turn this integer back into a human-readable `str` if needed.
+        Every person is given a unique integer `participant_id`. A `capacity` sets how many connections they can have;
+        it defaults to three
         :param kwargs:
         """
+        self.participant_id: int = next(Person._ids)
         self.grade: int = int(kwargs.get("grade"))
-        self.organisation: str = kwargs.get("organisation", None)
-        self.profession = kwargs.get("profession", None)
+        self.organisation: str = _intern(kwargs.get("organisation", None))
+        self.profession = _intern(kwargs.get("profession", None))
         if kwargs.get("current_profession") or kwargs.get("current profession"):
             warnings.warn(
                 "`current_profession` is deprecated. Use `profession` instead",
@@ -24,19 +65,27 @@ class Person:
         self.first_name = kwargs.get("first name", None)
         self.last_name = kwargs.get("last name", None)
         self.role = kwargs.get("role", None)
-        self._connections: List[Person] = []
+        capacity = kwargs.get("capacity")
+        self._connections = Connections(
+            capacity=DEFAULT_CAPACITY if capacity in (None, "") else int(capacity)
+        )
         self.has_no_match: bool = False
 
     @property
-    def connections(self) -> List["Person"]:
+    def connections(self) -> Connections:
         return self._connections
 
     @connections.setter
     def connections(self, new_connection: "Person"):
-        if len(self._connections) < 3:
-            self._connections.append(new_connection)
-        else:
-            raise Exception
+        self._connections.append(new_connection)
+
+    @property
+    def capacity(self) -> int:
+        return self._connections.capacity
+
+    @capacity.setter
+    def capacity(self, capacity: int):
+        self._connections.capacity = capacity
 
     def to_dict(
         self,
@@ -68,9 +117,14 @@ class Person:
     def to_dict_for_output(self, depth=1) -> dict:
         output = self.core_to_dict()[self.class_name()]
         if depth == 1:
-            for i, connection in enumerate(self._connections):
-                for key, value in connection.to_dict_for_output(depth=0).items():
-                    output[f"match {i + 1} {key}"] = value
+            for i, connection in enumerate(self._connections, start=1):
+                connection_output = connection.to_dict_for_output(depth=0)
+                output.update(
+                    zip(
+                        _match_headings(i, tuple(connection_output)),
+                        connection_output.values(),
+                    )
+                )
         return output
 
     def to_dict_for_export(self, depth=1) -> dict:
@@ -87,4 +141,7 @@ class Person:
     def __eq__(self, other: object):
         if not isinstance(other, Person):
             raise NotImplementedError
-        return self.email == other.email
+        return self is other or self.email == other.email
+
+    def __hash__(self):
+        return hash(self.email)
@@ -1,19 +1,53 @@
 import csv
 
-import functools
 import pathlib
-import sys
 from pathlib import Path
-from typing import Union, Type, List, Dict, Tuple, Generator, Callable, TypeVar
+from typing import (
+    Union,
+    Type,
+    List,
+    Dict,
+    Tuple,
+    Generator,
+    Callable,
+    TypeVar,
+    Optional,
+    Sequence,
+)
 
-from munkres import Munkres, make_cost_matrix, Matrix  # type: ignore
+import numpy as np
 
 import matching.rules.rule as rl
+from matching.blocking import generate_blocked_match_matrix
+from matching.cache import ScoreCache
+from matching.columnar import CohortColumns, ScoreMatrix
+from matching.connections import connect_all
+from matching.flow import CapacitySolver
+from matching.incremental import IncrementalScorer
+from matching.ingest import load_participants
+from matching.parallel import score_in_parallel
+from matching.partition import (
+    Shard,
+    shards_by_attribute,
+    shards_by_component,
+    solve_shards,
+)
 from matching.match import Match
 from matching.mentee import Mentee
 from matching.mentor import Mentor
+from matching.observer import NULL_OBSERVER, Observer
 from matching.person import Person
-from matching.export import ExportToSpreadsheet
+from matching.rules.compiler import compile_rules
+from matching.export import ExportToSpreadsheet, export_all
+from matching.solvers import (
+    Assignment,
+    CostMatrix,
+    SolverSpec,
+    get_solver,
+    prepare_costs,
+    solver_name,
+)
+from matching.sparse import CandidateGraph, SparseAssignmentSolver
 
 
 MenteeType = TypeVar("MenteeType", bound=Mentee)
@@ -24,13 +58,53 @@ def generate_match_matrix(
     mentor_list: List[MentorType],
     mentee_list: List[MenteeType],
     rules: List[rl.RuleProtocol],
+    observer: Optional[Observer] = None,
 ) -> List[List[Match]]:
+    """
+    Scores every mentor/mentee pair. The rules are compiled once for the whole grid (see `compile_rules`), so each
+    `Match` comes back already scored.
+    """
+    compiled_rules = compile_rules(rules, observer)
     return [
-        [Match(mentor, mentee, rules).calculate_match() for mentee in mentee_list]
+        [compiled_rules.match(mentor, mentee) for mentee in mentee_list]
         for mentor in mentor_list
     ]
 
 
+def generate_score_matrix(
+    mentor_list: List[MentorType],
+    mentee_list: List[MenteeType],
+    rules: List[rl.RuleProtocol],
+    workers: int = 1,
+    observer: Optional[Observer] = None,
+    cache: Optional[ScoreCache] = None,
+) -> ScoreMatrix:
+    """
+    The vectorised equivalent of `generate_match_matrix`. Rather than a grid of `Match` objects, this returns the
+    scores and disqualifications for every pair as NumPy arrays.
+    :param workers: if more than one, the mentors are split between this many processes. See `score_in_parallel`.
+        Rules scored in other processes aren't counted by the ``observer``
+    :param cache: if given, the outcomes of the rules that can be cached are taken from it when they're there, and
+        stored in it when they aren't. Those rules are scored in this process. See `matching.cache`
+    """
+    if workers > 1:
+        if cache is None:
+            return score_in_parallel(mentor_list, mentee_list, rules, workers)
+        score_matrix = score_in_parallel(
+            mentor_list,
+            mentee_list,
+            [rule for rule in rules if not cache.can_cache(rule)],
+            workers,
+        )
+        cached = CohortColumns(mentor_list, mentee_list).score(
+            [rule for rule in rules if cache.can_cache(rule)], observer, cache
+        )
+        score_matrix.scores += cached.scores
+        score_matrix.disallowed |= cached.disallowed
+        return score_matrix
+    return CohortColumns(mentor_list, mentee_list).score(rules, observer, cache)
+
+
 def process_form(path_to_form) -> Generator[Dict[str, str], None, None]:
     with open(path_to_form, "r") as data_form:
         file_reader = csv.DictReader(data_form)
@@ -41,15 +115,23 @@ def process_form(path_to_form) -> Generator[Dict[str, str], None, None]:
 def create_participant_list_from_path(
     participant: Union[Type[Mentee], Type[Mentor]],
     path_to_data: pathlib.Path,
-    mapping_func: Callable[
-        [dict[str, str], str], dict[str, str]
-    ] = lambda row, name: row,
+    mapping_func: Optional[Callable[[dict[str, str], str], dict[str, str]]] = None,
+    chunk_size: int = 10000,
+    use_mmap: bool = False,
 ):
-    path_to_data = path_to_data / f"{participant.__str__()}s.csv"
-    return [
-        participant(**mapping_func(row, participant.__str__()))
-        for row in process_form(path_to_data)
-    ]
+    """
+    Reads ``mentors.csv`` or ``mentees.csv`` from ``path_to_data`` a chunk of rows at a time (see `load_participants`)
+    and returns a participant for each row
+    :param mapping_func: if given, each row is passed through this function, along with the participant's role, before
+        the participant is created
+    """
+    return load_participants(
+        participant,
+        path_to_data / f"{participant.__str__()}s.csv",
+        mapping_func,
+        chunk_size=chunk_size,
+        use_mmap=use_mmap,
+    )
 
 
 def transpose_matrix(matrix):
@@ -75,32 +157,289 @@ def create_matches(
     return transpose_matrix(good_mentors)
 
 
-def prepare_matrix(matches: List[List[Match]]) -> Matrix:
-    prepared_matrix = make_cost_matrix(
-        matches,
-        lambda match: sys.maxsize - match.score,
+def prepare_matrix(matches: List[List[Match]]) -> np.ndarray:
+    """
+    Turns a grid of matches into the costs the solver minimises, with `prepare_costs`. A disqualified match scores 0,
+    and so costs as much as any other match that scores 0
+    """
+    return prepare_costs(
+        np.array([[match.score for match in row] for row in matches], ndmin=2)
     )
-    return prepared_matrix
 
 
-def calculate_matches(prepared_matrix: Matrix):
-    algorithm = Munkres()
-    return algorithm.compute(prepared_matrix)
+def calculate_matches(
+    prepared_matrix: CostMatrix,
+    solver: SolverSpec = "munkres",
+    observer: Optional[Observer] = None,
+) -> Assignment:
+    """
+    Finds the cheapest assignment for the prepared cost matrix.
+    :param prepared_matrix:
+    :param solver: the name of the backend to use, or a solver. "munkres" is the original pure-Python implementation;
+        "jonker-volgenant" is a faster solver built on NumPy; and "scipy" is available if SciPy is installed. "greedy"
+        and "auction" are approximate: they are faster on large cohorts, but may find an assignment that scores a
+        little less. Pass `GreedySolver(improvement_passes=...)` or `AuctionSolver(epsilon=...)` to choose how much
+        quality to trade for speed
+    :param observer: told how many iterations the solver took, if the solver counts them
+    :return: a list of `(row, column)` pairs
+    """
+    backend = get_solver(solver)
+    # a solver that's passed in may be used for several rounds, and counts its iterations across all of them
+    iterations_before = getattr(backend, "iterations", 0)
+    assignment = backend.solve(prepared_matrix)
+    if observer is not None:
+        iterations = getattr(backend, "iterations", None)
+        observer.solver_finished(
+            solver_name(solver),
+            None if iterations is None else iterations - iterations_before,
+        )
+    return assignment
 
 
 def match_and_assign_participants(
     good_matches: List[List[Match]],
+    solver: SolverSpec = "munkres",
+    observer: Optional[Observer] = None,
 ) -> List[List[Match]]:
-    for successful_match in calculate_matches(prepare_matrix(good_matches)):
-        match = good_matches[successful_match[0]][successful_match[1]]
-        match.mark_successful()
+    observer = NULL_OBSERVER if observer is None else observer
+    with observer.stage("prepare_matrix"):
+        prepared_matrix = prepare_matrix(good_matches)
+    with observer.stage("calculate_matches"):
+        assignment = calculate_matches(prepared_matrix, solver, observer)
+    with observer.stage("assign"):
+        for successful_match in assignment:
+            match = good_matches[successful_match[0]][successful_match[1]]
+            match.mark_successful()
     return good_matches
 
 
+def assign_from_score_matrix(
+    mentors: List[MentorType],
+    mentees: List[MenteeType],
+    score_matrix: ScoreMatrix,
+    solver: SolverSpec = "munkres",
+    observer: Optional[Observer] = None,
+) -> Assignment:
+    """
+    The vectorised equivalent of `match_and_assign_participants`. The cost matrix passed to the solver is the same as
+    the one `prepare_matrix` builds, for every mentor and mentee, even those whose pairs are all disallowed, so the
+    assignments are the same too.
+    :return: the indices of the mentors and mentees that were matched
+    """
+    observer = NULL_OBSERVER if observer is None else observer
+    if not score_matrix.scores.size:
+        return []
+    with observer.stage("prepare_matrix"):
+        prepared_matrix = prepare_costs(score_matrix.scores, score_matrix.disallowed)
+    with observer.stage("calculate_matches"):
+        solution = calculate_matches(prepared_matrix, solver, observer)
+    with observer.stage("assign"):
+        assignment = [
+            (int(row), int(column))
+            for row, column in solution
+            if not score_matrix.disallowed[row, column]
+        ]
+        connect_all((mentors[row], mentees[column]) for row, column in assignment)
+    return assignment
+
+
+def generate_candidate_graph(
+    mentor_list: List[MentorType],
+    mentee_list: List[MenteeType],
+    rules: List[rl.RuleProtocol],
+    block_size: int = 256,
+    observer: Optional[Observer] = None,
+) -> CandidateGraph:
+    """
+    The sparse equivalent of `generate_score_matrix`. Only the pairs that are allowed and have a nonzero score are
+    kept, so memory grows with the number of candidate pairs rather than with mentors x mentees.
+    """
+    return CandidateGraph.from_cohort(
+        CohortColumns(mentor_list, mentee_list), rules, block_size, observer
+    )
+
+
+def assign_from_candidate_graph(
+    mentors: List[MentorType],
+    mentees: List[MenteeType],
+    candidate_graph: CandidateGraph,
+    observer: Optional[Observer] = None,
+) -> None:
+    observer = NULL_OBSERVER if observer is None else observer
+    sparse_solver = SparseAssignmentSolver()
+    with observer.stage("calculate_matches"):
+        assignment = sparse_solver.solve(candidate_graph)
+    observer.solver_finished("sparse", sparse_solver.iterations)
+    with observer.stage("assign"):
+        connect_all((mentors[row], mentees[column]) for row, column in assignment)
+
+
+def assign_with_capacity(
+    mentors: List[MentorType],
+    mentees: List[MenteeType],
+    score_matrices: Sequence[ScoreMatrix],
+    rounds: int,
+    observer: Optional[Observer] = None,
+    capacities: Optional[Tuple[Sequence[int], Sequence[int]]] = None,
+) -> Assignment:
+    """
+    Makes every round's connections in one solve. Each participant is given up to ``rounds`` new connections, and
+    never more than they have room for; no pair is made twice; and as many pairs as possible are made, with the
+    highest total score. See `matching.flow.CapacitySolver`.
+    :param score_matrices: either one matrix, which scores every connection, or one per round, in which case each of
+        a mentor's new connections is scored by a different round's matrix
+    :param capacities: the most new connections each mentor and each mentee can be given, if not ``rounds``. Nobody
+        is given more than they have room for either way
+    :return: the indices of the mentors and mentees that were matched
+    """
+    observer = NULL_OBSERVER if observer is None else observer
+    with observer.stage("prepare_matrix"):
+        costs = [
+            np.where(matrix.disallowed, np.inf, -matrix.scores.astype(np.float64))
+            for matrix in score_matrices
+        ]
+        mentor_limits, mentee_limits = (
+            ([rounds] * len(mentors), [rounds] * len(mentees))
+            if capacities is None
+            else capacities
+        )
+        mentor_capacity = np.array(
+            [
+                min(mentor.connections.remaining, limit)
+                for mentor, limit in zip(mentors, mentor_limits)
+            ],
+            dtype=np.int64,
+        )
+        mentee_capacity = np.array(
+            [
+                min(mentee.connections.remaining, limit)
+                for mentee, limit in zip(mentees, mentee_limits)
+            ],
+            dtype=np.int64,
+        )
+    capacity_solver = CapacitySolver()
+    with observer.stage("calculate_matches"):
+        assignment = capacity_solver.solve(costs, mentor_capacity, mentee_capacity)
+    observer.solver_finished("capacity", capacity_solver.iterations)
+    with observer.stage("assign"):
+        connect_all((mentors[row], mentees[column]) for row, column in assignment)
+    return assignment
+
+
+def assign_partitioned(
+    mentors: List[MentorType],
+    mentees: List[MenteeType],
+    shards: Sequence[Shard],
+    rules: List[rl.RuleProtocol],
+    solver: SolverSpec = "munkres",
+    workers: int = 1,
+    observer: Optional[Observer] = None,
+    cache: Optional[ScoreCache] = None,
+) -> Assignment:
+    """
+    Runs one round of matching a shard at a time. Each shard is scored and solved on its own, and then everyone left
+    unmatched, whether their shard had no room for them or they weren't in a shard at all, is scored and solved
+    together in one clean-up solve. Nobody is given more than one new connection.
+    :param shards: the indices of each shard's mentors and mentees. See `matching.partition`
+    :param workers: the number of processes to solve the shards in
+    :param cache: see `generate_score_matrix`
+    :return: the indices of the mentors and mentees that were matched
+    """
+    observer = NULL_OBSERVER if observer is None else observer
+    assignment, iterations = _assign_shards(
+        mentors, mentees, shards, rules, solver, workers, observer, cache
+    )
+    matched_mentors = {mentor for mentor, _ in assignment}
+    matched_mentees = {mentee for _, mentee in assignment}
+    leftovers = (
+        np.array(
+            [i for i in range(len(mentors)) if i not in matched_mentors],
+            dtype=np.int64,
+        ),
+        np.array(
+            [i for i in range(len(mentees)) if i not in matched_mentees],
+            dtype=np.int64,
+        ),
+    )
+    clean_up, clean_up_iterations = _assign_shards(
+        mentors, mentees, [leftovers], rules, solver, 1, observer, cache
+    )
+    observer.solver_finished(
+        solver_name(solver),
+        None
+        if iterations is None or clean_up_iterations is None
+        else iterations + clean_up_iterations,
+    )
+    return assignment + clean_up
+
+
+def _assign_shards(
+    mentors: List[MentorType],
+    mentees: List[MenteeType],
+    shards: Sequence[Shard],
+    rules: List[rl.RuleProtocol],
+    solver: SolverSpec,
+    workers: int,
+    observer: Observer,
+    cache: Optional[ScoreCache],
+) -> Tuple[Assignment, Optional[int]]:
+    cost_matrices = []
+    viable_shards = []
+    with observer.stage("score"):
+        for mentor_indices, mentee_indices in shards:
+            score_matrix = generate_score_matrix(
+                [mentors[i] for i in mentor_indices],
+                [mentees[i] for i in mentee_indices],
+                rules,
+                observer=observer,
+                cache=cache,
+            )
+            if observer.enabled:
+                observer.pairs_scored(
+                    score_matrix.scores.size, int(score_matrix.disallowed.sum())
+                )
+            rows, columns = score_matrix.viable()
+            if not (len(rows) and len(columns)):
+                continue
+            viable_matrix = score_matrix.take(rows, columns)
+            cost_matrices.append(
+                prepare_costs(viable_matrix.scores, viable_matrix.disallowed)
+            )
+            viable_shards.append(
+                (
+                    mentor_indices[rows],
+                    mentee_indices[columns],
+                    viable_matrix.disallowed,
+                )
+            )
+    with observer.stage("calculate_matches"):
+        solutions = solve_shards(cost_matrices, solver, workers)
+    with observer.stage("assign"):
+        assignment = [
+            (int(mentor_indices[row]), int(mentee_indices[column]))
+            for (mentor_indices, mentee_indices, disallowed), (solution, _) in zip(
+                viable_shards, solutions
+            )
+            for row, column in solution
+            if not disallowed[row, column]
+        ]
+        connect_all((mentors[row], mentees[column]) for row, column in assignment)
+    counts = [iterations for _, iterations in solutions]
+    return assignment, None if None in counts else sum(counts)  # type: ignore
+
+
 def process_data(
     mentors: List[MentorType],
     mentees: List[MenteeType],
     all_rules: List[List[rl.RuleProtocol]],
+    scoring: str = "object",
+    solver: SolverSpec = "munkres",
+    blocking: bool = False,
+    workers: int = 1,
+    observer: Optional[Observer] = None,
+    capacity_matching: bool = False,
+    partition_by: Optional[str] = None,
+    score_cache: Optional[ScoreCache] = None,
 ) -> Tuple[List[MentorType], List[MenteeType]]:
     """
     This is the main entrypoint for this software. It lazily generates three matrices, which allows for them to be
@@ -108,24 +447,247 @@ def process_data(
     :param all_rules:
     :param mentors:
     :param mentees:
+    :param scoring: "object" scores every pair through a `Match` object; "vectorised" scores the whole grid at once
+        with NumPy. Both produce the same assignments. "incremental" is like "vectorised", but between rounds only
+        rescores the rules and participants that might have changed; it assumes connections only change through
+        matching, and works best when the same rule objects are used in every round. "sparse" only keeps the pairs
+        that are allowed and score more than nothing, and solves the assignment over those alone; it never makes
+        pairs that score zero, and ignores ``solver``
+    :param solver: the name of the assignment solver to use, or a solver. See `calculate_matches`
+    :param blocking: if `True`, pairs that are certain to be disqualified are ruled out before they're scored, and
+        the number pruned in each round is logged. Only used with "object" scoring
+    :param workers: the number of processes to score with. Only used with "vectorised" scoring, or to solve shards
+        with ``partition_by``
+    :param observer: told about each round and stage as it happens. See `matching.observer`
+    :param capacity_matching: if `True`, every round is solved at once rather than one after another: see
+        `assign_with_capacity`. If every round uses the same rule list, each participant can be given up to one
+        connection per round, up to their capacity, scored by that list. If the rounds' rule lists differ, each
+        mentor's new connections are scored by a different round's rules. Rules are evaluated once, before any new
+        connections are made, so a rule like `UnmatchedBonus` only sees the connections people started with. Pairs
+        are scored with the vectorised engine, so ``scoring`` must be "object" or "vectorised", and ``solver`` is
+        ignored
+    :param partition_by: if given, each round is split into shards that are solved on their own, followed by a
+        clean-up solve for everyone left over: see `assign_partitioned`. Either the name of an attribute that
+        participants in a shard share, like "profession", or "components", to make a shard of each group of
+        participants that have allowed, nonzero-scoring pairs only with each other. The shards are solved with
+        ``solver`` across ``workers`` processes, and scored with the vectorised engine, so ``scoring`` must be "object"
+        or "vectorised"
+    :param score_cache: if given, rule outcomes are reused from this cache, and stored in it, so that running the same
+        cohort again with some of the same rules doesn't score those rules again: see `matching.cache`. Only used with
+        the vectorised engine, so ``scoring`` must be "vectorised" unless ``capacity_matching`` or ``partition_by`` is
+        used
     :return:
     """
-    matrices = map(
-        functools.partial(generate_match_matrix, mentors, mentees),
-        all_rules,
-    )
-    for matrix in matrices:
-        match_and_assign_participants(matrix)
+    if scoring not in ("object", "vectorised", "incremental", "sparse"):
+        raise ValueError(f"Unknown scoring engine: {scoring}")
+    if blocking and scoring != "object":
+        raise ValueError("Blocking can only be used with object scoring")
+    if workers > 1 and scoring != "vectorised" and partition_by is None:
+        raise ValueError("Parallel scoring can only be used with vectorised scoring")
+    if partition_by is not None and (
+        blocking or capacity_matching or scoring not in ("object", "vectorised")
+    ):
+        raise ValueError(
+            "Partitioned matching can only be used with object or vectorised scoring, without capacity matching"
+        )
+    if capacity_matching and (blocking or scoring not in ("object", "vectorised")):
+        raise ValueError(
+            "Capacity matching can only be used with object or vectorised scoring"
+        )
+    if (
+        score_cache is not None
+        and scoring != "vectorised"
+        and not (capacity_matching or partition_by is not None)
+    ):
+        raise ValueError("A score cache can only be used with vectorised scoring")
+    observer = NULL_OBSERVER if observer is None else observer
+    if capacity_matching:
+        _match_with_capacity(
+            mentors, mentees, all_rules, workers, observer, score_cache
+        )
+        return mentors, mentees
+    if partition_by is not None:
+        _match_partitioned(
+            mentors,
+            mentees,
+            all_rules,
+            partition_by,
+            solver,
+            workers,
+            observer,
+            score_cache,
+        )
+        return mentors, mentees
+    scorer = IncrementalScorer(mentors, mentees) if scoring == "incremental" else None
+    for round_number, rules in enumerate(all_rules):
+        observer.round_started(round_number, len(mentors), len(mentees))
+        connections = _count_connections(mentors)
+        if scoring == "object":
+            with observer.stage("score"):
+                matrix = (
+                    generate_blocked_match_matrix if blocking else generate_match_matrix
+                )(mentors, mentees, rules, observer=observer)
+            if observer.enabled:
+                observer.pairs_scored(
+                    len(mentors) * len(mentees),
+                    sum(match.disallowed for row in matrix for match in row),
+                )
+            match_and_assign_participants(matrix, solver, observer)
+        elif scoring == "sparse":
+            with observer.stage("score"):
+                candidate_graph = generate_candidate_graph(
+                    mentors, mentees, rules, observer=observer
+                )
+            observer.pairs_scored(len(mentors) * len(mentees), None)
+            assign_from_candidate_graph(mentors, mentees, candidate_graph, observer)
+        else:
+            with observer.stage("score"):
+                score_matrix = (
+                    scorer.score(rules)
+                    if scorer is not None
+                    else generate_score_matrix(
+                        mentors, mentees, rules, workers, observer, score_cache
+                    )
+                )
+            if observer.enabled:
+                observer.pairs_scored(
+                    score_matrix.scores.size, int(score_matrix.disallowed.sum())
+                )
+            assignment = assign_from_score_matrix(
+                mentors, mentees, score_matrix, solver, observer
+            )
+            if scorer is not None:
+                for mentor, mentee in assignment:
+                    scorer.record_match(mentor, mentee)
+        observer.round_finished(_count_connections(mentors) - connections)
     return mentors, mentees
 
 
+def _match_with_capacity(
+    mentors: List[MentorType],
+    mentees: List[MenteeType],
+    all_rules: List[List[rl.RuleProtocol]],
+    workers: int,
+    observer: Observer,
+    cache: Optional[ScoreCache],
+) -> None:
+    observer.round_started(0, len(mentors), len(mentees))
+    connections = _count_connections(mentors)
+    assign_with_capacity(
+        mentors,
+        mentees,
+        generate_round_score_matrices(
+            mentors, mentees, all_rules, workers, observer, cache
+        ),
+        len(all_rules),
+        observer,
+    )
+    observer.round_finished(_count_connections(mentors) - connections)
+
+
+def generate_round_score_matrices(
+    mentors: List[MentorType],
+    mentees: List[MenteeType],
+    all_rules: List[List[rl.RuleProtocol]],
+    workers: int = 1,
+    observer: Optional[Observer] = None,
+    cache: Optional[ScoreCache] = None,
+) -> List[ScoreMatrix]:
+    """
+    Scores every round's rules at once, ready for `assign_with_capacity`. Returns a single matrix if every round uses
+    the same rule list, and otherwise one per round. Rounds that share a rule list share its matrix.
+    """
+    observer = NULL_OBSERVER if observer is None else observer
+    score_matrices: Dict[int, ScoreMatrix] = {}
+    with observer.stage("score"):
+        for rules in all_rules:
+            if id(rules) not in score_matrices:
+                score_matrices[id(rules)] = generate_score_matrix(
+                    mentors, mentees, rules, workers, observer, cache
+                )
+    if observer.enabled:
+        for score_matrix in score_matrices.values():
+            observer.pairs_scored(
+                score_matrix.scores.size, int(score_matrix.disallowed.sum())
+            )
+    if len(score_matrices) == 1:
+        return list(score_matrices.values())
+    return [score_matrices[id(rules)] for rules in all_rules]
+
+
+def _match_partitioned(
+    mentors: List[MentorType],
+    mentees: List[MenteeType],
+    all_rules: List[List[rl.RuleProtocol]],
+    partition_by: str,
+    solver: SolverSpec,
+    workers: int,
+    observer: Observer,
+    cache: Optional[ScoreCache],
+) -> None:
+    for round_number, rules in enumerate(all_rules):
+        observer.round_started(round_number, len(mentors), len(mentees))
+        connections = _count_connections(mentors)
+        with observer.stage("partition"):
+            shards = (
+                shards_by_component(
+                    generate_candidate_graph(mentors, mentees, rules, observer=observer)
+                )
+                if partition_by == "components"
+                else shards_by_attribute(mentors, mentees, partition_by)
+            )
+        assign_partitioned(
+            mentors, mentees, shards, rules, solver, workers, observer, cache
+        )
+        observer.round_finished(_count_connections(mentors) - connections)
+
+
+def _count_connections(participants: List[MentorType]) -> int:
+    return sum(len(participant.connections) for participant in participants)
+
+
 def conduct_matching_from_file(
-    path_to_data: Path, rules: list[list[rl.RuleProtocol]]
+    path_to_data: Path,
+    rules: list[list[rl.RuleProtocol]],
+    scoring: str = "object",
+    solver: SolverSpec = "munkres",
+    workers: int = 1,
+    observer: Optional[Observer] = None,
+    capacity_matching: bool = False,
+    partition_by: Optional[str] = None,
+    score_cache: Optional[ScoreCache] = None,
 ) -> Tuple[List[MentorType], List[MenteeType]]:
-    mentors = create_participant_list_from_path(Mentor, path_to_data)
-    mentees = create_participant_list_from_path(Mentee, path_to_data)
-    return process_data(mentors, mentees, rules)
+    observer = NULL_OBSERVER if observer is None else observer
+    with observer.stage("load"):
+        mentors = create_participant_list_from_path(Mentor, path_to_data)
+        mentees = create_participant_list_from_path(Mentee, path_to_data)
+    return process_data(
+        mentors,
+        mentees,
+        rules,
+        scoring=scoring,
+        solver=solver,
+        workers=workers,
+        observer=observer,
+        capacity_matching=capacity_matching,
+        partition_by=partition_by,
+        score_cache=score_cache,
+    )
 
 
-def create_mailing_list(participant_list: List[Person], output_folder: Path):
-    ExportToSpreadsheet(participant_list, output_folder).export()
+def create_mailing_list(
+    participant_list: List[Person], output_folder: Path, file_format: str = "csv"
+):
+    ExportToSpreadsheet(participant_list, output_folder, file_format).export()
+
+
+def create_mailing_lists(
+    mentors: List[Person],
+    mentees: List[Person],
+    output_folder: Path,
+    file_format: str = "csv",
+) -> List[Path]:
+    """
+    Writes the mentors' and the mentees' lists at the same time. See `matching.export` for the formats
+    """
+    return export_all([mentors, mentees], output_folder, file_format)
@@ -0,0 +1,246 @@
+"""
+Matching again after people join or drop out.
+
+Once a run has finished, late sign-ups and withdrawals still come in. Rather than matching everyone again from scratch,
+`rematch` starts from the pairs the last run made. Pairs between people who are still in the cohort are kept, and only
+the people with room for more connections - new sign-ups, the partners of anyone who dropped out, and anyone the last
+run couldn't place - are scored and matched, in one solve with `assign_with_capacity`. That's usually a small part of
+the cohort, so it's much quicker than the first run.
+
+Keeping everyone's existing pairs isn't always best: a new sign-up might be a much better match for someone who's
+already paired up. With an ``improvement_threshold``, the whole cohort is solved again instead, but every kept pair
+scores that many extra points, so a pair is only broken if doing so improves the total score by more than the
+threshold.
+
+The previous pairs can be read from the ``mentors-list.csv`` that `ExportToSpreadsheet` writes, or saved to and loaded
+from a small JSON state file with `save_pairs` and `load_pairs`.
+"""
+import csv
+import gzip
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Collection, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import matching.rules.rule as rl
+from matching.columnar import ScoreMatrix
+from matching.connections import connect, connected
+from matching.mentee import Mentee
+from matching.mentor import Mentor
+from matching.observer import NULL_OBSERVER, Observer
+from matching.process import (
+    MenteeType,
+    MentorType,
+    assign_with_capacity,
+    create_participant_list_from_path,
+    generate_round_score_matrices,
+)
+
+#: A pair of participants, as the mentor's email address and the mentee's email address
+EmailPair = Tuple[str, str]
+
+_MATCH_EMAIL = re.compile(r"match \d+ email")
+
+
+def read_exported_pairs(output_folder: Path) -> List[EmailPair]:
+    """
+    Reads the pairs from the ``mentors-list.csv``, or ``mentors-list.csv.gz``, that `ExportToSpreadsheet` wrote to
+    ``output_folder``. Every connection a mentor had is listed there, including any they came in with
+    """
+    path = output_folder / "mentors-list.csv"
+    opener = open
+    if not path.exists() and path.with_suffix(".csv.gz").exists():
+        path, opener = path.with_suffix(".csv.gz"), gzip.open  # type: ignore
+    with opener(path, "rt", newline="") as file:
+        return [
+            (row["email"], mentee_email)
+            for row in csv.DictReader(file)
+            for key, mentee_email in row.items()
+            if _MATCH_EMAIL.fullmatch(key) and mentee_email
+        ]
+
+
+def save_pairs(mentors: Iterable[Mentor], path: Path) -> None:
+    """
+    Writes every mentor's connections to a JSON state file, for `load_pairs` to read back
+    """
+    pairs = [
+        [mentor.email, mentee.email] for mentor in mentors for mentee in mentor.mentees
+    ]
+    path.write_text(json.dumps({"pairs": pairs}))
+
+
+def load_pairs(path: Path) -> List[EmailPair]:
+    """
+    Reads the pairs from a state file written by `save_pairs` or, if ``path`` is a folder, from the ``mentors-list.csv``
+    in it
+    """
+    if path.is_dir():
+        return read_exported_pairs(path)
+    return [
+        (mentor, mentee) for mentor, mentee in json.loads(path.read_text())["pairs"]
+    ]
+
+
+def rematch(
+    mentors: List[MentorType],
+    mentees: List[MenteeType],
+    previous_pairs: Iterable[EmailPair],
+    all_rules: List[List[rl.RuleProtocol]],
+    added_mentors: Sequence[MentorType] = (),
+    added_mentees: Sequence[MenteeType] = (),
+    removed: Collection[str] = (),
+    improvement_threshold: Optional[float] = None,
+    observer: Optional[Observer] = None,
+) -> Tuple[List[MentorType], List[MenteeType]]:
+    """
+    Matches a cohort again, starting from the pairs made last time.
+    :param mentors: the mentors, as they were before the last run made any pairs
+    :param mentees: the mentees, likewise
+    :param previous_pairs: the pairs the last run made. Pairs with anyone who isn't in the cohort any more are dropped,
+        and so are pairs that are already connected
+    :param all_rules: the rules for each round, as for `process_data`. As with capacity matching, every participant
+        can have one connection per round, counting the pairs that are kept
+    :param added_mentors: mentors who've signed up since the last run
+    :param added_mentees: mentees who've signed up since the last run
+    :param removed: the email addresses of anyone who's dropped out
+    :param improvement_threshold: if `None`, every kept pair stays as it is, and only the people with room for more
+        connections are matched. Otherwise, everyone is matched again, and a kept pair is only broken if that improves
+        the total score by more than this many points
+    :param observer: told about the rematch as a single round. See `matching.observer`
+    :return: the mentors and mentees in the cohort now, with their connections
+    """
+    observer = NULL_OBSERVER if observer is None else observer
+    mentors = [
+        mentor for mentor in [*mentors, *added_mentors] if mentor.email not in removed
+    ]
+    mentees = [
+        mentee for mentee in [*mentees, *added_mentees] if mentee.email not in removed
+    ]
+    mentor_by_email = {mentor.email: mentor for mentor in mentors}
+    mentee_by_email = {mentee.email: mentee for mentee in mentees}
+    kept = [
+        (mentor_by_email[mentor_email], mentee_by_email[mentee_email])
+        for mentor_email, mentee_email in dict.fromkeys(previous_pairs)
+        if mentor_email in mentor_by_email and mentee_email in mentee_by_email
+    ]
+    kept = [
+        (mentor, mentee) for mentor, mentee in kept if not connected(mentor, mentee)
+    ]
+    connections = sum(len(mentor.mentees) for mentor in mentors)
+    if improvement_threshold is None:
+        for mentor, mentee in kept:
+            connect(mentor, mentee)
+        _match_spare_places(mentors, mentees, kept, all_rules, observer)
+    else:
+        _match_everyone(
+            mentors, mentees, kept, all_rules, improvement_threshold, observer
+        )
+    still_kept = sum(connected(mentor, mentee) for mentor, mentee in kept)
+    if improvement_threshold is not None:
+        logging.info(
+            f"Rematching broke {len(kept) - still_kept} of {len(kept)} previous pairs"
+        )
+    observer.round_finished(
+        sum(len(mentor.mentees) for mentor in mentors) - connections - still_kept
+    )
+    return mentors, mentees
+
+
+def _match_spare_places(
+    mentors: List[MentorType],
+    mentees: List[MenteeType],
+    kept: List[Tuple[MentorType, MenteeType]],
+    all_rules: List[List[rl.RuleProtocol]],
+    observer: Observer,
+) -> None:
+    rounds = len(all_rules)
+    kept_count: Dict[int, int] = {}
+    for pair in kept:
+        for person in pair:
+            kept_count[id(person)] = kept_count.get(id(person), 0) + 1
+
+    def _places(person) -> int:
+        return min(person.connections.remaining, rounds - kept_count.get(id(person), 0))
+
+    affected_mentors = [mentor for mentor in mentors if _places(mentor) > 0]
+    affected_mentees = [mentee for mentee in mentees if _places(mentee) > 0]
+    mentor_places = [_places(mentor) for mentor in affected_mentors]
+    mentee_places = [_places(mentee) for mentee in affected_mentees]
+    observer.round_started(0, len(affected_mentors), len(affected_mentees))
+    if not (affected_mentors and affected_mentees and rounds):
+        return
+    assign_with_capacity(
+        affected_mentors,
+        affected_mentees,
+        generate_round_score_matrices(
+            affected_mentors, affected_mentees, all_rules, observer=observer
+        ),
+        rounds,
+        observer,
+        capacities=(mentor_places, mentee_places),
+    )
+
+
+def _match_everyone(
+    mentors: List[MentorType],
+    mentees: List[MenteeType],
+    kept: List[Tuple[MentorType, MenteeType]],
+    all_rules: List[List[rl.RuleProtocol]],
+    improvement_threshold: float,
+    observer: Observer,
+) -> None:
+    observer.round_started(0, len(mentors), len(mentees))
+    if not (mentors and mentees and all_rules):
+        return
+    # the kept pairs aren't connected yet, so that they're scored like any other pair
+    score_matrices = generate_round_score_matrices(
+        mentors, mentees, all_rules, observer=observer
+    )
+    mentor_index = {id(mentor): i for i, mentor in enumerate(mentors)}
+    mentee_index = {id(mentee): i for i, mentee in enumerate(mentees)}
+    rows, columns = (
+        np.array([index[id(person)] for person in people], dtype=np.int64)
+        for index, people in (
+            (mentor_index, [mentor for mentor, _ in kept]),
+            (mentee_index, [mentee for _, mentee in kept]),
+        )
+    )
+    sticky_matrices = []
+    for score_matrix in score_matrices:
+        scores = score_matrix.scores.astype(np.float64)
+        scores[rows, columns] += improvement_threshold
+        sticky_matrices.append(ScoreMatrix(scores, score_matrix.disallowed))
+    assign_with_capacity(mentors, mentees, sticky_matrices, len(all_rules), observer)
+
+
+def rematch_from_file(
+    path_to_data: Path,
+    previous: Path,
+    rules: List[List[rl.RuleProtocol]],
+    removed: Collection[str] = (),
+    improvement_threshold: Optional[float] = None,
+    observer: Optional[Observer] = None,
+) -> Tuple[List[Mentor], List[Mentee]]:
+    """
+    Loads the cohort as it is now from ``mentors.csv`` and ``mentees.csv`` in ``path_to_data``, and the pairs made last
+    time from ``previous`` (see `load_pairs`), and matches them again with `rematch`. New sign-ups only need adding to
+    the files. People who have dropped out can be taken out of the files or listed in ``removed``.
+    """
+    observer = NULL_OBSERVER if observer is None else observer
+    with observer.stage("load"):
+        mentors = create_participant_list_from_path(Mentor, path_to_data)
+        mentees = create_participant_list_from_path(Mentee, path_to_data)
+        previous_pairs = load_pairs(previous)
+    return rematch(
+        mentors,
+        mentees,
+        previous_pairs,
+        rules,
+        removed=removed,
+        improvement_threshold=improvement_threshold,
+        observer=observer,
+    )
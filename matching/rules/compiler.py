@@ -0,0 +1,200 @@
+"""
+Compiles a list of rules into a single scoring function.
+
+A `Match` applies its rules one at a time through `Rule.apply`, and every `Match` carries its own copy of the rule list.
+`compile_rules` does that work once per round instead: it looks at each rule, bakes its score table and parameters
+into a small closure, and orders the closures so that disqualifying rules run first and stop evaluation as soon as one
+of them fires.
+"""
+import operator
+import time
+from typing import TYPE_CHECKING, Callable, List, Optional, Sequence, Tuple
+
+from matching.connections import connected
+from matching.match import PREVIOUSLY_MATCHED, SAME_PERSON, Match
+from matching.observer import Observer, RuleCounter
+from matching.rules import rule as rl
+from matching.rules.expression import Expression
+
+if TYPE_CHECKING:
+    from matching.mentee import Mentee
+    from matching.mentor import Mentor
+    from matching.person import Person
+
+Condition = Callable[["Person", "Person"], bool]
+Scorer = Callable[["Person", "Person"], int]
+
+
+def _same_person(mentor: "Person", mentee: "Person") -> bool:
+    """The compiled form of `matching.match.SAME_PERSON`"""
+    return mentor == mentee
+
+
+def _condition(rule: rl.Rule) -> Optional[Condition]:
+    """
+    Returns a function of ``(mentor, mentee)`` equivalent to ``rule.evaluate``, or `None` if the rule isn't one of the
+    built-in kinds. Only exact types are compiled, because a subclass might have overridden `evaluate`.
+    """
+    if type(rule) is rl.Grade:
+        logical_operator, target_diff = rule.operator, rule.target_diff
+        return lambda mentor, mentee: logical_operator(
+            mentor.grade - mentee.grade, target_diff
+        )
+    if type(rule) is rl.Equivalent:
+        attribute = operator.attrgetter(rule.attribute)
+        return lambda mentor, mentee: attribute(mentor) == attribute(mentee)
+    if type(rule) is Expression:
+        return rule.condition
+    if type(rule) is rl.UnmatchedBonus:
+        return lambda mentor, mentee: not (mentor.connections and mentee.connections)
+    if type(rule) in (rl.Generic, rl.Disqualify):
+        wrapped_rule = rule.wrapped_rule  # type: ignore
+        if wrapped_rule is not None:
+            return _condition(wrapped_rule)
+    return None
+
+
+class CompiledRules:
+    """
+    The fused scoring function for one round's rules. Call it with a mentor and a mentee: it returns `None` if the pair
+    is disqualified, and the pair's score otherwise.
+
+    Rules that can't be compiled, such as custom `Rule` subclasses, `Generic` rules wrapping a plain function, or
+    anything that only implements `RuleProtocol`, still work: they're applied to a single `Match` object that's reused
+    for every pair, in the order `Match.calculate_match` applies them, from the end of the list, so that a disqualifying
+    rule still guards the rules before it.
+    """
+
+    def __init__(
+        self,
+        disqualifiers: Sequence[Condition],
+        fallbacks: Sequence[rl.RuleProtocol],
+        scorers: Sequence[Scorer],
+    ):
+        self.disqualifiers = tuple(disqualifiers)
+        self.fallbacks = tuple(fallbacks)
+        self.scorers = tuple(scorers)
+        self._match = Match(None, None, [])  # type: ignore
+
+    def _apply_fallbacks(self, mentor: "Person", mentee: "Person") -> Optional[int]:
+        match = self._match
+        match.mentor, match.mentee = mentor, mentee  # type: ignore
+        match._disallowed, match._score = False, 0
+        score = 0
+        for rule in reversed(self.fallbacks):
+            score += rule.apply(match)
+            if match.disallowed:
+                return None
+        return score
+
+    def __call__(self, mentor: "Person", mentee: "Person") -> Optional[int]:
+        for disqualifies in self.disqualifiers:
+            if disqualifies(mentor, mentee):
+                return None
+        score = 0
+        if self.fallbacks:
+            fallback_score = self._apply_fallbacks(mentor, mentee)
+            if fallback_score is None:
+                return None
+            score += fallback_score
+        for scorer in self.scorers:
+            score += scorer(mentor, mentee)
+        return score
+
+    def match(self, mentor: "Mentor", mentee: "Mentee") -> Match:
+        """
+        Scores the pair and returns a `Match` holding the result, as `Match(...).calculate_match()` would
+        """
+        score = self(mentor, mentee)
+        return Match.from_result(mentor, mentee, score or 0, score is None)
+
+
+def _scorer(condition: Condition, results: dict) -> Scorer:
+    if_true, if_false = results.get(True, False), results.get(False, False)
+    if not if_false:
+        return lambda mentor, mentee: if_true if condition(mentor, mentee) else 0
+    return lambda mentor, mentee: if_true if condition(mentor, mentee) else if_false
+
+
+def _counted_condition(condition: Condition, counter: RuleCounter) -> Condition:
+    def _condition(mentor: "Person", mentee: "Person") -> bool:
+        start = time.perf_counter()
+        outcome = condition(mentor, mentee)
+        counter.seconds += time.perf_counter() - start
+        counter.evaluations += 1
+        counter.disqualified += bool(outcome)
+        return outcome
+
+    return _condition
+
+
+def _counted_scorer(scorer: Scorer, counter: RuleCounter) -> Scorer:
+    def _scorer(mentor: "Person", mentee: "Person") -> int:
+        start = time.perf_counter()
+        score = scorer(mentor, mentee)
+        counter.seconds += time.perf_counter() - start
+        counter.evaluations += 1
+        return score
+
+    return _scorer
+
+
+class _CountedRule:
+    def __init__(self, rule: rl.RuleProtocol, counter: RuleCounter):
+        self.rule = rule
+        self.counter = counter
+
+    def apply(self, match_object: Match) -> int:
+        start = time.perf_counter()
+        score = self.rule.apply(match_object)
+        self.counter.seconds += time.perf_counter() - start
+        self.counter.evaluations += 1
+        self.counter.disqualified += match_object.disallowed
+        return score
+
+    def evaluate(self, match_object: Match) -> bool:
+        return self.rule.evaluate(match_object)
+
+
+def compile_rules(
+    rules: Sequence[rl.RuleProtocol], observer: Optional[Observer] = None
+) -> CompiledRules:
+    """
+    Compiles a round's rules, along with the two disqualifying rules built into every `Match`, into a single
+    `CompiledRules` function. If the ``observer`` hands out a `RuleCounter` for a rule, every evaluation of that rule
+    is counted and timed.
+    """
+    disqualifiers: List[Tuple[rl.RuleProtocol, Condition]] = [
+        (SAME_PERSON, _same_person),
+        (PREVIOUSLY_MATCHED, connected),
+    ]
+    fallbacks: List[rl.RuleProtocol] = []
+    scorers: List[Tuple[rl.RuleProtocol, Scorer]] = []
+    for rule in rules:
+        condition = _condition(rule) if isinstance(rule, rl.Rule) else None
+        if condition is None:
+            fallbacks.append(rule)
+        elif type(rule) is rl.Disqualify:
+            disqualifiers.append((rule, condition))
+        else:
+            scorer = _scorer(condition, rule.results)  # type: ignore
+            scorers.append((rule, scorer))
+    if observer is None:
+        return CompiledRules(
+            [condition for _, condition in disqualifiers],
+            fallbacks,
+            [scorer for _, scorer in scorers],
+        )
+
+    def _counted(rule: rl.RuleProtocol, compiled, wrap):
+        counter = observer.rule_counter(rule)  # type: ignore
+        return compiled if counter is None else wrap(compiled, counter)
+
+    return CompiledRules(
+        [
+            _counted(rule, condition, _counted_condition)
+            for rule, condition in disqualifiers
+        ],
+        [_counted(rule, rule, _CountedRule) for rule in fallbacks],
+        [_counted(rule, scorer, _counted_scorer) for rule, scorer in scorers],
+    )
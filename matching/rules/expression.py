@@ -0,0 +1,442 @@
+"""
+A small expression language for rule conditions.
+
+`Generic` and `Disqualify` rules take a Python function, which can't be written down in a rules file, sent to a worker
+process, cached or vectorised. An `Expression` is a condition written as text instead, like::
+
+    mentor.grade - mentee.grade <= 2 and mentor.profession == mentee.profession
+
+It's parsed and checked once, and turned into two evaluators: one that takes a mentor and a mentee, for object
+scoring, and one that works on whole columns at once, for vectorised scoring. An `Expression` is a `Rule` in its own
+right, so a rule that wraps it, like ``Disqualify(Expression("...").evaluate)``, is vectorised, picklable and
+cacheable too.
+
+The language has:
+
+- ``mentor.<attribute>`` and ``mentee.<attribute>``. ``grade`` and ``connections``, the number of connections someone
+  already has, are numbers. Every other attribute, like ``profession``, is a category
+- whole numbers, text in quotes, ``True`` and ``False``, and lists of numbers or text, like ``["Policy", "Digital"]``
+- ``+`` and ``-`` between numbers
+- ``==``, ``!=``, ``<``, ``<=``, ``>`` and ``>=`` between numbers. A category can be compared with ``==`` and ``!=``
+  to some text, or to the same category on the other side
+- ``in`` and ``not in`` a list
+- ``and``, ``or``, ``not`` and brackets
+"""
+import ast
+import functools
+import operator
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+from matching.columnar import flag_column
+from matching.rules.rule import Fingerprint, Rule
+
+if TYPE_CHECKING:
+    from matching.columnar import ParticipantColumns
+    from matching.match import Match
+    from matching.person import Person
+
+#: The attributes that are numbers, and the columns they're read from
+NUMERIC_ATTRIBUTES = {"grade": "grade", "connections": "connection_count"}
+
+_SIDES = ("mentor", "mentee")
+_NUMBER, _CATEGORY, _TEXT, _LIST, _BOOLEAN = (
+    "a number",
+    "a category",
+    "some text",
+    "a list",
+    "a condition",
+)
+_COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+_ARITHMETIC = {ast.Add: operator.add, ast.Sub: operator.sub}
+
+PairFunction = Callable[["Person", "Person"], Any]
+ArrayFunction = Callable[["ParticipantColumns", "ParticipantColumns"], Any]
+#: A column a rule needs encoding before the columns are compacted: an attribute's codes if the values are `None`, and
+#: otherwise whether each participant's attribute is one of the values
+Requirement = Tuple[str, Optional[Tuple]]
+
+
+class _Node(NamedTuple):
+    kind: str
+    pair: PairFunction
+    array: ArrayFunction
+    columns: Tuple[str, ...] = ()
+    requirements: Tuple[Requirement, ...] = ()
+    #: for a category, which side it's on and which attribute it is
+    side: Optional[str] = None
+    attribute: Optional[str] = None
+    #: for text or a list, its value
+    value: Any = None
+
+
+def _constant(kind: str, value: Any) -> _Node:
+    return _Node(
+        kind, lambda mentor, mentee: value, lambda mentors, mentees: value, value=value
+    )
+
+
+def _on_side(
+    side: str, column: Callable[["ParticipantColumns"], np.ndarray]
+) -> ArrayFunction:
+    """
+    Reads a column from the mentors, as a column vector, or from the mentees, as a row vector, so that it broadcasts
+    across every pair
+    """
+    if side == "mentor":
+        return lambda mentors, mentees: column(mentors)[:, np.newaxis]
+    return lambda mentors, mentees: column(mentees)[np.newaxis, :]
+
+
+def _person(side: str) -> Callable[["Person", "Person"], "Person"]:
+    return (
+        (lambda mentor, mentee: mentor)
+        if side == "mentor"
+        else (lambda mentor, mentee: mentee)
+    )
+
+
+class _Compiler:
+    def __init__(self, source: str):
+        self.source = source
+
+    def error(self, node: ast.AST, message: str) -> ValueError:
+        return ValueError(
+            f"{message}, at column {getattr(node, 'col_offset', 0) + 1} of {self.source!r}"
+        )
+
+    def compile(self, node: ast.AST) -> _Node:
+        if isinstance(node, ast.Expression):
+            return self.compile(node.body)
+        if isinstance(node, ast.BoolOp):
+            return self.boolean_operation(node)
+        if isinstance(node, ast.UnaryOp):
+            return self.unary_operation(node)
+        if isinstance(node, ast.BinOp):
+            return self.arithmetic(node)
+        if isinstance(node, ast.Compare):
+            return self.comparisons(node)
+        if isinstance(node, ast.Attribute):
+            return self.attribute(node)
+        if isinstance(node, ast.Constant):
+            return self.constant(node)
+        if isinstance(node, (ast.List, ast.Tuple)):
+            return self.list(node)
+        if isinstance(node, ast.Name):
+            raise self.error(
+                node, f"{node.id!r} isn't something an expression can use on its own"
+            )
+        raise self.error(node, f"{type(node).__name__} isn't allowed in an expression")
+
+    def expect(self, node: ast.AST, compiled: _Node, *kinds: str) -> _Node:
+        if compiled.kind not in kinds:
+            raise self.error(
+                node, f"Expected {' or '.join(kinds)}, not {compiled.kind}"
+            )
+        return compiled
+
+    def attribute(self, node: ast.Attribute) -> _Node:
+        if not (isinstance(node.value, ast.Name) and node.value.id in _SIDES):
+            raise self.error(node, "Attributes can only be read from mentor or mentee")
+        if node.attr.startswith("_"):
+            raise self.error(
+                node, f"{node.attr!r} isn't an attribute an expression can read"
+            )
+        side, person = node.value.id, _person(node.value.id)
+        name = node.attr
+        if name in NUMERIC_ATTRIBUTES:
+            column = NUMERIC_ATTRIBUTES[name]
+            read: Callable[["Person"], Any] = (
+                (lambda participant: len(participant.connections))
+                if name == "connections"
+                else operator.attrgetter(name)
+            )
+            return _Node(
+                _NUMBER,
+                lambda mentor, mentee: read(person(mentor, mentee)),
+                _on_side(side, lambda columns: columns.column(column)),
+                columns=(column,),
+            )
+        return _Node(
+            _CATEGORY,
+            lambda mentor, mentee: getattr(person(mentor, mentee), name),
+            _on_side(side, lambda columns: columns.codes(name)),
+            side=side,
+            attribute=name,
+        )
+
+    def constant(self, node: ast.Constant) -> _Node:
+        if isinstance(node.value, bool):
+            return _constant(_BOOLEAN, node.value)
+        if isinstance(node.value, (int, float)):
+            return _constant(_NUMBER, node.value)
+        if isinstance(node.value, str):
+            return _constant(_TEXT, node.value)
+        raise self.error(node, f"{node.value!r} isn't allowed in an expression")
+
+    def list(self, node: Union[ast.List, ast.Tuple]) -> _Node:
+        values = []
+        for element in node.elts:
+            compiled = self.expect(element, self.compile(element), _NUMBER, _TEXT)
+            if compiled.value is None:
+                raise self.error(element, "Lists can only hold numbers and text")
+            values.append(compiled.value)
+        return _constant(_LIST, tuple(values))
+
+    def boolean_operation(self, node: ast.BoolOp) -> _Node:
+        operands = [
+            self.expect(value, self.compile(value), _BOOLEAN) for value in node.values
+        ]
+        pairs = [operand.pair for operand in operands]
+        arrays = [operand.array for operand in operands]
+        test, combine = (
+            (all, np.logical_and)
+            if isinstance(node.op, ast.And)
+            else (any, np.logical_or)
+        )
+        return _Node(
+            _BOOLEAN,
+            lambda mentor, mentee: test(value(mentor, mentee) for value in pairs),
+            lambda mentors, mentees: functools.reduce(
+                combine, [value(mentors, mentees) for value in arrays]
+            ),
+            *self.merge(operands),
+        )
+
+    def unary_operation(self, node: ast.UnaryOp) -> _Node:
+        if isinstance(node.op, ast.Not):
+            operand = self.expect(node.operand, self.compile(node.operand), _BOOLEAN)
+            return _Node(
+                _BOOLEAN,
+                lambda mentor, mentee: not operand.pair(mentor, mentee),
+                lambda mentors, mentees: np.logical_not(
+                    operand.array(mentors, mentees)
+                ),
+                operand.columns,
+                operand.requirements,
+            )
+        if isinstance(node.op, ast.USub):
+            operand = self.expect(node.operand, self.compile(node.operand), _NUMBER)
+            if operand.value is not None:
+                return _constant(_NUMBER, -operand.value)
+            return _Node(
+                _NUMBER,
+                lambda mentor, mentee: -operand.pair(mentor, mentee),
+                lambda mentors, mentees: -operand.array(mentors, mentees),
+                operand.columns,
+            )
+        raise self.error(
+            node, f"{type(node.op).__name__} isn't allowed in an expression"
+        )
+
+    def arithmetic(self, node: ast.BinOp) -> _Node:
+        if type(node.op) not in _ARITHMETIC:
+            raise self.error(node, "Only + and - are allowed between numbers")
+        function = _ARITHMETIC[type(node.op)]
+        left = self.expect(node.left, self.compile(node.left), _NUMBER)
+        right = self.expect(node.right, self.compile(node.right), _NUMBER)
+        return _Node(
+            _NUMBER,
+            lambda mentor, mentee: function(
+                left.pair(mentor, mentee), right.pair(mentor, mentee)
+            ),
+            lambda mentors, mentees: function(
+                left.array(mentors, mentees), right.array(mentors, mentees)
+            ),
+            self.merge([left, right])[0],
+        )
+
+    def comparisons(self, node: ast.Compare) -> _Node:
+        # a chain like ``1 <= x < 3`` is each comparison in turn, and-ed together
+        operands = [self.compile(node.left)] + [
+            self.compile(comparator) for comparator in node.comparators
+        ]
+        comparisons = [
+            self.comparison(node, comparison, operands[i], operands[i + 1])
+            for i, comparison in enumerate(node.ops)
+        ]
+        if len(comparisons) == 1:
+            return comparisons[0]
+        pairs = [comparison.pair for comparison in comparisons]
+        arrays = [comparison.array for comparison in comparisons]
+        return _Node(
+            _BOOLEAN,
+            lambda mentor, mentee: all(value(mentor, mentee) for value in pairs),
+            lambda mentors, mentees: functools.reduce(
+                np.logical_and, [value(mentors, mentees) for value in arrays]
+            ),
+            *self.merge(comparisons),
+        )
+
+    def comparison(
+        self, node: ast.Compare, comparison: ast.cmpop, left: _Node, right: _Node
+    ) -> _Node:
+        if isinstance(comparison, (ast.In, ast.NotIn)):
+            if right.kind != _LIST:
+                raise self.error(node, f"Expected a list after 'in', not {right.kind}")
+            flags = self.membership(node, left, right.value)
+        elif left.kind == right.kind == _NUMBER:
+            function = _COMPARISONS[type(comparison)]
+            return _Node(
+                _BOOLEAN,
+                lambda mentor, mentee: function(
+                    left.pair(mentor, mentee), right.pair(mentor, mentee)
+                ),
+                lambda mentors, mentees: function(
+                    left.array(mentors, mentees), right.array(mentors, mentees)
+                ),
+                *self.merge([left, right]),
+            )
+        elif not isinstance(comparison, (ast.Eq, ast.NotEq)) or _CATEGORY not in (
+            left.kind,
+            right.kind,
+        ):
+            raise self.error(
+                node, f"Can't compare {left.kind} with {right.kind} that way"
+            )
+        elif left.kind == right.kind == _CATEGORY:
+            if left.attribute != right.attribute:
+                raise self.error(
+                    node, f"Can't compare {left.attribute} with {right.attribute}"
+                )
+            flags = _Node(
+                _BOOLEAN,
+                lambda mentor, mentee: left.pair(mentor, mentee)
+                == right.pair(mentor, mentee),
+                lambda mentors, mentees: left.array(mentors, mentees)
+                == right.array(mentors, mentees),
+                columns=(left.attribute,),  # type: ignore
+                requirements=((left.attribute, None),),  # type: ignore
+            )
+        else:
+            category, text = (left, right) if left.kind == _CATEGORY else (right, left)
+            if text.kind != _TEXT:
+                raise self.error(
+                    node, f"Can't compare {category.kind} with {text.kind}"
+                )
+            flags = self.membership(node, category, (text.value,))
+        if isinstance(comparison, (ast.NotEq, ast.NotIn)):
+            return flags._replace(
+                pair=lambda mentor, mentee: not flags.pair(mentor, mentee),
+                array=lambda mentors, mentees: np.logical_not(
+                    flags.array(mentors, mentees)
+                ),
+            )
+        return flags
+
+    def membership(self, node: ast.AST, left: _Node, values: Tuple) -> _Node:
+        if left.kind == _NUMBER:
+            return _Node(
+                _BOOLEAN,
+                lambda mentor, mentee: left.pair(mentor, mentee) in values,
+                lambda mentors, mentees: np.isin(left.array(mentors, mentees), values),
+                left.columns,
+            )
+        if left.kind != _CATEGORY:
+            raise self.error(node, f"Can't look for {left.kind} in a list")
+        attribute, wanted = left.attribute, frozenset(values)
+        assert attribute is not None and left.side is not None
+        return _Node(
+            _BOOLEAN,
+            lambda mentor, mentee: left.pair(mentor, mentee) in wanted,
+            _on_side(left.side, lambda columns: columns.flags(attribute, wanted)),
+            columns=(flag_column(attribute, wanted),),
+            requirements=((attribute, tuple(sorted(wanted, key=repr))),),
+        )
+
+    @staticmethod
+    def merge(nodes: List[_Node]) -> Tuple[Tuple[str, ...], Tuple[Requirement, ...]]:
+        """
+        The columns and requirements of all of these nodes, without repeats
+        """
+        columns = tuple(
+            dict.fromkeys(column for node in nodes for column in node.columns)
+        )
+        requirements = tuple(
+            dict.fromkeys(
+                requirement for node in nodes for requirement in node.requirements
+            )
+        )
+        return columns, requirements
+
+
+class Expression(Rule):
+    """
+    A rule whose condition is an expression, like ``"mentor.grade - mentee.grade > 2"``. See the module documentation
+    for what an expression can contain. A mistake in the expression raises a `ValueError` straight away, rather than
+    when the rule is first used
+    """
+
+    def __init__(self, source: str, score_dict: Union[Dict[bool, int], None] = None):
+        super(Expression, self).__init__(score_dict)
+        self.source = source
+        try:
+            tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError as error:
+            raise ValueError(
+                f"{source!r} isn't a valid expression: {error.msg}"
+            ) from None
+        compiled = _Compiler(source).compile(tree)
+        if compiled.kind != _BOOLEAN:
+            raise ValueError(f"{source!r} is {compiled.kind}, not a condition")
+        #: the expression, written out the same way however it was spaced
+        self.canonical = ast.unparse(tree)
+        #: the condition as a function of a mentor and a mentee
+        self.condition: PairFunction = compiled.pair
+        self._array = compiled.array
+        self._columns = compiled.columns
+        self._requirements = compiled.requirements
+        self.state_dependent = NUMERIC_ATTRIBUTES["connections"] in compiled.columns
+
+    def __getstate__(self):
+        # the compiled functions can't be pickled, so the expression is compiled again when it's unpickled
+        return {"source": self.source, "results": self.results}
+
+    def __setstate__(self, state):
+        self.__init__(state["source"], state["results"])
+
+    def __repr__(self) -> str:
+        return f"Expression({self.source!r})"
+
+    def evaluate(self, match_object: "Match") -> bool:
+        return bool(self.condition(match_object.mentor, match_object.mentee))
+
+    def fingerprint(self) -> Optional[Fingerprint]:
+        return Fingerprint(self._settings(self.canonical), self._columns)
+
+    def prepare(
+        self, mentors: "ParticipantColumns", mentees: "ParticipantColumns"
+    ) -> None:
+        for columns in (mentors, mentees):
+            for attribute, values in self._requirements:
+                if values is None:
+                    columns.codes(attribute)
+                else:
+                    columns.flags(attribute, values)
+
+    def evaluate_array(
+        self, mentors: "ParticipantColumns", mentees: "ParticipantColumns"
+    ) -> np.ndarray:
+        shape = (len(mentors), len(mentees))
+        outcome = np.asarray(self._array(mentors, mentees), dtype=bool)
+        if outcome.shape != shape:
+            outcome = np.broadcast_to(outcome, shape).copy()
+        return outcome
@@ -1,9 +1,32 @@
 import operator
 from abc import abstractmethod
-from typing import Callable, Dict, TYPE_CHECKING, Union, Protocol
+from typing import (
+    Callable,
+    Dict,
+    NamedTuple,
+    Optional,
+    TYPE_CHECKING,
+    Tuple,
+    Union,
+    Protocol,
+)
+
+import numpy as np
+
+from matching.columnar import evaluate_pairwise
 
 if TYPE_CHECKING:
     from matching.match import Match
+    from matching.columnar import ParticipantColumns, ScoreMatrix
+
+VECTORISABLE_OPERATORS = {
+    operator.gt,
+    operator.ge,
+    operator.lt,
+    operator.le,
+    operator.eq,
+    operator.ne,
+}
 
 
 class RuleProtocol(Protocol):
@@ -20,7 +43,33 @@ class RuleProtocol(Protocol):
         ...
 
 
+class Fingerprint(NamedTuple):
+    """
+    Everything that decides a rule's outcome for a pair: the rule's class and settings, and the participant columns it
+    reads. Two rules with the same settings, given the same values in those columns, score a cohort the same way
+    """
+
+    settings: Tuple
+    #: the names of the `ParticipantColumns` columns the rule reads, like "grade" or "profession"
+    columns: Tuple[str, ...]
+
+
+def _operator_name(logical_operator: Callable) -> Optional[str]:
+    """
+    The name of a function from the `operator` module, like "gt", or `None` for any other function
+    """
+    name = getattr(logical_operator, "__name__", None)
+    if name is not None and getattr(operator, name, None) is logical_operator:
+        return name
+    return None
+
+
 class Rule:
+    #: Whether the outcome of this rule can change as participants gain connections. Rules that can't are only
+    #: evaluated once when rescoring incrementally. Custom rules are assumed to be state-dependent unless they say
+    #: otherwise, and they should only depend on the state of the two participants being matched
+    state_dependent: bool = True
+
     def __init__(self, score_dict: Union[Dict[bool, int], None] = None):
         if score_dict is None:
             score_dict = {True: 0, False: 0}
@@ -33,21 +82,89 @@ class Rule:
     def evaluate(self, match_object: "Match"):
         raise NotImplementedError
 
+    @property
+    def vectorised(self) -> bool:
+        """
+        Whether this rule has a true vectorised implementation, rather than falling back to evaluating each pair in
+        turn. Only vectorised rules can score compact columns, which have no participants attached
+        """
+        return type(self).evaluate_array is not Rule.evaluate_array
+
+    def fingerprint(self) -> Optional[Fingerprint]:
+        """
+        Describes this rule well enough to cache its outcomes (see `matching.cache`), or returns `None` if it can't be
+        described, like a `Generic` rule built around a `lambda`. A subclass that changes how a rule is evaluated should
+        override this, or its outcomes could be mistaken for its parent's
+        """
+        return None
+
+    def _settings(self, *settings) -> Tuple:
+        return (
+            f"{type(self).__module__}.{type(self).__qualname__}",
+            *settings,
+            tuple(sorted(self.results.items())),
+        )
+
+    def prepare(
+        self, mentors: "ParticipantColumns", mentees: "ParticipantColumns"
+    ) -> None:
+        """
+        Encodes any columns this rule will need, so that it can still score the columns once they've been compacted
+        """
+        pass
+
+    def evaluate_array(
+        self, mentors: "ParticipantColumns", mentees: "ParticipantColumns"
+    ) -> np.ndarray:
+        """
+        Evaluates every mentor/mentee pair at once, returning a boolean array with a row per mentor and a column per
+        mentee. Subclasses should override this with a vectorised version; by default each pair is evaluated in turn
+        """
+        return evaluate_pairwise(self.evaluate, mentors, mentees)
+
+    def apply_array(
+        self,
+        mentors: "ParticipantColumns",
+        mentees: "ParticipantColumns",
+        score_matrix: "ScoreMatrix",
+    ) -> None:
+        """
+        The vectorised equivalent of `apply`: adds this rule's score for every pair to ``score_matrix``
+        """
+        self.apply_outcome(self.evaluate_array(mentors, mentees), score_matrix)
+
+    def apply_outcome(self, outcome: np.ndarray, score_matrix: "ScoreMatrix") -> None:
+        """
+        Adds the scores for an outcome from `evaluate_array` to ``score_matrix``
+        """
+        score_matrix.scores += np.where(
+            outcome,
+            self.results.get(True, False),
+            self.results.get(False, False),
+        ).astype(np.int64)
+
 
 class UnmatchedBonus(Rule):
     def __init__(self, unmatched_bonus: int):
         super(UnmatchedBonus, self).__init__({True: unmatched_bonus, False: 0})
 
     def evaluate(self, match_object: "Match") -> bool:
-        return any(
-            map(
-                lambda participant: len(participant.connections) == 0,
-                (match_object.mentee, match_object.mentor),
-            )
+        return not (match_object.mentee.connections and match_object.mentor.connections)
+
+    def fingerprint(self) -> Optional[Fingerprint]:
+        return Fingerprint(self._settings(), ("connection_count",))
+
+    def evaluate_array(
+        self, mentors: "ParticipantColumns", mentees: "ParticipantColumns"
+    ) -> np.ndarray:
+        return (mentors.connection_count[:, np.newaxis] == 0) | (
+            mentees.connection_count[np.newaxis, :] == 0
         )
 
 
 class Grade(Rule):
+    state_dependent = False
+
     def __init__(
         self,
         target_diff: int,
@@ -63,8 +180,30 @@ class Grade(Rule):
             (match_object.mentor.grade - match_object.mentee.grade), self.target_diff
         )
 
+    @property
+    def vectorised(self) -> bool:
+        return self.operator in VECTORISABLE_OPERATORS
+
+    def fingerprint(self) -> Optional[Fingerprint]:
+        operator_name = _operator_name(self.operator)
+        if operator_name is None:
+            return None
+        return Fingerprint(self._settings(self.target_diff, operator_name), ("grade",))
+
+    def evaluate_array(
+        self, mentors: "ParticipantColumns", mentees: "ParticipantColumns"
+    ) -> np.ndarray:
+        if self.operator not in VECTORISABLE_OPERATORS:
+            return super(Grade, self).evaluate_array(mentors, mentees)
+        return self.operator(
+            mentors.grade[:, np.newaxis] - mentees.grade[np.newaxis, :],
+            self.target_diff,
+        )
+
 
 class Equivalent(Rule):
+    state_dependent = False
+
     def __init__(self, attribute: str, score_dict: Union[Dict[bool, int], None] = None):
         super(Equivalent, self).__init__(score_dict)
         self.attribute = attribute
@@ -77,6 +216,23 @@ class Equivalent(Rule):
         )
         return operator.eq(*attrs)
 
+    def fingerprint(self) -> Optional[Fingerprint]:
+        return Fingerprint(self._settings(self.attribute), (self.attribute,))
+
+    def prepare(
+        self, mentors: "ParticipantColumns", mentees: "ParticipantColumns"
+    ) -> None:
+        mentors.codes(self.attribute)
+        mentees.codes(self.attribute)
+
+    def evaluate_array(
+        self, mentors: "ParticipantColumns", mentees: "ParticipantColumns"
+    ) -> np.ndarray:
+        return (
+            mentors.codes(self.attribute)[:, np.newaxis]
+            == mentees.codes(self.attribute)[np.newaxis, :]
+        )
+
 
 class Generic(Rule):
     def __init__(
@@ -86,10 +242,62 @@ class Generic(Rule):
     ):
         super(Generic, self).__init__(score_dict)
         self._evaluate = evaluation_func
+        wrapped_rule = self.wrapped_rule
+        self.state_dependent = (
+            True if wrapped_rule is None else wrapped_rule.state_dependent
+        )
 
     def evaluate(self, match_object: "Match") -> bool:
         return self._evaluate(match_object)
 
+    @property
+    def wrapped_rule(self) -> Optional[Rule]:
+        """
+        If this rule's function is another rule's `evaluate` method, as in ``Disqualify(Grade(...).evaluate)``,
+        returns that other rule
+        """
+        wrapped_rule = getattr(self._evaluate, "__self__", None)
+        if (
+            isinstance(wrapped_rule, Rule)
+            and getattr(self._evaluate, "__func__", None) is type(wrapped_rule).evaluate
+        ):
+            return wrapped_rule
+        return None
+
+    @property
+    def vectorised(self) -> bool:
+        wrapped_rule = self.wrapped_rule
+        return wrapped_rule is not None and wrapped_rule.vectorised
+
+    def fingerprint(self) -> Optional[Fingerprint]:
+        """
+        A `Generic` rule can only be fingerprinted if it wraps another rule that can be
+        """
+        wrapped_rule = self.wrapped_rule
+        wrapped = None if wrapped_rule is None else wrapped_rule.fingerprint()
+        if wrapped is None:
+            return None
+        return Fingerprint(self._settings(wrapped.settings), wrapped.columns)
+
+    def prepare(
+        self, mentors: "ParticipantColumns", mentees: "ParticipantColumns"
+    ) -> None:
+        wrapped_rule = self.wrapped_rule
+        if wrapped_rule is not None:
+            wrapped_rule.prepare(mentors, mentees)
+
+    def evaluate_array(
+        self, mentors: "ParticipantColumns", mentees: "ParticipantColumns"
+    ) -> np.ndarray:
+        """
+        A `Generic` rule wraps an arbitrary function, so in general it has to be evaluated pair by pair. The exception
+        is when it wraps another rule (see `wrapped_rule`); then the other rule's vectorised version is used instead
+        """
+        wrapped_rule = self.wrapped_rule
+        if wrapped_rule is not None:
+            return wrapped_rule.evaluate_array(mentors, mentees)
+        return super(Generic, self).evaluate_array(mentors, mentees)
+
 
 class Disqualify(Generic):
     """
@@ -103,3 +311,6 @@ class Disqualify(Generic):
     def apply(self, match_object: "Match") -> int:
         match_object.disallowed = self.evaluate(match_object)
         return 0
+
+    def apply_outcome(self, outcome: np.ndarray, score_matrix: "ScoreMatrix") -> None:
+        score_matrix.disallowed |= outcome
@@ -0,0 +1,243 @@
+"""
+Rules written down as data.
+
+Rules built in Python can hold any function, which is flexible but means they can only be set up in code. A rules
+file describes the same rules as data, in JSON, TOML or YAML, so that a matching exercise can be run from the command
+line, and so that every rule it builds can be sent to worker processes and cached. For example, in TOML::
+
+    rounds = 3
+
+    [[rules]]
+    type = "disqualify"
+    condition = "mentor.grade - mentee.grade > 2 or mentor.grade <= mentee.grade"
+
+    [[rules]]
+    type = "disqualify"
+    rule = { type = "equivalent", attribute = "organisation" }
+
+    [[rules]]
+    type = "grade"
+    difference = 1
+    operator = "=="
+    scores = { true = 12, false = 0 }
+
+    [[rules]]
+    type = "unmatched_bonus"
+    bonus = 6
+
+``rounds`` is either the number of rounds, each using the same ``rules``, or a list of rounds that each have their own
+``rules``. Each rule has a ``type``:
+
+- ``grade``: a `Grade` rule, with a ``difference``, an ``operator`` (one of ``>``, ``>=``, ``<``, ``<=``, ``==`` and
+  ``!=``) and ``scores``
+- ``equivalent``: an `Equivalent` rule, with an ``attribute`` and ``scores``
+- ``unmatched_bonus``: an `UnmatchedBonus` rule, with a ``bonus``
+- ``generic``: a `Generic` rule, with a ``condition`` written in the language described in `matching.rules.expression`,
+  and ``scores``
+- ``disqualify``: a `Disqualify` rule, with either a ``condition`` or another ``rule`` to disqualify on
+
+``scores`` gives the points for a pair when the rule is true and when it's false, like ``{"true": 4, "false": 0}``.
+Either can be left out, and scores nothing.
+
+Reading YAML needs PyYAML, and reading TOML before Python 3.11 needs tomli.
+"""
+import json
+import operator
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping
+
+import matching.rules.rule as rl
+from matching.rules.expression import Expression
+
+try:
+    import tomllib  # type: ignore
+except ImportError:  # pragma: no cover - tomllib is new in Python 3.11
+    try:
+        import tomli as tomllib  # type: ignore
+    except ImportError:
+        tomllib = None  # type: ignore
+
+try:
+    import yaml  # type: ignore
+except ImportError:  # pragma: no cover - PyYAML is optional
+    yaml = None
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+_OUTCOMES = {"true": True, "false": False}
+
+
+def _scores(spec: Mapping[str, Any]) -> Dict[bool, int]:
+    scores = spec.get("scores", {})
+    if not isinstance(scores, Mapping):
+        raise ValueError("scores must be a mapping of true and false to points")
+    outcomes = {}
+    for outcome, points in scores.items():
+        # JSON and TOML keys are always strings, but YAML reads true and false as booleans
+        key = _OUTCOMES.get(str(outcome).lower())
+        if key is None:
+            raise ValueError(
+                f"scores can only be given for true and false, not {outcome!r}"
+            )
+        if isinstance(points, bool) or not isinstance(points, int):
+            raise ValueError(
+                f"The score for {str(outcome).lower()} must be a whole number"
+            )
+        outcomes[key] = points
+    return {True: outcomes.get(True, 0), False: outcomes.get(False, 0)}
+
+
+def _field(spec: Mapping[str, Any], name: str, kind: type) -> Any:
+    if name not in spec:
+        raise ValueError(f"A {spec['type']} rule needs a {name}")
+    value = spec[name]
+    if isinstance(value, bool) or not isinstance(value, kind):
+        raise ValueError(
+            f"{name} must be {'a whole number' if kind is int else 'text'}, not {value!r}"
+        )
+    return value
+
+
+def _grade(spec: Mapping[str, Any]) -> rl.Rule:
+    symbol = _field(spec, "operator", str)
+    if symbol not in OPERATORS:
+        raise ValueError(
+            f"Unknown operator {symbol!r}: use one of {', '.join(OPERATORS)}"
+        )
+    return rl.Grade(_field(spec, "difference", int), OPERATORS[symbol], _scores(spec))
+
+
+def _equivalent(spec: Mapping[str, Any]) -> rl.Rule:
+    return rl.Equivalent(_field(spec, "attribute", str), _scores(spec))
+
+
+def _unmatched_bonus(spec: Mapping[str, Any]) -> rl.Rule:
+    return rl.UnmatchedBonus(_field(spec, "bonus", int))
+
+
+def _generic(spec: Mapping[str, Any]) -> rl.Rule:
+    return rl.Generic(
+        _scores(spec), Expression(_field(spec, "condition", str)).evaluate
+    )
+
+
+def _disqualify(spec: Mapping[str, Any]) -> rl.Rule:
+    if ("condition" in spec) == ("rule" in spec):
+        raise ValueError(
+            "A disqualify rule needs either a condition or a rule, but not both"
+        )
+    if "condition" in spec:
+        return rl.Disqualify(Expression(_field(spec, "condition", str)).evaluate)
+    if not isinstance(spec["rule"], Mapping):
+        raise ValueError(
+            "rule must be a rule, like {type: equivalent, attribute: organisation}"
+        )
+    return rl.Disqualify(rule_from_spec(spec["rule"]).evaluate)
+
+
+#: How to build each type of rule
+RULE_TYPES: Dict[str, Callable[[Mapping[str, Any]], rl.Rule]] = {
+    "grade": _grade,
+    "equivalent": _equivalent,
+    "unmatched_bonus": _unmatched_bonus,
+    "generic": _generic,
+    "disqualify": _disqualify,
+}
+_SETTINGS = {
+    "grade": {"difference", "operator", "scores"},
+    "equivalent": {"attribute", "scores"},
+    "unmatched_bonus": {"bonus"},
+    "generic": {"condition", "scores"},
+    "disqualify": {"condition", "rule"},
+}
+
+
+def rule_from_spec(spec: Mapping[str, Any]) -> rl.Rule:
+    """
+    Builds a single rule from its description, like ``{"type": "equivalent", "attribute": "profession"}``
+    """
+    if not isinstance(spec, Mapping):
+        raise ValueError(f"A rule must be a mapping, not {spec!r}")
+    rule_type = spec.get("type")
+    if rule_type not in RULE_TYPES:
+        raise ValueError(
+            f"Unknown rule type {rule_type!r}: use one of {', '.join(RULE_TYPES)}"
+        )
+    unknown = set(spec) - _SETTINGS[rule_type] - {"type"}
+    if unknown:
+        raise ValueError(f"A {rule_type} rule can't have {', '.join(sorted(unknown))}")
+    return RULE_TYPES[rule_type](spec)
+
+
+def _round(rule_specs: Any, round_number: int) -> List[rl.RuleProtocol]:
+    if not isinstance(rule_specs, list):
+        raise ValueError(f"Round {round_number}: rules must be a list")
+    rules: List[rl.RuleProtocol] = []
+    for rule_number, rule_spec in enumerate(rule_specs, start=1):
+        try:
+            rules.append(rule_from_spec(rule_spec))
+        except ValueError as error:
+            raise ValueError(
+                f"Round {round_number}, rule {rule_number}: {error}"
+            ) from None
+    return rules
+
+
+def rules_from_spec(spec: Mapping[str, Any]) -> List[List[rl.RuleProtocol]]:
+    """
+    Builds the rules for every round from a rules file's contents. When every round has the same rules, they're built
+    once, and every round shares the same list
+    """
+    if not isinstance(spec, Mapping):
+        raise ValueError("A rules file must hold a mapping, with rounds and rules")
+    rounds = spec.get("rounds", 1)
+    if isinstance(rounds, list):
+        if "rules" in spec:
+            raise ValueError(
+                "When each round has its own rules, there can't be rules outside the rounds"
+            )
+        return [
+            _round(
+                round_spec.get("rules") if isinstance(round_spec, Mapping) else None,
+                number,
+            )
+            for number, round_spec in enumerate(rounds, start=1)
+        ]
+    if isinstance(rounds, bool) or not isinstance(rounds, int) or rounds < 1:
+        raise ValueError("rounds must be a positive whole number or a list of rounds")
+    rules = _round(spec.get("rules"), 1)
+    return [rules] * rounds
+
+
+def load_rules(path: Path) -> List[List[rl.RuleProtocol]]:
+    """
+    Reads the rules for every round from a rules file. The format is chosen by the file's suffix: ``.json``, ``.toml``,
+    ``.yaml`` or ``.yml``
+    """
+    suffix = path.suffix.lower()
+    text = path.read_text()
+    if suffix == ".json":
+        spec = json.loads(text)
+    elif suffix == ".toml":
+        if tomllib is None:
+            raise ValueError(f"Reading {path} needs tomli installed")
+        spec = tomllib.loads(text)
+    elif suffix in (".yaml", ".yml"):
+        if yaml is None:
+            raise ValueError(f"Reading {path} needs PyYAML installed")
+        spec = yaml.safe_load(text)
+    else:
+        raise ValueError(
+            f"Rules files must be JSON, TOML or YAML, not {path.suffix or path.name}"
+        )
+    try:
+        return rules_from_spec(spec)
+    except ValueError as error:
+        raise ValueError(f"{path}: {error}") from None
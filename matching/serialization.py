@@ -0,0 +1,251 @@
+"""
+Whole cohorts as data, for sending to and from a service.
+
+`Person.to_dict` nests each participant's connections inside them, and `ParticipantFactory.create_from_dict` builds a
+new object for every one of those connections, so a cohort sent through them comes back with everyone copied once for
+every person they're connected to, and the copies aren't the same objects as the originals.
+
+Here a cohort is encoded as a flat table with a row per participant and a list of connections, each a pair of row
+numbers: person ``source`` is connected to person ``target``. Everyone is written once, however many connections they
+have, and decoding builds everyone first and then connects them, so each participant is one object, shared by everyone
+they're connected to. Connections are directed, as they are on a `Person`: matching connects both people, so there are
+usually two connections per match, in each person's own order.
+
+`cohort_to_dict` and `cohort_from_dict` use plain lists and dicts that `json` can read and write. `cohort_to_bytes` and
+`cohort_from_bytes` use a binary format that's smaller and quicker: a header, a table of every distinct piece of text,
+the participant table as fixed-size rows that point into the text table, and the connections as pairs of 32-bit
+integers.
+"""
+import contextlib
+import gc
+import struct
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
+
+import numpy as np
+
+from matching.mentee import Mentee
+from matching.mentor import Mentor
+from matching.person import Person
+
+#: Bump this if the encoding changes, so that old payloads are rejected rather than misread
+VERSION = 1
+
+#: The columns of the participant table, in order
+FIELDS = (
+    "type",
+    "email",
+    "first name",
+    "last name",
+    "role",
+    "organisation",
+    "grade",
+    "profession",
+    "capacity",
+)
+#: The columns that hold text, and so are stored as positions in the text table in the binary format
+_TEXT_FIELDS = tuple(field for field in FIELDS if field not in ("grade", "capacity"))
+_ROW = np.dtype([(field, "<i8" if field == "grade" else "<i4") for field in FIELDS])
+_MAGIC = b"MMCO"
+_HEADER = struct.Struct("<4sHIII")
+_NOTHING = -1
+
+PARTICIPANT_TYPES: Dict[str, Type[Person]] = {"mentor": Mentor, "mentee": Mentee}
+
+
+def _table(
+    participants: Iterable[Person],
+) -> Tuple[List[Person], List[Tuple[int, int]]]:
+    """
+    Numbers everyone in ``participants``, followed by anyone they're connected to who isn't, and lists the connections
+    between them by number. People are told apart by identity, not by email, so two copies of the same person stay two
+    rows
+    """
+    people = list(participants)
+    numbers = {id(person): number for number, person in enumerate(people)}
+    connections = []
+    number = 0
+    while number < len(people):
+        for connection in people[number].connections:
+            target = numbers.get(id(connection))
+            if target is None:
+                target = numbers[id(connection)] = len(people)
+                people.append(connection)
+            connections.append((number, target))
+        number += 1
+    return people, connections
+
+
+def _row(person: Person) -> Tuple[Any, ...]:
+    return (
+        person.class_name(),
+        person.email,
+        person.first_name,
+        person.last_name,
+        person.role,
+        person.organisation,
+        person.grade,
+        person.profession,
+        person.capacity,
+    )
+
+
+def _build(
+    rows: Iterable[Sequence[Any]],
+    connections: Iterable[Sequence[int]],
+    participant_types: Optional[Mapping[str, Type[Person]]],
+) -> List[Person]:
+    types = {**PARTICIPANT_TYPES, **(participant_types or {})}
+    with _collection_paused():
+        return _connect(
+            [
+                types.get(row[0], Person)(**dict(zip(FIELDS[1:], row[1:])))
+                for row in rows
+            ],
+            connections,
+        )
+
+
+@contextlib.contextmanager
+def _collection_paused() -> Iterator[None]:
+    """
+    Pauses the cyclic garbage collector. Building a cohort makes a great many objects and throws none away, and without
+    this the collector keeps stopping to look through all of them, which takes as long as building them
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _connect(
+    people: List[Person], connections: Iterable[Sequence[int]]
+) -> List[Person]:
+    count = len(people)
+    # each person's connections are added all at once, which only checks their capacity once
+    targets: List[List[Person]] = [[] for _ in people]
+    for source, target in connections:
+        if not (0 <= source < count and 0 <= target < count):
+            raise ValueError(
+                f"A connection refers to participant {source if target in range(count) else target}, "
+                f"but there are only {count}"
+            )
+        targets[source].append(people[target])
+    for person, connected in zip(people, targets):
+        if connected:
+            person.connections.extend(connected)
+    return people
+
+
+def cohort_to_dict(participants: Iterable[Person]) -> Dict[str, Any]:
+    """
+    Encodes everyone in ``participants``, and everyone they're connected to, as a dict that `json` can write. The
+    participants come first in the table, in the order given
+    """
+    people, connections = _table(participants)
+    return {
+        "version": VERSION,
+        "fields": list(FIELDS),
+        "participants": [list(_row(person)) for person in people],
+        "connections": [list(connection) for connection in connections],
+    }
+
+
+def cohort_from_dict(
+    data: Mapping[str, Any],
+    participant_types: Optional[Mapping[str, Type[Person]]] = None,
+) -> List[Person]:
+    """
+    Decodes a cohort encoded by `cohort_to_dict`, and returns everyone in the table, in order. Each row's type is
+    looked up in ``participant_types``, and then in `PARTICIPANT_TYPES`, and anything unknown becomes a `Person`
+    """
+    if data.get("version") != VERSION:
+        raise ValueError(f"Can't read version {data.get('version')!r} of a cohort")
+    if list(data.get("fields", ())) != list(FIELDS):
+        raise ValueError(f"A cohort's fields must be {', '.join(FIELDS)}")
+    return _build(data["participants"], data["connections"], participant_types)
+
+
+def cohort_to_bytes(participants: Iterable[Person]) -> bytes:
+    """
+    Encodes everyone in ``participants``, and everyone they're connected to, in the binary format
+    """
+    people, connections = _table(participants)
+    texts: Dict[str, int] = {}
+    rows = np.empty(len(people), dtype=_ROW)
+    table = [_row(person) for person in people]
+    for position, field in enumerate(FIELDS):
+        if field in _TEXT_FIELDS:
+            rows[field] = [
+                _NOTHING
+                if row[position] is None
+                else texts.setdefault(row[position], len(texts))
+                for row in table
+            ]
+        else:
+            rows[field] = [row[position] for row in table]
+    encoded = [text.encode() for text in texts]
+    return b"".join(
+        (
+            _HEADER.pack(_MAGIC, VERSION, len(people), len(connections), len(texts)),
+            np.array([len(text) for text in encoded], dtype="<u4").tobytes(),
+            b"".join(encoded),
+            rows.tobytes(),
+            np.array(connections, dtype="<i4").reshape(-1, 2).tobytes(),
+        )
+    )
+
+
+def cohort_from_bytes(
+    data: bytes, participant_types: Optional[Mapping[str, Type[Person]]] = None
+) -> List[Person]:
+    """
+    Decodes a cohort encoded by `cohort_to_bytes`. See `cohort_from_dict`
+    """
+    try:
+        magic, version, people, connection_count, text_count = _HEADER.unpack_from(data)
+    except struct.error:
+        raise ValueError("This isn't an encoded cohort: it's too short")
+    if magic != _MAGIC:
+        raise ValueError("This isn't an encoded cohort")
+    if version != VERSION:
+        raise ValueError(f"Can't read version {version} of a cohort")
+    offset = _HEADER.size
+    try:
+        lengths = np.frombuffer(data, dtype="<u4", count=text_count, offset=offset)
+        offset += lengths.nbytes
+        ends = (offset + np.cumsum(lengths, dtype=np.int64)).tolist()
+        if ends and ends[-1] > len(data):
+            raise ValueError
+        texts = [data[start:end].decode() for start, end in zip([offset, *ends], ends)]
+        offset = ends[-1] if ends else offset
+        rows = np.frombuffer(data, dtype=_ROW, count=people, offset=offset)
+        offset += rows.nbytes
+        connections = np.frombuffer(
+            data, dtype="<i4", count=2 * connection_count, offset=offset
+        ).reshape(-1, 2)
+    except ValueError:
+        raise ValueError("This encoded cohort has been cut short")
+    lookup = [*texts, None]
+    with _collection_paused():
+        columns = [
+            # a missing value is -1, which picks the `None` on the end of the lookup
+            [lookup[index] for index in rows[field].tolist()]
+            if field in _TEXT_FIELDS
+            else rows[field].tolist()
+            for field in FIELDS
+        ]
+        return _build(zip(*columns), connections.tolist(), participant_types)
@@ -0,0 +1,359 @@
+"""
+Backends for solving the assignment problem.
+
+Every solver takes a cost matrix, with a row per mentor and a column per mentee, and returns the `(row, column)`
+pairs of a complete assignment. The exact solvers, listed in `EXACT_SOLVERS`, return one that minimises the total
+cost; "greedy" and "auction" are approximate, and trade some of the quality of the assignment for speed. Solvers are
+looked up by name with `get_solver`, and `prepare_costs` turns a round's scores into costs for them.
+"""
+from typing import Callable, Dict, List, Optional, Protocol, Sequence, Tuple, Union
+
+import numpy as np
+from munkres import Munkres  # type: ignore
+
+try:
+    from scipy.optimize import linear_sum_assignment  # type: ignore
+except ImportError:  # pragma: no cover - scipy is optional
+    linear_sum_assignment = None
+
+CostMatrix = Union[Sequence[Sequence[int]], np.ndarray]
+Assignment = List[Tuple[int, int]]
+
+
+class SolverProtocol(Protocol):
+    def solve(self, cost_matrix: CostMatrix) -> Assignment:
+        """
+        Returns the `(row, column)` pairs that minimise the total cost of ``cost_matrix``
+        """
+        ...
+
+
+#: A solver's name, or a solver
+SolverSpec = Union[str, SolverProtocol]
+
+
+def solver_name(solver: SolverSpec) -> str:
+    return solver if isinstance(solver, str) else type(solver).__name__
+
+
+def cost_dtype(span: int, pairs: int) -> type:
+    """
+    The smallest integer type that's safe for costs from 0 to ``span``: one that can hold the total cost of an
+    assignment of ``pairs`` pairs, so that a solver adding costs up never overflows
+    """
+    return np.int32 if span * max(pairs, 1) <= np.iinfo(np.int32).max else np.int64
+
+
+def prepare_costs(
+    scores: np.ndarray, disallowed: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Turns a matrix of scores into the costs a solver minimises: the highest score less each score, so the best pair
+    costs nothing. The costs are a contiguous array of the smallest type `cost_dtype` allows, which is usually int32,
+    rather than the `sys.maxsize` less each score that `munkres.make_cost_matrix` makes. Those are Python integers of
+    over 30 bytes each, and every sum and comparison a solver makes with them is done in arbitrary precision.
+
+    A ``disallowed`` pair costs as much as a pair that scores 0, whatever its score, just as a disqualified `Match`
+    scores 0. The caller keeps the mask, and throws away any disallowed pairs a solver assigns.
+    """
+    scores = np.asarray(scores, dtype=np.int64)
+    if disallowed is not None:
+        scores = np.where(disallowed, 0, scores)
+    if scores.size == 0:
+        return np.zeros(scores.shape, dtype=np.int32)
+    costs = scores.max() - scores
+    return np.ascontiguousarray(
+        costs, dtype=cost_dtype(int(costs.max()), min(costs.shape))
+    )
+
+
+def as_cost_array(cost_matrix: CostMatrix) -> np.ndarray:
+    """
+    Converts a cost matrix into an array. Costs in a list may be close to `sys.maxsize`, so they're shifted down by the
+    smallest cost first; this doesn't change which assignment is cheapest, because every complete assignment uses the
+    same number of cells. Whole-number costs stay as they are, so an int32 array from `prepare_costs` is solved without
+    being copied, as long as the solvers can add two costs up for every pair without overflowing. Anything else is
+    converted to floats.
+    """
+    if isinstance(cost_matrix, np.ndarray):
+        costs = cost_matrix
+    else:
+        rows = [list(row) for row in cost_matrix]
+        if not rows or not rows[0]:
+            return np.zeros((len(rows), 0))
+        smallest = min(min(row) for row in rows)
+        costs = np.array([[cost - smallest for cost in row] for row in rows])
+    if costs.size and np.issubdtype(costs.dtype, np.signedinteger):
+        # the greedy solver compares the sums of two costs, so there must be room for twice the usual total
+        span = int(costs.max()) - min(int(costs.min()), 0)
+        if span * 2 * max(min(costs.shape), 1) <= np.iinfo(costs.dtype).max:
+            return costs
+    return costs.astype(np.float64)
+
+
+class MunkresSolver:
+    """
+    The original pure-Python implementation of the Hungarian algorithm. Rectangular matrices are padded to square.
+    """
+
+    def solve(self, cost_matrix: CostMatrix) -> Assignment:
+        if isinstance(cost_matrix, np.ndarray):
+            cost_matrix = cost_matrix.tolist()
+        if not len(cost_matrix) or not len(cost_matrix[0]):
+            return []
+        return Munkres().compute(cost_matrix)
+
+
+class JonkerVolgenantSolver:
+    """
+    A shortest augmenting path solver in the style of Jonker and Volgenant, working on NumPy arrays. Each row is
+    assigned in turn by finding the cheapest augmenting path with a Dijkstra-style search, and the search over
+    columns is vectorised. Rectangular matrices are solved as they are, without padding: if there are more rows than
+    columns, the transposed problem is solved instead.
+
+    After solving, ``iterations`` holds the number of steps the searches took in total.
+    """
+
+    def __init__(self):
+        self.iterations = 0
+
+    def solve(self, cost_matrix: CostMatrix) -> Assignment:
+        costs = as_cost_array(cost_matrix)
+        if costs.size == 0:
+            return []
+        if costs.shape[0] > costs.shape[1]:
+            return sorted((row, column) for column, row in self._solve(costs.T.copy()))
+        return self._solve(costs)
+
+    def _solve(self, costs: np.ndarray) -> Assignment:
+        row_count, column_count = costs.shape
+        row_duals = np.zeros(row_count)
+        column_duals = np.zeros(column_count)
+        column_for_row = np.full(row_count, -1, dtype=np.int64)
+        row_for_column = np.full(column_count, -1, dtype=np.int64)
+
+        for current_row in range(row_count):
+            shortest = np.full(column_count, np.inf)
+            path = np.full(column_count, -1, dtype=np.int64)
+            visited_rows = np.zeros(row_count, dtype=bool)
+            visited_columns = np.zeros(column_count, dtype=bool)
+            lowest = 0.0
+            row = current_row
+            sink = -1
+            while sink == -1:
+                self.iterations += 1
+                visited_rows[row] = True
+                reduced = lowest + costs[row] - row_duals[row] - column_duals
+                improved = ~visited_columns & (reduced < shortest)
+                path[improved] = row
+                shortest[improved] = reduced[improved]
+
+                unvisited = np.flatnonzero(~visited_columns)
+                lowest = shortest[unvisited].min()
+                if np.isinf(lowest):
+                    raise ValueError("cost matrix is infeasible")
+                candidates = unvisited[shortest[unvisited] == lowest]
+                unassigned = candidates[row_for_column[candidates] == -1]
+                column = unassigned[0] if len(unassigned) else candidates[0]
+
+                visited_columns[column] = True
+                if row_for_column[column] == -1:
+                    sink = column
+                else:
+                    row = row_for_column[column]
+
+            row_duals[current_row] += lowest
+            others = visited_rows.copy()
+            others[current_row] = False
+            row_duals[others] += lowest - shortest[column_for_row[others]]
+            column_duals[visited_columns] -= lowest - shortest[visited_columns]
+
+            column = sink
+            while True:
+                row = path[column]
+                row_for_column[column] = row
+                column_for_row[row], column = column, column_for_row[row]
+                if row == current_row:
+                    break
+
+        return [(row, int(column)) for row, column in enumerate(column_for_row)]
+
+
+class GreedySolver:
+    """
+    An approximate solver. Every unassigned row proposes to its cheapest unassigned column, and each column accepts the
+    cheapest of its proposals, until every row (or column, if there are fewer) is assigned. Then, for up to
+    ``improvement_passes`` passes, each row in turn makes whichever single change cuts the total cost the most: swapping
+    columns with another row, or moving to an unassigned column. More passes get closer to the optimum and take longer;
+    with none, the solver is purely greedy.
+
+    After solving, ``iterations`` holds the number of proposal rounds plus the number of improvements made.
+    """
+
+    def __init__(self, improvement_passes: int = 2):
+        self.improvement_passes = improvement_passes
+        self.iterations = 0
+
+    def solve(self, cost_matrix: CostMatrix) -> Assignment:
+        costs = as_cost_array(cost_matrix)
+        if costs.size == 0:
+            return []
+        if costs.shape[0] > costs.shape[1]:
+            return sorted((row, column) for column, row in self._solve(costs.T.copy()))
+        return self._solve(costs)
+
+    def _solve(self, costs: np.ndarray) -> Assignment:
+        row_count, column_count = costs.shape
+        column_for_row = np.full(row_count, -1, dtype=np.int64)
+        taken = np.zeros(column_count, dtype=bool)
+        free_rows = np.arange(row_count)
+        while len(free_rows):
+            self.iterations += 1
+            offers = np.where(taken, np.inf, costs[free_rows])
+            wanted = offers.argmin(axis=1)
+            offered = offers[np.arange(len(free_rows)), wanted]
+            # the cheapest proposal for each column wins; ties go to the lowest row
+            order = np.lexsort((free_rows, offered, wanted))
+            first = np.r_[True, wanted[order][1:] != wanted[order][:-1]]
+            winners = order[first]
+            column_for_row[free_rows[winners]] = wanted[winners]
+            taken[wanted[winners]] = True
+            free_rows = np.delete(free_rows, winners)
+
+        for _ in range(self.improvement_passes):
+            improved = False
+            for row in range(row_count):
+                column = column_for_row[row]
+                current = costs[np.arange(row_count), column_for_row]
+                swap_gains = (
+                    current[row]
+                    + current
+                    - costs[row, column_for_row]
+                    - costs[:, column]
+                )
+                other = int(swap_gains.argmax())
+                move_gains = np.where(taken, -np.inf, current[row] - costs[row])
+                free_column = int(move_gains.argmax())
+                if move_gains[free_column] > max(swap_gains[other], 0):
+                    taken[column], taken[free_column] = False, True
+                    column_for_row[row] = free_column
+                elif swap_gains[other] > 0:
+                    column_for_row[row], column_for_row[other] = (
+                        column_for_row[other],
+                        column,
+                    )
+                else:
+                    continue
+                improved = True
+                self.iterations += 1
+            if not improved:
+                break
+        return [(row, int(column)) for row, column in enumerate(column_for_row)]
+
+
+class AuctionSolver:
+    """
+    An approximate solver using Bertsekas' forward auction. Unassigned rows bid for their best column at its current
+    price, raising the price by how much better it is than their second choice plus ``epsilon``; the highest bid for each
+    column wins it, and whoever held it before goes back to bidding. All unassigned rows bid at once, so each round is a
+    handful of array operations.
+
+    The total cost is at most ``epsilon`` times the number of rows (or columns, if there are fewer) more than the
+    optimum. With whole-number costs, an ``epsilon`` below one over that number finds the optimum; larger values trade
+    accuracy for speed, because prices rise faster and fewer rounds of bidding are needed.
+
+    After solving, ``iterations`` holds the number of rounds of bidding.
+    """
+
+    def __init__(self, epsilon: float = 1.0):
+        if epsilon <= 0:
+            raise ValueError("epsilon must be positive")
+        self.epsilon = epsilon
+        self.iterations = 0
+
+    def solve(self, cost_matrix: CostMatrix) -> Assignment:
+        costs = as_cost_array(cost_matrix)
+        if costs.size == 0:
+            return []
+        if costs.shape[0] > costs.shape[1]:
+            return sorted((row, column) for column, row in self._solve(costs.T.copy()))
+        return self._solve(costs)
+
+    def _solve(self, costs: np.ndarray) -> Assignment:
+        row_count, column_count = costs.shape
+        benefits = costs.max() - costs
+        prices = np.zeros(column_count)
+        column_for_row = np.full(row_count, -1, dtype=np.int64)
+        row_for_column = np.full(column_count, -1, dtype=np.int64)
+        free_rows = np.arange(row_count)
+        while len(free_rows):
+            self.iterations += 1
+            values = benefits[free_rows] - prices
+            if column_count == 1:
+                wanted = np.zeros(len(free_rows), dtype=np.int64)
+                increments = np.full(len(free_rows), self.epsilon)
+            else:
+                top_two = np.argpartition(-values, 1, axis=1)[:, :2]
+                top_values = np.take_along_axis(values, top_two, axis=1)
+                best = top_values.argmax(axis=1)
+                positions = np.arange(len(free_rows))
+                wanted = top_two[positions, best]
+                increments = (
+                    top_values[positions, best]
+                    - top_values[positions, 1 - best]
+                    + self.epsilon
+                )
+            bids = prices[wanted] + increments
+            # the highest bid for each column wins it
+            order = np.lexsort((-bids, wanted))
+            first = np.r_[True, wanted[order][1:] != wanted[order][:-1]]
+            winners = order[first]
+            won = wanted[winners]
+            outbid = row_for_column[won]
+            outbid = outbid[outbid != -1]
+            column_for_row[outbid] = -1
+            prices[won] = bids[winners]
+            row_for_column[won] = free_rows[winners]
+            column_for_row[free_rows[winners]] = won
+            free_rows = np.concatenate([np.delete(free_rows, winners), outbid])
+        return [(row, int(column)) for row, column in enumerate(column_for_row)]
+
+
+class ScipySolver:
+    """
+    Uses SciPy's compiled implementation of the same algorithm, if SciPy is installed
+    """
+
+    def solve(self, cost_matrix: CostMatrix) -> Assignment:
+        costs = as_cost_array(cost_matrix)
+        if costs.size == 0:
+            return []
+        rows, columns = linear_sum_assignment(costs)
+        return list(zip(rows.tolist(), columns.tolist()))
+
+
+SOLVERS: Dict[str, Callable[[], SolverProtocol]] = {
+    "munkres": MunkresSolver,
+    "jonker-volgenant": JonkerVolgenantSolver,
+    "greedy": GreedySolver,
+    "auction": AuctionSolver,
+}
+#: The solvers that always find the cheapest assignment
+EXACT_SOLVERS = {"munkres", "jonker-volgenant", "scipy"}
+if linear_sum_assignment is not None:
+    SOLVERS["scipy"] = ScipySolver
+
+
+def get_solver(name: SolverSpec) -> SolverProtocol:
+    """
+    Returns a new solver with the given name. A solver that's already been made, perhaps with non-default settings like
+    ``AuctionSolver(epsilon=5)``, is returned as it is
+    """
+    if not isinstance(name, str):
+        return name
+    try:
+        return SOLVERS[name]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown solver: {name}. Available solvers are {', '.join(SOLVERS)}"
+        )
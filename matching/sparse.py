@@ -0,0 +1,161 @@
+"""
+Sparse matching for large cohorts.
+
+The dense path keeps a score for every mentor/mentee pair, even though in a big cross-department cohort most pairs are
+disallowed or score nothing. Here only the pairs worth making are kept, as an edge list in compressed sparse row
+(CSR) form, so memory grows with the number of candidate pairs rather than with mentors x mentees.
+"""
+import heapq
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from matching.columnar import CohortColumns, score_block
+from matching.observer import Observer
+from matching.rules.rule import RuleProtocol
+from matching.solvers import Assignment
+
+
+class CandidateGraph:
+    """
+    The candidate pairs for one round. The mentees a mentor could be matched with are
+    ``indices[indptr[mentor]:indptr[mentor + 1]]``, with the matching scores at the same positions in ``scores``.
+    """
+
+    def __init__(
+        self,
+        shape: Tuple[int, int],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        scores: np.ndarray,
+    ):
+        self.shape = shape
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.indices)
+
+    def row(self, mentor: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.indptr[mentor], self.indptr[mentor + 1]
+        return self.indices[start:end], self.scores[start:end]
+
+    @classmethod
+    def from_cohort(
+        cls,
+        cohort: CohortColumns,
+        rules: Sequence[RuleProtocol],
+        block_size: int = 256,
+        observer: Optional[Observer] = None,
+    ) -> "CandidateGraph":
+        """
+        Scores the cohort a block of mentors at a time, keeping only the pairs that are allowed and have a nonzero
+        score. At most ``block_size`` rows of the dense grid exist at any one time.
+        """
+        mentor_count, mentee_count = len(cohort.mentors), len(cohort.mentees)
+        row_lengths: List[np.ndarray] = []
+        indices: List[np.ndarray] = []
+        scores: List[np.ndarray] = []
+        for start in range(0, mentor_count, block_size):
+            block = cohort.mentors.take(
+                range(start, min(start + block_size, mentor_count))
+            )
+            score_matrix = score_block(cohort, block, cohort.mentees, rules, observer)
+            keep = ~score_matrix.disallowed & (score_matrix.scores != 0)
+            rows, columns = np.nonzero(keep)
+            row_lengths.append(np.bincount(rows, minlength=len(block)))
+            indices.append(columns)
+            scores.append(score_matrix.scores[rows, columns])
+        indptr = np.zeros(mentor_count + 1, dtype=np.int64)
+        if row_lengths:
+            np.cumsum(np.concatenate(row_lengths), out=indptr[1:])
+        return cls(
+            (mentor_count, mentee_count),
+            indptr,
+            np.concatenate(indices) if indices else np.empty(0, dtype=np.int64),
+            np.concatenate(scores) if scores else np.empty(0, dtype=np.int64),
+        )
+
+
+class SparseAssignmentSolver:
+    """
+    Finds the candidate pairs with the highest total score, where every mentor and mentee is in at most one pair.
+
+    Each mentor is given a private "unmatched" option that scores zero, which turns the problem into a min-cost
+    assignment over the candidate edges only. Mentors are then added one at a time along the cheapest augmenting path,
+    found with Dijkstra's algorithm over reduced costs. Unlike the dense solvers, pairs that score nothing are never
+    made.
+
+    After solving, ``iterations`` holds the number of columns the searches finalised in total.
+    """
+
+    def __init__(self):
+        self.iterations = 0
+
+    def solve(self, graph: CandidateGraph) -> Assignment:
+        mentor_count, mentee_count = graph.shape
+        if graph.edge_count == 0:
+            return []
+        unmatched_cost = float(max(graph.scores.max(), 0))
+        # columns 0..mentee_count-1 are mentees; column mentee_count + i is mentor i's "unmatched" option
+        column_duals = np.zeros(mentee_count + mentor_count)
+        row_duals = np.zeros(mentor_count)
+        column_for_row = np.full(mentor_count, -1, dtype=np.int64)
+        row_for_column = np.full(mentee_count + mentor_count, -1, dtype=np.int64)
+
+        for current_row in range(mentor_count):
+            shortest: Dict[int, float] = {}
+            path: Dict[int, int] = {}
+            finalised: Dict[int, float] = {}
+            visited_rows = [current_row]
+            heap: List[Tuple[float, int]] = []
+
+            def relax(row: int, distance: float):
+                columns, scores = graph.row(row)
+                for column, cost in zip(
+                    columns.tolist() + [mentee_count + row],
+                    (unmatched_cost - scores).tolist() + [unmatched_cost],
+                ):
+                    if column in finalised:
+                        continue
+                    reduced = distance + cost - row_duals[row] - column_duals[column]
+                    if reduced < shortest.get(column, np.inf):
+                        shortest[column] = reduced
+                        path[column] = row
+                        heapq.heappush(heap, (reduced, column))
+
+            relax(current_row, 0.0)
+            while True:
+                lowest, column = heapq.heappop(heap)
+                if column in finalised or lowest > shortest[column]:
+                    continue
+                finalised[column] = lowest
+                self.iterations += 1
+                if row_for_column[column] == -1:
+                    sink = column
+                    break
+                row = row_for_column[column]
+                visited_rows.append(row)
+                relax(row, lowest)
+
+            row_duals[current_row] += lowest
+            for row in visited_rows[1:]:
+                row_duals[row] += lowest - finalised[column_for_row[row]]
+            for column, distance in finalised.items():
+                column_duals[column] -= lowest - distance
+
+            column = sink
+            while True:
+                row = path[column]
+                row_for_column[column] = row
+                column_for_row[row], column = column, column_for_row[row]
+                if row == current_row:
+                    break
+
+        return [
+            (row, int(column))
+            for row, column in enumerate(column_for_row)
+            if column < mentee_count
+        ]
@@ -0,0 +1,301 @@
+"""
+Trying out different rule scores on the same cohort.
+
+A pair's score is the sum of what each rule gives it, and each rule gives one of two scores, depending on whether it's
+true or false for the pair. So to see what happens when the scores change, there's no need to evaluate the rules again:
+`sweep` evaluates each rule once, keeping whether it was true or false for every pair, and then works out every
+scenario's scores from those outcomes. Each scenario is then matched on its own, across worker processes if asked, and
+compared by its total score, how many pairs it made, and how many of those pairs share an organisation.
+
+Rules that depend on how many connections people have, like `UnmatchedBonus`, give different outcomes once people
+start to be matched, which happens differently in each scenario. With more than one round, those rules, including
+ones that disqualify pairs, are evaluated again for each scenario's later rounds, and so they must be vectorised. Every
+other rule is only evaluated once, however many rounds and scenarios there are.
+
+Nobody is actually matched: the participants are left as they were, and each scenario's pairs are returned as indices
+into the mentor and mentee lists.
+"""
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    Dict,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+import numpy as np
+
+from matching.columnar import CohortColumns, ScoreMatrix
+from matching.parallel import can_score_in_worker
+from matching.person import Person
+from matching.process import calculate_matches
+from matching.rules.rule import Disqualify, Rule, RuleProtocol
+from matching.solvers import SolverSpec, prepare_costs
+
+
+class Scenario(NamedTuple):
+    name: str
+    #: The scores to use for some of the rules, by their position in the list, like ``{2: {True: 8, False: 0}}``. The
+    #: other rules keep their own scores
+    scores: Mapping[int, Mapping[bool, int]] = {}
+
+
+class ScenarioResult(NamedTuple):
+    name: str
+    #: The scores of every pair made, over every round, by the scenario's own scores
+    total_score: int
+    #: How many pairs were made
+    matched: int
+    mentors_matched: int
+    mentees_matched: int
+    #: How many of the pairs were between people in the same organisation
+    same_organisation: int
+    #: How many pairs were made with mentees from each organisation
+    organisations: Dict[str, int]
+    #: Each round's pairs, as ``(mentor, mentee)`` positions in the lists that were swept
+    pairs: List[List[Tuple[int, int]]]
+
+
+class _Features:
+    """
+    Everything a scenario needs to be matched: the outcome of every rule that's only evaluated once, and the columns
+    and rules needed to evaluate the rest each round
+    """
+
+    def __init__(
+        self,
+        cohort: CohortColumns,
+        outcomes: np.ndarray,
+        disallowed: np.ndarray,
+        first_disallowed: np.ndarray,
+        later_rules: Sequence[Tuple[int, Rule]],
+        later_disqualifiers: Sequence[Rule],
+        rounds: int,
+        solver: SolverSpec,
+    ):
+        #: one boolean matrix per scoring rule, in the order of the rules
+        self.outcomes = outcomes
+        #: the pairs ruled out whatever happens, and those ruled out in the first round
+        self.disallowed = disallowed
+        self.first_disallowed = first_disallowed
+        #: the scoring rules, by their row in ``outcomes``, and the disqualifying rules, that depend on connections
+        self.later_rules = later_rules
+        self.later_disqualifiers = later_disqualifiers
+        self.mentors = cohort.mentors.compact()
+        self.mentees = cohort.mentees.compact()
+        self.rounds = rounds
+        self.solver = solver
+
+    def run(
+        self, weights: np.ndarray, offset: int
+    ) -> Tuple[int, List[List[Tuple[int, int]]]]:
+        """
+        Matches one scenario, with the points each scoring rule adds to a pair when it's true, over what it gives when
+        it's false, and the sum of what every rule gives when it's false
+        """
+        shape = self.disallowed.shape
+        base = np.full(shape, offset, dtype=np.int64)
+        for outcome, weight in zip(self.outcomes, weights):
+            if weight:
+                base += outcome * weight
+        mentor_connections = self.mentors.connection_count.copy()
+        mentee_connections = self.mentees.connection_count.copy()
+        taken = np.zeros(shape, dtype=bool)
+        total = 0
+        rounds = []
+        for round_number in range(self.rounds):
+            scores = base
+            disallowed = (
+                self.disallowed if round_number else self.first_disallowed
+            ) | taken
+            if round_number and (self.later_rules or self.later_disqualifiers):
+                scores = base.copy()
+                mentors = self.mentors.with_connection_count(mentor_connections)
+                mentees = self.mentees.with_connection_count(mentee_connections)
+                for position, rule in self.later_rules:
+                    # the first round's outcome, counted in ``base``, is swapped for this round's
+                    change = rule.evaluate_array(mentors, mentees).astype(
+                        np.int64
+                    ) - self.outcomes[position].astype(np.int64)
+                    scores += change * weights[position]
+                for rule in self.later_disqualifiers:
+                    disallowed = disallowed | rule.evaluate_array(mentors, mentees)
+            assignment = _solve(ScoreMatrix(scores, disallowed), self.solver)
+            for mentor, mentee in assignment:
+                mentor_connections[mentor] += 1
+                mentee_connections[mentee] += 1
+                taken[mentor, mentee] = True
+                total += int(scores[mentor, mentee])
+            rounds.append(assignment)
+        return total, rounds
+
+
+def _solve(score_matrix: ScoreMatrix, solver: SolverSpec) -> List[Tuple[int, int]]:
+    # as `assign_from_score_matrix`, without connecting anybody
+    if not score_matrix.scores.size:
+        return []
+    solution = calculate_matches(
+        prepare_costs(score_matrix.scores, score_matrix.disallowed), solver
+    )
+    return [
+        (int(row), int(column))
+        for row, column in solution
+        if not score_matrix.disallowed[row, column]
+    ]
+
+
+_worker_features: Optional[_Features] = None
+
+
+def _start_worker(features: _Features) -> None:
+    # each worker is sent the outcomes once, rather than once for every scenario
+    global _worker_features
+    _worker_features = features
+
+
+def _run_in_worker(
+    weights: np.ndarray, offset: int
+) -> Tuple[int, List[List[Tuple[int, int]]]]:
+    assert _worker_features is not None
+    return _worker_features.run(weights, offset)
+
+
+def _weights(
+    rules: Sequence[Rule], scenario: Scenario, disqualifiers: Set[int]
+) -> Tuple[np.ndarray, int]:
+    unknown = set(scenario.scores) - set(range(len(rules)))
+    if unknown:
+        raise ValueError(
+            f"Scenario {scenario.name!r} gives scores for rule {min(unknown)}, but there are only {len(rules)} rules"
+        )
+    if disqualifiers & set(scenario.scores):
+        raise ValueError(
+            f"Scenario {scenario.name!r} gives scores for rule {min(disqualifiers & set(scenario.scores))}, which "
+            f"disqualifies pairs rather than scoring them"
+        )
+    weights = []
+    offset = 0
+    for position, rule in enumerate(rules):
+        if position in disqualifiers:
+            continue
+        scores = scenario.scores.get(position, rule.results)
+        weights.append(scores.get(True, 0) - scores.get(False, 0))
+        offset += scores.get(False, 0)
+    return np.array(weights, dtype=np.int64), offset
+
+
+def _result(
+    scenario: Scenario,
+    total: int,
+    rounds: List[List[Tuple[int, int]]],
+    mentors: Sequence[Person],
+    mentees: Sequence[Person],
+) -> ScenarioResult:
+    pairs = [pair for assignment in rounds for pair in assignment]
+    return ScenarioResult(
+        scenario.name,
+        total,
+        len(pairs),
+        len({mentor for mentor, _ in pairs}),
+        len({mentee for _, mentee in pairs}),
+        sum(
+            mentors[mentor].organisation == mentees[mentee].organisation
+            for mentor, mentee in pairs
+        ),
+        dict(Counter(mentees[mentee].organisation for _, mentee in pairs)),
+        rounds,
+    )
+
+
+def sweep(
+    mentors: Sequence[Person],
+    mentees: Sequence[Person],
+    rules: Sequence[RuleProtocol],
+    scenarios: Sequence[Scenario],
+    rounds: int = 1,
+    solver: SolverSpec = "munkres",
+    workers: int = 1,
+) -> List[ScenarioResult]:
+    """
+    Matches the cohort once for each scenario, over ``rounds`` rounds of ``rules``, and reports on each, in order. The
+    pairs each scenario makes are the ones `process_data` would make with vectorised scoring and the scenario's scores,
+    but the rules are only evaluated once for all of them. With ``workers``, the scenarios are matched in that many
+    processes at once, unless a rule that's evaluated again in later rounds can't be sent to another process.
+    :param rules: the rules for every round. They must be `Rule` objects, so that their scores can be changed
+    """
+    if rounds < 1:
+        raise ValueError("A sweep needs at least one round")
+    for position, rule in enumerate(rules):
+        if not isinstance(rule, Rule):
+            raise ValueError(
+                f"Rule {position} isn't a Rule, so its scores can't be changed"
+            )
+    swept_rules: List[Rule] = list(rules)  # type: ignore
+    disqualifiers = {
+        position
+        for position, rule in enumerate(swept_rules)
+        if isinstance(rule, Disqualify)
+    }
+    # a scenario's mistakes are found before anything is evaluated
+    weights = [_weights(swept_rules, scenario, disqualifiers) for scenario in scenarios]
+    cohort = CohortColumns(mentors, mentees)
+    disallowed = cohort.builtin_disallowed(cohort.mentors, cohort.mentees)
+    outcomes: List[np.ndarray] = []
+    later_rules: List[Tuple[int, Rule]] = []
+    later_disqualifiers: List[Rule] = []
+    first_disallowed = np.zeros_like(disallowed)
+    for position, rule in enumerate(swept_rules):
+        again = rounds > 1 and rule.state_dependent
+        if again and not rule.vectorised:
+            raise ValueError(
+                f"Rule {position} depends on who's been matched, so it must be vectorised to be swept over more "
+                f"than one round"
+            )
+        if again:
+            rule.prepare(cohort.mentors, cohort.mentees)
+        outcome = rule.evaluate_array(cohort.mentors, cohort.mentees)
+        if position in disqualifiers:
+            if again:
+                # only ruled out in the first round: in later rounds it's evaluated again
+                first_disallowed |= outcome
+                later_disqualifiers.append(rule)
+            else:
+                disallowed |= outcome
+        else:
+            if again:
+                later_rules.append((len(outcomes), rule))
+            outcomes.append(np.asarray(outcome, dtype=bool))
+    features = _Features(
+        cohort,
+        np.array(outcomes, dtype=bool).reshape(-1, len(mentors), len(mentees)),
+        disallowed,
+        disallowed | first_disallowed,
+        later_rules,
+        later_disqualifiers,
+        rounds,
+        solver,
+    )
+    parallel = (
+        workers > 1
+        and len(scenarios) > 1
+        and all(can_score_in_worker(rule) for _, rule in later_rules)
+        and all(can_score_in_worker(rule) for rule in later_disqualifiers)
+    )
+    if parallel:
+        with ProcessPoolExecutor(
+            min(workers, len(scenarios)),
+            initializer=_start_worker,
+            initargs=(features,),
+        ) as pool:
+            runs = list(pool.map(_run_in_worker, *zip(*weights)))  # type: ignore
+    else:
+        runs = [features.run(*scenario_weights) for scenario_weights in weights]
+    return [
+        _result(scenario, total, assignment, mentors, mentees)
+        for scenario, (total, assignment) in zip(scenarios, runs)
+    ]
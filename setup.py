@@ -25,6 +25,7 @@ setup(
     ],
     packages=["matching", "matching/rules"],
     include_package_data=True,
-    install_requires=["munkres"],
+    install_requires=["munkres", "numpy"],
+    extras_require={"yaml": ["PyYAML"]},
     setup_requires=["wheel"],
 )
@@ -1,5 +1,6 @@
 import csv
 import math
+import random
 
 import pytest as pytest
 
@@ -80,3 +81,39 @@ def base_mentor(base_data):
     data_copy["grade"] = 6
     data_copy["organisation"] = "Ministry of Silly Walks"
     return Mentor(**data_copy)
+
+
+@pytest.fixture
+def varied_cohort():
+    """
+    Returns a function that builds fresh mentor and mentee lists with a spread of grades, organisations and
+    professions, so that rules actually discriminate between pairs
+    """
+
+    def _varied_cohort(mentor_count=30, mentee_count=40, seed=1):
+        generator = random.Random(seed)
+        organisations = [f"Department {letter}" for letter in "ABCDE"]
+        professions = ["Policy", "Digital", "Finance", "Operations"]
+
+        def _people(participant_class, role_type, count):
+            return [
+                participant_class(
+                    **{
+                        "first name": role_type,
+                        "last name": str(i),
+                        "email": f"{role_type}.{i}@gov.uk",
+                        "role": "Some role",
+                        "organisation": generator.choice(organisations),
+                        "grade": generator.randint(0, 6),
+                        "profession": generator.choice(professions),
+                    }
+                )
+                for i in range(count)
+            ]
+
+        return (
+            _people(Mentor, "mentor", mentor_count),
+            _people(Mentee, "mentee", mentee_count),
+        )
+
+    return _varied_cohort
@@ -0,0 +1,149 @@
+import json
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+from matching import batch
+from matching.__main__ import main
+from matching.batch import (
+    cohort_size,
+    find_cohorts,
+    match_cohorts,
+    summarise,
+)
+
+RULES = {
+    "rounds": 1,
+    "rules": [
+        {"type": "grade", "difference": 2, "operator": "==", "scores": {"true": 10}}
+    ],
+}
+
+
+@pytest.fixture
+def rules_path(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(RULES))
+    return path
+
+
+@pytest.fixture
+def cohorts(tmp_path, known_file):
+    def _cohorts(*sizes):
+        folders = []
+        for number, size in enumerate(sizes):
+            folder = tmp_path / "cohorts" / f"cohort-{number}"
+            folder.mkdir(parents=True)
+            known_file(folder, "mentor", size)
+            known_file(folder, "mentee", size)
+            folders.append(folder)
+        return folders
+
+    return _cohorts
+
+
+class TestFindCohorts:
+    def test_folders_globs_and_manifests(self, tmp_path, cohorts):
+        first, second, third = cohorts(2, 3, 4)
+        manifest = tmp_path / "manifest.txt"
+        manifest.write_text("# this cycle\n\ncohorts/cohort-2\ncohorts/cohort-0\n")
+        assert find_cohorts([str(manifest)]) == [third, first]
+        assert find_cohorts([str(second), str(tmp_path / "cohorts" / "*")]) == [
+            second,
+            first,
+            third,
+        ]
+
+    def test_not_cohorts(self, tmp_path):
+        (tmp_path / "empty").mkdir()
+        with pytest.raises(ValueError):
+            find_cohorts([str(tmp_path / "empty")])
+        with pytest.raises(ValueError):
+            find_cohorts([str(tmp_path / "nothing-*")])
+
+
+def test_cohort_size(cohorts):
+    (folder,) = cohorts(5)
+    (folder / "mentees.csv").write_text(
+        (folder / "mentees.csv").read_text().rstrip("\n")
+    )
+    assert cohort_size(folder) == 25
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_match_cohorts(cohorts, rules_path, jobs):
+    folders = cohorts(3, 10, 5)
+    reports = match_cohorts(folders, rules_path, jobs=jobs)
+    assert [report.folder for report in reports] == [str(folder) for folder in folders]
+    assert [report.matches for report in reports] == [3, 10, 5]
+    assert all(report.error is None for report in reports)
+    for folder in folders:
+        assert (folder / "output" / "mentors-list.csv").exists()
+
+
+def test_largest_cohorts_are_matched_first(cohorts, rules_path, monkeypatch):
+    folders = cohorts(3, 10, 5)
+    started = []
+    match_cohort = batch.match_cohort
+
+    def record(folder, *args, **kwargs):
+        started.append(folder)
+        return match_cohort(folder, *args, **kwargs)
+
+    monkeypatch.setattr(batch, "match_cohort", record)
+    match_cohorts(folders, rules_path)
+    assert started == [folders[1], folders[2], folders[0]]
+
+
+def test_a_failure_doesnt_stop_the_others(cohorts, rules_path):
+    broken, working = cohorts(3, 3)
+    (broken / "mentors.csv").write_text("name\nsomeone\n")
+    reports = match_cohorts([broken, working], rules_path, jobs=2)
+    assert reports[0].error is not None
+    assert reports[1].error is None
+    summary = summarise(reports, 1.0)
+    assert (summary["matched"], summary["failed"], summary["matches"]) == (1, 1, 3)
+
+
+def _die_on_first(folder, *args, **kwargs):
+    if folder.name == "cohort-0":
+        os._exit(1)
+    return _match_cohort(folder, *args, **kwargs)
+
+
+_match_cohort = batch.match_cohort
+
+
+def test_a_worker_dying_is_reported(cohorts, rules_path, monkeypatch):
+    if multiprocessing.get_start_method() != "fork":
+        pytest.skip("the workers only see the patched function if they're forked")
+    folders = cohorts(5, 3)
+    monkeypatch.setattr(batch, "match_cohort", _die_on_first)
+    reports = match_cohorts(folders, rules_path, jobs=2)
+    assert [report.folder for report in reports] == [str(folder) for folder in folders]
+    assert reports[0].error.startswith("BrokenProcessPool")
+
+
+def test_command_line_batch(tmp_path, cohorts, rules_path, monkeypatch):
+    folders = cohorts(3, 4)
+    summary_path = tmp_path / "summary.json"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "matching",
+            str(tmp_path / "cohorts" / "*"),
+            "--rules",
+            str(rules_path),
+            "--jobs",
+            "2",
+            "--summary",
+            str(summary_path),
+        ],
+    )
+    main()
+    summary = json.loads(summary_path.read_text())
+    assert [cohort["matches"] for cohort in summary["cohorts"]] == [3, 4]
+    assert all((folder / "output" / "mentees-list.csv").exists() for folder in folders)
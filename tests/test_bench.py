@@ -0,0 +1,100 @@
+import pytest
+
+from matching.bench import (
+    PIPELINES,
+    benchmark_approximation,
+    benchmark_ingest,
+    benchmark_participants,
+    benchmark_pipeline,
+    benchmark_serialization,
+    benchmark_solvers,
+    compare_pipeline_results,
+    write_synthetic_cohort,
+)
+from matching.mentee import Mentee
+from matching.mentor import Mentor
+from matching.process import create_participant_list_from_path
+
+
+class TestBench:
+    def test_solver_benchmark_agrees_on_cost(self):
+        results = benchmark_solvers([5], ["munkres", "jonker-volgenant"])
+        costs = {}
+        for result in results:
+            costs.setdefault((result["rows"], result["columns"]), set()).add(
+                result["total_cost"]
+            )
+        assert all(len(totals) == 1 for totals in costs.values())
+
+    def test_approximation_benchmark_reports_gaps(self):
+        results = benchmark_approximation([100], epsilons=[1.0], improvement_passes=[0])
+        assert [result["solver"] for result in results] == [
+            "jonker-volgenant",
+            "greedy",
+            "auction",
+        ]
+        assert results[0]["gap"] == 0
+        assert all(
+            result["total_score"] <= results[0]["total_score"]
+            and 0 <= result["gap"] < 1
+            for result in results
+        )
+
+    def test_participant_benchmark(self):
+        result = benchmark_participants(count=20, pairs=10)
+        assert result["participants"] == 20
+        assert result["bytes_per_participant"] > 0
+        assert result["pairs_per_second"] > 0
+
+    def test_ingest_benchmark(self):
+        result = benchmark_ingest(rows=50, chunk_size=20)
+        assert result["rows"] == 50
+        assert result["table_rows_per_second"] > 0
+        assert result["participants_rows_per_second"] > 0
+
+    def test_serialization_benchmark(self):
+        results = benchmark_serialization([50])
+        assert [result["encoding"] for result in results] == [
+            "nested_json",
+            "table_json",
+            "table_binary",
+        ]
+        # the nested encoding copies every mentee once for each of their mentors
+        assert results[0]["objects_built"] > 50
+        assert all(result["objects_built"] == 50 for result in results[1:])
+
+    def test_synthetic_cohort(self, tmp_path):
+        write_synthetic_cohort(tmp_path, 200, both_share=0.1)
+        mentors = create_participant_list_from_path(Mentor, tmp_path)
+        mentees = create_participant_list_from_path(Mentee, tmp_path)
+        assert (len(mentors), len(mentees)) == (80, 120)
+        assert (
+            len({mentor.email for mentor in mentors} & {m.email for m in mentees}) == 8
+        )
+        assert sum(mentor.grade for mentor in mentors) / len(mentors) > sum(
+            mentee.grade for mentee in mentees
+        ) / len(mentees)
+
+    @pytest.mark.parametrize("pipeline", list(PIPELINES))
+    def test_pipeline_benchmark(self, pipeline):
+        report = benchmark_pipeline([60], pipeline, solver="jonker-volgenant")
+        stages = [result["stage"] for result in report["results"]]
+        assert stages[0] == "load" and stages[-1] == "export"
+        assert all(result["peak_bytes"] > 0 for result in report["results"])
+        assert report["environment"]["python"]
+
+    def test_pipeline_benchmark_stops_early(self):
+        report = benchmark_pipeline([60], track_memory=False, until="load")
+        assert [result["stage"] for result in report["results"]] == ["load"]
+        assert report["results"][0]["peak_bytes"] is None
+
+    def test_compare_flags_regressions(self):
+        def _report(seconds):
+            return {
+                "results": [
+                    {"size": 10, "stage": "load", "seconds": seconds, "peak_bytes": 100}
+                ]
+            }
+
+        assert not compare_pipeline_results(_report(1.0), _report(1.05))[0]["regressed"]
+        assert compare_pipeline_results(_report(1.0), _report(1.5))[0]["regressed"]
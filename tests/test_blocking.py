@@ -0,0 +1,66 @@
+import operator
+
+import pytest
+
+import matching.rules.rule as rl
+from matching.blocking import PRUNED, BlockingIndex, generate_blocked_match_matrix
+from matching.process import generate_match_matrix, process_data
+
+
+class TestBlocking:
+    rules = [
+        rl.Disqualify(rl.Grade(2, operator.gt).evaluate),
+        rl.Disqualify(rl.Grade(0, operator.le).evaluate),
+        rl.Disqualify(rl.Equivalent("organisation").evaluate),
+        rl.Equivalent("profession", {True: 4, False: 0}),
+        rl.UnmatchedBonus(5),
+    ]
+
+    def test_blocked_matrix_agrees_with_full_matrix(self, varied_cohort):
+        mentors, mentees = varied_cohort()
+        mentees[3].email = mentors[0].email
+        mentors[1].mentees.append(mentees[5])
+        mentees[6].mentors.append(mentors[2])
+        full = generate_match_matrix(mentors, mentees, self.rules)
+        blocked = generate_blocked_match_matrix(mentors, mentees, self.rules)
+        for full_row, blocked_row in zip(full, blocked):
+            for full_match, blocked_match in zip(full_row, blocked_row):
+                assert full_match.disallowed == blocked_match.disallowed
+                assert full_match.score == blocked_match.score
+                if blocked_match is PRUNED:
+                    assert full_match.disallowed
+
+    def test_reports_pruned_pairs(self, varied_cohort):
+        mentors, mentees = varied_cohort()
+        reports = []
+        matrix = generate_blocked_match_matrix(
+            mentors, mentees, self.rules, reports.append
+        )
+        (index,) = reports
+        assert index.pair_count == len(mentors) * len(mentees)
+        assert index.pruned_count == sum(
+            match is PRUNED for row in matrix for match in row
+        )
+        assert index.pruned_count > index.pair_count / 2
+
+    def test_only_builtin_rules_prune_without_disqualifiers(self, varied_cohort):
+        mentors, mentees = varied_cohort()
+        mentors[0].mentees.append(mentees[0])
+        index = BlockingIndex(mentors, mentees, [rl.UnmatchedBonus(3)])
+        assert 0 not in index.candidates(mentors[0])
+        assert index.pruned_count == 1
+
+    def test_blocking_makes_the_same_assignments(self, varied_cohort):
+        def _assignments(blocking):
+            mentors, mentees = process_data(
+                *varied_cohort(), [self.rules] * 3, blocking=blocking
+            )
+            return [[mentee.email for mentee in mentor.mentees] for mentor in mentors]
+
+        assert _assignments(True) == _assignments(False)
+
+    def test_blocking_needs_object_scoring(self, varied_cohort):
+        with pytest.raises(ValueError):
+            process_data(
+                *varied_cohort(), [self.rules], scoring="vectorised", blocking=True
+            )
@@ -0,0 +1,159 @@
+import operator
+
+import numpy as np
+import pytest
+
+import matching.rules.rule as rl
+from matching.cache import ScoreCache
+from matching.process import generate_score_matrix, process_data
+
+
+class SameLastLetter(rl.Rule):
+    """A rule that can only be scored pair by pair, but says what it looks at"""
+
+    def __init__(self, results):
+        super().__init__(results)
+        self.evaluated = 0
+
+    def evaluate(self, match):
+        self.evaluated += 1
+        return match.mentor.profession[-1] == match.mentee.profession[-1]
+
+    def fingerprint(self):
+        return rl.Fingerprint(self._settings(), ("profession",))
+
+
+def _rules():
+    return [
+        rl.Disqualify(rl.Grade(2, operator.gt).evaluate),
+        rl.Equivalent("profession", {True: 4, False: 0}),
+        rl.Grade(1, operator.eq, {True: 6, False: 0}),
+        rl.UnmatchedBonus(3),
+    ]
+
+
+class TestFingerprints:
+    def test_same_settings_same_fingerprint(self):
+        assert (
+            rl.Grade(1, operator.eq).fingerprint()
+            == rl.Grade(1, operator.eq).fingerprint()
+        )
+        assert (
+            rl.Grade(1, operator.eq).fingerprint()
+            != rl.Grade(2, operator.eq).fingerprint()
+        )
+        assert (
+            rl.Equivalent("profession", {True: 4, False: 0}).fingerprint()
+            != rl.Equivalent("profession", {True: 5, False: 0}).fingerprint()
+        )
+        assert rl.Equivalent("profession").fingerprint().columns == ("profession",)
+
+    def test_rules_that_cant_be_fingerprinted(self):
+        assert rl.Generic({True: 1, False: 0}, lambda match: True).fingerprint() is None
+        assert rl.Grade(1, lambda a, b: a == b).fingerprint() is None
+
+    def test_disqualify_wraps_a_fingerprint(self):
+        disqualify = rl.Disqualify(rl.Grade(2, operator.gt).evaluate)
+        assert disqualify.fingerprint() is not None
+        assert disqualify.fingerprint() != rl.Grade(2, operator.gt).fingerprint()
+
+
+class TestScoreCache:
+    def test_second_scoring_is_read_from_the_cache(self, varied_cohort, tmp_path):
+        mentors, mentees = varied_cohort()
+        expected = generate_score_matrix(mentors, mentees, _rules())
+        cache = ScoreCache(tmp_path)
+        first = generate_score_matrix(mentors, mentees, _rules(), cache=cache)
+        assert (cache.hits, cache.misses) == (0, 4)
+        second = generate_score_matrix(mentors, mentees, _rules(), cache=cache)
+        assert (cache.hits, cache.misses) == (4, 4)
+        for score_matrix in (first, second):
+            assert np.array_equal(score_matrix.scores, expected.scores)
+            assert np.array_equal(score_matrix.disallowed, expected.disallowed)
+
+    def test_pairwise_rules_are_only_evaluated_once(self, varied_cohort, tmp_path):
+        mentors, mentees = varied_cohort()
+        cache = ScoreCache(tmp_path)
+        rule = SameLastLetter({True: 2, False: 0})
+        first = generate_score_matrix(mentors, mentees, [rule], cache=cache)
+        evaluated = rule.evaluated
+        second = generate_score_matrix(mentors, mentees, [rule], cache=cache)
+        assert rule.evaluated == evaluated > 0
+        assert np.array_equal(first.scores, second.scores)
+
+    def test_changed_data_only_invalidates_rules_that_read_it(
+        self, varied_cohort, tmp_path
+    ):
+        mentors, mentees = varied_cohort()
+        cache = ScoreCache(tmp_path)
+        generate_score_matrix(mentors, mentees, _rules(), cache=cache)
+        mentees[0].profession = "Something new"
+        changed = generate_score_matrix(mentors, mentees, _rules(), cache=cache)
+        assert (cache.hits, cache.misses) == (3, 5)
+        assert np.array_equal(
+            changed.scores, generate_score_matrix(mentors, mentees, _rules()).scores
+        )
+
+    def test_connections_invalidate_the_unmatched_bonus(self, varied_cohort, tmp_path):
+        mentors, mentees = varied_cohort()
+        cache = ScoreCache(tmp_path)
+        generate_score_matrix(mentors, mentees, [rl.UnmatchedBonus(3)], cache=cache)
+        mentors[0].mentees.append(mentees[0])
+        mentees[0].mentors.append(mentors[0])
+        generate_score_matrix(mentors, mentees, [rl.UnmatchedBonus(3)], cache=cache)
+        assert cache.misses == 2
+
+    def test_rules_that_cant_be_cached_are_scored(self, varied_cohort, tmp_path):
+        mentors, mentees = varied_cohort()
+        cache = ScoreCache(tmp_path)
+        rules = [rl.Generic({True: 1, False: 0}, lambda match: True)]
+        score_matrix = generate_score_matrix(mentors, mentees, rules, cache=cache)
+        assert (score_matrix.scores == 1).all()
+        assert (cache.hits, cache.misses, cache.bypassed) == (0, 0, 1)
+        assert not list(tmp_path.iterdir())
+
+    def test_least_recently_used_entries_are_evicted(self, varied_cohort, tmp_path):
+        mentors, mentees = varied_cohort()
+        cache = ScoreCache(tmp_path)
+        generate_score_matrix(mentors, mentees, _rules()[:1], cache=cache)
+        entry_size = sum(path.stat().st_size for path in tmp_path.iterdir())
+        cache.clear()
+        cache.max_bytes = 2 * entry_size
+        generate_score_matrix(mentors, mentees, _rules()[:3], cache=cache)
+        assert len(list(tmp_path.glob("*.npy"))) == 2
+        generate_score_matrix(mentors, mentees, _rules()[2:3], cache=cache)
+        assert cache.hits == 1
+
+    def test_a_damaged_entry_is_scored_again(self, varied_cohort, tmp_path):
+        mentors, mentees = varied_cohort()
+        cache = ScoreCache(tmp_path)
+        expected = generate_score_matrix(mentors, mentees, _rules(), cache=cache)
+        for path in tmp_path.glob("*.npy"):
+            path.write_bytes(b"not an array")
+        score_matrix = generate_score_matrix(mentors, mentees, _rules(), cache=cache)
+        assert cache.misses == 8
+        assert np.array_equal(score_matrix.scores, expected.scores)
+
+
+class TestProcessDataWithACache:
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_same_matches_with_a_cache(self, varied_cohort, tmp_path, workers):
+        rules = [_rules(), _rules()]
+        expected, _ = process_data(*varied_cohort(), rules, scoring="vectorised")
+        cache = ScoreCache(tmp_path)
+        for _ in range(2):
+            mentors, _ = process_data(
+                *varied_cohort(),
+                rules,
+                scoring="vectorised",
+                workers=workers,
+                score_cache=cache,
+            )
+            assert [
+                [mentee.email for mentee in mentor.mentees] for mentor in mentors
+            ] == [[mentee.email for mentee in mentor.mentees] for mentor in expected]
+        assert cache.hits > 0
+
+    def test_object_scoring_cant_use_a_cache(self, varied_cohort, tmp_path):
+        with pytest.raises(ValueError):
+            process_data(*varied_cohort(), [_rules()], score_cache=ScoreCache(tmp_path))
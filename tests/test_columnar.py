@@ -0,0 +1,83 @@
+import operator
+
+import numpy as np
+import pytest
+
+import matching.rules.rule as rl
+from matching.columnar import CohortColumns
+from matching.match import Match
+from matching.process import generate_match_matrix, generate_score_matrix
+
+
+class TestColumnar:
+    @pytest.mark.parametrize(
+        "rule",
+        [
+            rl.Grade(1, operator.gt, {True: 3, False: 1}),
+            rl.Grade(0, operator.le, {True: -2, False: 0}),
+            rl.Grade(2, lambda diff, target: diff == target, {True: 4, False: 0}),
+            rl.Equivalent("organisation", {True: 0, False: 5}),
+            rl.Equivalent("profession", {True: 4, False: 0}),
+            rl.UnmatchedBonus(6),
+            rl.Generic({True: 2, False: 1}, lambda match: match.mentor.grade > 3),
+        ],
+    )
+    def test_evaluate_array_matches_evaluate(self, varied_cohort, rule):
+        mentors, mentees = varied_cohort()
+        mentors[0].mentees.append(mentees[0])
+        cohort = CohortColumns(mentors, mentees)
+        expected = [
+            [rule.evaluate(Match(mentor, mentee, [])) for mentee in mentees]
+            for mentor in mentors
+        ]
+        assert rule.evaluate_array(cohort.mentors, cohort.mentees).tolist() == expected
+
+    def test_disqualify_uses_wrapped_rule(self, varied_cohort, monkeypatch):
+        mentors, mentees = varied_cohort()
+        cohort = CohortColumns(mentors, mentees)
+        monkeypatch.setattr(
+            "matching.rules.rule.evaluate_pairwise",
+            lambda *args: pytest.fail("fell back to pairwise evaluation"),
+        )
+        rule = rl.Disqualify(rl.Grade(2, operator.gt).evaluate)
+        assert rule.evaluate_array(cohort.mentors, cohort.mentees).shape == (30, 40)
+
+    def test_builtin_rules_disallow_self_and_previous_matches(self, varied_cohort):
+        mentors, mentees = varied_cohort()
+        mentees[1].email = mentors[0].email
+        mentees[2].mentors.append(mentors[3])
+        score_matrix = generate_score_matrix(mentors, mentees, [])
+        assert score_matrix.disallowed[0, 1]
+        assert score_matrix.disallowed[3, 2]
+        assert score_matrix.disallowed.sum() == 2
+
+    def test_score_matrix_matches_match_grid(self, varied_cohort):
+        mentors, mentees = varied_cohort()
+        mentees[4].mentors.append(mentors[2])
+        rules = [
+            rl.Disqualify(rl.Grade(2, operator.gt).evaluate),
+            rl.Disqualify(rl.Grade(0, operator.le).evaluate),
+            rl.Equivalent("profession", {True: 4, False: 0}),
+            rl.Generic(
+                {True: 3, False: 0},
+                lambda match: match.mentee.organisation != match.mentor.organisation,
+            ),
+            rl.UnmatchedBonus(5),
+        ]
+        match_grid = generate_match_matrix(mentors, mentees, rules)
+        score_matrix = generate_score_matrix(mentors, mentees, rules)
+        assert score_matrix.disallowed.tolist() == [
+            [match.disallowed for match in row] for row in match_grid
+        ]
+        assert score_matrix.masked_scores().tolist() == [
+            [match.score for match in row] for row in match_grid
+        ]
+
+    def test_viable_rows_and_columns(self):
+        score_matrix = CohortColumns([], []).score([])
+        score_matrix.disallowed = np.array(
+            [[True, True, True], [False, True, True], [True, True, False]]
+        )
+        rows, columns = score_matrix.viable()
+        assert rows.tolist() == [1, 2]
+        assert columns.tolist() == [0, 2]
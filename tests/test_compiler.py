@@ -0,0 +1,108 @@
+import operator
+
+import pytest
+
+import matching.rules.rule as rl
+from matching.match import Match
+from matching.rules.compiler import compile_rules
+
+
+class Seniority(rl.Rule):
+    def evaluate(self, match_object):
+        return match_object.mentor.grade > match_object.mentee.grade
+
+
+class NeverEvaluated(rl.Rule):
+    def evaluate(self, match_object):
+        raise AssertionError("this rule should have been short-circuited")
+
+
+class TestCompiler:
+    rules = [
+        rl.Disqualify(rl.Grade(3, operator.gt).evaluate),
+        rl.Disqualify(rl.Equivalent("organisation").evaluate),
+        rl.Grade(2, operator.eq, {True: 6, False: 1}),
+        rl.Equivalent("profession", {True: 4, False: 0}),
+        rl.Generic({True: 3, False: 0}, rl.Grade(1, operator.le).evaluate),
+        rl.Generic(
+            {True: 2, False: 0},
+            lambda match: len(match.mentor.mentees) < len(match.mentee.mentors),
+        ),
+        rl.Disqualify(lambda match: match.mentee.profession == "Finance"),
+        Seniority({True: 5, False: -1}),
+        rl.UnmatchedBonus(7),
+    ]
+
+    def test_compiled_rules_score_like_a_match(self, varied_cohort):
+        mentors, mentees = varied_cohort()
+        for i in range(0, len(mentors), 3):
+            mentors[i].mentees.append(mentees[i])
+            mentees[i].mentors.append(mentors[i])
+        compiled_rules = compile_rules(self.rules)
+        for mentor in mentors:
+            for mentee in mentees:
+                expected = Match(mentor, mentee, self.rules).calculate_match()
+                compiled = compiled_rules.match(mentor, mentee)
+                assert compiled.disallowed is expected.disallowed
+                assert compiled.score == expected.score
+
+    def test_built_in_rules_are_compiled(self, base_mentor, base_mentee):
+        base_mentee.email = "mentee@data.com"
+        compiled_rules = compile_rules([])
+        assert compiled_rules(base_mentor, base_mentor) is None
+        assert compiled_rules(base_mentor, base_mentee) == 0
+        base_mentor.mentees.append(base_mentee)
+        assert compiled_rules(base_mentor, base_mentee) is None
+
+    def test_known_rules_are_not_fallbacks(self):
+        compiled_rules = compile_rules(self.rules)
+        assert len(compiled_rules.disqualifiers) == 4
+        assert len(compiled_rules.scorers) == 4
+        assert [type(rule) for rule in compiled_rules.fallbacks] == [
+            rl.Generic,
+            rl.Disqualify,
+            Seniority,
+        ]
+
+    def test_fallbacks_are_applied_from_the_end_like_a_match(self, varied_cohort):
+        mentors, mentees = varied_cohort(mentor_count=4, mentee_count=4)
+        mentors[0].mentees.append(mentees[0])
+        mentees[0].mentors.append(mentors[0])
+        rules = [
+            rl.Generic(
+                {True: 1, False: 0}, lambda match: match.mentor.mentees[0].grade > 1
+            ),
+            rl.Disqualify(lambda match: len(match.mentor.mentees) == 0),
+        ]
+        compiled_rules = compile_rules(rules)
+        for mentor in mentors:
+            for mentee in mentees:
+                expected = Match(mentor, mentee, rules).calculate_match()
+                compiled = compiled_rules.match(mentor, mentee)
+                assert compiled.disallowed is expected.disallowed
+                assert compiled.score == expected.score
+
+    def test_disqualifiers_short_circuit(self, base_mentor, base_mentee):
+        base_mentee.email = "mentee@data.com"
+        base_mentee.grade = base_mentor.grade - 5
+        compiled_rules = compile_rules(
+            [NeverEvaluated(), rl.Disqualify(rl.Grade(3, operator.gt).evaluate)]
+        )
+        assert compiled_rules(base_mentor, base_mentee) is None
+
+    def test_protocol_only_rules_fall_back(self, base_mentor, base_mentee):
+        class Constant:
+            def apply(self, match_object):
+                return 9
+
+            def evaluate(self, match_object):
+                return True
+
+        base_mentee.email = "mentee@data.com"
+        assert compile_rules([Constant()])(base_mentor, base_mentee) == 9
+
+    @pytest.mark.parametrize("score", [0, 12])
+    def test_from_result(self, base_mentor, base_mentee, score):
+        match = Match.from_result(base_mentor, base_mentee, score, False)
+        assert match.calculate_match().score == score
+        assert Match.from_result(base_mentor, base_mentee, score, True).score == 0
@@ -0,0 +1,158 @@
+import copy
+import pickle
+
+import pytest
+
+import matching.rules.rule as rl
+from matching.connections import (
+    CapacityError,
+    ConnectionRegistry,
+    Connections,
+    connect,
+    connect_all,
+    connected,
+)
+from matching.factory import ParticipantFactory
+from matching.match import Match
+from matching.mentee import Mentee
+from matching.mentor import Mentor
+from matching.process import process_data
+
+
+def _people(participant_class, count, **kwargs):
+    return [
+        participant_class(
+            email=f"{participant_class.__name__.lower()}{i}@data.com", grade=1, **kwargs
+        )
+        for i in range(count)
+    ]
+
+
+class TestConnections:
+    def test_membership_follows_person_equality(self):
+        mentor, mentee = _people(Mentor, 1)[0], _people(Mentee, 1)[0]
+        mentor.mentees.append(mentee)
+        rebuilt = ParticipantFactory.create_from_dict(mentee.to_dict())
+        assert rebuilt in mentor.mentees
+        assert mentor.mentees.contains_id(mentee.participant_id)
+        assert not mentor.mentees.contains_id(rebuilt.participant_id)
+
+    def test_indexes_follow_removals(self):
+        mentees = _people(Mentee, 3)
+        connections = Connections(mentees)
+        connections.remove(mentees[0])
+        del connections[0]
+        assert mentees[0] not in connections and mentees[1] not in connections
+        assert mentees[2] in connections
+        assert connections.pop() is mentees[2]
+        assert mentees[2] not in connections
+
+    @pytest.mark.parametrize(
+        "add",
+        [
+            lambda connections, people: connections.append(people[0]),
+            lambda connections, people: connections.extend(people),
+            lambda connections, people: connections.insert(0, people[0]),
+            lambda connections, people: connections.__iadd__(people),
+            lambda connections, people: connections.__imul__(2),
+        ],
+    )
+    def test_capacity_is_enforced(self, add):
+        connections = Connections(_people(Mentee, 2), capacity=2)
+        with pytest.raises(CapacityError):
+            add(connections, _people(Mentee, 2))
+        assert len(connections) == 2
+
+    def test_multiplying_keeps_the_indexes(self):
+        mentees = _people(Mentee, 1)
+        connections = Connections(mentees)
+        connections *= 2
+        assert len(connections) == 2 and mentees[0] in connections
+        connections *= 0
+        assert mentees[0] not in connections
+        assert not connections.contains_id(mentees[0].participant_id)
+
+    @pytest.mark.parametrize(
+        "round_trip",
+        [lambda people: pickle.loads(pickle.dumps(people)), copy.deepcopy],
+    )
+    def test_matched_participants_can_be_copied(self, round_trip):
+        mentor = _people(Mentor, 1, capacity=4)[0]
+        mentees = _people(Mentee, 2)
+        connect_all((mentor, mentee) for mentee in mentees)
+        copied_mentor, *copied_mentees = round_trip([mentor, *mentees])
+        assert copied_mentor.capacity == 4
+        assert copied_mentor.mentees == mentees
+        assert copied_mentor.mentees[0] is copied_mentees[0]
+        assert copied_mentees[1].mentors[0] is copied_mentor
+        assert mentees[1] in copied_mentor.connections
+        assert copied_mentor.connections.contains_id(mentees[0].participant_id)
+        copied_mentor.connections.extend(_people(Mentee, 4)[2:])
+        with pytest.raises(CapacityError):
+            copied_mentor.connections.append(_people(Mentee, 1)[0])
+
+    def test_capacity_from_data(self):
+        mentor = Mentor(email="mentor@data.com", grade=5, capacity="5")
+        mentor.mentees.extend(_people(Mentee, 5))
+        assert mentor.capacity == 5 and mentor.connections.remaining == 0
+        assert Mentor(email="mentor@data.com", grade=5, capacity="").capacity == 3
+
+    def test_connections_setter_is_capped(self):
+        mentor = _people(Mentor, 1, capacity=1)[0]
+        mentor.connections = _people(Mentee, 1)[0]
+        with pytest.raises(CapacityError):
+            mentor.connections = _people(Mentee, 1)[0]
+
+    def test_connect_leaves_both_sides_alone_when_full(self):
+        mentor, mentee = _people(Mentor, 1)[0], _people(Mentee, 1, capacity=0)[0]
+        with pytest.raises(CapacityError):
+            connect(mentor, mentee)
+        assert not mentor.mentees and not connected(mentor, mentee)
+
+    def test_connect_all_is_all_or_nothing(self):
+        mentors, mentees = _people(Mentor, 2, capacity=1), _people(Mentee, 2)
+        with pytest.raises(CapacityError):
+            connect_all([(mentors[0], mentees[0]), (mentors[0], mentees[1])])
+        assert not any(mentee.mentors for mentee in mentees)
+        assert connect_all(zip(mentors, mentees)) == 2
+        assert all(
+            connected(mentor, mentee) for mentor, mentee in zip(mentors, mentees)
+        )
+
+    def test_mark_successful_connects_both_ways(self):
+        mentor, mentee = _people(Mentor, 1)[0], _people(Mentee, 1)[0]
+        Match(mentor, mentee, []).mark_successful()
+        assert mentor.mentees == [mentee] and mentee.mentors == [mentor]
+        assert Match(mentor, mentee, []).calculate_match().disallowed
+
+    def test_registry(self):
+        mentors, mentees = _people(Mentor, 3), _people(Mentee, 3)
+        registry = ConnectionRegistry(mentors + mentees)
+        assert len(registry) == 6 and mentors[0].participant_id in registry
+        assert (
+            registry.add_assignment(
+                (mentor.participant_id, mentee.participant_id)
+                for mentor, mentee in zip(mentors, mentees)
+            )
+            == 3
+        )
+        assert registry.neighbours(mentors[1].participant_id) == [
+            mentees[1].participant_id
+        ]
+        assert registry.connected(mentees[2].participant_id, mentors[2].participant_id)
+        assert not registry.connected(
+            mentors[0].participant_id, mentees[1].participant_id
+        )
+        registry.set_capacity(mentors[0].participant_id, 1)
+        assert registry.remaining(mentors[0].participant_id) == 0
+        with pytest.raises(CapacityError):
+            registry.connect(mentors[0].participant_id, mentees[1].participant_id)
+
+    @pytest.mark.parametrize("scoring", ["object", "vectorised", "sparse"])
+    def test_capacity_limits_rounds(self, varied_cohort, scoring):
+        mentors, mentees = varied_cohort()
+        for mentor in mentors:
+            mentor.capacity = 1
+        rules = [rl.Generic({True: 1, False: 1}, lambda match: True)]
+        with pytest.raises(CapacityError):
+            process_data(mentors, mentees, [rules, rules], scoring)
@@ -0,0 +1,214 @@
+import csv
+import gzip
+import io
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from matching import export
+from matching.export import (
+    DEFAULT_TEMPLATES,
+    ExportToEmail,
+    ExportToSpreadsheet,
+    export_all,
+    read_columns,
+    read_template,
+)
+from matching.mail import FileClient
+from matching.mentor import Mentor
+from matching.process import create_mailing_lists
+
+
+def _matched(varied_cohort):
+    mentors, mentees = varied_cohort(mentor_count=10, mentee_count=12)
+    for i, mentor in enumerate(mentors[:6]):
+        for mentee in mentees[i : i + 1 + i % 3]:
+            mentor.mentees.append(mentee)
+            mentee.mentors.append(mentor)
+    return mentors, mentees
+
+
+def _old_rows(participants):
+    """The rows, headings and all, as the exporter wrote them before it streamed"""
+    rows = [participant.to_dict_for_export() for participant in participants]
+    return rows, list(max(rows, key=len))
+
+
+def _read_csv(text):
+    reader = csv.DictReader(io.StringIO(text))
+    return reader.fieldnames, list(reader)
+
+
+class TestExportToSpreadsheet:
+    def test_csv(self, varied_cohort, tmp_path):
+        mentors, _ = _matched(varied_cohort)
+        path = ExportToSpreadsheet(mentors, tmp_path).export()
+        assert path == tmp_path / "mentors-list.csv"
+        headings, rows = _read_csv(path.read_text())
+        expected_rows, expected_headings = _old_rows(mentors)
+        assert headings[: len(expected_headings)] == expected_headings
+        assert headings[-1] == "match 3 profession"
+        for row, expected in zip(rows, expected_rows):
+            assert {key: value for key, value in row.items() if value} == {
+                key: str(value) for key, value in expected.items() if value is not None
+            }
+
+    def test_gzipped_csv(self, varied_cohort, tmp_path):
+        mentors, _ = _matched(varied_cohort)
+        plain = ExportToSpreadsheet(mentors, tmp_path).export()
+        compressed = ExportToSpreadsheet(mentors, tmp_path, "csv.gz").export()
+        assert compressed.name == "mentors-list.csv.gz"
+        with gzip.open(compressed, "rb") as file:
+            assert file.read() == plain.read_bytes()
+
+    def test_npz(self, varied_cohort, tmp_path):
+        mentors, _ = _matched(varied_cohort)
+        path = ExportToSpreadsheet(mentors, tmp_path, "npz", batch_size=4).export()
+        columns = read_columns(path)
+        headings, rows = _read_csv(
+            ExportToSpreadsheet(mentors, tmp_path).export().read_text()
+        )
+        assert list(columns) == headings
+        assert columns["grade"].dtype == np.int64
+        assert columns["email"].tolist() == [row["email"] for row in rows]
+        assert columns["match 2 grade"].tolist() == [
+            int(row["match 2 grade"]) if row["match 2 grade"] else export.MISSING_GRADE
+            for row in rows
+        ]
+        # one file for each column of each batch, and one for the headings
+        assert len(np.load(path).files) == len(headings) * 3 + 1
+
+    def test_columnar_falls_back_to_npz(self, varied_cohort, tmp_path, monkeypatch):
+        monkeypatch.setattr(export, "pyarrow", None)
+        mentors, _ = _matched(varied_cohort)
+        assert ExportToSpreadsheet(mentors, tmp_path, "columnar").file_format == "npz"
+        with pytest.raises(ValueError):
+            ExportToSpreadsheet(mentors, tmp_path, "parquet")
+
+    def test_parquet(self, varied_cohort, tmp_path):
+        parquet = pytest.importorskip("pyarrow.parquet")
+        mentors, _ = _matched(varied_cohort)
+        table = parquet.read_table(
+            ExportToSpreadsheet(mentors, tmp_path, "parquet").export()
+        )
+        assert table.column("email").to_pylist() == [mentor.email for mentor in mentors]
+
+    def test_participants_can_be_streamed(self, varied_cohort, tmp_path):
+        mentors, _ = _matched(varied_cohort)
+        path = ExportToSpreadsheet(iter(mentors), tmp_path).export()
+        headings, rows = _read_csv(path.read_text())
+        assert len(rows) == len(mentors)
+        assert "match 3 email" in headings
+
+    def test_capacity_sets_the_match_columns(self, varied_cohort, tmp_path):
+        mentors, _ = _matched(varied_cohort)
+        mentors[0].capacity = 5
+        headings, _ = _read_csv(
+            ExportToSpreadsheet(mentors, tmp_path).export().read_text()
+        )
+        assert "match 5 email" in headings and "match 6 email" not in headings
+
+    def test_headings_come_from_the_export_dict(self, varied_cohort, tmp_path):
+        class RankedMentor(Mentor):
+            __slots__ = ()
+
+            def to_dict_for_export(self, depth=1):
+                return {
+                    key.replace("grade", "rank"): value
+                    for key, value in super().to_dict_for_export(depth).items()
+                }
+
+        mentors, _ = _matched(varied_cohort)
+        mentors = mentors[6:7] + mentors[:1]
+        for mentor in mentors:
+            mentor.__class__ = RankedMentor
+        headings, rows = _read_csv(
+            ExportToSpreadsheet(mentors, tmp_path).export().read_text()
+        )
+        assert "match 1 rank" in headings and "match 1 grade" not in headings
+        assert rows[1]["match 1 rank"] == str(mentors[1].mentees[0].grade)
+
+    def test_unknown_format(self, tmp_path):
+        with pytest.raises(ValueError):
+            ExportToSpreadsheet([], tmp_path, "xlsx")
+
+    def test_nothing_to_export(self, tmp_path):
+        with pytest.raises(ValueError):
+            ExportToSpreadsheet([], tmp_path).export()
+
+
+def test_export_all(varied_cohort, tmp_path):
+    mentors, mentees = _matched(varied_cohort)
+    paths = create_mailing_lists(mentors, mentees, tmp_path / "output", "csv.gz")
+    assert [path.name for path in paths] == [
+        "mentors-list.csv.gz",
+        "mentees-list.csv.gz",
+    ]
+    assert export_all([mentors], tmp_path) == [tmp_path / "mentors-list.csv"]
+
+
+class TestExportToEmail:
+    def test_render(self, varied_cohort):
+        mentors, mentees = _matched(varied_cohort)
+        mentor = mentors[2]
+        message = ExportToEmail(mentors, FileClient).render(mentor)
+        assert message.to == "mentor.2@gov.uk"
+        assert message.subject == "Your mentees"
+        assert message.body.startswith("Dear mentor,\n")
+        for mentee in mentor.mentees:
+            assert (
+                f"- mentee {mentee.last_name}, Some role, {mentee.organisation} ({mentee.email})"
+                in message.body
+            )
+
+    def test_custom_template(self, varied_cohort):
+        _, mentees = _matched(varied_cohort)
+        exporter = ExportToEmail(
+            mentees,
+            FileClient,
+            template="Subject: Hello $first_name\n\n$match_count match for $email\n",
+        )
+        message = exporter.render(mentees[0])
+        assert message.subject == "Hello mentee"
+        assert message.body == "1 match for mentee.0@gov.uk\n"
+
+    def test_unknown_placeholder(self, varied_cohort):
+        mentors, _ = _matched(varied_cohort)
+        exporter = ExportToEmail(mentors, FileClient, template="Subject: $nickname\n")
+        with pytest.raises(KeyError):
+            exporter.render(mentors[0])
+
+    def test_template_needs_a_subject(self):
+        with pytest.raises(ValueError):
+            read_template("Dear $first_name")
+
+    @pytest.mark.parametrize("name", ["mentor", "mentee"])
+    def test_template_folder(self, varied_cohort, name):
+        # the templates shipped in the repository are the defaults
+        folder = Path(__file__).parent.parent / "templates"
+        assert folder.joinpath(f"{name}.txt").read_text() == DEFAULT_TEMPLATES[name]
+        mentors, mentees = _matched(varied_cohort)
+        participant = (mentors if name == "mentor" else mentees)[0]
+        assert ExportToEmail([participant], FileClient, template_folder=folder).render(
+            participant
+        ) == ExportToEmail([participant], FileClient).render(participant)
+
+    def test_sends_everyone_with_a_match(self, varied_cohort, tmp_path):
+        mentors, _ = _matched(varied_cohort)
+        outbox = tmp_path / "outbox"
+        report = ExportToEmail(mentors, FileClient(outbox), batch_size=4).export()
+        assert report.sent == 6
+        assert report.skipped == 4
+        assert not report.failed
+        assert sorted(file.name for file in outbox.iterdir()) == [
+            f"mentor.{i}@gov.uk.eml" for i in range(6)
+        ]
+
+    def test_can_send_to_the_unmatched(self, varied_cohort, tmp_path):
+        mentors, _ = _matched(varied_cohort)
+        report = ExportToEmail(
+            mentors, FileClient(tmp_path), skip_unmatched=False
+        ).export()
+        assert report.sent == 10
+        assert report.skipped == 0
@@ -0,0 +1,122 @@
+import operator
+import pickle
+
+import numpy as np
+import pytest
+
+import matching.rules.rule as rl
+from matching.columnar import CohortColumns, evaluate_pairwise
+from matching.match import Match
+from matching.observer import describe_rule
+from matching.parallel import can_score_in_worker, score_in_parallel
+from matching.process import generate_score_matrix
+from matching.rules.compiler import compile_rules
+from matching.rules.expression import Expression
+
+EXPRESSIONS = [
+    "mentor.grade - mentee.grade <= 2 and mentor.profession == mentee.profession",
+    "mentor.organisation != mentee.organisation",
+    "mentor.profession in ['Policy', 'Digital'] or not mentee.organisation != 'Department A'",
+    "mentee.profession not in ('Finance',)",
+    "1 <= mentor.grade - mentee.grade < 3",
+    "mentee.grade in [1, 2] or -mentee.grade > -1",
+    "mentor.connections == 0 and True",
+]
+
+
+class TestExpression:
+    @pytest.mark.parametrize("source", EXPRESSIONS)
+    def test_vectorised_matches_pairwise(self, varied_cohort, source):
+        mentors, mentees = varied_cohort()
+        mentors[0].mentees.append(mentees[0])
+        mentees[0].mentors.append(mentors[0])
+        expression = Expression(source)
+        cohort = CohortColumns(mentors, mentees)
+        outcome = expression.evaluate_array(cohort.mentors, cohort.mentees)
+        assert outcome.shape == (len(mentors), len(mentees))
+        assert np.array_equal(
+            outcome,
+            evaluate_pairwise(expression.evaluate, cohort.mentors, cohort.mentees),
+        )
+
+    def test_matches_the_rule_it_replaces(self, varied_cohort):
+        mentors, mentees = varied_cohort()
+        expected = generate_score_matrix(
+            mentors, mentees, [rl.Disqualify(rl.Grade(2, operator.gt).evaluate)]
+        )
+        actual = generate_score_matrix(
+            mentors,
+            mentees,
+            [rl.Disqualify(Expression("mentor.grade - mentee.grade > 2").evaluate)],
+        )
+        assert np.array_equal(expected.disallowed, actual.disallowed)
+
+    @pytest.mark.parametrize(
+        "source",
+        [
+            "mentor.grade",
+            "mentor.grade ==",
+            "mentor.profession > 'Policy'",
+            "mentor.profession == mentee.organisation",
+            "mentor.profession == 3",
+            "participant.grade == 1",
+            "mentor.__class__ == 1",
+            "len(mentor.connections) == 0",
+            "mentor.grade * 2 > 1",
+            "mentor.grade in mentee.grade",
+            "[mentor.grade] == 1",
+        ],
+    )
+    def test_mistakes_are_reported_straight_away(self, source):
+        with pytest.raises(ValueError):
+            Expression(source)
+
+    def test_wrapping_rules_are_vectorised_and_picklable(self, varied_cohort):
+        rule = rl.Generic(
+            {True: 3, False: 0}, Expression("mentor.profession == 'Policy'").evaluate
+        )
+        assert rule.vectorised and can_score_in_worker(rule)
+        copy = pickle.loads(pickle.dumps(rule))
+        assert copy.wrapped_rule.source == "mentor.profession == 'Policy'"
+        mentors, mentees = varied_cohort()
+        assert np.array_equal(
+            score_in_parallel(mentors, mentees, [rule], 2).scores,
+            generate_score_matrix(mentors, mentees, [rule]).scores,
+        )
+
+    def test_fingerprint(self):
+        assert (
+            Expression("mentor.grade>mentee.grade").fingerprint()
+            == Expression("mentor.grade > mentee.grade").fingerprint()
+        )
+        assert Expression("mentor.grade > mentee.grade").fingerprint().columns == (
+            "grade",
+        )
+        assert rl.Disqualify(Expression("mentor.grade > 1").evaluate).fingerprint()
+
+    def test_state_dependent_only_if_it_reads_connections(self):
+        assert not rl.Generic(
+            None, Expression("mentor.grade > 1").evaluate
+        ).state_dependent
+        assert rl.Generic(
+            None, Expression("mentor.connections > 1").evaluate
+        ).state_dependent
+
+    def test_compiled(self, varied_cohort):
+        mentors, mentees = varied_cohort()
+        rules = [
+            rl.Disqualify(Expression("mentor.grade <= mentee.grade").evaluate),
+            rl.Generic({True: 4, False: 1}, Expression(EXPRESSIONS[0]).evaluate),
+        ]
+        compiled = compile_rules(rules)
+        assert not compiled.fallbacks
+        for mentor in mentors:
+            for mentee in mentees:
+                expected = Match(mentor, mentee, rules).calculate_match()
+                actual = compiled.match(mentor, mentee)
+                assert actual.disallowed is expected.disallowed
+                assert actual.score == expected.score
+
+    def test_described(self):
+        rule = rl.Disqualify(Expression("mentor.grade > 1").evaluate)
+        assert describe_rule(rule) == "Disqualify(Expression('mentor.grade > 1'))"
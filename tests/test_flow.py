@@ -0,0 +1,173 @@
+import itertools
+import operator
+import random
+
+import numpy as np
+import pytest
+
+import matching.rules.rule as rl
+from matching.flow import CapacitySolver
+from matching.observer import Profiler
+from matching.process import generate_score_matrix, process_data
+from matching.solvers import JonkerVolgenantSolver
+
+
+def _cost(costs, mentor_capacity, assignment):
+    """The cost of an assignment, with each mentor's pairs put in their cheapest rows"""
+    total = 0.0
+    for mentor, capacity in enumerate(mentor_capacity):
+        mentees = [mentee for row, mentee in assignment if row == mentor]
+        if len(costs) == 1:
+            total += sum(costs[0][mentor, mentee] for mentee in mentees)
+        else:
+            total += min(
+                sum(costs[slot][mentor, mentee] for slot, mentee in zip(slots, mentees))
+                for slots in itertools.permutations(
+                    range(min(capacity, len(costs))), len(mentees)
+                )
+            )
+    return total
+
+
+def _brute_force(costs, mentor_capacity, mentee_capacity):
+    mentor_count, mentee_count = costs[0].shape
+    pairs = list(itertools.product(range(mentor_count), range(mentee_count)))
+    best = (0, 0.0)
+    for size in range(1, len(pairs) + 1):
+        for chosen in itertools.combinations(pairs, size):
+            mentor_limits = (
+                mentor_capacity
+                if len(costs) == 1
+                else np.minimum(mentor_capacity, len(costs))
+            )
+            if any(
+                sum(row == mentor for row, _ in chosen) > limit
+                for mentor, limit in enumerate(mentor_limits)
+            ) or any(
+                sum(column == mentee for _, column in chosen) > limit
+                for mentee, limit in enumerate(mentee_capacity)
+            ):
+                continue
+            cost = _cost(costs, mentor_capacity, chosen)
+            if np.isfinite(cost) and (size, -cost) > (best[0], -best[1]):
+                best = (size, cost)
+    return best
+
+
+class TestCapacitySolver:
+    @pytest.mark.parametrize("rounds", [1, 2, 3])
+    def test_matches_brute_force(self, rounds):
+        generator = random.Random(rounds)
+        for _ in range(60):
+            shape = generator.randint(1, 3), generator.randint(1, 3)
+            costs = [
+                np.array(
+                    [
+                        [
+                            generator.choice([np.inf, 0, 1, 2, 3, 5, 8])
+                            for _ in range(shape[1])
+                        ]
+                        for _ in range(shape[0])
+                    ]
+                )
+                for _ in range(rounds)
+            ]
+            mentor_capacity = [generator.randint(0, 3) for _ in range(shape[0])]
+            mentee_capacity = [generator.randint(0, 3) for _ in range(shape[1])]
+            assignment = CapacitySolver().solve(
+                costs, np.array(mentor_capacity), np.array(mentee_capacity)
+            )
+            assert len(set(assignment)) == len(assignment)
+            assert (
+                len(assignment),
+                _cost(costs, mentor_capacity, assignment),
+            ) == _brute_force(costs, mentor_capacity, mentee_capacity)
+
+    def test_capacity_of_one_is_an_assignment(self):
+        costs = np.random.default_rng(0).integers(0, 20, (30, 35)).astype(float)
+        solver = CapacitySolver()
+        assignment = solver.solve([costs], np.ones(30), np.ones(35))
+        expected = JonkerVolgenantSolver().solve(costs)
+        assert sum(costs[pair] for pair in assignment) == sum(
+            costs[pair] for pair in expected
+        )
+        assert solver.iterations > 0
+
+    def test_nothing_to_solve(self):
+        assert CapacitySolver().solve([np.full((2, 2), np.inf)], [1, 1], [1, 1]) == []
+        assert CapacitySolver().solve([np.zeros((2, 0))], [1, 1], []) == []
+
+
+class TestCapacityMatching:
+    rules = [
+        rl.Disqualify(rl.Grade(2, operator.gt).evaluate),
+        rl.Disqualify(rl.Equivalent("organisation").evaluate),
+        rl.Equivalent("profession", {True: 4, False: 0}),
+        rl.Grade(1, operator.eq, {True: 6, False: 0}),
+    ]
+
+    def test_one_solve_respects_every_limit(self, varied_cohort):
+        mentors, mentees = varied_cohort()
+        mentors[0].capacity = 1
+        allowed = ~generate_score_matrix(mentors, mentees, self.rules).disallowed
+        profiler = Profiler()
+        process_data(
+            mentors,
+            mentees,
+            [self.rules] * 3,
+            capacity_matching=True,
+            observer=profiler,
+        )
+        assert len(mentors[0].mentees) <= 1
+        assert all(len(person.connections) <= 3 for person in mentors + mentees)
+        for i, mentor in enumerate(mentors):
+            assert len(set(mentor.mentees)) == len(mentor.mentees)
+            for mentee in mentor.mentees:
+                assert mentor in mentee.mentors
+                assert allowed[i, mentees.index(mentee)]
+        assert [round_["solver"] for round_ in profiler.rounds] == ["capacity"]
+        assert profiler.rounds[0]["matched"] == sum(len(m.mentees) for m in mentors)
+
+    def test_makes_at_least_as_many_pairs_as_rounds(self, varied_cohort):
+        by_rounds, _ = process_data(
+            *varied_cohort(), [self.rules] * 3, solver="jonker-volgenant"
+        )
+        at_once, _ = process_data(
+            *varied_cohort(), [self.rules] * 3, capacity_matching=True
+        )
+        assert sum(len(mentor.mentees) for mentor in at_once) >= sum(
+            len(mentor.mentees) for mentor in by_rounds
+        )
+
+    def test_rounds_limit_connections(self, varied_cohort):
+        mentors, mentees = varied_cohort()
+        process_data(mentors, mentees, [self.rules], capacity_matching=True)
+        assert max(len(person.connections) for person in mentors + mentees) == 1
+
+    def test_round_specific_rules(self, varied_cohort):
+        generous = [rl.Generic({True: 1, False: 1}, lambda match: True)]
+        mentors, mentees = varied_cohort()
+        process_data(
+            mentors,
+            mentees,
+            [self.rules, generous],
+            scoring="vectorised",
+            capacity_matching=True,
+        )
+        assert any(len(mentor.mentees) == 2 for mentor in mentors)
+        strict = generate_score_matrix(*varied_cohort(), self.rules).disallowed
+        for i, mentor in enumerate(mentors):
+            # at most one of each mentor's connections can be one the strict rules disallow
+            assert (
+                sum(strict[i, mentees.index(mentee)] for mentee in mentor.mentees) <= 1
+            )
+
+    @pytest.mark.parametrize(
+        "options",
+        [{"scoring": "sparse"}, {"scoring": "incremental"}, {"blocking": True}],
+    )
+    def test_unsupported_options(self, varied_cohort, options):
+        with pytest.raises(ValueError):
+            process_data(
+                *varied_cohort(), [self.rules], capacity_matching=True, **options
+            )
@@ -0,0 +1,87 @@
+import operator
+
+import pytest
+
+import matching.rules.rule as rl
+from matching.incremental import IncrementalScorer
+from matching.process import generate_score_matrix, process_data
+
+
+class CountingEquivalent(rl.Equivalent):
+    def __init__(self, *args, **kwargs):
+        super(CountingEquivalent, self).__init__(*args, **kwargs)
+        self.evaluations = 0
+
+    def evaluate_array(self, mentors, mentees):
+        self.evaluations += 1
+        return super(CountingEquivalent, self).evaluate_array(mentors, mentees)
+
+
+class TestIncremental:
+    rules = [
+        rl.Disqualify(rl.Grade(3, operator.gt).evaluate),
+        rl.Equivalent("profession", {True: 4, False: 0}),
+        rl.Generic(
+            {True: 2, False: 0},
+            lambda match: len(match.mentor.mentees) < len(match.mentee.mentors),
+        ),
+        rl.UnmatchedBonus(5),
+    ]
+
+    @pytest.mark.parametrize(
+        ["rule", "state_dependent"],
+        [
+            (rl.Grade(1, operator.gt), False),
+            (rl.Equivalent("organisation"), False),
+            (rl.Disqualify(rl.Grade(1, operator.gt).evaluate), False),
+            (rl.UnmatchedBonus(3), True),
+            (rl.Disqualify(rl.UnmatchedBonus(3).evaluate), True),
+            (rl.Generic({True: 1}, lambda match: True), True),
+        ],
+    )
+    def test_rules_declare_whether_they_depend_on_state(self, rule, state_dependent):
+        assert rule.state_dependent is state_dependent
+
+    def test_scores_are_identical_to_a_full_rescore(self, varied_cohort):
+        mentors, mentees = varied_cohort()
+        scorer = IncrementalScorer(mentors, mentees)
+        rounds = [self.rules, self.rules[:2], self.rules]
+        for round_number, rules in enumerate(rounds):
+            incremental = scorer.score(rules)
+            full = generate_score_matrix(mentors, mentees, rules)
+            assert (incremental.scores == full.scores).all()
+            assert (incremental.disallowed == full.disallowed).all()
+            for i in range(round_number, len(mentors), 4):
+                mentors[i].mentees.append(mentees[i])
+                mentees[i].mentors.append(mentors[i])
+                scorer.record_match(i, i)
+
+    def test_static_rules_are_only_evaluated_once(self, varied_cohort):
+        mentors, mentees = varied_cohort()
+        rule = CountingEquivalent("organisation", {True: 0, False: 3})
+        scorer = IncrementalScorer(mentors, mentees)
+        for i in range(3):
+            scorer.score([rule, rl.UnmatchedBonus(2)])
+            mentors[i].mentees.append(mentees[i])
+            scorer.record_match(i, i)
+        assert rule.evaluations == 1
+
+    def test_only_changed_rows_and_columns_are_rescored(self, varied_cohort):
+        mentors, mentees = varied_cohort()
+        scorer = IncrementalScorer(mentors, mentees)
+        rule = rl.UnmatchedBonus(2)
+        scorer.score([rule])
+        mentors[0].mentees.append(mentees[1])
+        scorer.record_match(0, 1)
+        scorer.score([rule])
+        # the rule and the built-in "previously matched" rule each rescore one row and one column
+        assert (scorer.rescored_rows, scorer.rescored_columns) == (2, 2)
+
+    def test_incremental_scoring_makes_the_same_assignments(self, varied_cohort):
+        def _assignments(scoring):
+            mentors, mentees = process_data(
+                *varied_cohort(), [self.rules] * 3, scoring=scoring
+            )
+            return [[mentee.email for mentee in mentor.mentees] for mentor in mentors]
+
+        assert _assignments("incremental") == _assignments("vectorised")
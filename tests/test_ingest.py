@@ -0,0 +1,132 @@
+import csv
+import operator
+
+import numpy as np
+import pytest
+
+import matching.rules.rule as rl
+from matching.ingest import (
+    ParticipantTable,
+    iter_tables,
+    load_cohort_columns,
+    load_participants,
+    read_table,
+)
+from matching.mentee import Mentee
+from matching.mentor import Mentor
+from matching.process import generate_score_matrix
+
+
+def write_rows(path, rows):
+    with open(path, "w", newline="") as file:
+        csv.writer(file).writerows(rows)
+    return path
+
+
+@pytest.fixture
+def cohort_path(tmp_path, varied_cohort):
+    mentors, mentees = varied_cohort()
+    for participants, role in ((mentors, "mentor"), (mentees, "mentee")):
+        header = ["first name", "last name", "email", "role", "organisation"]
+        write_rows(
+            tmp_path / f"{role}s.csv",
+            [header + ["grade", "profession"]]
+            + [
+                [
+                    participant.__getattribute__(name.replace(" ", "_"))
+                    for name in header
+                ]
+                + [participant.grade, participant.profession]
+                for participant in participants
+            ],
+        )
+    return tmp_path, mentors, mentees
+
+
+class TestIngest:
+    @pytest.mark.parametrize("use_mmap", [False, True])
+    @pytest.mark.parametrize("chunk_size", [1, 7, 10000])
+    def test_table_holds_every_row(self, cohort_path, chunk_size, use_mmap):
+        path, mentors, _ = cohort_path
+        table = read_table(path / "mentors.csv", chunk_size, use_mmap=use_mmap)
+        with open(path / "mentors.csv", newline="") as file:
+            expected = [
+                {**row, "grade": int(row["grade"])} for row in csv.DictReader(file)
+            ]
+        assert list(table.rows()) == expected
+        assert table.integers["grade"].dtype == np.int64
+        assert set(table.categories["organisation"]) == {
+            mentor.organisation for mentor in mentors
+        }
+
+    def test_chunks(self, cohort_path):
+        path, mentors, _ = cohort_path
+        chunks = list(iter_tables(path / "mentors.csv", chunk_size=8))
+        assert [len(chunk) for chunk in chunks] == [8, 8, 8, 6]
+        assert len(ParticipantTable.concatenate(chunks)) == len(mentors)
+
+    def test_participants_match_the_csv_reader(self, cohort_path):
+        path, mentors, _ = cohort_path
+        loaded = load_participants(Mentor, path / "mentors.csv", chunk_size=4)
+        assert [mentor.core_to_dict() for mentor in loaded] == [
+            mentor.core_to_dict() for mentor in mentors
+        ]
+
+    def test_mapping_function_sees_strings(self, known_file, tmp_path):
+        known_file(tmp_path, "mentee", 5)
+        seen = []
+
+        def _mapping(row, role):
+            seen.append((row["grade"], role))
+            return {**row, "grade": 3}
+
+        mentees = load_participants(Mentee, tmp_path / "mentees.csv", _mapping)
+        assert seen == [("0", "mentee")] * 5
+        assert {mentee.grade for mentee in mentees} == {3}
+
+    def test_columns_score_like_participants(self, cohort_path):
+        path, mentors, mentees = cohort_path
+        rules = [
+            rl.Disqualify(rl.Grade(3, operator.gt).evaluate),
+            rl.Equivalent("profession", {True: 4, False: 1}),
+            rl.Disqualify(rl.Equivalent("organisation").evaluate),
+            rl.UnmatchedBonus(6),
+        ]
+        expected = generate_score_matrix(mentors, mentees, rules)
+        actual = load_cohort_columns(path).score(rules)
+        assert (actual.scores == expected.scores).all()
+        assert (actual.disallowed == expected.disallowed).all()
+
+    def test_empty_file(self, tmp_path):
+        (tmp_path / "mentors.csv").write_text("")
+        assert read_table(tmp_path / "mentors.csv") is None
+        assert load_participants(Mentor, tmp_path / "mentors.csv") == []
+
+    @pytest.mark.parametrize(
+        ["rows", "message"],
+        [
+            ([["email", "role"], ["a@b.com", "x"]], "missing required columns: grade"),
+            ([["grade", "grade"], ["1", "2"]], "duplicate columns: grade"),
+            ([["email", "grade"], ["a@b.com", "1"], ["b@b.com"]], "Row 2 .* 1 fields"),
+            ([["email", "grade"], ["a@b.com", "1"], ["b@b.com", "G7"]], "Row 2 .*'G7'"),
+        ],
+    )
+    def test_invalid_files(self, tmp_path, rows, message):
+        path = write_rows(tmp_path / "mentors.csv", rows)
+        with pytest.raises(ValueError, match=message):
+            read_table(path)
+
+    def test_blank_lines_are_skipped(self, tmp_path):
+        path = tmp_path / "mentors.csv"
+        path.write_text("email,grade\na@b.com,1\n\nb@b.com,2\n")
+        assert read_table(path).integers["grade"].tolist() == [1, 2]
+
+    def test_deprecated_columns_warn_once(self, tmp_path):
+        path = write_rows(
+            tmp_path / "mentors.csv",
+            [["email", "grade", "current profession"]]
+            + [[f"{i}@b.com", "1", "Policy"] for i in range(5)],
+        )
+        with pytest.warns(DeprecationWarning) as record:
+            read_table(path)
+        assert len(record) == 1
@@ -0,0 +1,159 @@
+import time
+
+import pytest
+
+from matching.jobs import JobService, JobStore, QueueFull, memory_budget, run_job
+from matching.process import process_data
+from matching.rules.spec import rules_from_spec
+
+RULES = {
+    "rounds": 2,
+    "rules": [
+        {"type": "disqualify", "condition": "mentor.grade <= mentee.grade"},
+        {"type": "equivalent", "attribute": "profession", "scores": {"true": 4}},
+        {"type": "unmatched_bonus", "bonus": 6},
+    ],
+}
+
+
+def _pairs(mentors):
+    return sorted(
+        (mentor.email, mentee.email) for mentor in mentors for mentee in mentor.mentees
+    )
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = JobService(tmp_path / "jobs", workers=1, poll_interval=0.01)
+    yield service
+    service.close()
+
+
+class TestJobService:
+    def test_runs_a_job(self, service, varied_cohort):
+        mentors, mentees = varied_cohort(mentor_count=12, mentee_count=15)
+        service.start()
+        job_id = service.submit(mentors, mentees, RULES, scoring="vectorised")
+        status = service.wait(job_id, timeout=60)
+        assert status.state == "finished", status.error
+        assert status.progress == {"round": 2, "rounds": 2, "stage": "assign"}
+        assert status.started <= status.finished
+        matched_mentors, matched_mentees = service.result(job_id)
+        assert [mentor.email for mentor in matched_mentors] == [
+            mentor.email for mentor in mentors
+        ]
+        assert len(matched_mentees) == len(mentees)
+        process_data(mentors, mentees, rules_from_spec(RULES), scoring="vectorised")
+        assert _pairs(matched_mentors) == _pairs(mentors)
+        assert _pairs(matched_mentors)
+        # nothing was matched in the caller's cohort
+        assert matched_mentors[0] is not mentors[0]
+
+    def test_runs_no_more_jobs_than_workers(self, service, varied_cohort):
+        service.start()
+        job_ids = [
+            service.submit(*varied_cohort(mentor_count=5, mentee_count=5), RULES)
+            for _ in range(3)
+        ]
+        statuses = [service.wait(job_id, timeout=60) for job_id in job_ids]
+        assert all(status.state == "finished" for status in statuses)
+        for earlier, later in zip(statuses, statuses[1:]):
+            assert earlier.finished <= later.started
+
+    def test_mistakes_are_reported_when_submitting(self, service, varied_cohort):
+        mentors, mentees = varied_cohort(mentor_count=2, mentee_count=2)
+        with pytest.raises(ValueError):
+            service.submit(mentors, mentees, {"rules": [{"type": "guess"}]})
+        with pytest.raises(ValueError):
+            service.submit(mentors, mentees, RULES, workers=4)
+
+    def test_failures_are_recorded(self, service, varied_cohort):
+        service.start()
+        job_id = service.submit(
+            *varied_cohort(mentor_count=2, mentee_count=2), RULES, scoring="quantum"
+        )
+        status = service.wait(job_id, timeout=60)
+        assert status.state == "failed"
+        assert "Unknown scoring engine" in status.error
+        with pytest.raises(ValueError):
+            service.result(job_id)
+
+    def test_cancelling_a_queued_job(self, service, varied_cohort):
+        job_id = service.submit(*varied_cohort(mentor_count=2, mentee_count=2), RULES)
+        assert service.cancel(job_id) == "cancelled"
+        service.start()
+        other = service.submit(*varied_cohort(mentor_count=2, mentee_count=2), RULES)
+        service.wait(other, timeout=60)
+        assert service.status(job_id).state == "cancelled"
+        assert service.status(job_id).started is None
+
+    def test_queue_limit(self, tmp_path, varied_cohort):
+        service = JobService(tmp_path, max_queued=1)
+        service.submit(*varied_cohort(mentor_count=2, mentee_count=2), RULES)
+        with pytest.raises(QueueFull):
+            service.submit(*varied_cohort(mentor_count=2, mentee_count=2), RULES)
+        service.close()
+
+    def test_interrupted_jobs_are_run_again(self, tmp_path, varied_cohort):
+        first = JobService(tmp_path)
+        job_id = first.submit(*varied_cohort(mentor_count=4, mentee_count=4), RULES)
+        # claimed by a service that then died without running it
+        assert first.store.claim() == job_id
+        first.close()
+        with JobService(tmp_path, poll_interval=0.01) as second:
+            assert second.wait(job_id, timeout=60).state == "finished"
+
+    def test_jobs_another_service_is_running_are_left_alone(
+        self, tmp_path, varied_cohort
+    ):
+        first = JobService(tmp_path)
+        job_id = first.submit(*varied_cohort(mentor_count=4, mentee_count=4), RULES)
+        first.store.beat(first.service_id)
+        assert first.store.claim(first.service_id) == job_id
+        with JobService(tmp_path, poll_interval=0.01, stale_after=1) as second:
+            time.sleep(0.1)
+            assert second.status(job_id).state == "running"
+            # once the first service has gone quiet, its job is taken over
+            assert second.wait(job_id, timeout=60).state == "finished"
+        first.close()
+
+    def test_unknown_job(self, service):
+        with pytest.raises(ValueError):
+            service.status("nothing")
+
+    def test_memory_budget(self, tmp_path, varied_cohort):
+        pytest.importorskip("resource")
+        with JobService(tmp_path, memory_limit=1, poll_interval=0.01) as service:
+            job_id = service.submit(
+                *varied_cohort(mentor_count=4, mentee_count=4), RULES
+            )
+            status = service.wait(job_id, timeout=60)
+            assert status.state == "failed"
+            assert "memory" in status.error
+            service.memory_limit = None
+            job_id = service.submit(
+                *varied_cohort(mentor_count=4, mentee_count=4), RULES
+            )
+            assert service.wait(job_id, timeout=60).state == "finished"
+
+
+class TestRunJob:
+    def test_a_running_job_can_be_cancelled(self, tmp_path, varied_cohort):
+        service = JobService(tmp_path)
+        job_id = service.submit(*varied_cohort(mentor_count=4, mentee_count=4), RULES)
+        store = JobStore(tmp_path)
+        assert store.claim() == job_id
+        assert store.cancel(job_id) == "running"
+        assert run_job(tmp_path, job_id) == "cancelled"
+        assert store.status(job_id).state == "cancelled"
+        assert not store.job_folder(job_id).joinpath("result.bin").exists()
+        store.close()
+        service.close()
+
+    def test_memory_budget_is_lifted_afterwards(self):
+        resource = pytest.importorskip("resource")
+        before = resource.getrlimit(resource.RLIMIT_AS)
+        with pytest.raises(MemoryError):
+            with memory_budget(1):
+                bytearray(64 * 1024 * 1024)
+        assert resource.getrlimit(resource.RLIMIT_AS) == before
@@ -0,0 +1,285 @@
+import asyncio
+import email
+import smtplib
+import time
+from typing import Dict, List
+
+import pytest
+
+from matching import mail
+from matching.mail import (
+    Email,
+    FileClient,
+    RateLimiter,
+    SendError,
+    SMTPClient,
+    send_all,
+)
+
+
+def _emails(count):
+    return (
+        Email(f"person{i}@example.com", "Your matches", f"Hello {i}")
+        for i in range(count)
+    )
+
+
+class RecordingClient:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.batches = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    async def send_batch(self, emails):
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        await asyncio.sleep(self.latency)
+        self.in_flight -= 1
+        self.batches.append(list(emails))
+
+
+class FlakyClient(RecordingClient):
+    """Fails each batch ``failures`` times before sending it"""
+
+    def __init__(self, failures, error):
+        super(FlakyClient, self).__init__()
+        self.failures = failures
+        self.error = error
+        self.attempts = {}
+
+    async def send_batch(self, emails):
+        key = emails[0].to
+        self.attempts[key] = self.attempts.get(key, 0) + 1
+        if self.attempts[key] <= self.failures:
+            raise self.error
+        await super(FlakyClient, self).send_batch(emails)
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(mail.random, "uniform", lambda low, high: 1.0)
+
+
+class TestSendAll:
+    def test_sends_in_batches(self):
+        client = RecordingClient()
+        report = asyncio.run(send_all(_emails(23), client, batch_size=10))
+        assert report.sent == 23
+        assert not report.failed
+        assert sorted(len(batch) for batch in client.batches) == [3, 10, 10]
+        assert {message.to for batch in client.batches for message in batch} == {
+            f"person{i}@example.com" for i in range(23)
+        }
+
+    def test_sends_no_more_than_concurrency_batches_at_once(self):
+        client = RecordingClient(latency=0.01)
+        report = asyncio.run(
+            send_all(_emails(100), client, batch_size=5, concurrency=3)
+        )
+        assert report.sent == 100
+        assert client.most_in_flight == 3
+
+    @pytest.mark.parametrize(
+        "error", [SendError("busy"), ConnectionError("reset"), asyncio.TimeoutError()]
+    )
+    def test_retries_temporary_errors(self, error):
+        client = FlakyClient(failures=2, error=error)
+        report = asyncio.run(send_all(_emails(10), client, batch_size=5, backoff=0.001))
+        assert report.sent == 10
+        assert report.retries == 4
+        assert not report.failed
+
+    def test_backs_off_exponentially(self, monkeypatch):
+        delays = []
+        sleep = asyncio.sleep
+
+        async def record(delay):
+            if delay:
+                delays.append(delay)
+            await sleep(0)
+
+        monkeypatch.setattr(mail.asyncio, "sleep", record)
+        client = FlakyClient(failures=3, error=SendError("busy"))
+        asyncio.run(send_all(_emails(1), client, backoff=0.5))
+        assert delays == [0.5, 1.0, 2.0]
+
+    def test_waits_as_long_as_the_client_asks(self, monkeypatch):
+        delays = []
+        sleep = asyncio.sleep
+
+        async def record(delay):
+            if delay:
+                delays.append(delay)
+            await sleep(0)
+
+        monkeypatch.setattr(mail.asyncio, "sleep", record)
+        client = FlakyClient(failures=1, error=SendError("slow down", retry_after=30))
+        asyncio.run(send_all(_emails(1), client, backoff=0.5))
+        assert delays == [30]
+
+    def test_gives_up_after_max_attempts(self):
+        client = FlakyClient(failures=10, error=SendError("busy"))
+        report = asyncio.run(
+            send_all(_emails(4), client, batch_size=2, max_attempts=3, backoff=0.001)
+        )
+        assert report.sent == 0
+        assert report.retries == 4
+        assert sorted(to for to, _ in report.failed) == [
+            f"person{i}@example.com" for i in range(4)
+        ]
+
+    @pytest.mark.parametrize(
+        "error", [SendError("no such mailbox", temporary=False), ValueError("bad")]
+    )
+    def test_permanent_errors_are_recorded_and_not_retried(self, error):
+        client = FlakyClient(failures=1, error=error)
+        report = asyncio.run(send_all(_emails(6), client, batch_size=3))
+        assert report.retries == 0
+        assert report.sent == 0
+        assert len(report.failed) == 6
+        assert report.failed[0][1] == str(error)
+
+    def test_only_resends_what_wasnt_sent(self):
+        class PartialClient(RecordingClient):
+            failed = False
+
+            async def send_batch(self, emails):
+                if not self.failed:
+                    self.failed = True
+                    await super(PartialClient, self).send_batch(emails[:2])
+                    raise SendError("dropped", unsent=emails[2:])
+                await super(PartialClient, self).send_batch(emails)
+
+        client = PartialClient()
+        report = asyncio.run(send_all(_emails(5), client, backoff=0.001))
+        assert report.sent == 5
+        assert sorted(
+            message.to for batch in client.batches for message in batch
+        ) == sorted(message.to for message in _emails(5))
+
+    def test_rate_limit(self):
+        client = RecordingClient()
+        start = time.monotonic()
+        report = asyncio.run(
+            send_all(_emails(30), client, batch_size=5, emails_per_second=20)
+        )
+        # a second's worth are sent straight away, and the other 10 take half a second
+        assert report.sent == 30
+        assert 0.4 < time.monotonic() - start < 1.5
+
+    def test_rejects_nonsense(self):
+        with pytest.raises(ValueError):
+            asyncio.run(send_all(_emails(1), RecordingClient(), batch_size=0))
+
+
+class TestRateLimiter:
+    def test_holds_the_rate(self):
+        async def run():
+            limiter = RateLimiter(rate=200, burst=10)
+            start = time.monotonic()
+            for _ in range(30):
+                await limiter.acquire(2)
+            return time.monotonic() - start
+
+        # 10 are let through straight away, and the other 50 take a quarter of a second
+        assert 0.2 < asyncio.run(run()) < 1
+
+    def test_rejects_a_rate_that_isnt_positive(self):
+        with pytest.raises(ValueError):
+            RateLimiter(0)
+
+
+class TestFileClient:
+    def test_writes_each_email(self, tmp_path):
+        client = FileClient(tmp_path / "outbox", sender="scheme@example.com")
+        report = asyncio.run(send_all(_emails(3), client))
+        assert report.sent == 3
+        files = sorted((tmp_path / "outbox").iterdir())
+        assert [file.name for file in files] == [
+            f"person{i}@example.com.eml" for i in range(3)
+        ]
+        message = email.message_from_bytes(files[1].read_bytes())
+        assert message["To"] == "person1@example.com"
+        assert message["From"] == "scheme@example.com"
+        assert message["Subject"] == "Your matches"
+        assert message.get_payload().strip() == "Hello 1"
+
+
+class FakeSMTP:
+    """Stands in for `smtplib.SMTP`, refusing the emails in ``refusals`` with the given error"""
+
+    refusals: Dict[str, Exception] = {}
+    sent: List[str] = []
+
+    def __init__(self, host, port, timeout):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def send_message(self, message):
+        error = self.refusals.get(message["To"])
+        if error is not None:
+            raise error
+        self.sent.append(message["To"])
+
+
+class TestSMTPClient:
+    @pytest.fixture
+    def server(self, monkeypatch):
+        monkeypatch.setattr(FakeSMTP, "refusals", {})
+        monkeypatch.setattr(FakeSMTP, "sent", [])
+        monkeypatch.setattr(mail.smtplib, "SMTP", FakeSMTP)
+        return FakeSMTP
+
+    @pytest.mark.parametrize(
+        "error",
+        [
+            smtplib.SMTPRecipientsRefused(
+                {"person3@example.com": (550, b"no such mailbox")}
+            ),
+            smtplib.SMTPDataError(554, b"rejected"),
+            smtplib.SMTPSenderRefused(553, b"not allowed", "mentoring@localhost"),
+        ],
+    )
+    def test_a_refused_email_doesnt_fail_the_rest_of_the_batch(self, server, error):
+        server.refusals["person3@example.com"] = error
+        report = asyncio.run(send_all(_emails(9), SMTPClient(), batch_size=9))
+        assert report.sent == 8
+        assert report.retries == 0
+        assert [to for to, _ in report.failed] == ["person3@example.com"]
+        assert len(server.sent) == 8
+
+    @pytest.mark.parametrize(
+        "error",
+        [
+            smtplib.SMTPDataError(451, b"try again later"),
+            smtplib.SMTPRecipientsRefused(
+                {"person3@example.com": (450, b"mailbox busy")}
+            ),
+        ],
+    )
+    def test_a_temporary_error_only_retries_what_wasnt_dealt_with(self, server, error):
+        server.refusals["person1@example.com"] = smtplib.SMTPRecipientsRefused(
+            {"person1@example.com": (550, b"no such mailbox")}
+        )
+        server.refusals["person3@example.com"] = error
+        client = SMTPClient()
+        original = client._send
+
+        def send_then_recover(emails):
+            try:
+                return original(emails)
+            finally:
+                server.refusals.pop("person3@example.com", None)
+
+        client._send = send_then_recover
+        report = asyncio.run(send_all(_emails(5), client, backoff=0.001))
+        assert report.sent == 4
+        assert report.retries == 1
+        assert [to for to, _ in report.failed] == ["person1@example.com"]
+        assert sorted(server.sent) == [f"person{i}@example.com" for i in (0, 2, 3, 4)]
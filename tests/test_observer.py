@@ -0,0 +1,123 @@
+import json
+import operator
+
+import pytest
+
+import matching.rules.rule as rl
+from matching.observer import Observer, Profiler, describe_rule
+from matching.process import process_data
+
+
+class TestObserver:
+    rules = [
+        rl.Disqualify(rl.Grade(2, operator.gt).evaluate),
+        rl.Disqualify(rl.Equivalent("organisation").evaluate),
+        rl.Equivalent("profession", {True: 4, False: 0}),
+        rl.Generic({True: 3, False: 0}, lambda match: match.mentee.grade < 3),
+        rl.UnmatchedBonus(6),
+    ]
+
+    def _assignments(self, mentors):
+        return [[mentee.email for mentee in mentor.mentees] for mentor in mentors]
+
+    @pytest.mark.parametrize("scoring", ["object", "vectorised", "incremental"])
+    def test_profiling_doesnt_change_the_matches(self, varied_cohort, scoring):
+        all_rules = [self.rules, self.rules]
+        expected, _ = process_data(*varied_cohort(), all_rules, scoring=scoring)
+        profiled, _ = process_data(
+            *varied_cohort(), all_rules, scoring=scoring, observer=Profiler()
+        )
+        assert self._assignments(profiled) == self._assignments(expected)
+
+    @pytest.mark.parametrize("scoring", ["object", "vectorised"])
+    def test_rounds_are_reported(self, varied_cohort, scoring):
+        profiler = Profiler()
+        mentors, mentees = varied_cohort()
+        process_data(
+            mentors, mentees, [self.rules, self.rules], scoring, observer=profiler
+        )
+        assert [round_["round"] for round_ in profiler.rounds] == [0, 1]
+        first_round = profiler.rounds[0]
+        assert set(first_round["stages"]) == {
+            "score",
+            "prepare_matrix",
+            "calculate_matches",
+            "assign",
+        }
+        assert first_round["pairs_scored"] == len(mentors) * len(mentees)
+        assert 0 < first_round["pairs_disqualified"] < first_round["pairs_scored"]
+        assert sum(round_["matched"] for round_ in profiler.rounds) == sum(
+            len(mentor.mentees) for mentor in mentors
+        )
+        assert first_round["solver"] == "munkres"
+
+    @pytest.mark.parametrize("scoring", ["object", "vectorised"])
+    def test_rules_are_counted(self, varied_cohort, scoring):
+        profiler = Profiler()
+        mentors, mentees = varied_cohort()
+        process_data(mentors, mentees, [self.rules], scoring, observer=profiler)
+        counters = {
+            counter.label: counter for counter in profiler.rule_counters.values()
+        }
+        grade = counters["Disqualify(Grade(2, gt))"]
+        assert grade.evaluations > 0 and grade.disqualified > 0
+        assert counters["Generic(<lambda>)"].evaluations > 0
+        if scoring == "vectorised":
+            assert grade.evaluations == len(mentors) * len(mentees)
+        else:
+            # disqualifying rules short-circuit, so later rules see fewer pairs
+            assert grade.evaluations > counters["Equivalent('profession')"].evaluations
+
+    def test_solver_iterations(self, varied_cohort):
+        profiler = Profiler(count_rules=False)
+        process_data(
+            *varied_cohort(), [self.rules], solver="jonker-volgenant", observer=profiler
+        )
+        assert profiler.rounds[0]["solver_iterations"] > 0
+        assert not profiler.rule_counters
+
+    def test_sparse_rounds(self, varied_cohort):
+        profiler = Profiler()
+        process_data(
+            *varied_cohort(), [self.rules], scoring="sparse", observer=profiler
+        )
+        assert profiler.rounds[0]["pairs_disqualified"] is None
+        assert profiler.rounds[0]["solver"] == "sparse"
+
+    def test_base_observer_is_silent(self, varied_cohort):
+        observer = Observer()
+        process_data(*varied_cohort(), [self.rules], observer=observer)
+        assert observer.rule_counter(self.rules[0]) is None
+
+    @pytest.mark.parametrize("trace_format", ["json", "chrome"])
+    def test_dump(self, varied_cohort, tmp_path, trace_format):
+        profiler = Profiler()
+        process_data(*varied_cohort(), [self.rules], observer=profiler)
+        profiler.dump(tmp_path / "profile.json", trace_format)
+        profile = json.loads((tmp_path / "profile.json").read_text())
+        if trace_format == "chrome":
+            stages = [event for event in profile["traceEvents"] if event["ph"] == "X"]
+            assert {event["name"] for event in stages} >= {"score", "assign"}
+            assert all(event["dur"] >= 0 for event in stages)
+        else:
+            assert len(profile["rounds"]) == 1
+            assert profile["rules"]
+
+    def test_unknown_format(self, tmp_path):
+        with pytest.raises(ValueError):
+            Profiler().dump(tmp_path / "profile.txt", "xml")
+
+    @pytest.mark.parametrize(
+        ["rule", "description"],
+        [
+            (rl.Grade(1, operator.eq), "Grade(1, eq)"),
+            (rl.Equivalent("profession"), "Equivalent('profession')"),
+            (rl.UnmatchedBonus(4), "UnmatchedBonus"),
+            (
+                rl.Disqualify(rl.Grade(2, operator.gt).evaluate),
+                "Disqualify(Grade(2, gt))",
+            ),
+        ],
+    )
+    def test_describe_rule(self, rule, description):
+        assert describe_rule(rule) == description
@@ -0,0 +1,57 @@
+import operator
+
+import pytest
+
+import matching.rules.rule as rl
+from matching.parallel import can_score_in_worker, score_in_parallel
+from matching.process import generate_score_matrix, process_data
+
+
+class TestParallel:
+    rules = [
+        rl.Disqualify(rl.Grade(3, operator.gt).evaluate),
+        rl.Equivalent("profession", {True: 4, False: 0}),
+        rl.Generic(
+            {True: 2, False: 0},
+            lambda match: match.mentee.organisation != match.mentor.organisation,
+        ),
+        rl.UnmatchedBonus(5),
+    ]
+
+    @pytest.mark.parametrize(
+        ["rule", "expected"],
+        [
+            (rl.Grade(1, operator.gt), True),
+            (rl.Grade(1, lambda difference, target: difference > target), False),
+            (rl.Disqualify(rl.Equivalent("organisation").evaluate), True),
+            (rl.Generic({True: 1}, lambda match: True), False),
+            (rl.UnmatchedBonus(3), True),
+        ],
+    )
+    def test_can_score_in_worker(self, rule, expected):
+        assert can_score_in_worker(rule) is expected
+
+    @pytest.mark.parametrize("workers", [2, 3])
+    def test_parallel_scores_match_serial_scores(self, varied_cohort, workers):
+        mentors, mentees = varied_cohort()
+        mentees[2].mentors.append(mentors[5])
+        parallel = score_in_parallel(mentors, mentees, self.rules, workers)
+        serial = generate_score_matrix(mentors, mentees, self.rules)
+        assert (parallel.scores == serial.scores).all()
+        assert (parallel.disallowed == serial.disallowed).all()
+
+    def test_parallel_scoring_makes_the_same_assignments(self, varied_cohort):
+        def _assignments(workers):
+            mentors, mentees = process_data(
+                *varied_cohort(),
+                [self.rules] * 2,
+                scoring="vectorised",
+                workers=workers,
+            )
+            return [[mentee.email for mentee in mentor.mentees] for mentor in mentors]
+
+        assert _assignments(2) == _assignments(1)
+
+    def test_workers_need_vectorised_scoring(self, varied_cohort):
+        with pytest.raises(ValueError):
+            process_data(*varied_cohort(), [self.rules], workers=2)
@@ -0,0 +1,152 @@
+import operator
+import random
+
+import numpy as np
+import pytest
+
+import matching.rules.rule as rl
+from matching.observer import Profiler
+from matching.partition import shards_by_attribute, shards_by_component, solve_shards
+from matching.process import generate_score_matrix, process_data
+from matching.sparse import CandidateGraph
+
+
+def _components(edges, mentor_count, mentee_count):
+    """Connected components by breadth-first search, as sets of ("mentor", i) and ("mentee", j) nodes"""
+    neighbours = {}
+    for mentor, mentee in edges:
+        neighbours.setdefault(("mentor", mentor), set()).add(("mentee", mentee))
+        neighbours.setdefault(("mentee", mentee), set()).add(("mentor", mentor))
+    seen, components = set(), []
+    for node in neighbours:
+        if node in seen:
+            continue
+        component, frontier = {node}, [node]
+        while frontier:
+            for other in neighbours[frontier.pop()]:
+                if other not in component:
+                    component.add(other)
+                    frontier.append(other)
+        seen |= component
+        components.append(frozenset(component))
+    return set(components)
+
+
+def _total_score(mentors, mentees, scores):
+    return sum(
+        scores[i, mentees.index(mentee)]
+        for i, mentor in enumerate(mentors)
+        for mentee in mentor.mentees
+    )
+
+
+class TestShards:
+    def test_shards_by_attribute(self, varied_cohort):
+        mentors, mentees = varied_cohort()
+        mentees[0].profession = "Only mentees"
+        shards = shards_by_attribute(mentors, mentees, "profession")
+        for mentor_indices, mentee_indices in shards:
+            professions = {mentors[i].profession for i in mentor_indices}
+            assert professions == {mentees[i].profession for i in mentee_indices}
+            assert len(professions) == 1
+        assert 0 not in np.concatenate([mentee for _, mentee in shards])
+        assert sum(len(mentor) for mentor, _ in shards) == len(mentors)
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_shards_by_component(self, seed):
+        generator = random.Random(seed)
+        mentor_count, mentee_count = generator.randint(1, 12), generator.randint(1, 12)
+        edges = sorted(
+            {
+                (generator.randrange(mentor_count), generator.randrange(mentee_count))
+                for _ in range(generator.randint(0, 15))
+            }
+        )
+        indptr = np.searchsorted(
+            [mentor for mentor, _ in edges], np.arange(mentor_count + 1)
+        )
+        graph = CandidateGraph(
+            (mentor_count, mentee_count),
+            indptr,
+            np.array([mentee for _, mentee in edges], dtype=np.int64),
+            np.ones(len(edges)),
+        )
+        shards = {
+            frozenset(
+                [("mentor", int(i)) for i in mentor_indices]
+                + [("mentee", int(j)) for j in mentee_indices]
+            )
+            for mentor_indices, mentee_indices in shards_by_component(graph)
+        }
+        assert shards == _components(edges, mentor_count, mentee_count)
+
+    def test_solve_shards_in_parallel(self):
+        generator = np.random.default_rng(0)
+        cost_matrices = [
+            generator.integers(0, 20, shape).astype(float)
+            for shape in [(3, 4), (8, 6), (1, 1)]
+        ]
+        assert solve_shards(
+            cost_matrices, "jonker-volgenant", workers=2
+        ) == solve_shards(cost_matrices, "jonker-volgenant")
+
+
+class TestPartitionedMatching:
+    rules = [
+        rl.Disqualify(rl.Grade(2, operator.gt).evaluate),
+        rl.Disqualify(rl.Equivalent("organisation").evaluate),
+        rl.Equivalent("profession", {True: 4, False: 0}),
+        rl.Grade(1, operator.eq, {True: 6, False: 1}),
+    ]
+
+    @pytest.mark.parametrize("partition_by", ["profession", "components"])
+    def test_rounds_respect_limits(self, varied_cohort, partition_by):
+        mentors, mentees = varied_cohort()
+        allowed = ~generate_score_matrix(mentors, mentees, self.rules).disallowed
+        profiler = Profiler()
+        process_data(
+            mentors,
+            mentees,
+            [self.rules] * 2,
+            solver="jonker-volgenant",
+            partition_by=partition_by,
+            observer=profiler,
+        )
+        assert all(len(person.connections) <= 2 for person in mentors + mentees)
+        for i, mentor in enumerate(mentors):
+            assert len(set(mentor.mentees)) == len(mentor.mentees)
+            for mentee in mentor.mentees:
+                assert mentor in mentee.mentors
+                assert allowed[i, mentees.index(mentee)]
+        assert len(profiler.rounds) == 2
+        assert all("partition" in round_["stages"] for round_ in profiler.rounds)
+        assert profiler.rounds[0]["solver"] == "jonker-volgenant"
+        assert profiler.rounds[0]["matched"] > 0
+
+    @pytest.mark.parametrize("partition_by", ["profession", "components"])
+    def test_separable_cohorts_lose_nothing(self, varied_cohort, partition_by):
+        rules = self.rules + [
+            rl.Disqualify(
+                lambda match: match.mentor.profession != match.mentee.profession
+            )
+        ]
+        scores = generate_score_matrix(*varied_cohort(), rules).masked_scores()
+        whole = process_data(*varied_cohort(), [rules], solver="jonker-volgenant")
+        sharded = process_data(
+            *varied_cohort(),
+            [rules],
+            solver="jonker-volgenant",
+            partition_by=partition_by,
+            workers=2,
+        )
+        assert _total_score(*sharded, scores) == _total_score(*whole, scores)
+
+    @pytest.mark.parametrize(
+        "options",
+        [{"scoring": "sparse"}, {"blocking": True}, {"capacity_matching": True}],
+    )
+    def test_unsupported_options(self, varied_cohort, options):
+        with pytest.raises(ValueError):
+            process_data(
+                *varied_cohort(), [self.rules], partition_by="profession", **options
+            )
@@ -58,3 +58,30 @@ class TestPerson:
         with pytest.deprecated_call():
             base_data[attribute] = "error"
             match_class(**base_data)
+
+    @pytest.mark.parametrize("participant_class", [Person, Mentor, Mentee])
+    def test_participants_have_no_instance_dict(self, base_data, participant_class):
+        assert not hasattr(participant_class(**base_data), "__dict__")
+
+    def test_subclasses_can_add_attributes(self, base_data):
+        class Apprentice(Mentee):
+            def __init__(self, **kwargs):
+                super(Apprentice, self).__init__(**kwargs)
+                self.scheme = kwargs.get("scheme")
+
+        assert Apprentice(scheme="Fast Stream", **base_data).scheme == "Fast Stream"
+
+    def test_shared_values_are_interned(self, base_data):
+        first = Person(**{**base_data, "organisation": "".join("Department of Fun")})
+        second = Person(**{**base_data, "organisation": "".join("Department of Fun")})
+        assert first.organisation is second.organisation
+
+    def test_participant_ids_are_unique(self, base_data):
+        people = [Person(**base_data) for _ in range(3)]
+        assert len({person.participant_id for person in people}) == 3
+
+    def test_hash_is_consistent_with_equality(self, base_data):
+        first, second = Mentor(**base_data), Mentee(**base_data)
+        assert first == second
+        assert hash(first) == hash(second)
+        assert len({first, second}) == 1
@@ -1,8 +1,12 @@
 import csv
 import logging
+import operator
+
+import pytest
 
 import matching.rules.rule as rl
 from matching.mentor import Mentor
+from matching.solvers import SOLVERS
 from matching.process import (
     create_participant_list_from_path,
     Mentee,
@@ -10,6 +14,7 @@ from matching.process import (
     conduct_matching_from_file,
     create_mailing_list,
     generate_match_matrix,
+    process_data,
 )
 
 
@@ -93,3 +98,51 @@ class TestProcess:
             assert {"match 1 email", "match 2 email", "match 3 email"}.issubset(
                 set(next(file_reader))
             )
+
+    def test_vectorised_scoring_makes_the_same_assignments(self, varied_cohort):
+        rules = [
+            rl.Disqualify(rl.Grade(3, operator.gt).evaluate),
+            rl.Grade(1, operator.eq, {True: 4, False: 0}),
+            rl.Equivalent("profession", {True: 3, False: 0}),
+            rl.Generic(
+                {True: 2, False: 0},
+                lambda match: match.mentee.organisation != match.mentor.organisation,
+            ),
+            rl.UnmatchedBonus(5),
+        ]
+
+        def _assignments(mentors, mentees, engine):
+            process_data(mentors, mentees, [rules, rules, rules], scoring=engine)
+            return [[mentee.email for mentee in mentor.mentees] for mentor in mentors]
+
+        assert _assignments(*varied_cohort(), "vectorised") == _assignments(
+            *varied_cohort(), "object"
+        )
+
+    @pytest.mark.parametrize("engine", ["vectorised", "incremental"])
+    def test_a_mentor_nobody_can_match_is_solved_like_object_scoring(
+        self, varied_cohort, engine
+    ):
+        rules = [
+            rl.Disqualify(lambda match: match.mentor.email == "mentor.0@gov.uk"),
+            rl.Grade(1, operator.eq, {True: 4, False: 0}),
+            rl.UnmatchedBonus(5),
+        ]
+
+        def _assignments(mentors, mentees, scoring):
+            process_data(mentors, mentees, [rules] * 3, scoring=scoring)
+            return [[mentee.email for mentee in mentor.mentees] for mentor in mentors]
+
+        for seed in range(10):
+            cohort = varied_cohort(mentor_count=5, mentee_count=2, seed=seed)
+            assert _assignments(*cohort, engine) == _assignments(
+                *varied_cohort(mentor_count=5, mentee_count=2, seed=seed), "object"
+            )
+
+    @pytest.mark.parametrize("solver", list(SOLVERS))
+    def test_every_solver_matches_everyone(self, varied_cohort, solver):
+        mentors, mentees = process_data(
+            *varied_cohort(), [self.default_rules] * 3, solver=solver
+        )
+        assert all(len(mentee.mentors) > 0 for mentee in mentees)
+        assert all(len(mentor.mentees) == 3 for mentor in mentors)
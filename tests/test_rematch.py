@@ -0,0 +1,160 @@
+import operator
+
+import pytest
+
+import matching.rules.rule as rl
+from matching.mentee import Mentee
+from matching.mentor import Mentor
+from matching.observer import Profiler
+from matching.process import create_mailing_list, generate_score_matrix, process_data
+from matching.rematch import (
+    load_pairs,
+    read_exported_pairs,
+    rematch,
+    rematch_from_file,
+    save_pairs,
+)
+
+RULES = [
+    rl.Disqualify(rl.Grade(2, operator.gt).evaluate),
+    rl.Disqualify(rl.Equivalent("organisation").evaluate),
+    rl.Equivalent("profession", {True: 4, False: 1}),
+    rl.Grade(1, operator.eq, {True: 6, False: 1}),
+]
+
+
+def _pairs(mentors):
+    return {
+        (mentor.email, mentee.email) for mentor in mentors for mentee in mentor.mentees
+    }
+
+
+def _late(participant_class, count):
+    return [
+        participant_class(
+            email=f"late.{participant_class.__name__.lower()}.{i}@gov.uk",
+            grade=i % 3 + (3 if participant_class is Mentor else 1),
+            organisation="Department Z",
+            profession="Policy",
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def previous_run(varied_cohort):
+    mentors, _ = process_data(*varied_cohort(), [RULES] * 2, capacity_matching=True)
+    return _pairs(mentors)
+
+
+class TestPreviousPairs:
+    def test_state_file_round_trip(self, varied_cohort, tmp_path):
+        mentors, _ = process_data(*varied_cohort(), [RULES], capacity_matching=True)
+        save_pairs(mentors, tmp_path / "state.json")
+        assert set(load_pairs(tmp_path / "state.json")) == _pairs(mentors)
+
+    @pytest.mark.parametrize("file_format", ["csv", "csv.gz"])
+    def test_exported_lists(self, varied_cohort, tmp_path, file_format):
+        mentors, mentees = process_data(
+            *varied_cohort(), [RULES] * 2, capacity_matching=True
+        )
+        create_mailing_list(mentors, tmp_path, file_format)
+        create_mailing_list(mentees, tmp_path, file_format)
+        assert set(read_exported_pairs(tmp_path)) == _pairs(mentors)
+        assert set(load_pairs(tmp_path)) == _pairs(mentors)
+
+
+class TestRematch:
+    def test_keeps_pairs_and_fills_spare_places(self, varied_cohort, previous_run):
+        mentors, mentees = varied_cohort()
+        removed = {mentors[0].email, mentees[0].email}
+        late_mentors, late_mentees = _late(Mentor, 2), _late(Mentee, 3)
+        profiler = Profiler()
+        mentors, mentees = rematch(
+            mentors,
+            mentees,
+            previous_run,
+            [RULES] * 2,
+            late_mentors,
+            late_mentees,
+            removed,
+            observer=profiler,
+        )
+        assert not removed & {person.email for person in mentors + mentees}
+        pairs = _pairs(mentors)
+        survivors = {
+            (mentor, mentee)
+            for mentor, mentee in previous_run
+            if mentor not in removed and mentee not in removed
+        }
+        assert survivors < pairs
+        assert any(person.connections for person in late_mentors + late_mentees)
+        assert all(len(person.connections) <= 2 for person in mentors + mentees)
+        # only the people with room for more connections were scored
+        assert profiler.rounds[0]["mentors"] < len(mentors)
+        assert profiler.rounds[0]["matched"] == len(pairs) - len(survivors)
+
+    def test_nothing_changed(self, varied_cohort, previous_run):
+        mentors, _ = rematch(*varied_cohort(), previous_run, [RULES] * 2)
+        assert _pairs(mentors) == previous_run
+
+    def test_pairs_already_connected_are_not_made_twice(self, varied_cohort):
+        mentors, mentees = varied_cohort()
+        mentors[1].mentees.append(mentees[1])
+        mentees[1].mentors.append(mentors[1])
+        mentors, _ = rematch(
+            mentors, mentees, [(mentors[1].email, mentees[1].email)], [RULES]
+        )
+        assert mentors[1].mentees.count(mentees[1]) == 1
+
+    def test_high_threshold_keeps_every_pair(self, varied_cohort, previous_run):
+        mentors, mentees = varied_cohort()
+        mentors, _ = rematch(
+            mentors,
+            mentees,
+            previous_run,
+            [RULES] * 2,
+            added_mentees=_late(Mentee, 3),
+            improvement_threshold=1000,
+        )
+        assert previous_run <= _pairs(mentors)
+
+    def test_low_threshold_scores_at_least_as_well(self, varied_cohort, previous_run):
+        late_mentees = _late(Mentee, 5)
+        scores = generate_score_matrix(
+            varied_cohort()[0], varied_cohort()[1] + late_mentees, RULES
+        ).masked_scores()
+
+        def _total(mentors, mentees):
+            emails = [mentee.email for mentee in mentees]
+            return sum(
+                scores[i, emails.index(mentee.email)]
+                for i, mentor in enumerate(mentors)
+                for mentee in mentor.mentees
+            )
+
+        kept = rematch(
+            *varied_cohort(), previous_run, [RULES] * 2, added_mentees=_late(Mentee, 5)
+        )
+        resolved = rematch(
+            *varied_cohort(),
+            previous_run,
+            [RULES] * 2,
+            added_mentees=_late(Mentee, 5),
+            improvement_threshold=0,
+        )
+        assert _total(*resolved) >= _total(*kept)
+
+    def test_rematch_from_file(self, known_file, tmp_path):
+        known_file(tmp_path, "mentor", 10)
+        known_file(tmp_path, "mentee", 10)
+        generous = [rl.Generic({True: 1, False: 1}, lambda match: True)]
+        save_pairs([], tmp_path / "state.json")
+        mentors, mentees = rematch_from_file(
+            tmp_path,
+            tmp_path / "state.json",
+            [generous],
+            removed={"mentor.00@gov.uk"},
+        )
+        assert len(mentors) == 9
+        assert all(len(mentor.mentees) == 1 for mentor in mentors)
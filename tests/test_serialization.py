@@ -0,0 +1,136 @@
+import json
+
+import pytest
+
+from matching.connections import connect_all
+from matching.mentor import Mentor
+from matching.person import Person
+from matching.serialization import (
+    cohort_from_bytes,
+    cohort_from_dict,
+    cohort_to_bytes,
+    cohort_to_dict,
+)
+
+
+def _through_json(participants, **kwargs):
+    return cohort_from_dict(
+        json.loads(json.dumps(cohort_to_dict(participants))), **kwargs
+    )
+
+
+def _through_bytes(participants, **kwargs):
+    return cohort_from_bytes(cohort_to_bytes(participants), **kwargs)
+
+
+ROUND_TRIPS = [_through_json, _through_bytes]
+
+
+def _details(person):
+    return (
+        type(person),
+        person.email,
+        person.first_name,
+        person.last_name,
+        person.role,
+        person.organisation,
+        person.grade,
+        person.profession,
+        person.capacity,
+        [connection.email for connection in person.connections],
+    )
+
+
+@pytest.fixture
+def matched_cohort(varied_cohort):
+    mentors, mentees = varied_cohort(mentor_count=6, mentee_count=8)
+    mentors[0].capacity = 5
+    mentees[3].role = None
+    connect_all(
+        [
+            (mentors[0], mentees[0]),
+            (mentors[0], mentees[1]),
+            (mentors[0], mentees[2]),
+            (mentors[0], mentees[3]),
+            (mentors[1], mentees[0]),
+            (mentors[2], mentees[4]),
+        ]
+    )
+    return mentors, mentees
+
+
+@pytest.mark.parametrize("round_trip", ROUND_TRIPS)
+class TestRoundTrip:
+    def test_everything_comes_back(self, matched_cohort, round_trip):
+        mentors, mentees = matched_cohort
+        rebuilt = round_trip(mentors + mentees)
+        assert [_details(person) for person in rebuilt] == [
+            _details(person) for person in mentors + mentees
+        ]
+
+    def test_everyone_is_built_once(self, matched_cohort, round_trip):
+        mentors, mentees = matched_cohort
+        rebuilt = round_trip(mentors + mentees)
+        mentor, mentee = rebuilt[0], rebuilt[len(mentors)]
+        assert mentor.mentees[0] is mentee
+        assert mentee.mentors[0] is mentor
+        assert rebuilt[1].mentees[0] is mentee
+
+    def test_connections_outside_the_list_are_included(
+        self, matched_cohort, round_trip
+    ):
+        mentors, mentees = matched_cohort
+        rebuilt = round_trip(mentors[:1])
+        assert [person.email for person in rebuilt] == [
+            mentors[0].email,
+            *(mentee.email for mentee in mentees[:4]),
+            mentors[1].email,
+        ]
+        assert rebuilt[1].mentors[1] is rebuilt[-1]
+
+    def test_custom_types(self, matched_cohort, round_trip):
+        class Volunteer(Mentor):
+            pass
+
+        mentors, mentees = matched_cohort
+        helper = Person(email="helper@gov.uk", grade=2)
+        rebuilt = round_trip(
+            [*mentors, *mentees, helper], participant_types={"mentor": Volunteer}
+        )
+        assert type(rebuilt[0]) is Volunteer
+        assert type(rebuilt[len(mentors)]) is type(mentees[0])
+        assert type(rebuilt[-1]) is Person
+
+    def test_nobody(self, round_trip):
+        assert round_trip([]) == []
+
+
+class TestErrors:
+    def test_unknown_version(self, matched_cohort):
+        data = cohort_to_dict(matched_cohort[0])
+        data["version"] = 99
+        with pytest.raises(ValueError):
+            cohort_from_dict(data)
+
+    def test_unknown_fields(self, matched_cohort):
+        data = cohort_to_dict(matched_cohort[0])
+        data["fields"] = data["fields"][::-1]
+        with pytest.raises(ValueError):
+            cohort_from_dict(data)
+
+    def test_connection_to_nobody(self, matched_cohort):
+        data = cohort_to_dict(matched_cohort[0])
+        data["connections"].append([0, len(data["participants"])])
+        with pytest.raises(ValueError, match="refers to participant"):
+            cohort_from_dict(data)
+
+    def test_not_a_cohort(self):
+        with pytest.raises(ValueError):
+            cohort_from_bytes(b"")
+        with pytest.raises(ValueError):
+            cohort_from_bytes(b"x" * 64)
+
+    def test_cut_short(self, matched_cohort):
+        data = cohort_to_bytes(matched_cohort[0])
+        with pytest.raises(ValueError, match="cut short"):
+            cohort_from_bytes(data[:-1])
@@ -0,0 +1,168 @@
+import random
+import sys
+
+import numpy as np
+import pytest
+
+import matching.rules.rule as rl
+from matching.observer import Profiler
+from matching.process import calculate_matches, process_data
+from matching.solvers import (
+    EXACT_SOLVERS,
+    SOLVERS,
+    AuctionSolver,
+    GreedySolver,
+    as_cost_array,
+    cost_dtype,
+    get_solver,
+    prepare_costs,
+)
+
+
+def random_costs(rows, columns, seed):
+    generator = random.Random(seed)
+    return [[generator.randint(0, 20) for _ in range(columns)] for _ in range(rows)]
+
+
+def total_cost(costs, assignment):
+    return sum(costs[row][column] for row, column in assignment)
+
+
+class TestSolvers:
+    @pytest.mark.parametrize("solver", sorted(EXACT_SOLVERS.intersection(SOLVERS)))
+    @pytest.mark.parametrize("shape", [(1, 1), (5, 5), (12, 7), (7, 12), (20, 20)])
+    @pytest.mark.parametrize("seed", range(3))
+    def test_solvers_find_an_optimal_assignment(self, solver, shape, seed):
+        costs = random_costs(*shape, seed)
+        assignment = get_solver(solver).solve(costs)
+        assert len(assignment) == min(shape)
+        assert len({row for row, _ in assignment}) == min(shape)
+        assert len({column for _, column in assignment}) == min(shape)
+        assert total_cost(costs, assignment) == total_cost(
+            costs, get_solver("munkres").solve(costs)
+        )
+
+    @pytest.mark.parametrize("solver", list(SOLVERS))
+    def test_solvers_handle_empty_matrices(self, solver):
+        assert get_solver(solver).solve([]) == []
+
+    def test_scipy_solver_is_registered_when_available(self):
+        pytest.importorskip("scipy")
+        assert "scipy" in SOLVERS
+
+    def test_unknown_solver(self):
+        with pytest.raises(ValueError):
+            calculate_matches([[1]], solver="guesswork")
+
+    def test_costs_near_maxsize_are_shifted(self):
+        costs = as_cost_array([[2**63 - 1, 2**63 - 3], [2**63 - 2, 2**63 - 1]])
+        assert costs.tolist() == [[2, 0], [1, 2]]
+
+    def test_prepared_costs_are_solved_without_a_copy(self):
+        costs = prepare_costs(np.array([[3, 7], [0, 5]]))
+        assert as_cost_array(costs) is costs
+        # two of these could overflow when added up, so they're solved as floats
+        wide = np.array([[0, 2**30], [2**30, 0]], dtype=np.int32)
+        assert as_cost_array(wide).dtype == np.float64
+
+    @pytest.mark.parametrize("solver", ["jonker-volgenant", "greedy", "auction"])
+    @pytest.mark.parametrize("seed", range(3))
+    def test_integer_costs_are_solved_as_floats_would_be(self, solver, seed):
+        generator = np.random.default_rng(seed)
+        costs = prepare_costs(generator.integers(0, 50, size=(12, 17)))
+        assert get_solver(solver).solve(costs) == get_solver(solver).solve(
+            costs.astype(np.float64)
+        )
+
+
+class TestPrepareCosts:
+    def test_costs_are_the_highest_score_less_each_score(self):
+        costs = prepare_costs(np.array([[3, 7], [0, 5]]))
+        assert costs.dtype == np.int32
+        assert costs.flags["C_CONTIGUOUS"]
+        assert costs.tolist() == [[4, 0], [7, 2]]
+
+    def test_disallowed_pairs_cost_the_same_as_scoring_zero(self):
+        costs = prepare_costs(
+            np.array([[3, 7], [9, 5]]), np.array([[False, True], [False, False]])
+        )
+        assert costs.tolist() == [[6, 9], [0, 4]]
+
+    def test_large_spreads_use_64_bits(self):
+        assert prepare_costs(np.array([[0, 2**31], [1, 2]])).dtype == np.int64
+        assert cost_dtype(2**20, 2**11) == np.int64
+        assert cost_dtype(2**20, 2**10) == np.int32
+
+    def test_empty(self):
+        assert prepare_costs(np.zeros((0, 3), dtype=int)).shape == (0, 3)
+
+    @pytest.mark.parametrize("solver", ["munkres", "jonker-volgenant"])
+    @pytest.mark.parametrize("seed", range(5))
+    def test_same_assignment_as_costs_near_maxsize(self, solver, seed):
+        generator = np.random.default_rng(seed)
+        scores = generator.integers(0, 30, size=(9, 13))
+        disallowed = generator.random(scores.shape) < 0.3
+        old = [
+            [sys.maxsize - score for score in row]
+            for row in np.where(disallowed, 0, scores).tolist()
+        ]
+        assert get_solver(solver).solve(
+            prepare_costs(scores, disallowed)
+        ) == get_solver(solver).solve(old)
+
+
+class TestApproximateSolvers:
+    @pytest.mark.parametrize(
+        "solver", [GreedySolver(0), GreedySolver(), AuctionSolver(), AuctionSolver(5)]
+    )
+    @pytest.mark.parametrize("shape", [(1, 1), (1, 4), (12, 7), (7, 12), (20, 20)])
+    def test_assignments_are_complete(self, solver, shape):
+        costs = random_costs(*shape, 0)
+        assignment = solver.solve(costs)
+        assert len({row for row, _ in assignment}) == min(shape)
+        assert len({column for _, column in assignment}) == min(shape)
+        assert solver.iterations > 0
+
+    @pytest.mark.parametrize("epsilon", [0.5, 2, 10])
+    @pytest.mark.parametrize("seed", range(5))
+    def test_auction_is_within_its_bound(self, epsilon, seed):
+        costs = random_costs(15, 20, seed)
+        optimum = total_cost(costs, get_solver("munkres").solve(costs))
+        assignment = AuctionSolver(epsilon).solve(costs)
+        assert optimum <= total_cost(costs, assignment) <= optimum + 15 * epsilon
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_small_epsilon_is_exact(self, seed):
+        costs = random_costs(15, 20, seed)
+        assert total_cost(costs, AuctionSolver(1 / 16).solve(costs)) == total_cost(
+            costs, get_solver("munkres").solve(costs)
+        )
+
+    def test_improvement_passes_only_help(self):
+        costs = random_costs(40, 50, 0)
+        greedy = total_cost(costs, GreedySolver(0).solve(costs))
+        improved = total_cost(costs, GreedySolver(3).solve(costs))
+        assert total_cost(costs, get_solver("munkres").solve(costs)) <= improved
+        assert improved <= greedy
+
+    def test_epsilon_must_be_positive(self):
+        with pytest.raises(ValueError):
+            AuctionSolver(0)
+
+    def test_solver_instances_are_used_as_they_are(self):
+        solver = AuctionSolver(epsilon=3)
+        assert get_solver(solver) is solver
+
+    def test_process_data_with_an_approximate_solver(self, varied_cohort):
+        rules = [rl.Generic({True: 1, False: 0}, lambda match: True)]
+        profiler = Profiler()
+        mentors, _ = process_data(
+            *varied_cohort(),
+            [rules, rules],
+            solver=AuctionSolver(epsilon=2),
+            observer=profiler,
+        )
+        assert all(len(mentor.mentees) == 2 for mentor in mentors)
+        assert [round_["solver"] for round_ in profiler.rounds] == ["AuctionSolver"] * 2
+        assert all(round_["solver_iterations"] > 0 for round_ in profiler.rounds)
+        assert process_data(*varied_cohort(), [rules], solver="greedy")[0]
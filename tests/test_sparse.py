@@ -0,0 +1,75 @@
+import operator
+import random
+
+import numpy as np
+import pytest
+
+import matching.rules.rule as rl
+from matching.process import (
+    generate_candidate_graph,
+    generate_score_matrix,
+    process_data,
+)
+from matching.solvers import get_solver
+from matching.sparse import CandidateGraph, SparseAssignmentSolver
+
+
+def graph_from_dense(scores: np.ndarray) -> CandidateGraph:
+    rows, columns = np.nonzero(scores)
+    indptr = np.zeros(scores.shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=scores.shape[0]), out=indptr[1:])
+    return CandidateGraph(scores.shape, indptr, columns, scores[rows, columns])
+
+
+class TestSparse:
+    rules = [
+        rl.Disqualify(rl.Grade(2, operator.gt).evaluate),
+        rl.Disqualify(rl.Grade(0, operator.le).evaluate),
+        rl.Equivalent("profession", {True: 4, False: 0}),
+        rl.Equivalent("organisation", {True: 0, False: 2}),
+    ]
+
+    @pytest.mark.parametrize("block_size", [1, 7, 256])
+    def test_candidate_graph_keeps_allowed_nonzero_pairs(
+        self, varied_cohort, block_size
+    ):
+        mentors, mentees = varied_cohort()
+        score_matrix = generate_score_matrix(mentors, mentees, self.rules)
+        graph = generate_candidate_graph(mentors, mentees, self.rules, block_size)
+        expected = score_matrix.masked_scores()
+        assert graph.edge_count == np.count_nonzero(expected)
+        for mentor in range(len(mentors)):
+            columns, scores = graph.row(mentor)
+            assert columns.tolist() == np.flatnonzero(expected[mentor]).tolist()
+            assert scores.tolist() == expected[mentor][columns].tolist()
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_solver_finds_the_best_total_score(self, seed):
+        generator = random.Random(seed)
+        shape = generator.randint(1, 10), generator.randint(1, 10)
+        scores = np.array(
+            [
+                [generator.choice([0, 0, 1, 3, 5]) for _ in range(shape[1])]
+                for _ in range(shape[0])
+            ]
+        )
+        assignment = SparseAssignmentSolver().solve(graph_from_dense(scores))
+        dense_assignment = get_solver("jonker-volgenant").solve(scores.max() - scores)
+        assert len({column for _, column in assignment}) == len(assignment)
+        assert all(scores[row, column] > 0 for row, column in assignment)
+        assert sum(scores[row, column] for row, column in assignment) == sum(
+            scores[row, column] for row, column in dense_assignment
+        )
+
+    def test_sparse_matching_scores_as_well_as_dense(self, varied_cohort):
+        def _total_score(scoring):
+            mentors, mentees = varied_cohort()
+            score_matrix = generate_score_matrix(mentors, mentees, self.rules)
+            process_data(mentors, mentees, [self.rules], scoring=scoring)
+            return sum(
+                score_matrix.masked_scores()[i, mentees.index(mentee)]
+                for i, mentor in enumerate(mentors)
+                for mentee in mentor.mentees
+            )
+
+        assert _total_score("sparse") == _total_score("vectorised")
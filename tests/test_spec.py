@@ -0,0 +1,154 @@
+import json
+import operator
+import sys
+
+import numpy as np
+import pytest
+
+import matching.rules.rule as rl
+from matching.__main__ import main
+from matching.cache import ScoreCache
+from matching.process import generate_score_matrix
+from matching.rules.spec import load_rules, rule_from_spec, rules_from_spec
+
+TOML = """
+rounds = 3
+
+[[rules]]
+type = "disqualify"
+condition = "mentor.grade - mentee.grade > 2 or mentor.grade <= mentee.grade"
+
+[[rules]]
+type = "disqualify"
+rule = { type = "equivalent", attribute = "organisation" }
+
+[[rules]]
+type = "grade"
+difference = 1
+operator = "=="
+scores = { true = 12, false = 0 }
+
+[[rules]]
+type = "equivalent"
+attribute = "profession"
+scores = { true = 4 }
+
+[[rules]]
+type = "unmatched_bonus"
+bonus = 6
+"""
+
+YAML = """
+rounds:
+  - rules:
+      - {type: grade, difference: 1, operator: "==", scores: {true: 12, false: 0}}
+  - rules:
+      - type: generic
+        condition: mentor.profession == mentee.profession
+        scores: {true: 4}
+"""
+
+
+def _python_rules():
+    return [
+        rl.Disqualify(rl.Grade(2, operator.gt).evaluate),
+        rl.Disqualify(rl.Grade(0, operator.le).evaluate),
+        rl.Disqualify(rl.Equivalent("organisation").evaluate),
+        rl.Grade(1, operator.eq, {True: 12, False: 0}),
+        rl.Equivalent("profession", {True: 4, False: 0}),
+        rl.UnmatchedBonus(6),
+    ]
+
+
+class TestRulesFromSpec:
+    def test_toml_scores_like_the_same_rules_in_python(self, varied_cohort, tmp_path):
+        path = tmp_path / "rules.toml"
+        path.write_text(TOML)
+        rounds = load_rules(path)
+        assert len(rounds) == 3 and rounds[0] is rounds[1] is rounds[2]
+        mentors, mentees = varied_cohort()
+        expected = generate_score_matrix(mentors, mentees, _python_rules())
+        actual = generate_score_matrix(mentors, mentees, rounds[0])
+        assert np.array_equal(expected.scores, actual.scores)
+        assert np.array_equal(expected.disallowed, actual.disallowed)
+
+    def test_every_rule_can_be_cached(self, tmp_path):
+        path = tmp_path / "rules.toml"
+        path.write_text(TOML)
+        assert all(ScoreCache.can_cache(rule) for rule in load_rules(path)[0])
+
+    def test_rounds_with_their_own_rules(self, tmp_path):
+        pytest.importorskip("yaml")
+        path = tmp_path / "rules.yaml"
+        path.write_text(YAML)
+        first, second = load_rules(path)
+        assert isinstance(first[0], rl.Grade) and first[0].results[True] == 12
+        assert isinstance(second[0], rl.Generic)
+        assert second[0].results == {True: 4, False: 0}
+
+    def test_json(self, tmp_path):
+        path = tmp_path / "rules.json"
+        path.write_text(
+            json.dumps({"rules": [{"type": "unmatched_bonus", "bonus": 3}]})
+        )
+        (rules,) = load_rules(path)
+        assert isinstance(rules[0], rl.UnmatchedBonus)
+        assert rules[0].results[True] == 3
+
+    @pytest.mark.parametrize(
+        "spec",
+        [
+            {"type": "unknown"},
+            {"type": "grade", "difference": 1},
+            {"type": "grade", "difference": 1, "operator": "=>"},
+            {"type": "grade", "difference": "1", "operator": ">"},
+            {"type": "equivalent", "attribute": "profession", "score": 4},
+            {"type": "equivalent", "attribute": "profession", "scores": {"yes": 4}},
+            {"type": "equivalent", "attribute": "profession", "scores": {"true": 0.5}},
+            {"type": "generic", "condition": "mentor.grade"},
+            {"type": "disqualify"},
+            {"type": "disqualify", "condition": "True", "rule": {"type": "grade"}},
+            "grade",
+        ],
+    )
+    def test_mistakes(self, spec):
+        with pytest.raises(ValueError):
+            rule_from_spec(spec)
+
+    def test_mistakes_say_where_they_are(self):
+        with pytest.raises(ValueError, match="Round 2, rule 1"):
+            rules_from_spec({"rounds": [{"rules": []}, {"rules": [{"type": "x"}]}]})
+        with pytest.raises(ValueError):
+            rules_from_spec({"rounds": 0, "rules": []})
+
+    def test_unknown_format(self, tmp_path):
+        path = tmp_path / "rules.txt"
+        path.write_text("")
+        with pytest.raises(ValueError):
+            load_rules(path)
+
+
+def test_command_line_uses_rules(
+    test_data_path, test_participants, tmp_path, monkeypatch
+):
+    path = tmp_path / "rules.json"
+    path.write_text(
+        json.dumps(
+            {
+                "rounds": 1,
+                "rules": [
+                    {
+                        "type": "grade",
+                        "difference": 2,
+                        "operator": "==",
+                        "scores": {"true": 10},
+                    }
+                ],
+            }
+        )
+    )
+    monkeypatch.setattr(
+        sys, "argv", ["matching", str(test_data_path), "--rules", str(path)]
+    )
+    main()
+    assert (test_data_path / "output" / "mentors-list.csv").exists()
@@ -0,0 +1,136 @@
+import copy
+import operator
+
+import pytest
+
+from matching.process import process_data
+from matching.rules.expression import Expression
+from matching.rules.rule import Disqualify, Equivalent, Generic, Grade
+from matching.rules.spec import rules_from_spec
+from matching.sweep import Scenario, sweep
+
+SPEC = {
+    "rules": [
+        {"type": "disqualify", "condition": "mentor.grade <= mentee.grade"},
+        {"type": "equivalent", "attribute": "profession", "scores": {"true": 4}},
+        {"type": "equivalent", "attribute": "organisation", "scores": {"false": 3}},
+        {"type": "grade", "difference": 2, "operator": "==", "scores": {"true": 5}},
+        {"type": "unmatched_bonus", "bonus": 6},
+    ]
+}
+
+SCENARIOS = [
+    Scenario("as written"),
+    Scenario("profession first", {1: {True: 20}}),
+    Scenario("mix organisations", {2: {True: 0, False: 15}, 4: {True: 1}}),
+]
+
+
+def _with_scores(rules, scores):
+    rules = copy.deepcopy(rules)
+    for position, score_dict in scores.items():
+        rules[position].results = dict(score_dict)
+    return rules
+
+
+def _pairs(mentors, mentees):
+    emails = {mentee.email: number for number, mentee in enumerate(mentees)}
+    return sorted(
+        (number, emails[mentee.email])
+        for number, mentor in enumerate(mentors)
+        for mentee in mentor.mentees
+    )
+
+
+@pytest.mark.parametrize("rounds", [1, 3])
+def test_matches_as_process_data_would(varied_cohort, rounds):
+    rules = rules_from_spec(SPEC)[0]
+    mentors, mentees = varied_cohort(mentor_count=12, mentee_count=15)
+    results = sweep(mentors, mentees, rules, SCENARIOS, rounds=rounds)
+    assert not any(mentor.connections for mentor in mentors)
+    for scenario, result in zip(SCENARIOS, results):
+        fresh_mentors, fresh_mentees = varied_cohort(mentor_count=12, mentee_count=15)
+        process_data(
+            fresh_mentors,
+            fresh_mentees,
+            [_with_scores(rules, scenario.scores)] * rounds,
+            scoring="vectorised",
+        )
+        assert result.name == scenario.name
+        assert len(result.pairs) == rounds
+        assert sorted(
+            pair for assignment in result.pairs for pair in assignment
+        ) == _pairs(fresh_mentors, fresh_mentees)
+        assert result.matched == len(_pairs(fresh_mentors, fresh_mentees))
+    assert results[0].total_score != results[2].total_score
+
+
+def test_disqualifications_that_depend_on_connections_can_be_lifted(varied_cohort):
+    rules = [
+        Disqualify(
+            Expression("mentee.connections == 0 and mentor.grade <= 3").evaluate
+        ),
+        Grade(1, operator.gt, {True: 1}),
+    ]
+    mentors, mentees = varied_cohort(mentor_count=6, mentee_count=3)
+    (result,) = sweep(mentors, mentees, rules, [Scenario("as written")], rounds=2)
+    process_data(mentors, mentees, [rules, rules], scoring="vectorised")
+    # a mentor of grade 3 or below can only be matched once their mentee has someone
+    assert any(mentors[mentor].grade <= 3 for mentor, _ in result.pairs[1])
+    assert sorted(pair for assignment in result.pairs for pair in assignment) == _pairs(
+        mentors, mentees
+    )
+
+
+def test_metrics(varied_cohort):
+    mentors, mentees = varied_cohort(mentor_count=8, mentee_count=8)
+    rules = [Equivalent("organisation", {True: 10, False: 0})]
+    (result,) = sweep(mentors, mentees, rules, [Scenario("together")])
+    pairs = result.pairs[0]
+    assert result.mentors_matched == result.mentees_matched == result.matched == 8
+    assert result.same_organisation == sum(
+        mentors[mentor].organisation == mentees[mentee].organisation
+        for mentor, mentee in pairs
+    )
+    assert result.total_score == 10 * result.same_organisation
+    assert sum(result.organisations.values()) == 8
+    (apart,) = sweep(
+        mentors, mentees, rules, [Scenario("apart", {0: {True: 0, False: 10}})]
+    )
+    assert apart.same_organisation < result.same_organisation
+
+
+def test_in_parallel(varied_cohort):
+    rules = rules_from_spec(SPEC)[0]
+    mentors, mentees = varied_cohort(mentor_count=10, mentee_count=10)
+    assert sweep(mentors, mentees, rules, SCENARIOS, rounds=2, workers=2) == sweep(
+        mentors, mentees, rules, SCENARIOS, rounds=2
+    )
+
+
+def test_rules_are_evaluated_once(varied_cohort, monkeypatch):
+    calls = []
+    evaluate_array = Grade.evaluate_array
+
+    def count(self, mentors, mentees):
+        calls.append(self)
+        return evaluate_array(self, mentors, mentees)
+
+    monkeypatch.setattr(Grade, "evaluate_array", count)
+    mentors, mentees = varied_cohort(mentor_count=5, mentee_count=5)
+    scenarios = [Scenario(str(points), {0: {True: points}}) for points in range(6)]
+    sweep(mentors, mentees, [Grade(1, operator.eq, {True: 1})], scenarios, rounds=3)
+    assert len(calls) == 1
+
+
+def test_mistakes(varied_cohort):
+    mentors, mentees = varied_cohort(mentor_count=3, mentee_count=3)
+    rules = rules_from_spec(SPEC)[0]
+    with pytest.raises(ValueError):
+        sweep(mentors, mentees, rules, [Scenario("nothing", {9: {True: 1}})])
+    with pytest.raises(ValueError):
+        sweep(mentors, mentees, rules, [Scenario("disqualify", {0: {True: 1}})])
+    lambda_rule = Generic({True: 1}, lambda match: match.mentor.connections)
+    with pytest.raises(ValueError):
+        sweep(mentors, mentees, [lambda_rule], [Scenario("lambda")], rounds=2)
+    assert sweep(mentors, mentees, [lambda_rule], [Scenario("lambda")])[0].matched